@@ -4,9 +4,8 @@ from django.db.models import Q
 from .models import Project
 from .serializers import ProjectSerializer
 from django.contrib.auth import get_user_model
-from notifications.models import Notification
-from django.core.mail import send_mail
-from django.conf import settings
+from notifications.service import notify
+from emails.outbox import enqueue
 
 def send_project_created_email(recipient, creator, project):
     subject = f"[InsureTM] Nouveau projet créé : {project.name}"
@@ -19,7 +18,8 @@ Un nouveau projet vient d'être créé sur la plateforme InsureTM par {creator.u
 
 Connectez-vous pour voir les détails.
 """
-    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient.email], fail_silently=True)
+    if recipient.email:
+        enqueue(subject, recipient.email, message)
 
 class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
@@ -53,14 +53,13 @@ class ProjectViewSet(viewsets.ModelViewSet):
         
         # Notify all ADMINs
         User = get_user_model()
-        admins = User.objects.filter(role='ADMIN').exclude(id=self.request.user.id)
-        
+        admins = list(User.objects.filter(role='ADMIN').exclude(id=self.request.user.id))
+        notify(
+            admins,
+            title="Nouveau Projet",
+            message=f"{self.request.user.username} a créé le projet : {instance.name}",
+            type='info',
+        )
         for admin in admins:
-            Notification.objects.create(
-                recipient=admin,
-                title="Nouveau Projet",
-                message=f"{self.request.user.username} a créé le projet : {instance.name}",
-                type='info'
-            )
             if admin.email:
                 send_project_created_email(admin, self.request.user, instance)
\ No newline at end of file
@@ -102,9 +102,10 @@ class GroqService:
         
         base_schema += """
         2. campaigns_campaign (id, title, description, start_date, estimated_end_date, created_at, scheduled_at, nb_test_cases, project_id, imported_by_id)
-        3. "testCases_testcase" (id, test_case_ref, data_json, status, campaign_id, tester_id, execution_date)
+        3. "testCases_testcase" (id, test_case_ref, data_json, module, status, campaign_id, tester_id, execution_date)
            - status values: 'PENDING', 'PASSED', 'FAILED'
-           - data_json: JSON field containing extra details like 'Module', 'Domaine', 'Etape', 'Attendu' (e.g. data_json->>'Module' or inside array of objects).
+           - module: indexed functional module ('Module' / 'Domaine' from data_json, '' when unknown). Always GROUP BY / filter on module, never on data_json->>'Module'.
+           - data_json: JSON field containing extra details like 'Etape', 'Attendu' (object or array of objects).
         4. "Project_project" (id, name, description, status, created_at)
         5. anomalies_anomalie (id, titre, description, impact, priorite, visibilite, cree_le, test_case_id, cree_par_id)
            - impact values: 'BLOQUANTES', 'CRITIQUE', 'MAJEUR', 'MINEURS', 'COSMETIQUE', 'TEXTE', 'SIMPLE', 'FONCTIONNALITE'
@@ -787,6 +788,9 @@ class GroqService:
                 "theme_name": "Inconnu"
             }
 
+    # Bump when the prompt below changes: cached scripts (testCases.GeneratedScript) are keyed on it
+    PLAYWRIGHT_PROMPT_VERSION = 1
+
     def generate_playwright_test(self, test_title, test_data_json):
         """
         Génère un script de test Playwright à partir de données JSON extraites d'Excel.
@@ -949,17 +953,22 @@ class GroqService:
         pattern = r'page\.locator\(\s*(["\'])(.*?)\1\s*\)'
         return re.sub(pattern, replace_match, code)
 
-    def generate_anomaly_from_logs(self, test_title, logs):
+    def generate_anomaly_from_logs(self, test_title, logs, excerpt=None):
         """
         Génère un titre et une description d'anomalie pertinents à partir des logs d'erreur Playwright.
         Distingue un bug de script (SCRIPT_ERROR) d'un vrai bug applicatif (APP_BUG).
+        Seul l'extrait du tri local (analytics.log_triage) est envoyé au modèle, ou `excerpt` s'il est fourni.
         """
+        if excerpt is None:
+            from .log_triage import triage_logs
+            excerpt = triage_logs(logs)['excerpt']
+
         prompt = f"""
         Tu es un expert QA senior. Un test Playwright automatisé vient d'échouer.
         Titre du Cas de Test : {test_title}
         
-        LOGS D'ERREUR PLAYWRIGHT :
-        {logs[-2000:]}
+        LOGS D'ERREUR PLAYWRIGHT (extrait trié : étape en échec, erreur, locator, pile) :
+        {excerpt}
         
         TON TRAVAIL EN 2 ÉTAPES :
         
@@ -992,9 +1001,9 @@ class GroqService:
             data = json.loads(response)
             cause = data.get("cause", "APP_BUG")
             titre = data.get("titre", f"Échec automatique : {test_title}")
-            description = data.get("description", logs[-1000:])
+            description = data.get("description", excerpt)
             
             return titre, description
         except Exception as e:
-            return f"Échec d'exécution : {test_title}", f"Le test automatisé a échoué. \n\nLogs d'erreur:\n{logs[-1000:]}"
+            return f"Échec d'exécution : {test_title}", f"Le test automatisé a échoué. \n\nLogs d'erreur:\n{excerpt}"
 
@@ -0,0 +1,188 @@
+"""
+Local triage of Playwright logs before they reach the LLM.
+
+A failed run produces the whole `DEBUG=pw:api` trace (thousands of lines), and pasted
+logs (diagnose_external_logs) can be anything.  `triage_logs` extracts, with plain
+regular expressions, what a diagnosis needs:
+
+- the failing test (reporter header) and the failing step (last pw:api `=> x started`
+  without its `<= x succeeded`), with the time spent in it;
+- the error message, locator, expected / received values, code frame and stack frames;
+- HTTP / network errors, and the last pw:api actions before the failure;
+- a deduplicated tail of the log when nothing structured was found.
+
+The result is a compact excerpt (at most `max_chars`) plus token estimates, so callers
+can report how much input was saved.
+"""
+import math
+import re
+
+DEFAULT_MAX_CHARS = 3000
+TIMELINE_STEPS = 8
+MAX_FRAMES = 5
+
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+_TIMESTAMP_RE = re.compile(r'^\d{4}-\d{2}-\d{2}T[\d:.]+Z\s+')
+_PW_API_RE = re.compile(r'pw:api\s+(?P<msg>.*?)(?:\s+\+(?P<delta>\d+(?:\.\d+)?)(?P<unit>ms|s|m))?\s*$')
+_STEP_START_RE = re.compile(r'^=>\s+(?P<step>\S+)\s+started')
+_STEP_END_RE = re.compile(r'^<=\s+(?P<step>\S+)\s+(?:succeeded|failed)')
+_TEST_HEADER_RE = re.compile(r'^\s*\d+\)\s+(?P<test>\[.+?\]\s+›\s+.+?)\s*[─-]*\s*$')
+_ERROR_RE = re.compile(r'^\s*(?:[A-Z]\w*Error|Error)(?:\s*:|\s+\w)')
+_LOCATOR_RE = re.compile(r'^\s*Locator:\s*(?P<value>.+)$')
+_WAITING_RE = re.compile(r'waiting for (?P<value>(?:locator|getBy\w+|frameLocator)\(.+)$')
+_EXPECTED_RE = re.compile(r'^\s*Expected(?: [\w ]+)?:\s*(?P<value>.+)$')
+_RECEIVED_RE = re.compile(r'^\s*Received(?: [\w ]+)?:\s*(?P<value>.+)$')
+_CODE_FRAME_RE = re.compile(r'^\s*>\s*\d+\s*\|')
+_FRAME_RE = re.compile(r'^\s*at\s+(?P<frame>.+)$')
+_HTTP_RE = re.compile(r'\b(?:status(?:\s+code)?|HTTP(?:/\d(?:\.\d)?)?)\s*[:=]?\s*(?P<code>[45]\d\d)\b|net::ERR_[A-Z_]+', re.IGNORECASE)
+_NUMBERS_RE = re.compile(r'\d+')
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token), enough to compare sizes."""
+    return math.ceil(len(text or '') / 4)
+
+
+def _clean(logs):
+    lines = []
+    for line in _ANSI_RE.sub('', logs or '').replace('\r', '').split('\n'):
+        line = _TIMESTAMP_RE.sub('', line.rstrip())
+        if line.strip():
+            lines.append(line)
+    return lines
+
+
+def dedupe_lines(lines):
+    """Keep the first occurrence of each line (numbers ignored), suffixed with its count."""
+    counts, order, first = {}, [], {}
+    for line in lines:
+        key = _NUMBERS_RE.sub('#', line.strip())
+        if key not in counts:
+            counts[key] = 0
+            order.append(key)
+            first[key] = line
+        counts[key] += 1
+    return [first[key] + (f'  (×{counts[key]})' if counts[key] > 1 else '') for key in order]
+
+
+def _delta_ms(match):
+    if not match.group('delta'):
+        return 0
+    value = float(match.group('delta'))
+    return value * {'ms': 1, 's': 1000, 'm': 60000}[match.group('unit')]
+
+
+def _parse_pw_api(lines):
+    """(failing step, ms spent in it, last actions) from the pw:api trace."""
+    open_steps, timeline = {}, []
+    last_started = None
+    for line in lines:
+        match = _PW_API_RE.search(line)
+        if not match:
+            continue
+        message, delta = match.group('msg'), _delta_ms(match)
+        for step in open_steps:
+            open_steps[step] += delta
+        timeline.append(message + (f' +{int(delta)}ms' if match.group('delta') else ''))
+        start = _STEP_START_RE.match(message)
+        if start:
+            last_started = start.group('step')
+            open_steps[last_started] = 0
+            continue
+        end = _STEP_END_RE.match(message)
+        if end:
+            open_steps.pop(end.group('step'), None)
+    failing = last_started if last_started in open_steps else None
+    return failing, (open_steps.get(failing) if failing else None), dedupe_lines(timeline)[-TIMELINE_STEPS:]
+
+
+def _first(regex, lines, group='value'):
+    for line in lines:
+        match = regex.search(line)
+        if match:
+            return match.group(group).strip()
+    return None
+
+
+def triage_logs(logs, max_chars=DEFAULT_MAX_CHARS):
+    """
+    Compact, deterministic summary of a (Playwright) log for the LLM.
+
+    Returns a dict: the extracted fields, `excerpt` (at most `max_chars`),
+    `tokens_in` / `tokens_out` estimates and `structured` (False when nothing
+    recognisable was found and the excerpt is a deduplicated tail).
+    """
+    lines = _clean(logs)
+    failing_step, step_ms, timeline = _parse_pw_api(lines)
+    non_api = [line for line in lines if 'pw:api' not in line]
+
+    # The error block starts at the first error line after the failing test header
+    header_index = next((i for i, line in enumerate(non_api) if _TEST_HEADER_RE.match(line)), None)
+    block = non_api[header_index + 1:] if header_index is not None else non_api
+    error_index = next((i for i, line in enumerate(block) if _ERROR_RE.match(line)), None)
+    error_block = block[error_index:] if error_index is not None else block
+
+    frames = []
+    for line in error_block:
+        match = _FRAME_RE.match(line)
+        if match and 'node_modules' not in line and 'node:internal' not in line:
+            frames.append(match.group('frame'))
+    waiting = [m.group('value').strip() for m in (_WAITING_RE.search(line) for line in lines) if m]
+    http_errors = dedupe_lines([m.group(0) for m in (_HTTP_RE.search(line) for line in non_api) if m])
+
+    fields = {
+        'test': _first(_TEST_HEADER_RE, non_api, 'test'),
+        'failing_step': failing_step,
+        'failing_step_ms': int(step_ms) if step_ms else None,
+        'error': error_block[0].strip() if error_index is not None else None,
+        'locator': _first(_LOCATOR_RE, error_block) or (waiting[-1] if waiting else None),
+        'expected': _first(_EXPECTED_RE, error_block),
+        'received': _first(_RECEIVED_RE, error_block),
+        'code_frame': next((line.strip() for line in error_block if _CODE_FRAME_RE.match(line)), None),
+        'frames': dedupe_lines(frames)[:MAX_FRAMES],
+        'http_errors': http_errors[:5],
+        'timeline': timeline,
+    }
+    structured = bool(fields['error'] or fields['failing_step'])
+
+    parts = []
+    labels = (
+        ('test', 'Test'), ('error', 'Erreur'), ('locator', 'Locator'),
+        ('expected', 'Attendu'), ('received', 'Reçu'), ('code_frame', 'Code'),
+    )
+    if fields['failing_step']:
+        timing = f" ({fields['failing_step_ms']} ms)" if fields['failing_step_ms'] else ''
+        parts.append(f"Étape en échec : {fields['failing_step']}{timing}")
+    for key, label in labels:
+        if fields[key]:
+            parts.append(f'{label} : {fields[key]}')
+    for key, label in (('frames', 'Pile'), ('http_errors', 'Erreurs HTTP / réseau'), ('timeline', 'Dernières actions')):
+        if fields[key]:
+            parts.append(f'{label} :\n' + '\n'.join(f'  {item}' for item in fields[key]))
+
+    # Remaining budget: the deduplicated end of the log (error lines first when unstructured)
+    head = '\n'.join(parts)
+    budget = max_chars - len(head) - 40
+    if budget > 200:
+        tail_source = error_block if structured else non_api
+        tail = dedupe_lines(tail_source)
+        if not structured:
+            errors = [line for line in tail if re.search(r'error|fail|exception|timeout|échec', line, re.IGNORECASE)]
+            tail = errors + [line for line in tail if line not in errors][-30:]
+        kept, size = [], 0
+        for line in (tail if not structured else tail[:60]):
+            if size + len(line) + 1 > budget:
+                break
+            kept.append(line)
+            size += len(line) + 1
+        if kept:
+            head += ('\n' if head else '') + 'Journal (dédupliqué) :\n' + '\n'.join(kept)
+
+    excerpt = head[:max_chars]
+    return {
+        **fields,
+        'structured': structured,
+        'excerpt': excerpt,
+        'tokens_in': estimate_tokens(logs),
+        'tokens_out': estimate_tokens(excerpt),
+    }
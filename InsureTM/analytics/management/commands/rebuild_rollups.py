@@ -0,0 +1,36 @@
+"""
+python manage.py rebuild_rollups [--check] [--batch-size 200]
+- Recalcule les agrégats journaliers des tableaux de bord (analytics.rollups) de toutes les campagnes
+- --check : compare les agrégats aux tables brutes sans rien écrire, code de sortie 1 en cas d'écart
+- À lancer après un import massif qui contourne les signaux (bulk_create, SQL brut)
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.rollups import BATCH_SIZE, rebuild_all, reconcile
+
+
+class Command(BaseCommand):
+    help = "Recalcule (ou vérifie avec --check) les agrégats des tableaux de bord."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Vérifie les agrégats sans les modifier")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['check']:
+            mismatched = reconcile(batch_size=options['batch_size'])
+            if mismatched:
+                labels = ', '.join('sans campagne' if pk is None else str(pk) for pk in mismatched)
+                raise CommandError(f"Agrégats désynchronisés pour les campagnes : {labels}")
+            self.stdout.write(self.style.SUCCESS(
+                f"✔ Agrégats conformes aux données brutes ({time.perf_counter() - started:.1f}s)."
+            ))
+            return
+
+        count = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Agrégats de {count} campagne(s) recalculés en {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import TruncDate
+
+# Frozen copy of the analytics.rollups recompute as of this migration
+BATCH_SIZE = 200
+
+
+def backfill(apps, schema_editor):
+    Campaign = apps.get_model('campaigns', 'Campaign')
+    TestCase = apps.get_model('testCases', 'TestCase')
+    Anomalie = apps.get_model('anomalies', 'Anomalie')
+    TestCaseRollup = apps.get_model('analytics', 'TestCaseRollup')
+    AnomalyRollup = apps.get_model('analytics', 'AnomalyRollup')
+
+    def anomaly_rows(queryset):
+        return (
+            queryset.order_by()
+            .values('impact', 'statut', campaign_id=F('test_case__campaign_id'), day=TruncDate('cree_le'))
+            .annotate(count=Count('id'))
+        )
+
+    campaign_ids = list(Campaign.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(campaign_ids), BATCH_SIZE):
+        ids = campaign_ids[start:start + BATCH_SIZE]
+        TestCaseRollup.objects.bulk_create(
+            [
+                TestCaseRollup(**row) for row in
+                TestCase.objects.filter(campaign_id__in=ids).order_by()
+                .values('campaign_id', 'tester_id', 'status', 'module', day=TruncDate('execution_date'))
+                .annotate(count=Count('id'), first_execution=Min('execution_date'), last_execution=Max('execution_date'))
+            ],
+            batch_size=1000,
+        )
+        AnomalyRollup.objects.bulk_create(
+            [AnomalyRollup(**row) for row in anomaly_rows(Anomalie.objects.filter(test_case__campaign_id__in=ids))],
+            batch_size=1000,
+        )
+    AnomalyRollup.objects.bulk_create(
+        [AnomalyRollup(**row) for row in anomaly_rows(Anomalie.objects.filter(test_case__isnull=True))],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_savedvisualization'),
+        ('anomalies', '0014_anomalie_anomalie_cree_le_id_idx'),
+        ('campaigns', '0010_campaign_assigned_testers'),
+        ('testCases', '0019_testcase_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('impact', models.CharField(max_length=20)),
+                ('statut', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('campaign', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_rollups', to='campaigns.campaign')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['campaign', 'day'], name='anrollup_campaign_day_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TestCaseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('module', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('first_execution', models.DateTimeField(null=True)),
+                ('last_execution', models.DateTimeField(null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_case_rollups', to='campaigns.campaign')),
+                ('tester', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['campaign', 'day'], name='tcrollup_campaign_day_idx'), models.Index(fields=['module', 'status'], name='tcrollup_module_status_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -8,13 +8,19 @@ import os
 import pandas as pd
 
 
+def campaign_timeline_cache_keys(campaign_id):
+    """Every cache key holding a timeline guard / AI insight for a campaign."""
+    return [
+        f"campaign_status{version}_{campaign_id}_{suffix}"
+        for suffix in ('insight', 'fast')
+        for version in ('', '_v2', '_v3')
+    ]
+
+
 def invalidate_campaign_timeline_cache(campaign_id):
     """Invalidate cached timeline guard / AI insight after campaign metadata changes."""
     from django.core.cache import cache
-    for suffix in ('insight', 'fast'):
-        cache.delete(f"campaign_status_{campaign_id}_{suffix}")
-        cache.delete(f"campaign_status_v2_{campaign_id}_{suffix}")
-        cache.delete(f"campaign_status_v3_{campaign_id}_{suffix}")
+    cache.delete_many(campaign_timeline_cache_keys(campaign_id))
 
 
 class MLTimelineGuard:
@@ -101,3 +101,36 @@ class SavedVisualization(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class TestCaseRollup(models.Model):
+    """Cas de test par (jour d'exécution, campagne, testeur, statut, module), maintenu par analytics.rollups."""
+    day = models.DateField(null=True)
+    campaign = models.ForeignKey('campaigns.Campaign', on_delete=models.CASCADE, related_name='test_case_rollups')
+    tester = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    status = models.CharField(max_length=20)
+    module = models.CharField(max_length=255, blank=True, default='')
+    count = models.PositiveIntegerField(default=0)
+    # Première / dernière exécution du groupe (durée et vélocité des tableaux de bord)
+    first_execution = models.DateTimeField(null=True)
+    last_execution = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['campaign', 'day'], name='tcrollup_campaign_day_idx'),
+            models.Index(fields=['module', 'status'], name='tcrollup_module_status_idx'),
+        ]
+
+
+class AnomalyRollup(models.Model):
+    """Anomalies par (jour de création, campagne, impact, statut) ; campaign=None : sans cas de test."""
+    day = models.DateField()
+    campaign = models.ForeignKey('campaigns.Campaign', on_delete=models.CASCADE, null=True, related_name='anomaly_rollups')
+    impact = models.CharField(max_length=20)
+    statut = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['campaign', 'day'], name='anrollup_campaign_day_idx'),
+        ]
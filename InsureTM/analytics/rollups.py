@@ -0,0 +1,362 @@
+"""
+Daily rollups of test cases and anomalies for the QA dashboards.
+
+DashboardBriefView, the historical views (releases, testers, modules) and the
+anomaly distribution used to aggregate the raw TestCase / Anomalie tables on every
+cache miss.  They read these tables instead, a few rows per campaign and day:
+
+- TestCaseRollup: test cases per (execution day, campaign, tester, status, module),
+  with the first / last execution of the bucket (durations and velocities);
+- AnomalyRollup: anomalies per (creation day, campaign, impact, statut); anomalies
+  without a test case are counted in campaign=None rows;
+- `track_rollups(model)` compares the bucket of a saved / deleted row with the one it
+  was loaded from, and queues -1 / +1 on the invalidation bus (utils.invalidation);
+  bulk writes report theirs with `count_saved`.  After commit each touched bucket
+  gets one UPDATE (count = count + delta), no campaign is re-aggregated;
+- a delta the stored rows cannot take (rows written with queryset.update(), raw SQL)
+  falls back to recomputing that campaign;
+- `python manage.py rebuild_rollups` recomputes every campaign; `--check` compares
+  the rollups with the raw tables (reconcile) without writing.
+"""
+import logging
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200  # campaigns per rebuild / reconciliation step
+
+# Fields deciding the bucket of a row, as loaded (post_init) and as saved
+TRACKED_FIELDS = {
+    'testCases.TestCase': ('campaign_id', 'tester_id', 'status', 'module', 'execution_date'),
+    'anomalies.Anomalie': ('test_case_id', 'impact', 'statut', 'cree_le'),
+}
+
+_tracked = {}
+
+
+def count_sum(**filters):
+    """Sum of rollup counts (optionally of the rows matching `filters`), 0 when there is none."""
+    return Coalesce(Sum('count', filter=Q(**filters) if filters else None), Value(0))
+
+
+def _test_case_buckets(queryset):
+    return (
+        queryset.order_by()
+        .values('campaign_id', 'tester_id', 'status', 'module', day=TruncDate('execution_date'))
+        .annotate(count=Count('id'), first_execution=Min('execution_date'), last_execution=Max('execution_date'))
+    )
+
+
+def _anomaly_buckets(queryset):
+    return (
+        queryset.order_by()
+        .values('impact', 'statut', campaign_id=F('test_case__campaign_id'), day=TruncDate('cree_le'))
+        .annotate(count=Count('id'))
+    )
+
+
+def _refresh(models, campaign_ids, unassigned=False):
+    """Recompute the rollup rows of `campaign_ids` (and of the anomalies without test case)."""
+    TestCase, Anomalie, TestCaseRollup, AnomalyRollup = models
+    campaign_ids = [pk for pk in campaign_ids if pk]
+    if not campaign_ids and not unassigned:
+        return
+    anomalies = Q(test_case__campaign_id__in=campaign_ids)
+    stale = Q(campaign_id__in=campaign_ids)
+    if unassigned:
+        anomalies |= Q(test_case__isnull=True)
+        stale |= Q(campaign__isnull=True)
+
+    with transaction.atomic():
+        TestCaseRollup.objects.filter(campaign_id__in=campaign_ids).delete()
+        AnomalyRollup.objects.filter(stale).delete()
+        TestCaseRollup.objects.bulk_create(
+            [TestCaseRollup(**row) for row in _test_case_buckets(TestCase.objects.filter(campaign_id__in=campaign_ids))],
+            batch_size=1000,
+        )
+        AnomalyRollup.objects.bulk_create(
+            [AnomalyRollup(**row) for row in _anomaly_buckets(Anomalie.objects.filter(anomalies))],
+            batch_size=1000,
+        )
+
+
+def _models():
+    from anomalies.models import Anomalie
+    from testCases.models import TestCase
+    from .models import AnomalyRollup, TestCaseRollup
+    return TestCase, Anomalie, TestCaseRollup, AnomalyRollup
+
+
+def _rebuild(models, Campaign, batch_size=BATCH_SIZE):
+    campaign_ids = list(Campaign.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(campaign_ids), batch_size):
+        _refresh(models, campaign_ids[start:start + batch_size])
+    _refresh(models, [], unassigned=True)
+    return len(campaign_ids)
+
+
+def rebuild_all(batch_size=BATCH_SIZE):
+    """Recompute every rollup row, by batches of campaigns; returns the number of campaigns."""
+    from campaigns.models import Campaign
+    return _rebuild(_models(), Campaign, batch_size)
+
+
+# --- incremental maintenance ---------------------------------------------------
+
+def _moment(value):
+    """Datetime of a tracked field (strings assigned before save included); None when unset."""
+    if value is None:
+        return None
+    return models.DateTimeField().to_python(value)
+
+
+def _day(moment):
+    """Bucket day of `moment`, as TruncDate computes it in the current time zone."""
+    if moment is None:
+        return None
+    return timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+
+
+def _widen(bounds, moment):
+    if moment is None:
+        return bounds
+    if bounds is None:
+        return moment, moment
+    return min(bounds[0], moment), max(bounds[1], moment)
+
+
+class Deltas:
+    """Bucket changes collected by the invalidation bus; applied once after commit."""
+
+    def __init__(self):
+        self.cases = {}  # (day, campaign, tester, status, module) -> [delta, removals, added bounds, removed bounds]
+        self.anomalies = Counter()  # (day, campaign, impact, statut) -> delta
+        self.case_campaigns = {}  # test case id -> campaign id, resolved once per batch
+
+    def __bool__(self):
+        return bool(self.cases or self.anomalies)
+
+    def add_case(self, key, moment, count):
+        change = self.cases.setdefault(key, [0, 0, None, None])
+        change[0] += count
+        if count > 0:
+            change[2] = _widen(change[2], moment)
+        else:
+            change[1] -= count
+            change[3] = _widen(change[3], moment)
+
+    def add_anomaly(self, key, count):
+        self.anomalies[key] += count
+
+    def campaign_of(self, test_case_id, test_case=None):
+        """Campaign of a test case: the cached relation when loaded, else one query per test case."""
+        if test_case_id not in self.case_campaigns:
+            if test_case is not None and test_case.pk == test_case_id:
+                self.case_campaigns[test_case_id] = test_case.campaign_id
+            else:
+                from testCases.models import TestCase
+                self.case_campaigns[test_case_id] = (
+                    TestCase.objects.filter(pk=test_case_id).values_list('campaign_id', flat=True).first()
+                )
+        return self.case_campaigns[test_case_id]
+
+    def apply(self):
+        from campaigns.models import Campaign
+        TestCase, Anomalie, TestCaseRollup, AnomalyRollup = models_ = _models()
+
+        # Rows of deleted campaigns went with them (cascade)
+        wanted = {key[1] for key in self.cases} | {key[1] for key in self.anomalies}
+        alive = set(Campaign.objects.filter(pk__in=wanted - {None}).values_list('pk', flat=True)) | {None}
+        stale = set()
+        with transaction.atomic():
+            for key, (count, removals, added, removed) in self.cases.items():
+                if key[1] in alive and not _apply_case(TestCase, TestCaseRollup, key, count, removals, added, removed):
+                    stale.add(key[1])
+            for key, count in self.anomalies.items():
+                if count and key[1] in alive and not _apply_bucket(
+                    AnomalyRollup, dict(zip(('day', 'campaign_id', 'impact', 'statut'), key)), count, count < 0,
+                ):
+                    stale.add(key[1])
+        if stale:
+            logger.warning("Rollups out of sync, campaigns recomputed: %s", sorted(stale, key=lambda pk: pk or 0))
+            _refresh(models_, stale, unassigned=None in stale)
+
+
+def _apply_bucket(model, lookup, count, removing, created=None, updates=None):
+    """count = count + `count` on one row of the bucket (created when absent); False when the rows drifted."""
+    if not count and not updates:
+        return True
+    pk = model.objects.filter(**lookup, count__gte=max(-count, 0)).order_by('pk').values_list('pk', flat=True).first()
+    if pk is None:
+        if removing or count <= 0:
+            return False
+        model.objects.create(**lookup, count=count, **(created or {}))
+        return True
+    if not model.objects.filter(pk=pk, count__gte=max(-count, 0)).update(count=F('count') + count, **(updates or {})):
+        return False
+    if count < 0:
+        model.objects.filter(pk=pk, count=0).delete()
+    return True
+
+
+def _apply_case(TestCase, TestCaseRollup, key, count, removals, added, removed):
+    day, campaign_id, tester_id, status, module = key
+    lookup = {'day': day, 'campaign_id': campaign_id, 'tester_id': tester_id, 'status': status, 'module': module}
+    created, updates = {}, {}
+    if added:
+        first, last = (Value(moment, output_field=models.DateTimeField()) for moment in added)
+        created = {'first_execution': added[0], 'last_execution': added[1]}
+        updates = {
+            'first_execution': Least(Coalesce('first_execution', first), first),
+            'last_execution': Greatest(Coalesce('last_execution', last), last),
+        }
+    if removed:
+        # The first / last execution may have left the bucket: read them back from its rows
+        bounds = TestCase.objects.filter(
+            campaign_id=campaign_id, tester_id=tester_id, status=status, module=module, execution_date__date=day,
+        ).aggregate(first=Min('execution_date'), last=Max('execution_date'))
+        updates = {'first_execution': bounds['first'], 'last_execution': bounds['last']}
+    return _apply_bucket(TestCaseRollup, lookup, count, removals > 0, created, updates)
+
+
+def _count_test_case(deltas, instance, old, new):
+    for state, sign in ((old, -1), (new, 1)):
+        if state is not None and state['campaign_id']:
+            moment = _moment(state['execution_date'])
+            key = (_day(moment), state['campaign_id'], state['tester_id'], state['status'], state['module'] or '')
+            deltas.add_case(key, moment, sign)
+    deltas.case_campaigns[instance.pk] = new['campaign_id'] if new else None
+    if old and new and old['campaign_id'] != new['campaign_id']:
+        # Its anomalies follow the test case to the other campaign
+        from anomalies.models import Anomalie
+        for row in _anomaly_buckets(Anomalie.objects.filter(test_case_id=instance.pk)):
+            deltas.add_anomaly((row['day'], old['campaign_id'], row['impact'], row['statut']), -row['count'])
+            deltas.add_anomaly((row['day'], new['campaign_id'], row['impact'], row['statut']), row['count'])
+
+
+def _count_anomaly(deltas, instance, old, new):
+    cached = instance._meta.get_field('test_case').get_cached_value(instance, None)
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        test_case_id = state['test_case_id']
+        campaign_id = deltas.campaign_of(test_case_id, cached) if test_case_id else None
+        if test_case_id and not campaign_id:
+            continue  # test case gone: nothing was counted for it
+        deltas.add_anomaly((_day(_moment(state['cree_le'])), campaign_id, state['impact'], state['statut']), sign)
+
+
+def _count(instance, old, new):
+    if old == new:
+        return
+    from utils.invalidation import rollup_deltas
+    with rollup_deltas() as deltas:
+        _tracked[instance._meta.label][2](deltas, instance, old, new)
+
+
+def _saved(instance, created, update_fields):
+    fields, names, _ = _tracked[instance._meta.label]
+    old = None if created else instance.__dict__.get('_rollup_state')
+    new = {field: instance.__dict__.get(field) for field in fields}
+    if old is not None and len(old) < len(fields):
+        old = {**new, **old}  # bulk write of a partially loaded row: unknown fields are taken as unchanged
+    if old is not None and update_fields is not None:
+        # Fields left out of update_fields keep their stored value
+        new = {field: new[field] if names[field] in update_fields else old.get(field) for field in fields}
+    _count(instance, old, new)
+    instance._rollup_state = new
+
+
+def track_rollups(model):
+    """Count the saves and deletes of `model` (TestCase, Anomalie) in the rollup buckets they move between."""
+    label = model._meta.label
+    fields = TRACKED_FIELDS[label]
+    names = {field.attname: field.name for field in model._meta.concrete_fields if field.attname in fields}
+    counter = _count_test_case if label == 'testCases.TestCase' else _count_anomaly
+    _tracked[label] = (fields, names, counter)
+    uid = f'rollups_{model._meta.label_lower}'
+
+    def remember(sender, instance, **kwargs):
+        instance._rollup_state = {field: instance.__dict__[field] for field in fields if field in instance.__dict__}
+
+    def complete(sender, instance, raw=False, **kwargs):
+        # Deferred fields were not loaded: read their stored value before it is overwritten
+        state = instance.__dict__.get('_rollup_state')
+        if raw or instance._state.adding or state is None or len(state) == len(fields):
+            return
+        missing = [field for field in fields if field not in state]
+        state.update(sender._base_manager.filter(pk=instance.pk).values(*missing).first() or {})
+
+    def saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+        if not raw:
+            _saved(instance, created, update_fields)
+
+    def deleted(sender, instance, **kwargs):
+        _count(instance, instance.__dict__.get('_rollup_state'), None)
+
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    pre_save.connect(complete, sender=model, weak=False, dispatch_uid=uid)
+    pre_delete.connect(complete, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
+
+
+def count_saved(instances, created=False, fields=None):
+    """bulk_create / bulk_update skip the signals: count the bucket changes of `instances` after the write."""
+    for instance in instances:
+        _saved(instance, created, fields)
+
+
+def _summed(rows, dimensions):
+    """{dimensions: (count, first, last)} of bucket rows; rollup rows may repeat a key (tester deleted)."""
+    totals = {}
+    for row in rows:
+        key = tuple(row[name] for name in dimensions)
+        count, first, last = totals.get(key, (0, None, None))
+        totals[key] = (
+            count + row['count'],
+            min(filter(None, (first, row.get('first_execution'))), default=None),
+            max(filter(None, (last, row.get('last_execution'))), default=None),
+        )
+    return totals
+
+
+def _differing(raw, rolled):
+    return {key[0] for key in raw.keys() | rolled.keys() if raw.get(key) != rolled.get(key)}
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """
+    Compare the rollups with the raw tables; returns the campaign ids whose rows
+    differ (None for the anomalies without test case).  Nothing is written.
+    """
+    from campaigns.models import Campaign
+    TestCase, Anomalie, TestCaseRollup, AnomalyRollup = _models()
+
+    case_dims = ('campaign_id', 'tester_id', 'status', 'module', 'day')
+    anomaly_dims = ('campaign_id', 'impact', 'statut', 'day')
+
+    mismatched = set()
+    campaign_ids = list(Campaign.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(campaign_ids), batch_size):
+        ids = campaign_ids[start:start + batch_size]
+        mismatched |= _differing(
+            _summed(_test_case_buckets(TestCase.objects.filter(campaign_id__in=ids)), case_dims),
+            _summed(TestCaseRollup.objects.filter(campaign_id__in=ids).values(), case_dims),
+        )
+        mismatched |= _differing(
+            _summed(_anomaly_buckets(Anomalie.objects.filter(test_case__campaign_id__in=ids)), anomaly_dims),
+            _summed(AnomalyRollup.objects.filter(campaign_id__in=ids).values(), anomaly_dims),
+        )
+    if _differing(
+        _summed(_anomaly_buckets(Anomalie.objects.filter(test_case__isnull=True)), anomaly_dims),
+        _summed(AnomalyRollup.objects.filter(campaign__isnull=True).values(), anomaly_dims),
+    ):
+        mismatched.add(None)
+    return sorted(mismatched, key=lambda pk: (pk is not None, pk or 0))
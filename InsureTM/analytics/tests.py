@@ -1,3 +1,4 @@
+from unittest import skipUnless
 from django.test import TestCase
 from django.utils import timezone
 from datetime import timedelta
@@ -5,10 +6,18 @@ from campaigns.models import Campaign
 from testCases.models import TestCase as TMTestCase
 from Project.models import Project
 from analytics.ml_service import MLTimelineGuard
+from django.core.cache import cache
+from utils.invalidation import batch as invalidation_batch
 import os
 
+# The trained model is a research artifact, not tracked: the tests that need it are skipped without it
+TIMELINE_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'research', 'timeline_model.joblib')
+requires_timeline_model = skipUnless(os.path.exists(TIMELINE_MODEL_PATH), 'research/timeline_model.joblib absent')
+
 class MLTimelineGuardMLTest(TestCase):
     def setUp(self):
+        # Test transactions never commit, so deferred invalidations never reach the cache
+        cache.clear()
         self.project = Project.objects.create(name="Test Project")
         self.campaign = Campaign.objects.create(
             project=self.project,
@@ -19,10 +28,12 @@ class MLTimelineGuardMLTest(TestCase):
         )
         self.guard = MLTimelineGuard()
 
+    @requires_timeline_model
     def test_model_loaded(self):
         # Vérifie que le modèle joblib est bien chargé
         self.assertIsNotNone(self.guard.model, "Le modèle ML (.joblib) n'a pas été chargé")
 
+    @requires_timeline_model
     def test_prediction_with_model(self):
         # 50 tests sur 5 jours ≈ 10 tests/jour ; reste 50 tests
         for i in range(50):
@@ -64,8 +75,10 @@ class MLTimelineGuardMLTest(TestCase):
         self.assertEqual(completed['progress']['total'], 6)
         self.assertIn('exécutés', completed['message'].lower())
 
-        self.campaign.nb_test_cases = 30
-        self.campaign.save()
+        # Cache invalidation is deferred to commit by utils.invalidation
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            self.campaign.nb_test_cases = 30
+            self.campaign.save()
 
         updated = self.guard.get_campaign_status(self.campaign.id)
         self.assertEqual(updated['progress']['finished'], 6)
@@ -128,3 +141,199 @@ class DashboardBriefViewTest(TestCase):
         response = self.client.post(self.url, data=json.dumps(payload), content_type='application/json')
         # We expect 200 if Groq is available, or 500/exception if not (but endpoint exists)
         self.assertIn(response.status_code, [200, 500])
+
+
+class HistoricalModulesViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='manager_modules', password='password', role='MANAGER')
+        self.client.login(username='manager_modules', password='password')
+        project = Project.objects.create(name="Modules Project")
+        c1 = Campaign.objects.create(project=project, title="R1")
+        c2 = Campaign.objects.create(project=project, title="R2")
+        # The view reads the daily rollups, refreshed by the invalidation bus on commit
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            TMTestCase.objects.create(campaign=c1, test_case_ref="M1", status='FAILED', data_json={'Module': 'Sinistres'})
+            TMTestCase.objects.create(campaign=c2, test_case_ref="M2", status='PASSED', data_json=[{'Etape': 'x'}, {'Domaine': 'Sinistres'}])
+            TMTestCase.objects.create(campaign=c1, test_case_ref="M3", status='PASSED', data_json={'Etape': 'y'})
+
+    def test_modules_grouped_from_indexed_column(self):
+        response = self.client.get(reverse('historical-modules'))
+        self.assertEqual(response.status_code, 200)
+        by_name = {row['module_name']: row for row in response.json()}
+        self.assertEqual(by_name['Sinistres']['tc_range'], "2 tests")
+        self.assertEqual(by_name['Sinistres']['avg_fail_rate'], 50.0)
+        self.assertEqual(by_name['Sinistres']['releases_affected'], 2)
+        self.assertEqual(by_name['Core']['tc_range'], "1 tests")
+
+
+from unittest.mock import patch
+from analytics.log_triage import dedupe_lines, triage_logs
+
+PLAYWRIGHT_FAILURE_LOG = "\n".join(
+    ["Running 1 test using 1 worker"]
+    + [f"  pw:api => page.goto started +{i}ms" for i in range(2)]
+    + ['  pw:api navigating to "https://app.insuretb.tech/login", waiting until "load" +2ms',
+       "  pw:api <= page.goto succeeded +480ms",
+       "  pw:api => locator.click started +1ms"]
+    + ["  pw:api waiting for locator('button#submit').first() +1000ms"] * 400
+    + ["  ✘  1 [chromium] › tests/generated/test_7.spec.ts:5:5 › TC_LOGIN (30.2s)",
+       "",
+       "  1) [chromium] › tests/generated/test_7.spec.ts:5:5 › TC_LOGIN ──────────────",
+       "",
+       "    Error: locator.click: Timeout 30000ms exceeded.",
+       "    Call log:",
+       "      - waiting for locator('button#submit').first()",
+       "",
+       "       8 |   await page.goto('/login');",
+       "    >  9 |   await page.locator('button#submit').first().click({ force: true });",
+       "         |                                               ^",
+       "",
+       "        at /app/project/tests/generated/test_7.spec.ts:9:47",
+       "        at /app/project/node_modules/playwright/lib/runner.js:10:3",
+       "",
+       "  1 failed"]
+)
+
+
+class LogTriageTest(TestCase):
+    def test_extracts_failure_from_playwright_output(self):
+        triage = triage_logs(PLAYWRIGHT_FAILURE_LOG)
+        self.assertTrue(triage['structured'])
+        self.assertEqual(triage['failing_step'], 'locator.click')
+        self.assertGreaterEqual(triage['failing_step_ms'], 30000)
+        self.assertEqual(triage['error'], 'Error: locator.click: Timeout 30000ms exceeded.')
+        self.assertEqual(triage['locator'], "locator('button#submit').first()")
+        self.assertIn('button#submit', triage['code_frame'])
+        self.assertEqual(triage['frames'], ['/app/project/tests/generated/test_7.spec.ts:9:47'])
+        self.assertIn('TC_LOGIN', triage['test'])
+        # 400 identical waits collapse into one timeline entry
+        self.assertEqual(sum('waiting for' in step for step in triage['timeline']), 1)
+        self.assertLess(triage['tokens_out'] * 5, triage['tokens_in'])
+
+    def test_expect_failure_fields(self):
+        triage = triage_logs(
+            "Error: Timed out 10000ms waiting for expect(locator).toBeVisible()\n"
+            "Locator: locator('h1.dashboard')\nExpected: visible\nReceived: <element(s) not found>\n"
+            "Response status 500 from /api/dashboard"
+        )
+        self.assertEqual(triage['locator'], "locator('h1.dashboard')")
+        self.assertEqual((triage['expected'], triage['received']), ('visible', '<element(s) not found>'))
+        self.assertEqual(triage['http_errors'], ['status 500'])
+
+    def test_unstructured_logs_are_deduplicated_and_bounded(self):
+        pasted = "\n".join([f"INFO tick {i}" for i in range(5000)] + ["FATAL exception in worker"])
+        triage = triage_logs(pasted, max_chars=1000)
+        self.assertFalse(triage['structured'])
+        self.assertLessEqual(len(triage['excerpt']), 1000)
+        self.assertIn('FATAL exception in worker', triage['excerpt'])
+        self.assertIn('(×5000)', triage['excerpt'])
+        self.assertEqual(dedupe_lines(['a 1', 'a 2', 'b']), ['a 1  (×2)', 'b'])
+
+    @patch('analytics.groq_service.GroqService.__init__', return_value=None)
+    @patch('analytics.groq_service.GroqService._get_completion_with_fallback',
+           return_value='{"cause": "SCRIPT_ERROR", "titre": "Bouton introuvable", "description": "d"}')
+    def test_only_the_excerpt_reaches_the_model(self, completion, _init):
+        from analytics.groq_service import GroqService
+        title, _ = GroqService().generate_anomaly_from_logs('TC_LOGIN', PLAYWRIGHT_FAILURE_LOG)
+        self.assertEqual(title, 'Bouton introuvable')
+        prompt = completion.call_args.args[0][0]['content']
+        self.assertIn('Étape en échec : locator.click', prompt)
+        self.assertLess(prompt.count('waiting for'), 5)
+
+
+from io import StringIO
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from anomalies.models import Anomalie
+from analytics import rollups
+from analytics.models import AnomalyRollup, TestCaseRollup
+
+
+class DashboardRollupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='manager_rollup', email='manager_rollup@lloyd.com', password='password', role='MANAGER')
+        self.tester = User.objects.create_user(username='tester_rollup', email='tester_rollup@lloyd.com', password='password', role='TESTER')
+        self.client.login(username='manager_rollup', email='manager_rollup@lloyd.com', password='password')
+        self.campaign = Campaign.objects.create(project=Project.objects.create(name="Rollup"), title="R1")
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            self.cases = [
+                TMTestCase.objects.create(campaign=self.campaign, test_case_ref=f"TC{i}", status=status, tester=self.tester)
+                for i, status in enumerate(['PASSED', 'PASSED', 'FAILED', 'PENDING'])
+            ]
+            Anomalie.objects.create(test_case=self.cases[2], titre="Échec", impact='CRITIQUE', cree_par=self.tester)
+            Anomalie.objects.create(titre="Sans cas de test", impact='MINEURS', statut='RESOLUE', cree_par=self.user)
+
+    def test_rollups_follow_writes_after_commit(self):
+        by_status = dict(TestCaseRollup.objects.values_list('status').annotate(n=rollups.count_sum()))
+        self.assertEqual(by_status, {'PASSED': 2, 'FAILED': 1, 'PENDING': 1})
+        self.assertEqual(AnomalyRollup.objects.get(campaign=self.campaign).count, 1)
+        self.assertEqual(AnomalyRollup.objects.get(campaign__isnull=True).statut, 'RESOLUE')
+
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            self.cases[3].status = 'FAILED'
+            self.cases[3].save()
+            self.cases[0].delete()
+        by_status = dict(TestCaseRollup.objects.values_list('status').annotate(n=rollups.count_sum()))
+        self.assertEqual(by_status, {'PASSED': 1, 'FAILED': 2})
+        self.assertEqual(rollups.reconcile(), [])
+
+    def test_writes_apply_bucket_deltas(self):
+        passed = TestCaseRollup.objects.get(status='PASSED')
+        other = Campaign.objects.create(project=self.campaign.project, title="R2")
+        # No campaign is re-aggregated: only the touched buckets are updated
+        with patch('analytics.rollups._refresh') as refresh, \
+                self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            self.cases[3].status = 'FAILED'
+            self.cases[3].save()
+            self.cases[2].campaign = other
+            self.cases[2].save()
+        refresh.assert_not_called()
+
+        self.assertEqual(TestCaseRollup.objects.get(status='PASSED'), passed)
+        self.assertEqual(passed.count, 2)
+        self.assertFalse(TestCaseRollup.objects.filter(status='PENDING').exists())
+        self.assertEqual(TestCaseRollup.objects.get(campaign=other).count, 1)
+        # The anomaly follows its test case to the other campaign
+        self.assertEqual(AnomalyRollup.objects.get(campaign=other).count, 1)
+        self.assertFalse(AnomalyRollup.objects.filter(campaign=self.campaign).exists())
+        self.assertEqual(rollups.reconcile(), [])
+
+    def test_drifted_bucket_recomputes_its_campaign(self):
+        TestCaseRollup.objects.filter(status='FAILED').delete()
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            self.cases[2].status = 'PASSED'
+            self.cases[2].save()
+        self.assertEqual(rollups.reconcile(), [])
+
+    def test_reconcile_reports_drift_and_rebuild_fixes_it(self):
+        # queryset.update() skips the signals: the rollups are now stale
+        TMTestCase.objects.filter(pk=self.cases[3].pk).update(status='PASSED')
+        Anomalie.objects.filter(test_case__isnull=True).update(statut='OUVERTE')
+        self.assertEqual(rollups.reconcile(), [None, self.campaign.id])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO())
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(rollups.reconcile(), [])
+        call_command('rebuild_rollups', '--check', stdout=StringIO())
+
+    def test_dashboards_read_the_rollups(self):
+        with CaptureQueriesContext(connection) as queries:
+            releases = self.client.get(reverse('historical-releases')).json()
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('"testCases_testcase"', sql)
+        self.assertNotIn('"anomalies_anomalie"', sql)
+        row = releases['results'][0]
+        self.assertEqual((row['total_tests'], row['pass_rate'], row['anomaly_count']), (4, 66.7, 1))
+
+        distribution = self.client.get(reverse('anomaly-distribution'), {'days': 7}).json()
+        self.assertEqual(distribution['open_by_impact'], {'CRITIQUE': 1})
+        self.assertEqual(distribution['by_statut'], {'OUVERTE': 1, 'RESOLUE': 1})
+        self.assertEqual(len(distribution['daily']), 7)
+        self.assertEqual(distribution['daily'][-1]['created'], 2)
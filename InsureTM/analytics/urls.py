@@ -16,6 +16,7 @@ from .views import (
     HistoricalReleasesView,
     HistoricalTestersView,
     HistoricalModulesView,
+    AnomalyDistributionView,
     ReinforcementStatusView,
     PendingReinforcementsView,
     N8NCreateNotificationView,
@@ -46,6 +47,7 @@ urlpatterns = [
     path('releases/', HistoricalReleasesView.as_view(), name='historical-releases'),
     path('testers/', HistoricalTestersView.as_view(), name='historical-testers'),
     path('modules/', HistoricalModulesView.as_view(), name='historical-modules'),
+    path('anomaly-distribution/', AnomalyDistributionView.as_view(), name='anomaly-distribution'),
     path('accept-reinforcement/', AcceptReinforcementView.as_view(), name='accept-reinforcement'),
     path('refuse-reinforcement/', RefuseReinforcementView.as_view(), name='refuse-reinforcement'),
     path('reinforcement-status/<int:campaign_id>/', ReinforcementStatusView.as_view(), name='reinforcement-status'),
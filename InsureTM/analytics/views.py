@@ -9,13 +9,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from django.http import HttpResponse
-from fpdf import FPDF
-from datetime import datetime
 
 from campaigns.models import Campaign
-from anomalies.models import Anomalie
-from testCases.models import TestCase
 from .models import Conversation, Message, SavedVisualization
 from .groq_service import GroqService
 from .ml_service import MLTimelineGuard
@@ -324,149 +319,11 @@ class CampaignClosureReportView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, campaign_id):
-        try:
-            campaign = get_object_or_404(Campaign, id=campaign_id)
-            logger.info("Generating closure report for campaign %s", campaign_id)
-            
-            # Security check
-            if request.user.role not in ['ADMIN', 'MANAGER']:
-                return Response({'error': 'Accès restreint aux administrateurs et managers.'}, status=status.HTTP_403_FORBIDDEN)
-
-            # 1. Gather Data
-            readiness_manager = ReleaseReadinessManager()
-            readiness_data = readiness_manager.calculate_readiness_score(campaign_id=campaign_id)
-            if not readiness_data:
-                readiness_data = {"score": 0, "reasons": ["Impossible de calculer le score."], "breakdown": {}}
-                
-            ml_status = MLTimelineGuard().get_campaign_status(campaign_id)
-            if not ml_status:
-                ml_status = {"status": "INCONNU", "progress": {"percentage": 0}, "delay_days": 0}
-                
-            critical_anomalies = Anomalie.objects.filter(test_case__campaign=campaign, impact__in=['CRITIQUE', 'BLOQUANTES']).exclude(statut='RESOLUE')
-            logger.info("Data gathered. Score: %s, Anomalies: %d", readiness_data.get('score'), critical_anomalies.count())
-            
-            # 2. Generate PDF
-            pdf = FPDF()
-            pdf.set_auto_page_break(auto=True, margin=15)
-            pdf.add_page()
-            
-            # Header
-            pdf.set_fill_color(30, 41, 59)
-            pdf.rect(0, 0, 210, 40, 'F')
-            
-            pdf.set_font('helvetica', 'B', 24)
-            pdf.set_text_color(255, 255, 255)
-            pdf.set_xy(10, 10)
-            pdf.cell(w=pdf.epw, h=15, txt="FICHE DE CLOTURE DE CAMPAGNE", border=0, ln=1, align='L')
-            
-            pdf.set_font('helvetica', 'I', 10)
-            pdf.set_xy(10, 25)
-            date_str = datetime.now().strftime('%d/%m/%Y %H:%M')
-            author = campaign.imported_by
-            author_name = author.get_full_name() if author and author.get_full_name() else (author.username if author else "Inconnu")
-            pdf.multi_cell(w=pdf.epw, h=7, txt=f"Document Officiel - Lloyd Assurances - Genere le {date_str}\nPublie par : {author_name}", border=0, align='L')
-            
-            pdf.set_y(50)
-            pdf.set_text_color(30, 41, 59)
-            pdf.set_font('helvetica', 'B', 16)
-            camp_title = str(campaign.title or 'Sans Titre')
-            pdf.multi_cell(w=pdf.epw, h=10, txt=f"Campagne : {camp_title}", border=0, align='L')
-            pdf.ln(2)
-            
-            pdf.set_font('helvetica', '', 12)
-            proj_name = str(campaign.project.name if campaign.project else 'N/A')
-            pdf.multi_cell(w=pdf.epw, h=8, txt=f"Projet : {proj_name}", border=0, align='L')
-            pdf.ln(5)
-            
-            # Score
-            pdf.set_fill_color(248, 250, 252)
-            pdf.set_font('helvetica', 'B', 14)
-            pdf.cell(w=pdf.epw, h=12, txt="  1. SCORE GLOBAL DE PREPARATION", border=1, ln=1, align='L', fill=True)
-            pdf.ln(5)
-            
-            score = readiness_data.get('score', 0)
-            pdf.set_font('helvetica', 'B', 40)
-            if score >= 80:
-                pdf.set_text_color(16, 185, 129)
-            elif score >= 40:
-                pdf.set_text_color(245, 158, 11)
-            else:
-                pdf.set_text_color(239, 68, 68)
-            pdf.cell(w=pdf.epw, h=25, txt=f"{score}%", border=0, ln=1, align='C')
-            
-            pdf.set_text_color(30, 41, 59)
-            pdf.set_font('helvetica', 'B', 10)
-            pdf.cell(w=pdf.epw, h=8, txt="JUSTIFICATION DE L'IA :", border=0, ln=1)
-            pdf.set_font('helvetica', '', 10)
-            reasons = readiness_data.get('reasons', [])
-            if not isinstance(reasons, list):
-                reasons = [str(reasons)]
-            for reason in reasons:
-                # Force a narrower width and explicit move to next line
-                safe_reason = str(reason).encode('latin-1', 'replace').decode('latin-1')
-                pdf.multi_cell(w=pdf.epw - 15, h=6, txt=f"- {safe_reason}", border=0, align='L')
-                pdf.ln(2)
-            pdf.ln(5)
-            
-            # ML
-            pdf.set_font('helvetica', 'B', 14)
-            pdf.set_text_color(30, 41, 59)
-            pdf.set_fill_color(248, 250, 252)
-            pdf.cell(w=pdf.epw, h=12, txt="  2. ANALYSE PREDICTIVE ML VS REALITE", border=1, ln=1, align='L', fill=True)
-            pdf.ln(5)
-            pdf.set_font('helvetica', '', 11)
-            pdf.cell(w=pdf.epw, h=8, txt=f"Statut de Sante : {str(ml_status.get('status', 'N/A'))}", border=0, ln=1)
-            prog_val = ml_status.get('progress', {}).get('percentage', 0) if isinstance(ml_status.get('progress'), dict) else 0
-            pdf.cell(w=pdf.epw, h=8, txt=f"Progression Actuelle : {prog_val}%", border=0, ln=1)
-            pdf.cell(w=pdf.epw, h=8, txt=f"Delai estime : {ml_status.get('delay_days', 0)} jours", border=0, ln=1)
-            pdf.cell(w=pdf.epw, h=8, txt=f"Date de fin projetee : {str(ml_status.get('projected_end_date', 'N/A'))}", border=0, ln=1)
-            pdf.ln(10)
-            
-            # Anomalies
-            pdf.set_font('helvetica', 'B', 14)
-            pdf.set_fill_color(239, 68, 68)
-            pdf.set_text_color(255, 255, 255)
-            pdf.cell(w=pdf.epw, h=12, txt="  3. ANOMALIES CRITIQUES BLOQUANTES", border=1, ln=1, align='L', fill=True)
-            pdf.set_text_color(30, 41, 59)
-            pdf.ln(5)
-            
-            if not critical_anomalies.exists():
-                pdf.set_font('helvetica', 'I', 11)
-                pdf.cell(w=pdf.epw, h=8, txt="Aucune anomalie critique non resolue detectee.", border=0, ln=1)
-            else:
-                pdf.set_font('helvetica', 'B', 10)
-                pdf.cell(30, 10, "ID", 1)
-                pdf.cell(120, 10, "TITRE", 1)
-                pdf.cell(40, 10, "STATUT", 1)
-                pdf.ln()
-                pdf.set_font('helvetica', '', 9)
-                for an in critical_anomalies[:20]: # Show up to 20
-                    safe_titre = str(an.titre).encode('latin-1', 'replace').decode('latin-1')
-                    pdf.cell(30, 8, str(an.id), 1)
-                    pdf.cell(120, 8, safe_titre[:65], 1)
-                    pdf.cell(40, 8, str(an.statut), 1)
-                    pdf.ln()
-
-            # Signatures
-            pdf.ln(15)
-            pdf.set_font('helvetica', 'B', 10)
-            
-            # Simple centered signature for QA Manager only
-            pdf.cell(w=pdf.epw, h=10, txt="SIGNATURE DU QA MANAGER / VALIDATEUR", border=0, ln=1, align='C')
-            pdf.ln(20)
-            pdf.set_font('helvetica', 'I', 8)
-            pdf.cell(w=pdf.epw, h=10, txt="Document certifie automatiquement par la plateforme InsureTM.", border=0, ln=1, align='C')
-
-            logger.info("PDF generation complete, returning response.")
-            pdf_out = bytes(pdf.output())
-            logger.info("PDF Size: %d bytes", len(pdf_out))
-            response = HttpResponse(pdf_out, content_type='application/pdf')
-            filename = f"fiche_cloture_{campaign.id}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
-        except Exception as e:
-            logger.exception("FATAL ERROR in closure report")
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Built by the report worker (analytics.reports), served from storage while the campaign is unchanged
+        from core.reports import report_response
+        return report_response(request, 'closure_pdf', {'campaign_id': campaign_id})
+
+
 class DashboardBriefView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -479,21 +336,24 @@ class DashboardBriefView(APIView):
         Result is cached for 5 minutes to avoid consuming AI quota on every page load.
         """
         from django.core.cache import cache
-        from testCases.models import TestCase
+        from .models import AnomalyRollup, TestCaseRollup
+        from .rollups import count_sum
 
         stats = request.data.get('stats', {})
 
-        # Enrich stats with live DB data
+        # Enrich stats with live DB data (daily rollups, see analytics.rollups)
         if not stats.get('total_campaigns'):
             stats['total_campaigns'] = Campaign.objects.count()
+        anomalies = AnomalyRollup.objects.exclude(statut='RESOLUE').aggregate(
+            open=count_sum(), critical=count_sum(impact__in=['CRITIQUE', 'BLOQUANTES']),
+        )
         if not stats.get('open_anomalies'):
-            stats['open_anomalies'] = Anomalie.objects.exclude(statut='RESOLUE').count()
+            stats['open_anomalies'] = anomalies['open']
 
-        stats['critical_impact_count'] = Anomalie.objects.filter(
-            impact__in=['CRITIQUE', 'BLOQUANTES']
-        ).exclude(statut='RESOLUE').count()
-        stats['total_passed'] = TestCase.objects.filter(status='PASSED').count()
-        stats['total_failed'] = TestCase.objects.filter(status='FAILED').count()
+        stats['critical_impact_count'] = anomalies['critical']
+        executions = TestCaseRollup.objects.aggregate(passed=count_sum(status='PASSED'), failed=count_sum(status='FAILED'))
+        stats['total_passed'] = executions['passed']
+        stats['total_failed'] = executions['failed']
         stats['total_executions'] = stats['total_passed'] + stats['total_failed']
 
         active_campaigns = Campaign.objects.all().order_by('-created_at')[:5]
@@ -690,17 +550,17 @@ class AcceptReinforcementView(APIView):
             # Notify the manager (campaign.imported_by)
             manager = campaign.imported_by
             if manager:
-                from notifications.models import Notification
+                from notifications.service import notify
                 from django.contrib.auth import get_user_model
                 User = get_user_model()
                 try:
                     tester = User.objects.get(id=tester_id)
-                    Notification.objects.create(
-                        recipient=manager,
+                    notify(
+                        [manager],
                         title="Renfort Accepté",
                         message=f"{tester.get_full_name() or tester.username} a accepté votre demande de renfort pour la campagne : {campaign.title}",
                         type='info',
-                        related_campaign=campaign
+                        related_campaign=campaign,
                     )
                 except Exception as notif_err:
                     logger.error(f"Failed to create accepted reinforcement notification: {notif_err}")
@@ -739,17 +599,17 @@ class RefuseReinforcementView(APIView):
             # Notify the manager (campaign.imported_by)
             manager = campaign.imported_by
             if manager:
-                from notifications.models import Notification
+                from notifications.service import notify
                 from django.contrib.auth import get_user_model
                 User = get_user_model()
                 try:
                     tester = User.objects.get(id=tester_id)
-                    Notification.objects.create(
-                        recipient=manager,
+                    notify(
+                        [manager],
                         title="Renfort Refusé",
                         message=f"{tester.get_full_name() or tester.username} a refusé votre demande de renfort pour la campagne : {campaign.title}",
                         type='info',
-                        related_campaign=campaign
+                        related_campaign=campaign,
                     )
                 except Exception as notif_err:
                     logger.error(f"Failed to create refused reinforcement notification: {notif_err}")
@@ -820,7 +680,7 @@ class N8NCreateNotificationView(APIView):
         notif_type = request.data.get('type', 'info')
         campaign_id = request.data.get('campaign_id')
         
-        from notifications.models import Notification
+        from notifications.service import notify
         from django.contrib.auth import get_user_model
         User = get_user_model()
         
@@ -832,12 +692,12 @@ class N8NCreateNotificationView(APIView):
             else:
                 return Response({'error': 'Missing user identifier'}, status=400)
                 
-            Notification.objects.create(
-                recipient=user,
+            notify(
+                [user],
                 title=title,
                 message=message,
                 type=notif_type,
-                related_campaign_id=campaign_id
+                related_campaign=campaign_id,
             )
             return Response({'status': 'success'})
         except User.DoesNotExist:
@@ -938,8 +798,10 @@ class HistoricalReleasesView(APIView):
 
     def get(self, request):
         from django.core.cache import cache
-        from django.db.models import Count, Q, Min, Max, Sum
+        from django.db.models import Min, Max, Sum
         from Project.models import Project
+        from .models import AnomalyRollup, TestCaseRollup
+        from .rollups import count_sum
 
         project_id = request.query_params.get('project_id')
         page = max(1, int(request.query_params.get('page', 1)))
@@ -976,15 +838,15 @@ class HistoricalReleasesView(APIView):
             page_release_ids = [r.id for r in page_releases]
 
             tc_stats = (
-                TestCase.objects
+                TestCaseRollup.objects
                 .filter(campaign__project_id__in=all_release_ids)
                 .values('campaign__project_id')
                 .annotate(
-                    total=Count('id'),
-                    passed=Count('id', filter=Q(status='PASSED')),
-                    failed=Count('id', filter=Q(status='FAILED')),
-                    min_date=Min('execution_date'),
-                    max_date=Max('execution_date'),
+                    total=count_sum(),
+                    passed=count_sum(status='PASSED'),
+                    failed=count_sum(status='FAILED'),
+                    min_date=Min('first_execution'),
+                    max_date=Max('last_execution'),
                 )
             )
             tc_map = {r['campaign__project_id']: r for r in tc_stats}
@@ -998,12 +860,12 @@ class HistoricalReleasesView(APIView):
             planned_map = {r['project_id']: r['planned'] or 0 for r in planned_stats}
 
             anomaly_stats = (
-                Anomalie.objects
-                .filter(test_case__campaign__project_id__in=all_release_ids)
-                .values('test_case__campaign__project_id')
-                .annotate(cnt=Count('id'))
+                AnomalyRollup.objects
+                .filter(campaign__project_id__in=all_release_ids)
+                .values('campaign__project_id')
+                .annotate(cnt=count_sum())
             )
-            anomaly_map = {r['test_case__campaign__project_id']: r['cnt'] for r in anomaly_stats}
+            anomaly_map = {r['campaign__project_id']: r['cnt'] for r in anomaly_stats}
 
             pass_rates_newest_first = [
                 self._pass_rate(rid, tc_map, planned_map) for rid in all_release_ids
@@ -1050,9 +912,11 @@ class HistoricalTestersView(APIView):
 
     def get(self, request):
         from django.core.cache import cache
-        from django.db.models import Count, Q, Min, Max
+        from django.db.models import Min, Max
         from django.contrib.auth import get_user_model
         from .ml_service import MLTimelineGuard
+        from .models import TestCaseRollup
+        from .rollups import count_sum
 
         project_id = request.query_params.get('project_id')
         cache_key = f"hist_testers_{project_id or 'all'}"
@@ -1062,7 +926,7 @@ class HistoricalTestersView(APIView):
 
         try:
             User = get_user_model()
-            base_qs = TestCase.objects.exclude(status='PENDING')
+            base_qs = TestCaseRollup.objects.exclude(status='PENDING')
             if project_id and project_id != 'all':
                 base_qs = base_qs.filter(campaign__project__business_project_id=project_id)
 
@@ -1070,10 +934,10 @@ class HistoricalTestersView(APIView):
             agg = (base_qs
                    .values('tester_id', 'campaign_id', 'campaign__title')
                    .annotate(
-                       passed=Count('id', filter=Q(status='PASSED')),
-                       total=Count('id'),
-                       min_date=Min('execution_date'),
-                       max_date=Max('execution_date'),
+                       passed=count_sum(status='PASSED'),
+                       total=count_sum(),
+                       min_date=Min('first_execution'),
+                       max_date=Max('last_execution'),
                    )
                    .order_by('tester_id', 'campaign__created_at'))
 
@@ -1137,7 +1001,10 @@ class HistoricalModulesView(APIView):
 
     def get(self, request):
         from django.core.cache import cache
-        from django.db.models import Count, Q
+        from django.db.models import Count, Value
+        from django.db.models.functions import Coalesce, NullIf
+        from .models import TestCaseRollup
+        from .rollups import count_sum
 
         project_id = request.query_params.get('project_id')
         cache_key = f"hist_modules_{project_id or 'all'}"
@@ -1147,33 +1014,24 @@ class HistoricalModulesView(APIView):
 
         try:
             if project_id and project_id != 'all':
-                qs = TestCase.objects.filter(campaign__project__business_project_id=project_id)
+                qs = TestCaseRollup.objects.filter(campaign__project__business_project_id=project_id)
             else:
-                qs = TestCase.objects.all()
-
-            # Only fetch the fields we need — avoids loading heavy data_json blobs
-            rows = qs.only('id', 'status', 'campaign_id', 'data_json').iterator(chunk_size=500)
-
-            modules: dict = {}
-            for tc in rows:
-                raw = tc.data_json or {}
-                mod_name = "Core"
-                if isinstance(raw, dict):
-                    mod_name = raw.get('Module') or raw.get('Domaine') or "Core"
-                elif isinstance(raw, list):
-                    for item in raw:
-                        if isinstance(item, dict):
-                            found = item.get('Module') or item.get('Domaine')
-                            if found:
-                                mod_name = found
-                                break
-
-                if mod_name not in modules:
-                    modules[mod_name] = {"fails": 0, "total": 0, "releases": set()}
-                modules[mod_name]["total"] += 1
-                if tc.status == 'FAILED':
-                    modules[mod_name]["fails"] += 1
-                modules[mod_name]["releases"].add(tc.campaign_id)
+                qs = TestCaseRollup.objects.all()
+
+            # One GROUP BY over the daily rollups of the module column (see testCases.models.extract_module)
+            rows = (
+                qs.annotate(module_name=Coalesce(NullIf('module', Value('')), Value('Core')))
+                .values('module_name')
+                .annotate(
+                    total=count_sum(),
+                    fails=count_sum(status='FAILED'),
+                    releases=Count('campaign_id', distinct=True),
+                )
+            )
+            modules = {
+                row['module_name']: {"fails": row['fails'], "total": row['total'], "releases": row['releases']}
+                for row in rows
+            }
 
             result = []
             for name, stats in modules.items():
@@ -1186,7 +1044,7 @@ class HistoricalModulesView(APIView):
                     "fail_rates": [fail_rate],
                     "avg_fail_rate": fail_rate,
                     "status": status_val,
-                    "releases_affected": len(stats["releases"]),
+                    "releases_affected": stats["releases"],
                 })
             cache.set(cache_key, result, timeout=self.CACHE_TTL)
             return Response(result)
@@ -1194,6 +1052,45 @@ class HistoricalModulesView(APIView):
             logger.exception("Error in HistoricalModulesView")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class AnomalyDistributionView(APIView):
+    """Répartition des anomalies (impact, statut, créations par jour), lue dans les agrégats journaliers."""
+    permission_classes = [IsAuthenticated]
+    DEFAULT_DAYS = 30
+    MAX_DAYS = 365
+
+    def get(self, request):
+        from datetime import timedelta
+        from .models import AnomalyRollup
+        from .rollups import count_sum
+
+        project_id = request.query_params.get('project_id')
+        try:
+            days = min(max(1, int(request.query_params.get('days', self.DEFAULT_DAYS))), self.MAX_DAYS)
+        except ValueError:
+            return Response({'error': "Paramètre 'days' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = AnomalyRollup.objects.all()
+        if project_id and project_id != 'all':
+            rows = rows.filter(campaign__project__business_project_id=project_id)
+        if request.query_params.get('campaign_id'):
+            rows = rows.filter(campaign_id=request.query_params['campaign_id'])
+
+        since = timezone.localdate() - timedelta(days=days - 1)
+        daily = {
+            row['day']: row['created']
+            for row in rows.filter(day__gte=since).values('day').annotate(created=count_sum()).order_by('day')
+        }
+        return Response({
+            "open_by_impact": dict(
+                rows.exclude(statut='RESOLUE').values_list('impact').annotate(n=count_sum()).order_by('impact')
+            ),
+            "by_statut": dict(rows.values_list('statut').annotate(n=count_sum()).order_by('statut')),
+            "daily": [
+                {"day": (since + timedelta(days=i)).isoformat(), "created": daily.get(since + timedelta(days=i), 0)}
+                for i in range(days)
+            ],
+        })
+
 class QANewsListView(APIView):
     """View to list QA news and tips, with an option to trigger scraping."""
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,107 @@
+"""
+python manage.py benchmark_similarity [--anomalies 100000] [--families 2000] [--queries 200]
+- Insère N anomalies synthétiques, dont des familles de quasi-doublons (titre reformulé, logs aux durées
+  différentes), dans une transaction annulée à la fin
+- Mesure la construction de l'index, la recherche de doublons (médiane / p95) et le rappel sur les familles
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from anomalies.models import Anomalie
+from anomalies.similarity import find_similar, index_anomalies, stored_signature
+from campaigns.models import Campaign
+from Project.models import Project
+from testCases.models import TestCase
+
+WORDS = [
+    'connexion', 'échec', 'paiement', 'contrat', 'sinistre', 'délai', 'bouton', 'validation', 'écran',
+    'timeout', 'erreur', 'serveur', 'réponse', 'attendue', 'reçue', 'page', 'formulaire', 'client',
+    'souscription', 'facture', 'export', 'pdf', 'champ', 'obligatoire', 'grisé', 'lenteur', 'session',
+]
+PREFIXES = ['', 'Anomalie : ', 'Bug - ', 'Régression : ', '[Auto] ']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mesure l'index de quasi-doublons d'anomalies sur un volume synthétique (rollback final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anomalies', type=int, default=100_000)
+        parser.add_argument('--families', type=int, default=2000)
+        parser.add_argument('--family-size', type=int, default=4)
+        parser.add_argument('--test-cases', type=int, default=10_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write(self.style.SUCCESS("↩ Données synthétiques annulées."))
+
+    def _run(self, options):
+        rng = random.Random(44)
+        batch_size = options['batch_size']
+        author = get_user_model().objects.create_user(
+            username='bench_similarity', email='bench_similarity@bench.invalid', password='x',
+        )
+        campaign = Campaign.objects.create(project=Project.objects.create(name='benchmark_similarity'), title='bench')
+        cases = TestCase.objects.bulk_create(
+            [TestCase(campaign=campaign, test_case_ref=f'TC_{i:05d}', data_json={}) for i in range(options['test_cases'])],
+            batch_size=batch_size,
+        )
+
+        def text(n):
+            return ' '.join(rng.choices(WORDS, k=n))
+
+        # Each family: one bug filed family_size times, reworded and with different timings
+        families, objs = [], []
+        for _ in range(options['families']):
+            tc, title, log = rng.choice(cases), text(6), text(40)
+            families.append(len(objs))
+            for _ in range(options['family_size']):
+                words = title.split()
+                words[0], words[1] = words[1], words[0]
+                objs.append(Anomalie(
+                    test_case=tc, cree_par=author,
+                    titre=rng.choice(PREFIXES) + ' '.join(words),
+                    description=f"{log} après {rng.randint(100, 9000)}ms (tentative {rng.randint(1, 9)})",
+                ))
+        while len(objs) < options['anomalies']:
+            objs.append(Anomalie(test_case=rng.choice(cases), cree_par=author, titre=text(6), description=text(40)))
+
+        self.stdout.write(f"⏳ Insertion de {len(objs)} anomalies ({connection.vendor})…")
+        created = Anomalie.objects.bulk_create(objs, batch_size=batch_size)
+        started = time.perf_counter()
+        index_anomalies(Anomalie.objects.filter(cree_par=author), batch_size=batch_size)
+        build = time.perf_counter() - started
+        self.stdout.write(f"   index : {build:.1f}s ({build / len(created) * 1000:.2f} ms / anomalie)")
+
+        queryset = Anomalie.objects.select_related('test_case')
+        timings, found, expected = [], 0, 0
+        size = options['family_size']
+        for start in rng.sample(families, min(options['queries'], len(families))):
+            anomaly = created[start]
+            started = time.perf_counter()
+            matches = find_similar(stored_signature(anomaly), queryset, exclude_id=anomaly.pk, limit=size)
+            timings.append((time.perf_counter() - started) * 1000)
+            family = {a.pk for a in created[start:start + size]} - {anomaly.pk}
+            found += len(family & {match.pk for match, _ in matches})
+            expected += len(family)
+
+        timings.sort()
+        self.stdout.write(
+            f"   recherche : médiane {statistics.median(timings):.1f} ms, "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms sur {len(timings)} requêtes"
+        )
+        self.stdout.write(f"   rappel des doublons : {found}/{expected} ({found / max(expected, 1):.0%})")
@@ -0,0 +1,25 @@
+"""
+python manage.py rebuild_similarity_index [--batch-size 2000]
+- Recalcule la signature MinHash et les clés LSH de toutes les anomalies (détection des doublons)
+- À lancer après un import massif qui contourne les signaux (bulk_create, SQL brut) ou un changement de paramètres
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from anomalies.models import Anomalie
+from anomalies.similarity import BATCH_SIZE, index_anomalies
+
+
+class Command(BaseCommand):
+    help = "Recalcule les signatures de similarité des anomalies."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = index_anomalies(Anomalie.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {count} signature(s) recalculée(s) en {time.perf_counter() - started:.1f}s."
+        ))
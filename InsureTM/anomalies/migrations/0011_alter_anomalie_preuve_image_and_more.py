@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:37
+
+import utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anomalies', '0010_anomalie_preuve_video'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='anomalie',
+            name='preuve_image',
+            field=models.FileField(blank=True, null=True, storage=utils.storage.get_proof_storage, upload_to='anomalies/preuves/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='anomalie',
+            name='preuve_video',
+            field=models.FileField(blank=True, null=True, storage=utils.storage.get_proof_storage, upload_to='anomalies/videos/%Y/%m/%d/'),
+        ),
+    ]
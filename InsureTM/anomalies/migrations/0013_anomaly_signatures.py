@@ -0,0 +1,108 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:55
+
+import hashlib
+import re
+import unicodedata
+import zlib
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+# Frozen copy of anomalies.similarity (MinHash parameters, seed, normalisation) as of this migration
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+MAX_TEXT_CHARS = 4000
+BATCH_SIZE = 2000
+
+_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20241)
+_A = _rng.integers(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r'[^\W_]+')
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def anomaly_text(test_ref, titre, description):
+    description = _DIGITS_RE.sub('0', description or '')
+    words = _WORD_RE.findall(normalize(f'{test_ref or ""} {titre or ""} {description}'))
+    return ' '.join(words)[:MAX_TEXT_CHARS]
+
+
+def signature(text):
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text} if text else set()
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    if not grams:
+        return None
+    hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig):
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(bytes([band]) + sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def backfill(apps, schema_editor):
+    Anomalie = apps.get_model('anomalies', 'Anomalie')
+    AnomalySignature = apps.get_model('anomalies', 'AnomalySignature')
+    AnomalySignatureBand = apps.get_model('anomalies', 'AnomalySignatureBand')
+    last_id = 0
+    while True:
+        rows = list(
+            Anomalie.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'test_case__test_case_ref', 'titre', 'description')[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        signatures, bands = [], []
+        for pk, test_ref, titre, description in rows:
+            sig = signature(anomaly_text(test_ref, titre, description))
+            if sig is None:
+                continue
+            signatures.append(AnomalySignature(anomalie_id=pk, minhash=sig.astype('<u4').tobytes()))
+            bands.extend(AnomalySignatureBand(anomalie_id=pk, key=key) for key in band_keys(sig))
+        AnomalySignature.objects.bulk_create(signatures, batch_size=BATCH_SIZE)
+        AnomalySignatureBand.objects.bulk_create(bands, batch_size=BATCH_SIZE * 4)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anomalies', '0012_anomalie_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalySignature',
+            fields=[
+                ('anomalie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='anomalies.anomalie')),
+                ('minhash', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnomalySignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('anomalie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='anomalies.anomalie')),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
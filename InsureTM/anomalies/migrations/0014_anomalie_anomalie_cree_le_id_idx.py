@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anomalies', '0013_anomaly_signatures'),
+        ('testCases', '0019_testcase_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomalie',
+            index=models.Index(fields=['cree_le', 'id'], name='anomalie_cree_le_id_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
 # models.py
 from django.db import models
 from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from analytics.rollups import track_rollups
+from utils.search import register_search
+from utils.storage import blob_digest, file_sha256, get_proof_storage, storing_blobs, track_blob_fields
 
 
 
@@ -68,39 +73,66 @@ class Anomalie(models.Model):
     )
     
     # Preuve visuelle (Capture d'écran ou fichier)
-    preuve_image = models.FileField(upload_to='anomalies/preuves/%Y/%m/%d/', blank=True, null=True)
+    preuve_image = models.FileField(upload_to='anomalies/preuves/%Y/%m/%d/', storage=get_proof_storage, blank=True, null=True)
     preuve_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
     # Enregistrement vidéo Playwright
-    preuve_video = models.FileField(upload_to='anomalies/videos/%Y/%m/%d/', blank=True, null=True)
+    preuve_video = models.FileField(upload_to='anomalies/videos/%Y/%m/%d/', storage=get_proof_storage, blank=True, null=True)
     
     # Traçabilité du testeur
     cree_par = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     cree_le = models.DateTimeField(auto_now_add=True)
 
+    # Texte normalisé indexé pour la recherche (utils.search), maintenu à l'enregistrement
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the list (config.pagination)
+            models.Index(fields=['cree_le', 'id'], name='anomalie_cree_le_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if self.preuve_image:
-            import hashlib
-            hasher = hashlib.sha256()
-            try:
-                opened_here = False
-                if self.preuve_image.closed:
-                    self.preuve_image.open('rb')
-                    opened_here = True
-                else:
-                    self.preuve_image.seek(0)
-                
-                for chunk in self.preuve_image.chunks():
-                    hasher.update(chunk)
-                
-                self.preuve_hash = hasher.hexdigest()
-                
-                if opened_here:
-                    self.preuve_image.close()
-            except Exception:
-                pass
-        else:
-            self.preuve_hash = None
-        super().save(*args, **kwargs)
+        # Content-addressed storage: the hash is the blob name, no second read of the file.
+        # A failed save discards the blob it stored.
+        with storing_blobs(self.preuve_image):
+            if self.preuve_image:
+                self.preuve_hash = blob_digest(self.preuve_image.name) or self.preuve_hash or file_sha256(self.preuve_image)
+            else:
+                self.preuve_hash = None
+            super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"Bug: {self.titre} (Test: {self.test_case.test_case_ref})"
\ No newline at end of file
+        return f"Bug: {self.titre} (Test: {self.test_case.test_case_ref})"
+
+
+track_blob_fields(Anomalie, 'preuve_image', 'preuve_video')
+register_search(Anomalie)
+track_rollups(Anomalie)
+
+
+class AnomalySignature(models.Model):
+    """Signature MinHash d'une anomalie (anomalies.similarity), pour la détection des doublons."""
+    anomalie = models.OneToOneField(Anomalie, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    minhash = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class AnomalySignatureBand(models.Model):
+    """Clé LSH d'une bande de signature : les anomalies partageant une clé sont des doublons candidats."""
+    anomalie = models.ForeignKey(Anomalie, on_delete=models.CASCADE, related_name='signature_bands')
+    key = models.BigIntegerField(db_index=True)
+
+
+@receiver(post_save, sender=Anomalie)
+@receiver(post_delete, sender=Anomalie)
+def bump_anomaly_version(sender, instance, **kwargs):
+    from utils.invalidation import mark_anomalies
+    mark_anomalies(instance.test_case_id)
+
+
+@receiver(post_save, sender=Anomalie)
+def index_anomaly_signature(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'titre', 'description', 'test_case'} & set(update_fields)):
+        return
+    from .similarity import index_anomaly
+    index_anomaly(instance)
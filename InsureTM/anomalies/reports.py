@@ -0,0 +1,210 @@
+"""
+Anomaly list report (PDF), built by the report worker (core.reports).
+
+The filters of the anomaly list (`filter_anomalies`) are shared with
+AnomalieViewSet, so the report holds exactly the rows the list shows for the
+same query parameters and user.
+"""
+from datetime import datetime
+from pathlib import Path
+
+from fpdf import FPDF
+
+from utils.search import search as search_queryset
+
+PDF_FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+PDF_FONT_BOLD_CANDIDATES = (
+    '/usr/share/fonts/truetype/freefont/FreeSansBold.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+)
+
+EXPORT_COLUMNS = (
+    ('ID', 0.05),
+    ('Titre', 0.22),
+    ('Gravité', 0.08),
+    ('Priorité', 0.07),
+    ('Statut', 0.08),
+    ('Test lié', 0.10),
+    ('Release', 0.11),
+    ('Campagne', 0.12),
+    ('Créé par', 0.08),
+    ('Date', 0.09),
+)
+
+# Columns read by anomaly_export_fields (exports skip the log excerpt annotation)
+EXPORT_FIELDS = (
+    'id', 'titre', 'impact', 'priorite', 'statut', 'cree_le',
+    'test_case__test_case_ref', 'test_case__campaign__title', 'test_case__campaign__project__name',
+    'cree_par__username', 'cree_par__first_name', 'cree_par__last_name',
+)
+LIST_FILTERS = ('search', 'impact', 'campaign_id', 'ordering')
+
+
+def _resolve_pdf_font(candidates):
+    for path in candidates:
+        if Path(path).is_file():
+            return path
+    return None
+
+
+def anomaly_report_params(user, data):
+    """List filters from query parameters; testers only ever get their own anomalies."""
+    params = {key: str(data.get(key)).strip() for key in LIST_FILTERS if data.get(key)}
+    if params.get('impact') in ('ALL', 'Tout'):
+        del params['impact']
+    if user.role == 'TESTER':
+        params['tester_id'] = user.id
+    return params
+
+
+def filter_anomalies(queryset, params):
+    if params.get('tester_id'):
+        queryset = queryset.filter(cree_par_id=params['tester_id'])
+
+    if params.get('campaign_id'):
+        queryset = queryset.filter(test_case__campaign_id=params['campaign_id'])
+
+    if params.get('search'):
+        # Indexed full-text search (utils.search); `#12` / `12` is an exact id lookup
+        queryset = search_queryset(queryset, params['search'])
+
+    if params.get('impact'):
+        queryset = queryset.filter(impact=params['impact'].upper())
+
+    if params.get('ordering'):
+        queryset = queryset.order_by(params['ordering'])
+
+    return queryset
+
+
+def anomaly_export_fields(an):
+    test_ref = an.test_case.test_case_ref if an.test_case else ''
+    project_name = '-'
+    campaign_title = '-'
+    if an.test_case and an.test_case.campaign:
+        campaign_title = an.test_case.campaign.title or '-'
+        if an.test_case.campaign.project:
+            project_name = an.test_case.campaign.project.name or '-'
+    if an.cree_par:
+        author = f"{an.cree_par.first_name} {an.cree_par.last_name}".strip() or an.cree_par.username
+    else:
+        author = 'Inconnu'
+    return [
+        an.id,
+        str(an.titre or '').replace('\x00', ''),
+        an.impact or 'A_DEFINIR',
+        an.priorite or 'A_DEFINIR',
+        an.statut or 'OUVERTE',
+        test_ref or '-',
+        project_name,
+        campaign_title,
+        author,
+        an.cree_le.strftime('%d/%m/%Y'),
+    ]
+
+
+def build_anomalies_pdf(params):
+    from .models import Anomalie
+
+    queryset = filter_anomalies(
+        Anomalie.objects.select_related(
+            'test_case', 'test_case__campaign', 'test_case__campaign__project', 'cree_par',
+        ).only(*EXPORT_FIELDS),
+        params,
+    )
+
+    font_regular = _resolve_pdf_font(PDF_FONT_CANDIDATES)
+    font_bold = _resolve_pdf_font(PDF_FONT_BOLD_CANDIDATES)
+    font_family = 'FreeSans' if font_regular else 'helvetica'
+
+    class PDF(FPDF):
+        def header(self):
+            self.set_fill_color(239, 68, 68)
+            self.rect(0, 0, self.w, 5, 'F')
+            self.set_font(font_family, 'B', 14)
+            self.set_text_color(30, 41, 59)
+            self.set_y(8)
+            self.cell(0, 7, pdf_text("Rapport d'Anomalies - InsureTM"), ln=True, align='L')
+            self.set_font(font_family, '', 8)
+            self.set_text_color(100, 116, 139)
+            generated_label = 'Généré le' if font_regular else 'Genere le'
+            generated_at = datetime.now().strftime(
+                '%d/%m/%Y à %H:%M' if font_regular else '%d/%m/%Y a %H:%M'
+            )
+            self.cell(
+                0, 5,
+                pdf_text(f'{generated_label} {generated_at}'),
+                ln=True,
+                align='L',
+            )
+            self.ln(1)
+
+        def draw_table_header(self, col_widths):
+            self.set_font(font_family, 'B', 7)
+            self.set_fill_color(248, 250, 252)
+            self.set_text_color(71, 85, 105)
+            x = self.l_margin
+            y = self.get_y()
+            for (header, _), width in zip(EXPORT_COLUMNS, col_widths):
+                self.set_xy(x, y)
+                self.cell(width, 7, pdf_text(header), border=1, align='L', fill=True)
+                x += width
+            self.ln(7)
+
+    def pdf_text(value):
+        text = str(value or '-')
+        if font_regular:
+            return text
+        return text.encode('latin-1', 'replace').decode('latin-1')
+
+    pdf = PDF(orientation='L', unit='mm', format='A4')
+    pdf.set_margins(4, 10, 4)
+    pdf.set_auto_page_break(auto=True, margin=10)
+    if font_regular:
+        pdf.add_font(font_family, '', font_regular)
+        pdf.add_font(font_family, 'B', font_bold or font_regular)
+    pdf.add_page()
+
+    available_w = pdf.w - pdf.l_margin - pdf.r_margin
+    col_widths = [available_w * ratio for _, ratio in EXPORT_COLUMNS]
+
+    pdf.draw_table_header(col_widths)
+
+    row_h = 7
+    fill = False
+    for an in queryset.iterator(chunk_size=2000):
+        if pdf.get_y() > pdf.h - pdf.b_margin - row_h:
+            pdf.add_page()
+            pdf.draw_table_header(col_widths)
+
+        values = anomaly_export_fields(an)
+        x = pdf.l_margin
+        y = pdf.get_y()
+        for col_idx, ((_, _), width, value) in enumerate(zip(EXPORT_COLUMNS, col_widths, values)):
+            pdf.set_xy(x, y)
+            text = pdf_text(value)
+            is_date_col = col_idx == len(EXPORT_COLUMNS) - 1
+            if not is_date_col and col_idx != 0:
+                max_chars = max(6, int(width / 1.9))
+                if len(text) > max_chars:
+                    text = text[: max_chars - 3] + '...'
+            style = 'B' if col_idx == 0 else ''
+            pdf.set_font(font_family, style, 7)
+            if col_idx == 2:
+                if an.impact in ['CRITIQUE', 'BLOQUANTES']:
+                    pdf.set_text_color(239, 68, 68)
+                elif an.impact in ['MAJEUR', 'MINEURS']:
+                    pdf.set_text_color(234, 179, 8)
+                else:
+                    pdf.set_text_color(59, 130, 246)
+            else:
+                pdf.set_text_color(30, 41, 59)
+            pdf.cell(width, row_h, text, border=1, align='L', fill=fill)
+            x += width
+        pdf.set_y(y + row_h)
+        fill = not fill
+
+    return 'rapport_anomalies.pdf', 'application/pdf', bytes(pdf.output())
@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from utils.fieldsets import SparseFieldsMixin
+from utils.storage import file_sha256
 from .models import Anomalie
 
-class AnomalieSerializer(serializers.ModelSerializer):
+class AnomalieSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     cree_par_nom = serializers.SerializerMethodField()
 
     def get_cree_par_nom(self, obj):
@@ -45,20 +47,17 @@ class AnomalieSerializer(serializers.ModelSerializer):
     execution_logs = serializers.SerializerMethodField()
 
     def get_execution_logs(self, obj):
-        """Retourne les logs d'exécution du cas de test."""
-        try:
-            return obj.test_case.data_json.get('execution_logs') if obj.test_case and isinstance(obj.test_case.data_json, dict) else None
-        except AttributeError:
-            return None
+        """Retourne l'extrait des logs d'exécution (annoté par AnomalieViewSet.get_queryset)."""
+        if hasattr(obj, 'execution_log_excerpt'):
+            return obj.execution_log_excerpt
+        log = obj.execution_logs.first() or (obj.test_case.execution_logs.first() if obj.test_case_id else None)
+        return log.excerpt if log else None
 
     def validate_preuve_image(self, value):
         if value:
-            import hashlib
-            hasher = hashlib.sha256()
             try:
-                for chunk in value.chunks():
-                    hasher.update(chunk)
-                file_hash = hasher.hexdigest()
+                # Computed by the hashing upload handler while the request was read
+                file_hash = file_sha256(value)
                 
                 # Check if hash already exists in base
                 queryset = Anomalie.objects.filter(preuve_hash=file_hash)
@@ -78,4 +77,12 @@ class AnomalieSerializer(serializers.ModelSerializer):
     class Meta:
         model = Anomalie
         fields = ['id', 'titre', 'description', 'impact', 'priorite', 'visibilite', 'statut', 'preuve_image', 'preuve_hash', 'preuve_video', 'cree_le', 'cree_par', 'cree_par_nom', 'test_case', 'test_case_ref', 'campaign_id', 'campaign_title', 'project_name', 'playwright_script', 'execution_logs']
-        read_only_fields = ['cree_par', 'cree_le', 'cree_par_nom', 'preuve_hash', 'test_case_ref', 'campaign_title', 'project_name', 'playwright_script', 'execution_logs']
\ No newline at end of file
+        read_only_fields = ['cree_par', 'cree_le', 'cree_par_nom', 'preuve_hash', 'test_case_ref', 'campaign_title', 'project_name', 'playwright_script', 'execution_logs']
+
+class AnomalieListSerializer(AnomalieSerializer):
+    """Ligne de la liste : sans description, logs ni script (détail ou ?fields=)."""
+    playwright_script = None
+    execution_logs = None
+
+    class Meta(AnomalieSerializer.Meta):
+        fields = ['id', 'titre', 'impact', 'priorite', 'visibilite', 'statut', 'preuve_image', 'preuve_video', 'cree_le', 'cree_par', 'cree_par_nom', 'test_case', 'test_case_ref', 'campaign_id', 'campaign_title', 'project_name']
@@ -0,0 +1,179 @@
+"""
+Near-duplicate anomaly detection (MinHash + LSH).
+
+Testers file the same bug several times, and every failed automated run creates its
+own anomaly with a model-written title; `preuve_hash` only catches identical files.
+Each anomaly gets a MinHash signature of the character 5-grams of its test
+reference, title and description (normalised like utils.search; numbers of the
+description are folded, so durations and ids in logs do not matter):
+
+- signatures are persisted (AnomalySignature), updated when an anomaly is saved and
+  rebuilt by `python manage.py rebuild_similarity_index`;
+- the 64 minima are cut into 16 bands of 4 and each band is hashed to an indexed key
+  (AnomalySignatureBand): candidates are the anomalies sharing a band, found with one
+  indexed lookup instead of a comparison with every anomaly;
+- candidates are ranked by estimated Jaccard similarity (share of equal minima),
+  computed with numpy on their stored signatures.
+
+With 16 bands of 4 rows, pairs above ~0.5 similarity are found with high probability
+and pairs below ~0.3 rarely become candidates.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.db.models import Count
+
+from utils.search import normalize
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+MAX_TEXT_CHARS = 4000
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+MAX_CANDIDATES = 200  # most colliding candidates scored per lookup
+BATCH_SIZE = 2000
+
+# Fixed seed: stored signatures stay comparable across processes and restarts
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32: (a * h + b) fits in uint64
+_rng = np.random.default_rng(20241)
+_A = _rng.integers(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r'[^\W_]+')
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def anomaly_text(test_ref, titre, description):
+    description = _DIGITS_RE.sub('0', description or '')
+    words = _WORD_RE.findall(normalize(f'{test_ref or ""} {titre or ""} {description}'))
+    return ' '.join(words)[:MAX_TEXT_CHARS]
+
+
+def shingles(text):
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32) of `text`; None when there is nothing to hash."""
+    grams = shingles(text)
+    if not grams:
+        return None
+    hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig):
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(bytes([band]) + sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def pack(sig):
+    return sig.astype('<u4').tobytes()
+
+
+def unpack(value):
+    return np.frombuffer(bytes(value), dtype='<u4')
+
+
+def _index_rows(rows, signature_model, band_model):
+    """Replace the signatures and band keys of `rows` (id, test ref, titre, description); returns how many were stored."""
+    ids, signatures, bands = [], [], []
+    for pk, test_ref, titre, description in rows:
+        ids.append(pk)
+        sig = signature(anomaly_text(test_ref, titre, description))
+        if sig is None:
+            continue
+        signatures.append(signature_model(anomalie_id=pk, minhash=pack(sig)))
+        bands.extend(band_model(anomalie_id=pk, key=key) for key in band_keys(sig))
+    band_model.objects.filter(anomalie_id__in=ids).delete()
+    signature_model.objects.filter(anomalie_id__in=ids).delete()
+    signature_model.objects.bulk_create(signatures, batch_size=BATCH_SIZE)
+    band_model.objects.bulk_create(bands, batch_size=BATCH_SIZE * 4)
+    return len(signatures)
+
+
+def _index_batches(queryset, signature_model, band_model, batch_size=BATCH_SIZE):
+    total, last_id = 0, 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'test_case__test_case_ref', 'titre', 'description')[:batch_size]
+        )
+        if not rows:
+            return total
+        last_id = rows[-1][0]
+        total += _index_rows(rows, signature_model, band_model)
+
+
+def index_anomalies(queryset, batch_size=BATCH_SIZE):
+    """(Re)index every anomaly of `queryset` by primary key batches; used after bulk writes and by the command."""
+    from .models import AnomalySignature, AnomalySignatureBand
+    return _index_batches(queryset, AnomalySignature, AnomalySignatureBand, batch_size)
+
+
+def index_anomaly(anomaly):
+    """Update the signature of one saved anomaly; nothing is written when its text did not change."""
+    from .models import AnomalySignature, AnomalySignatureBand
+
+    test_ref = anomaly.test_case.test_case_ref if anomaly.test_case_id else ''
+    sig = signature(anomaly_text(test_ref, anomaly.titre, anomaly.description))
+    packed = pack(sig) if sig is not None else None
+    stored = AnomalySignature.objects.filter(anomalie_id=anomaly.pk).values_list('minhash', flat=True).first()
+    if (bytes(stored) if stored is not None else None) == packed:
+        return False
+
+    AnomalySignatureBand.objects.filter(anomalie_id=anomaly.pk).delete()
+    if packed is None:
+        AnomalySignature.objects.filter(anomalie_id=anomaly.pk).delete()
+        return True
+    AnomalySignature.objects.update_or_create(anomalie_id=anomaly.pk, defaults={'minhash': packed})
+    AnomalySignatureBand.objects.bulk_create(
+        [AnomalySignatureBand(anomalie_id=anomaly.pk, key=key) for key in band_keys(sig)]
+    )
+    return True
+
+
+def stored_signature(anomaly):
+    from .models import AnomalySignature
+
+    stored = AnomalySignature.objects.filter(anomalie_id=anomaly.pk).values_list('minhash', flat=True).first()
+    if stored is not None:
+        return unpack(stored)
+    test_ref = anomaly.test_case.test_case_ref if anomaly.test_case_id else ''
+    return signature(anomaly_text(test_ref, anomaly.titre, anomaly.description))
+
+
+def find_similar(sig, queryset, exclude_id=None, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+    """[(anomaly, score)] of `queryset` whose estimated similarity to `sig` reaches `threshold`, best first."""
+    from .models import AnomalySignature, AnomalySignatureBand
+
+    if sig is None:
+        return []
+    candidates = AnomalySignatureBand.objects.filter(key__in=band_keys(sig))
+    if exclude_id:
+        candidates = candidates.exclude(anomalie_id=exclude_id)
+    candidate_ids = [
+        row['anomalie_id'] for row in
+        candidates.values('anomalie_id').annotate(shared=Count('id')).order_by('-shared', '-anomalie_id')[:MAX_CANDIDATES]
+    ]
+    if not candidate_ids:
+        return []
+
+    stored = list(AnomalySignature.objects.filter(anomalie_id__in=candidate_ids).values_list('anomalie_id', 'minhash'))
+    matrix = np.vstack([unpack(minhash) for _, minhash in stored])
+    scores = (matrix == sig).mean(axis=1)
+    scored = {pk: float(score) for (pk, _), score in zip(stored, scores) if score >= threshold}
+    if not scored:
+        return []
+    ranked = sorted(queryset.filter(pk__in=scored), key=lambda anomaly: (-scored[anomaly.pk], -anomaly.pk))
+    return [(anomaly, round(scored[anomaly.pk], 2)) for anomaly in ranked[:limit]]
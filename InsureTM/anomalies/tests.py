@@ -7,10 +7,11 @@ from Project.models import Project
 from .models import Anomalie
 from .serializers import AnomalieSerializer
 from rest_framework.exceptions import ValidationError
+from utils.testing import TemporaryMediaMixin
 
 User = get_user_model()
 
-class AnomalieSHAProofTestCase(TestCase):
+class AnomalieSHAProofTestCase(TemporaryMediaMixin, TestCase):
     def setUp(self):
         # Create user, project, campaign, and test case
         self.user = User.objects.create_user(username='tester', email='tester@lloyd.com', password='password')
@@ -155,3 +156,143 @@ class AnomalieSearchTestCase(TestCase):
         ids = {item['id'] for item in results}
         self.assertIn(self.anomaly.id, ids)
         self.assertNotIn(other.id, ids)
+
+    def _search(self, term):
+        from rest_framework.test import APIClient
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        response = client.get('/api/anomalies/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data.get('results', response.data)]
+
+    def test_full_text_search_ignores_accents_and_matches_prefixes(self):
+        accented = Anomalie.objects.create(
+            test_case=self.test_case,
+            titre='Échec de la connexion',
+            description='Le bouton « Valider » reste grisé',
+            cree_par=self.manager,
+        )
+        self.assertEqual(self._search('echec connex'), [accented.id])
+        self.assertEqual(self._search('GRISÉ'), [accented.id])
+        self.assertEqual(self._search('introuvable'), [])
+
+    def test_search_document_follows_related_rows(self):
+        self.assertIn('campaign 1', Anomalie.objects.get(pk=self.anomaly.pk).search_document)
+
+        self.campaign.title = 'Recette Sinistres'
+        self.campaign.save()
+        self.manager.first_name = 'Amélie'
+        self.manager.save()
+
+        self.assertEqual(self._search('sinistres amelie'), [self.anomaly.id])
+        self.assertEqual(self._search('campaign'), [])
+
+    def test_search_ranks_best_match_first(self):
+        weak = Anomalie.objects.create(
+            test_case=self.test_case, titre='Lenteur', description='Page login lente', cree_par=self.manager,
+        )
+        strong = Anomalie.objects.create(
+            test_case=self.test_case, titre='Login login', description='Login refusé au login', cree_par=self.manager,
+        )
+        ids = self._search('login')
+        self.assertEqual(ids[0], strong.id)
+        self.assertEqual(set(ids), {strong.id, weak.id, self.anomaly.id})
+
+    def test_bulk_created_anomalies_are_indexed_by_refresh(self):
+        from utils.search import refresh_documents
+
+        created = Anomalie.objects.bulk_create([
+            Anomalie(test_case=self.test_case, titre='Timeout paiement', description='', cree_par=self.manager),
+        ])
+        self.assertEqual(self._search('paiement'), [])
+        refresh_documents(Anomalie.objects.filter(pk__in=[a.pk for a in created]))
+        self.assertEqual(self._search('paiement'), [created[0].id])
+
+    def test_export_xlsx_streams_filtered_anomalies(self):
+        import io
+        from openpyxl import load_workbook
+        from rest_framework.test import APIClient
+
+        Anomalie.objects.create(test_case=self.test_case, titre='Paiement refusé', description='', cree_par=self.manager)
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        response = client.get('/api/anomalies/export_xlsx/', {'search': 'login'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        ws = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(ws.max_row, 2)
+        self.assertEqual([ws['A2'].value, ws['B2'].value, ws['F2'].value, ws['H2'].value],
+                         [self.anomaly.id, 'Bug login', 'TC_01', 'Campaign 1'])
+
+
+class AnomalySimilarityTestCase(TestCase):
+    LOG = (
+        "TimeoutError: locator.click: Timeout 30000ms exceeded. waiting for getByRole('button', "
+        "{ name: 'Valider le paiement' }) - element is not enabled after 4512ms"
+    )
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.manager = User.objects.create_user(
+            username='sim_manager', email='sim_manager@lloyd.com', password='password', role='MANAGER',
+        )
+        campaign = Campaign.objects.create(title='Recette paiement', project=Project.objects.create(name='Sim'))
+        self.test_case = TestCaseModel.objects.create(test_case_ref='TC_PAY_01', campaign=campaign)
+        self.original = Anomalie.objects.create(
+            test_case=self.test_case, titre='Bouton Valider le paiement inactif', description=self.LOG,
+            cree_par=self.manager,
+        )
+        self.unrelated = Anomalie.objects.create(
+            test_case=self.test_case, titre="Export PDF des contrats vide",
+            description="Le fichier généré ne contient aucune ligne pour la souscription", cree_par=self.manager,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def test_create_returns_likely_duplicates(self):
+        response = self.client.post('/api/anomalies/', {
+            'test_case': self.test_case.id,
+            'titre': 'Le bouton Valider le paiement reste inactif',
+            'description': self.LOG.replace('4512ms', '3987ms'),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        duplicates = response.data['possible_duplicates']
+        self.assertEqual([d['id'] for d in duplicates], [self.original.id])
+        self.assertGreaterEqual(duplicates[0]['score'], 0.5)
+        self.assertEqual(duplicates[0]['test_case_ref'], 'TC_PAY_01')
+
+    def test_similar_endpoint_and_incremental_update(self):
+        from .models import AnomalySignature
+        duplicate = Anomalie.objects.create(
+            test_case=self.test_case, titre='Anomalie : bouton Valider le paiement inactif', description=self.LOG,
+            cree_par=self.manager,
+        )
+        response = self.client.get(f'/api/anomalies/{self.original.id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([d['id'] for d in response.data], [duplicate.id])
+
+        before = bytes(AnomalySignature.objects.get(pk=duplicate.pk).minhash)
+        duplicate.statut = 'RESOLUE'
+        duplicate.save(update_fields=['statut'])
+        self.assertEqual(bytes(AnomalySignature.objects.get(pk=duplicate.pk).minhash), before)
+
+        duplicate.titre = self.unrelated.titre
+        duplicate.description = self.unrelated.description
+        duplicate.save()
+        response = self.client.get(f'/api/anomalies/{self.original.id}/similar/')
+        self.assertEqual(response.data, [])
+
+    def test_bulk_created_anomalies_are_indexed_by_rebuild(self):
+        import io
+        from django.core.management import call_command
+        from .models import AnomalySignature
+
+        created = Anomalie.objects.bulk_create([
+            Anomalie(test_case=self.test_case, titre='Bouton Valider le paiement inactif', description=self.LOG,
+                     cree_par=self.manager),
+        ])
+        self.assertFalse(AnomalySignature.objects.filter(pk=created[0].pk).exists())
+        call_command('rebuild_similarity_index', stdout=io.StringIO())
+        response = self.client.get(f'/api/anomalies/{self.original.id}/similar/')
+        self.assertEqual([d['id'] for d in response.data], [created[0].id])
+        self.assertEqual(response.data[0]['score'], 1.0)
@@ -1,9 +1,13 @@
 from django.core.cache import cache
 
 
+def bp_health_cache_key(business_project_id):
+    return f"bp_health_{business_project_id}"
+
+
 def invalidate_bp_health(business_project_id):
     if business_project_id:
-        cache.delete(f"bp_health_{business_project_id}")
+        cache.delete(bp_health_cache_key(business_project_id))
 
 
 def invalidate_bp_health_for_campaign(campaign_id):
@@ -1,7 +1,7 @@
 """
 python manage.py run_demo_tests
 - Crée 1 cas de test par campagne (12 scénarios)
-- Génère le script Playwright via Groq
+- Génère le script Playwright via Groq (scripts inchangés servis par le cache)
 - Lance l'exécution Playwright en arrière-plan
 """
 from django.conf import settings
@@ -10,6 +10,7 @@ from django.contrib.auth import get_user_model
 from campaigns.models import Campaign, CampaignAssignment
 from testCases.models import TestCase
 from analytics.groq_service import GroqService
+from testCases.script_generation import generate_cached
 
 User = get_user_model()
 
@@ -185,15 +186,13 @@ class Command(BaseCommand):
             # Générer le script via Groq
             self.stdout.write(f"\n🔧 [{camp.title}] Génération script : {scenario_title}")
             try:
-                script = groq.generate_playwright_test(
-                    test_title=scenario_title,
-                    test_data_json=str(data)
-                )
+                script, cached = generate_cached(scenario_title, str(data), service=groq)
                 if script:
                     tc.automation_code = script
                     tc.is_automated = True
                     tc.save(update_fields=['automation_code', 'is_automated'])
-                    self.stdout.write(self.style.SUCCESS(f"   ✅ Script généré ({len(script)} chars)"))
+                    origin = "cache" if cached else "généré"
+                    self.stdout.write(self.style.SUCCESS(f"   ✅ Script {origin} ({len(script)} chars)"))
                 else:
                     self.stdout.write(self.style.WARNING("   ⚠ Script vide retourné par Groq"))
             except Exception as e:
@@ -25,3 +25,8 @@ class CampaignLiveConsumer(AsyncWebsocketConsumer):
     async def live_event(self, event):
         # Send message to WebSocket
         await self.send(text_data=json.dumps(event['payload']))
+
+    # Several events coalesced by the invalidation bus in one flush
+    async def live_event_batch(self, event):
+        for payload in event['payloads']:
+            await self.send(text_data=json.dumps(payload))
@@ -60,14 +60,12 @@ class TaskAssignment(models.Model):
 @receiver(post_save, sender=Campaign)
 @receiver(post_delete, sender=Campaign)
 def invalidate_bp_health_on_campaign_change(sender, instance, **kwargs):
-    from business_projects.health_cache import invalidate_bp_health_for_campaign
-    from analytics.ml_service import invalidate_campaign_timeline_cache
-    invalidate_bp_health_for_campaign(instance.id)
-    invalidate_campaign_timeline_cache(instance.id)
+    from utils.invalidation import mark_campaign
+    mark_campaign(instance.id, project_id=instance.project_id)
 
 
 @receiver(post_save, sender=CampaignAssignment)
 @receiver(post_delete, sender=CampaignAssignment)
 def invalidate_timeline_on_assignment_change(sender, instance, **kwargs):
-    from analytics.ml_service import invalidate_campaign_timeline_cache
-    invalidate_campaign_timeline_cache(instance.campaign_id)
\ No newline at end of file
+    from utils.invalidation import mark_campaign
+    mark_campaign(instance.campaign_id)
\ No newline at end of file
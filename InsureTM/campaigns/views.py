@@ -1,6 +1,7 @@
 import logging
 
-from django.db.models import Q
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
@@ -8,9 +9,10 @@ from rest_framework.parsers import MultiPartParser, FormParser
 
 from django.contrib.auth import get_user_model
 from .models import Campaign, TaskAssignment
-from .serializers import CampaignSerializer, TaskAssignmentSerializer
-from notifications.models import Notification
+from .serializers import CampaignListSerializer, CampaignSerializer, TaskAssignmentSerializer
+from notifications.service import notify
 from utils.email_service import send_campaign_created_email
+from utils.fieldsets import SPARSE_ACTIONS, SparseFieldsViewMixin
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
@@ -18,8 +20,41 @@ logger = logging.getLogger(__name__)
 
 from rest_framework import viewsets, filters
 
-class CampaignViewSet(viewsets.ModelViewSet):
+def _count_per_campaign(queryset, campaign_field='campaign'):
+    return Coalesce(Subquery(
+        queryset.filter(**{campaign_field: OuterRef('pk')}).order_by()
+        .values(campaign_field).annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+def with_counters(queryset, fields):
+    """
+    Annotate the global counters of the list rows (one subquery each instead of one
+    query per row); CampaignSerializer reads them when present.
+    """
+    from anomalies.models import Anomalie
+    from testCases.models import TestCase
+
+    counters = {
+        'test_case_total': ({'nb_test_cases', 'progress_percentage'}, TestCase.objects.all(), 'campaign'),
+        'passed_total': ({'passed_count'}, TestCase.objects.filter(status='PASSED'), 'campaign'),
+        'failed_total': ({'failed_count'}, TestCase.objects.filter(status='FAILED'), 'campaign'),
+        'executed_total': (
+            {'executed_count', 'progress_percentage'}, TestCase.objects.exclude(status='PENDING'), 'campaign',
+        ),
+        'open_anomalies_total': (
+            {'anomalies_count'}, Anomalie.objects.exclude(statut='RESOLUE'), 'test_case__campaign',
+        ),
+    }
+    return queryset.annotate(**{
+        name: _count_per_campaign(rows, campaign_field)
+        for name, (used_by, rows, campaign_field) in counters.items() if used_by & fields
+    })
+
+
+class CampaignViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = CampaignSerializer
+    list_serializer_class = CampaignListSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
     filter_backends = [filters.OrderingFilter]
@@ -30,6 +65,14 @@ class CampaignViewSet(viewsets.ModelViewSet):
         queryset = Campaign.objects.all()
         user = self.request.user
 
+        if self.action in SPARSE_ACTIONS:
+            queryset = queryset.select_related('project__business_project', 'imported_by')
+            if self.returned_fields() & {'assigned_testers', 'assigned_testers_names'}:
+                queryset = queryset.prefetch_related('assigned_testers')
+            # Testers get their own counters (CampaignSerializer.to_representation)
+            if getattr(user, 'role', None) != 'TESTER':
+                queryset = with_counters(queryset, self.returned_fields())
+
         if hasattr(user, 'role') and user.role == 'TESTER':
             queryset = queryset.filter(
                 Q(assigned_testers=user) &
@@ -65,16 +108,15 @@ class CampaignViewSet(viewsets.ModelViewSet):
         
         # Notify ADMINs and MANAGERs when a campaign is created
         User = get_user_model()
-        recipients = User.objects.filter(role__in=['ADMIN', 'MANAGER']).exclude(id=self.request.user.id)
-        
+        recipients = list(User.objects.filter(role__in=['ADMIN', 'MANAGER']).exclude(id=self.request.user.id))
+        notify(
+            recipients,
+            title="Nouvelle Campagne",
+            message=f"{self.request.user.username} a créé la campagne : {instance.title}",
+            type='info',
+            related_campaign=instance,
+        )
         for recipient in recipients:
-            Notification.objects.create(
-                recipient=recipient,
-                title="Nouvelle Campagne",
-                message=f"{self.request.user.username} a créé la campagne : {instance.title}",
-                type='info',
-                related_campaign=instance
-            )
             if recipient.email:
                 send_campaign_created_email(recipient, self.request.user, instance)
 
@@ -82,28 +124,24 @@ class CampaignViewSet(viewsets.ModelViewSet):
         instance = serializer.save()
         
         # Notify all assigned testers of the update
-        testers = instance.assigned_testers.all()
-        for tester in testers:
-            if tester != self.request.user:
-                Notification.objects.create(
-                    recipient=tester,
-                    title="Mise à jour Campagne",
-                    message=f"La campagne '{instance.title}' a été mise à jour.",
-                    type='info',
-                    related_campaign=instance
-                )
+        notify(
+            instance.assigned_testers.all(),
+            title="Mise à jour Campagne",
+            message=f"La campagne '{instance.title}' a été mise à jour.",
+            type='info',
+            related_campaign=instance,
+            exclude=self.request.user,
+        )
 
     def perform_destroy(self, instance):
         # Notify assigned testers before deletion
-        testers = instance.assigned_testers.all()
-        for tester in testers:
-            if tester != self.request.user:
-                Notification.objects.create(
-                    recipient=tester,
-                    title="Campagne Supprimée",
-                    message=f"La campagne '{instance.title}' a été supprimée.",
-                    type='info'
-                )
+        notify(
+            instance.assigned_testers.all(),
+            title="Campagne Supprimée",
+            message=f"La campagne '{instance.title}' a été supprimée.",
+            type='info',
+            exclude=self.request.user,
+        )
         instance.delete()
 
     @action(detail=True, methods=['get'])
@@ -194,6 +232,22 @@ class CampaignViewSet(viewsets.ModelViewSet):
             "recent_activity": recent_activity
         })
 
+    @action(detail=True, methods=['get'], url_path='results-xlsx')
+    def results_xlsx(self, request, pk=None):
+        campaign = self.get_object()
+        from django.utils.text import slugify
+        from testCases.models import TestCase
+        from testCases.views import TEST_CASE_XLSX_COLUMNS, test_case_export_rows
+        from utils.xlsx_export import xlsx_response
+
+        queryset = TestCase.objects.filter(campaign=campaign).order_by('test_case_ref', 'id')
+        return xlsx_response(
+            f'resultats_{slugify(campaign.title) or campaign.id}_{timezone.now().strftime("%Y-%m-%d")}.xlsx',
+            TEST_CASE_XLSX_COLUMNS,
+            test_case_export_rows(queryset),
+            sheet_title=campaign.title or 'Résultats',
+        )
+
 
 class TaskAssignmentViewSet(viewsets.ModelViewSet):
     queryset = TaskAssignment.objects.all()
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_chatmsg_conv_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationreadcursor',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -28,6 +28,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # History of a conversation, read newest first by cursor (config.pagination)
+            models.Index(fields=['conversation', 'created_at', 'id'], name='chatmsg_conv_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Msg by {self.author} at {self.created_at}"
@@ -38,6 +42,8 @@ class ConversationReadCursor(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_cursors')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_read_cursors')
     last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Messages of the others after last_read_message, maintained by notifications.badges
+    unread_count = models.PositiveIntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -62,10 +62,9 @@ class ConversationSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return 0
-        cursor = ConversationReadCursor.objects.filter(
-            conversation=obj, user=request.user
-        ).first()
-        qs = obj.messages.exclude(author=request.user)
-        if cursor and cursor.last_read_message_id:
-            qs = qs.filter(id__gt=cursor.last_read_message_id)
-        return qs.count()
+        # Maintained counter (notifications.badges); prefetched by ConversationViewSet
+        cursors = getattr(obj, 'user_read_cursors', None)
+        if cursors is None:
+            cursors = ConversationReadCursor.objects.filter(conversation=obj, user=request.user)
+        cursor = next(iter(cursors), None)
+        return cursor.unread_count if cursor else 0
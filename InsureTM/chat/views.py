@@ -3,14 +3,23 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Conversation, Message, ConversationReadCursor
 from .serializers import ConversationSerializer, MessageSerializer
-from django.db.models import Q
+from django.db.models import Prefetch, Q
+from notifications import badges
 
 class ConversationViewSet(viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Conversation.objects.filter(participants=self.request.user).distinct().order_by('-updated_at')
+        # The user's own cursor carries the unread count (notifications.badges)
+        return (
+            Conversation.objects.filter(participants=self.request.user).distinct().order_by('-updated_at')
+            .prefetch_related(Prefetch(
+                'read_cursors',
+                queryset=ConversationReadCursor.objects.filter(user=self.request.user),
+                to_attr='user_read_cursors',
+            ))
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -38,11 +47,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         if not last_msg:
             return Response({'status': 'ok', 'last_read_message_id': None})
 
-        ConversationReadCursor.objects.update_or_create(
-            conversation=conv,
-            user=request.user,
-            defaults={'last_read_message': last_msg},
-        )
+        badges.conversation_read(conv, request.user, last_msg)
 
         from asgiref.sync import async_to_sync
         from channels.layers import get_channel_layer
@@ -63,6 +68,9 @@ class ConversationViewSet(viewsets.ModelViewSet):
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Newest messages first, older ones by following `next` (config.pagination); ?page= still works
+    cursor_ordering = '-created_at'
+    cursor_by_default = True
 
     def get_queryset(self):
         conv_id = self.request.query_params.get('conversation')
@@ -94,6 +102,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         instance = serializer.save(author=self.request.user)
         conv = instance.conversation
         conv.save()
+        badges.message_posted(instance)
 
         payload = MessageSerializer(instance, context={'request': self.request}).data
         self._broadcast('chat_message', conv, payload=payload)
@@ -129,6 +138,7 @@ class MessageViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         conv = instance.conversation
         msg_id = instance.id
+        badges.message_deleted(instance)
         instance.delete()
         self._broadcast('chat_message_delete', conv, extra={'message_id': msg_id})
 
@@ -147,6 +157,7 @@ class MessageViewSet(viewsets.ModelViewSet):
             attachment=msg.attachment,
         )
         target_conv.save()
+        badges.message_posted(new_msg)
         payload = MessageSerializer(new_msg, context={'request': self.request}).data
         self._broadcast('chat_message', target_conv, payload=payload)
         return Response(payload, status=status.HTTP_201_CREATED)
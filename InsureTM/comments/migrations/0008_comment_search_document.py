@@ -0,0 +1,122 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:10
+
+import logging
+import unicodedata
+
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+# Frozen copy of utils.search (document fields, normalisation, index DDL) as of this migration
+SEARCH_FIELDS = ('message', 'author__username', 'author__first_name', 'author__last_name')
+TS_CONFIG = 'insuretm_fr'
+MAX_FIELD_CHARS = 20000
+BATCH_SIZE = 2000
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def build_document(values):
+    return ' '.join(filter(None, (normalize(str(v)[:MAX_FIELD_CHARS]) for v in values if v is not None)))
+
+
+def install_postgresql(connection, cursor, table):
+    qn = connection.ops.quote_name
+    cursor.execute("SELECT 1 FROM pg_ts_config WHERE cfgname = %s", [TS_CONFIG])
+    if cursor.fetchone() is None:
+        cursor.execute(f"CREATE TEXT SEARCH CONFIGURATION {TS_CONFIG} (COPY = french)")
+        try:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+                cursor.execute(
+                    f"ALTER TEXT SEARCH CONFIGURATION {TS_CONFIG} "
+                    "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem"
+                )
+        except Exception as e:
+            logger.warning("unaccent unavailable, %s uses the plain French dictionary: %s", TS_CONFIG, e)
+    cursor.execute(
+        f"ALTER TABLE {qn(table)} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}'::regconfig, search_document)) STORED"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_search_gin')} ON {qn(table)} USING gin (search_vector)")
+
+
+def install_sqlite(connection, cursor, table):
+    qn = connection.ops.quote_name
+    fts = f'{table}_fts'
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts)} USING fts5("
+        f"search_document, content={qn(table)}, content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    delete_old = f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, search_document) VALUES ('delete', old.id, old.search_document);"
+    insert_new = f"INSERT INTO {qn(fts)}(rowid, search_document) VALUES (new.id, new.search_document);"
+    for name, event, body in (
+        ('ai', 'AFTER INSERT', insert_new),
+        ('ad', 'AFTER DELETE', delete_old),
+        ('au', 'AFTER UPDATE OF search_document', delete_old + ' ' + insert_new),
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {qn(f'{fts}_{name}')}")
+        cursor.execute(f"CREATE TRIGGER {qn(f'{fts}_{name}')} {event} ON {qn(table)} BEGIN {body} END")
+    cursor.execute(f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')")
+
+
+def fill_search_documents(apps, schema_editor):
+    model = apps.get_model('comments', 'Comment')
+    last_id = 0
+    while True:
+        rows = list(
+            model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', *SEARCH_FIELDS)[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        model.objects.bulk_update(
+            [model(pk=pk, search_document=build_document(values)) for pk, *values in rows],
+            ['search_document'],
+        )
+
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            install_postgresql(connection, cursor, table)
+    elif connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                install_sqlite(connection, cursor, table)
+        except Exception as e:
+            logger.warning("FTS5 unavailable for %s, search falls back to containment: %s", table, e)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    qn, table = connection.ops.quote_name, apps.get_model('comments', 'Comment')._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {qn(f'{table}_search_gin')}")
+            cursor.execute(f"ALTER TABLE {qn(table)} DROP COLUMN IF EXISTS search_vector")
+        elif connection.vendor == 'sqlite':
+            fts = f'{table}_fts'
+            for name in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {qn(f'{fts}_{name}')}")
+            cursor.execute(f"DROP TABLE IF EXISTS {qn(fts)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0007_comment_test_case'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_documents, drop_search_index),
+    ]
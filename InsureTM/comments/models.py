@@ -1,6 +1,9 @@
 from django.db import models
 from django.conf import settings
 
+from utils.search import register_search
+
+
 class Comment(models.Model):
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -20,5 +23,11 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Texte normalisé indexé pour la recherche (utils.search), maintenu à l'enregistrement
+    search_document = models.TextField(blank=True, default='', editable=False)
+
     def __str__(self):
         return f"DM from {self.author} to {self.recipient}"
+
+
+register_search(Comment)
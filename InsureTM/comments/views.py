@@ -6,8 +6,9 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
-from notifications.models import Notification
+from notifications.service import notify
 from utils.email_service import send_comment_posted_email
+from utils.search import search as search_queryset
 from .models import Comment
 from .serializers import CommentSerializer
 
@@ -34,9 +35,8 @@ class CommentViewSet(viewsets.ModelViewSet):
             ).filter(test_case__isnull=True)
 
         if search:
-            queryset = queryset.filter(
-                Q(message__icontains=search) | Q(author__username__icontains=search)
-            )
+            # Conversations stay chronological: filter only, no ranking
+            queryset = search_queryset(queryset, search, rank=False)
 
         if test_case_id:
             queryset = queryset.filter(test_case_id=test_case_id)
@@ -51,11 +51,12 @@ class CommentViewSet(viewsets.ModelViewSet):
         
         # Handle Direct Messages Notifications
         if instance.recipient:
-            Notification.objects.create(
-                recipient=instance.recipient,
+            notify(
+                [instance.recipient],
                 title="Nouveau message direct",
                 message=f"{self.request.user.username} vous a envoyé un message.",
                 type='comment_posted', # Reuse type or add new one
+                digest_key=f'direct_message:{self.request.user.id}',
             )
             return
 
@@ -71,15 +72,15 @@ class CommentViewSet(viewsets.ModelViewSet):
             recipients.add(test_case.tester)
         recipients.discard(self.request.user)
 
+        notify(
+            recipients,
+            title="Nouveau Commentaire",
+            message=f"{self.request.user.username} a commenté sur {test_case.test_case_ref}",
+            type='comment_posted',
+            related_campaign=test_case.campaign,
+            related_object_id=test_case.id,
+        )
         for recipient in recipients:
-            Notification.objects.create(
-                recipient=recipient,
-                title="Nouveau Commentaire",
-                message=f"{self.request.user.username} a commenté sur {test_case.test_case_ref}",
-                type='comment_posted',
-                related_campaign=test_case.campaign,
-                related_object_id=test_case.id,
-            )
             # Send SMTP email
             if recipient.email:
                 try:
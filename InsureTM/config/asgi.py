@@ -12,6 +12,7 @@ from channels.auth import AuthMiddlewareStack
 from chat.middleware import TokenAuthMiddleware
 import campaigns.routing
 import chat.routing
+import notifications.routing
 import testCases.routing
 
 application = ProtocolTypeRouter({
@@ -21,6 +22,7 @@ application = ProtocolTypeRouter({
             URLRouter(
                 campaigns.routing.websocket_urlpatterns +
                 chat.routing.websocket_urlpatterns +
+                notifications.routing.websocket_urlpatterns +
                 testCases.routing.websocket_urlpatterns
             )
         )
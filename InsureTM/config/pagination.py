@@ -1,6 +1,169 @@
+"""
+API pagination: page numbers (default, unchanged) or keyset cursors.
+
+Page numbers pay a COUNT(*) per page and an OFFSET scan that grows with the page
+number.  Views declaring `cursor_ordering` (a timestamp field, e.g. '-cree_le', or
+'-id') also accept `?cursor=` (empty for the first page):
+
+- rows are ordered by (field, id) and a page is `WHERE (field, id) < (last seen)`
+  `LIMIT page_size + 1`: the same cost at any depth, served by a (field, id) index;
+- `next` / `previous` carry an opaque cursor; rows inserted meanwhile do not shift
+  pages, unlike offsets;
+- `?ordering=` may flip the direction of the key (`cree_le` / `-cree_le`);
+- no count unless asked: `?count=exact`, or `?count=approx` (planner estimate on
+  PostgreSQL, count capped at APPROX_COUNT_CAP elsewhere; `count_estimated` is true).
+
+Views with `cursor_by_default = True` use cursors unless `?page=` is given.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+APPROX_COUNT_CAP = 10_000
+
+
+def _encode_cursor(value, pk, reverse):
+    raw = json.dumps({'v': value.isoformat() if hasattr(value, 'isoformat') else value, 'id': pk, 'r': reverse})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token, field):
+    """(key value, id, reverse) of a cursor token for the model `field`; NotFound when it is malformed."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8'))
+        value = field.to_python(data['v']) if field is not None else None
+        return value, int(data['id']), bool(data['r'])
+    except Exception:
+        raise NotFound("Curseur de pagination invalide.")
+
+
+def estimate_count(queryset):
+    """(count, estimated): planner row estimate on PostgreSQL, count capped at APPROX_COUNT_CAP elsewhere."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), True
+    capped = queryset.order_by()[:APPROX_COUNT_CAP + 1].count()
+    return min(capped, APPROX_COUNT_CAP), capped > APPROX_COUNT_CAP
+
+
+class KeysetPagination:
+    """Cursor pages keyed on (view.cursor_ordering field, id)."""
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def _key(self, request, view):
+        key = view.cursor_ordering
+        requested = request.query_params.get('ordering')
+        if requested and requested.lstrip('-') == key.lstrip('-'):
+            key = requested
+        name = key.lstrip('-')
+        return (None if name in ('id', 'pk') else name), key.startswith('-')
+
+    def paginate_queryset(self, queryset, request, view):
+        self.request = request
+        name, descending = self._key(request, view)
+        field = queryset.model._meta.get_field(name) if name else None
+        token = request.query_params.get(self.cursor_query_param)
+        position = _decode_cursor(token, field) if token else None
+        reverse = bool(position and position[2])
+
+        self.count, self.count_estimated = None, False
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            self.count = queryset.count()
+        elif mode == 'approx':
+            self.count, self.count_estimated = estimate_count(queryset)
+
+        # Walking backwards reads the opposite order, then flips the page
+        newest_first = descending != reverse
+        ordering = ['-pk' if newest_first else 'pk']
+        if name:
+            ordering.insert(0, f'-{name}' if newest_first else name)
+        queryset = queryset.order_by(*ordering)
+        if position:
+            value, pk, _ = position
+            after = 'lt' if newest_first else 'gt'
+            if name:
+                queryset = queryset.filter(
+                    Q(**{f'{name}__{after}': value}) | Q(**{name: value, f'pk__{after}': pk})
+                )
+            else:
+                queryset = queryset.filter(**{f'pk__{after}': pk})
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = position is not None if not reverse else has_more
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        self.key_name = name
+        return rows
+
+    def _link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        value = getattr(row, self.key_name) if self.key_name else None
+        return replace_query_param(url, self.cursor_query_param, _encode_cursor(value, row.pk, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self._link(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self._link(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        body = OrderedDict([('next', self.get_next_link()), ('previous', self.get_previous_link())])
+        if self.count is not None:
+            body['count'] = self.count
+            body['count_estimated'] = self.count_estimated
+        body['results'] = data
+        return Response(body)
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 1000
+
+    def _use_cursor(self, request, view):
+        if not getattr(view, 'cursor_ordering', None):
+            return False
+        params = request.query_params
+        if KeysetPagination.cursor_query_param in params:
+            return True
+        return getattr(view, 'cursor_by_default', False) and self.page_query_param not in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if view is not None and self._use_cursor(request, view):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if getattr(self, 'keyset', None) is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
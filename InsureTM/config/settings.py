@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.invalidation.InvalidationMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -140,6 +141,17 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# e.g. '/protected-media/': nginx sends authorised media itself (internal location aliasing MEDIA_ROOT)
+MEDIA_ACCEL_REDIRECT_PREFIX = env('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
+
+# Uploads are hashed (SHA-256) while they are received, see utils/storage.py
+FILE_UPLOAD_HANDLERS = [
+    'utils.storage.HashingMemoryFileUploadHandler',
+    'utils.storage.HashingTemporaryFileUploadHandler',
+]
+# Proofs sent with bulk results (TestCaseSerializer.validate_bulk_proof): accepted extensions and size cap
+PROOF_FILE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.pdf', '.docx']
+PROOF_FILE_MAX_MB = env.int('PROOF_FILE_MAX_MB', default=20)
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -160,6 +172,29 @@ FRONTEND_URL = env('FRONTEND_URL', default='http://nginx')
 BACKEND_URL = env('BACKEND_URL', default='http://backend:8000')
 N8N_BASE_URL = env('N8N_BASE_URL', default='https://n8n.insuretb.tech')
 
+# ---------------------------------------------------------------------------
+# Playwright execution queue (testCases/execution_queue.py)
+# ---------------------------------------------------------------------------
+PLAYWRIGHT_WORKERS = env.int('PLAYWRIGHT_WORKERS', default=2)              # Playwright processes at once
+PLAYWRIGHT_JOB_TIMEOUT = env.int('PLAYWRIGHT_JOB_TIMEOUT', default=600)      # seconds per single run
+PLAYWRIGHT_SUITE_WORKERS = env.int('PLAYWRIGHT_SUITE_WORKERS', default=4)    # --workers of a suite run
+PLAYWRIGHT_SUITE_TIMEOUT = env.int('PLAYWRIGHT_SUITE_TIMEOUT', default=3600)  # seconds per suite run
+# Warm Chromium servers reused by headless runs (testCases/browser_pool.py); 0 disables the pool
+PLAYWRIGHT_BROWSER_POOL_SIZE = env.int('PLAYWRIGHT_BROWSER_POOL_SIZE', default=PLAYWRIGHT_WORKERS)
+PLAYWRIGHT_BROWSER_MAX_RUNS = env.int('PLAYWRIGHT_BROWSER_MAX_RUNS', default=50)  # runs before a server is recycled
+PLAYWRIGHT_RESULTS_RETENTION_DAYS = env.int('PLAYWRIGHT_RESULTS_RETENTION_DAYS', default=14)  # prune_test_results
+# Runner agents (testCases/agent.py): a job whose lease is not renewed in time is queued again
+RUNNER_AGENT_LEASE_SECONDS = env.int('RUNNER_AGENT_LEASE_SECONDS', default=60)
+RUNNER_AGENT_MAX_ATTEMPTS = env.int('RUNNER_AGENT_MAX_ATTEMPTS', default=3)
+# Batch Playwright script generation (testCases/script_generation.py): model calls at once per process
+SCRIPT_GENERATION_CONCURRENCY = env.int('SCRIPT_GENERATION_CONCURRENCY', default=4)
+# Background PDF reports (core/reports.py), stored outside the public MEDIA_ROOT
+REPORTS_ROOT = env('REPORTS_ROOT', default=os.path.join(BASE_DIR, 'private', 'reports'))
+REPORT_CONCURRENCY = env.int('REPORT_CONCURRENCY', default=2)              # reports built at once per process
+REPORT_JOB_TIMEOUT = env.int('REPORT_JOB_TIMEOUT', default=600)            # seconds before a queued/running job is retried
+REPORT_CACHE_TTL = env.int('REPORT_CACHE_TTL', default=86400)              # seconds an unchanged artifact is reused
+REPORT_INLINE_WAIT_SECONDS = env.int('REPORT_INLINE_WAIT_SECONDS', default=3)  # legacy GET exports hold a worker this long, then 202
+
 # ---------------------------------------------------------------------------
 # Email (SMTP via Gmail — uses App Password from .env.docker)
 # ---------------------------------------------------------------------------
@@ -170,3 +205,9 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env('EMAIL_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Outbox dispatcher (emails/outbox.py): messages are written with the request and sent by worker threads
+EMAIL_OUTBOX_WORKERS = env.int('EMAIL_OUTBOX_WORKERS', default=1)            # dispatcher threads per process, 0 = none
+EMAIL_OUTBOX_BATCH_SIZE = env.int('EMAIL_OUTBOX_BATCH_SIZE', default=50)     # messages claimed at once
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5)
+EMAIL_OUTBOX_RETRY_SECONDS = env.int('EMAIL_OUTBOX_RETRY_SECONDS', default=30)  # first retry delay, doubled each attempt
+EMAIL_OUTBOX_IDLE_SECONDS = env.int('EMAIL_OUTBOX_IDLE_SECONDS', default=60)    # SMTP connection kept open without mail
@@ -21,17 +21,18 @@ urlpatterns = [
     path('api/notifications/', include('notifications.urls')),
     path('api/emails/', include('emails.urls')),
     path('api/analytics/', include('analytics.urls')),
+    path('api/reports/', include('core.urls')),
     # Swagger / OpenAPI
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
 
-from django.conf import settings
 from django.urls import re_path
-from django.views.static import serve
+from utils.media import media_view
 
 # Serve uploaded files (proofs, avatars) — required in prod where DEBUG=False
+# Range/ETag aware; offloaded to nginx when MEDIA_ACCEL_REDIRECT_PREFIX is set
 urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    re_path(r'^media/(?P<path>.*)$', media_view),
 ]
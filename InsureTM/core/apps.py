@@ -5,3 +5,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from utils.search import connect_dependencies
+        connect_dependencies()
@@ -0,0 +1,108 @@
+"""
+python manage.py benchmark_endpoints [--scale 5] [--iterations 10] [--explain 3] [--json out.json]
+- Injecte un jeu de données synthétique (seed_demo + volume) dans une transaction annulée à la fin
+- Appelle chaque endpoint de liste / analytics et mesure requêtes SQL, temps DB, taille de réponse, latence p50/p95
+- Affiche le plan EXPLAIN des requêtes les plus lentes
+- Échoue si un budget de core/perf_budgets.json est dépassé (--write-budgets pour le régénérer)
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from core import perf
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark des endpoints : nombre de requêtes, temps DB, latence et plans EXPLAIN, contrôlés par budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=5)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--explain', type=int, default=3, help="Nombre de requêtes les plus lentes à expliquer par endpoint")
+        parser.add_argument('--only', nargs='*', help="Noms d'endpoints à mesurer")
+        parser.add_argument('--budgets', default=perf.BUDGETS_PATH)
+        parser.add_argument('--json', dest='json_path', help="Écrit les résultats dans ce fichier")
+        parser.add_argument('--write-budgets', action='store_true', help="Remplace max_queries par les valeurs mesurées")
+        parser.add_argument('--no-latency-budget', action='store_true', help="Ne contrôle que le nombre de requêtes")
+
+    def handle(self, *args, **options):
+        results = {}
+        try:
+            # The test client talks to 'testserver', outside of the deployed ALLOWED_HOSTS
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                results = self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'vendor': connection.vendor, 'scale': options['scale'], 'endpoints': results}, f, indent=2)
+
+        budgets = perf.load_budgets(options['budgets'])
+        if options['write_budgets']:
+            for name, result in results.items():
+                budgets.setdefault(name, {})['max_queries'] = result['queries']
+            with open(options['budgets'], 'w', encoding='utf-8') as f:
+                json.dump(budgets, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"💾 Budgets écrits dans {options['budgets']}"))
+            return
+
+        violations = []
+        for name, result in results.items():
+            violations += perf.check_budget(name, result, budgets, check_latency=not options['no_latency_budget'])
+        if violations:
+            raise CommandError("Budgets dépassés :\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS("✅ Tous les budgets sont respectés."))
+
+    def _run(self, options):
+        self.stdout.write(f"⏳ Seed synthétique (scale={options['scale']}, {connection.vendor})…")
+        users = perf.seed(scale=options['scale'])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        clients = {}
+        for role, user in users.items():
+            clients[role] = APIClient()
+            clients[role].force_authenticate(user)
+
+        self.stdout.write(f"\n{'endpoint':<22}{'status':>7}{'queries':>9}{'db ms':>10}{'KB':>9}{'p50 ms':>10}{'p95 ms':>10}")
+        results = {}
+        for name, url, role in perf.ENDPOINTS:
+            if options['only'] and name not in options['only']:
+                continue
+            result = perf.measure(clients[role], url, iterations=options['iterations'])
+            captured = result.pop('captured')
+            self.stdout.write(
+                f"{name:<22}{result['status']:>7}{result['queries']:>9}{result['db_ms']:>10}{result['bytes'] / 1024:>9.1f}"
+                f"{result['p50_ms']:>10}{result['p95_ms']:>10}"
+            )
+
+            slowest = sorted(captured, key=lambda q: float(q['time']), reverse=True)[:options['explain']]
+            result['slowest'] = []
+            for query in slowest:
+                try:
+                    plan = perf.explain(query['sql'])
+                except Exception as e:
+                    plan = f"EXPLAIN impossible : {e}"
+                result['slowest'].append({'ms': round(float(query['time']) * 1000, 2), 'sql': query['sql'], 'plan': plan})
+            results[name] = result
+
+        if options['explain']:
+            self.stdout.write("\n📋 Requêtes les plus lentes :")
+            for name, result in results.items():
+                for query in result['slowest']:
+                    self.stdout.write(self.style.MIGRATE_HEADING(f"\n[{name}] {query['ms']} ms"))
+                    self.stdout.write(query['sql'][:500])
+                    if query['plan']:
+                        self.stdout.write(query['plan'])
+        return results
@@ -0,0 +1,148 @@
+"""
+python manage.py benchmark_search [--anomalies 500000] [--terms "connexion,tc_00042,#1234"]
+- Insère N anomalies synthétiques (avec cas de test, campagnes, auteurs) dans une transaction annulée à la fin
+- Compare, pour chaque terme, l'ancienne recherche icontains sur 7 colonnes jointes à l'index plein texte
+  (première page de 20 + comptage, comme l'endpoint paginé)
+- Affiche le plan d'exécution de la recherche indexée
+"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q, TextField
+from django.db.models.functions import Cast
+
+from anomalies.models import Anomalie
+from campaigns.models import Campaign
+from Project.models import Project
+from testCases.models import TestCase
+from utils.search import build_document, search
+
+WORDS = [
+    'connexion', 'échec', 'paiement', 'contrat', 'sinistre', 'délai', 'bouton', 'validation', 'écran',
+    'timeout', 'erreur', 'serveur', 'réponse', 'attendue', 'reçue', 'page', 'formulaire', 'client',
+    'souscription', 'facture', 'export', 'pdf', 'champ', 'obligatoire', 'grisé', 'lenteur', 'session',
+]
+DEFAULT_TERMS = 'connexion,echec paiement,sinistre delai,tc_00042,bench-7,#1234'
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _legacy(queryset, term):
+    """The search the anomaly list used before the index: seven icontains across joins, id as text."""
+    term = term.lstrip('#').strip()
+    if term.isdigit():
+        return queryset.annotate(pk_str=Cast('pk', TextField())).filter(pk_str__icontains=term).order_by('-pk')
+    return queryset.filter(
+        Q(titre__icontains=term) |
+        Q(description__icontains=term) |
+        Q(test_case__campaign__title__icontains=term) |
+        Q(test_case__test_case_ref__icontains=term) |
+        Q(cree_par__username__icontains=term) |
+        Q(cree_par__first_name__icontains=term) |
+        Q(cree_par__last_name__icontains=term)
+    ).order_by('-pk')
+
+
+class Command(BaseCommand):
+    help = "Compare la recherche icontains et l'index plein texte sur un volume synthétique (rollback final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anomalies', type=int, default=500_000)
+        parser.add_argument('--test-cases', type=int, default=50_000)
+        parser.add_argument('--campaigns', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--terms', default=DEFAULT_TERMS)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write(self.style.SUCCESS("↩ Données synthétiques annulées."))
+
+    def _timed(self, queryset, repeat):
+        best, page, total = None, [], 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            page = list(queryset.values_list('pk', flat=True)[:20])
+            total = queryset.count()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, page, total
+
+    def _run(self, options):
+        rng = random.Random(42)
+        batch_size = options['batch_size']
+        User = get_user_model()
+        authors = [
+            User.objects.create_user(
+                username=f'bench_search_{i}', email=f'bench_search_{i}@bench.invalid', password='x',
+                first_name=rng.choice(['Amélie', 'Karim', 'Sonia', 'Hédi', 'Léa']), last_name=f'Testeur{i}',
+            )
+            for i in range(20)
+        ]
+        project = Project.objects.create(name='benchmark_search')
+        campaigns = Campaign.objects.bulk_create(
+            [Campaign(project=project, title=f'bench-{i} recette {rng.choice(WORDS)}') for i in range(options['campaigns'])]
+        )
+
+        self.stdout.write(f"⏳ Insertion de {options['test_cases']} cas de test et {options['anomalies']} anomalies ({connection.vendor})…")
+        started = time.perf_counter()
+        cases = []
+        for offset in range(0, options['test_cases'], batch_size):
+            objs = []
+            for i in range(offset, min(offset + batch_size, options['test_cases'])):
+                campaign = rng.choice(campaigns)
+                ref = f'TC_{i:05d}'
+                objs.append(TestCase(
+                    campaign=campaign, test_case_ref=ref, data_json={},
+                    search_document=build_document([ref, '', campaign.title]),
+                ))
+            cases += TestCase.objects.bulk_create(objs, batch_size=batch_size)
+        campaign_titles = {c.id: c.title for c in campaigns}
+
+        for offset in range(0, options['anomalies'], batch_size):
+            objs = []
+            for i in range(offset, min(offset + batch_size, options['anomalies'])):
+                tc, author = rng.choice(cases), rng.choice(authors)
+                titre = f"Anomalie {' '.join(rng.sample(WORDS, 3))}"
+                description = ' '.join(rng.choices(WORDS, k=40))
+                # bulk_create skips the signals: documents are built here, from the same fields
+                objs.append(Anomalie(
+                    test_case=tc, titre=titre, description=description, cree_par=author,
+                    search_document=build_document([
+                        titre, description, tc.test_case_ref, campaign_titles[tc.campaign_id],
+                        author.username, author.first_name, author.last_name,
+                    ]),
+                ))
+            Anomalie.objects.bulk_create(objs, batch_size=batch_size)
+        self.stdout.write(f"   insertion : {time.perf_counter() - started:.1f}s")
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE "anomalies_anomalie"')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+        base = Anomalie.objects.all()
+        self.stdout.write(f"\n{'terme':<22}{'icontains':>12}{'index':>12}{'résultats':>20}")
+        indexed = None
+        for term in [t.strip() for t in options['terms'].split(',') if t.strip()]:
+            legacy_time, _, legacy_total = self._timed(_legacy(base, term), options['repeat'])
+            indexed = search(base, term)
+            index_time, _, index_total = self._timed(indexed, options['repeat'])
+            self.stdout.write(
+                f"{term:<22}{legacy_time * 1000:>10.0f}ms{index_time * 1000:>10.0f}ms"
+                f"{f'{legacy_total} / {index_total}':>20}"
+            )
+
+        if indexed is not None:
+            self.stdout.write("\n📋 Plan d'exécution (recherche indexée) :")
+            self.stdout.write(indexed[:20].explain())
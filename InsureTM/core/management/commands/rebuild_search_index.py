@@ -0,0 +1,30 @@
+"""
+python manage.py rebuild_search_index [--model anomalies.Anomalie]
+- Recalcule search_document des anomalies, cas de test et commentaires (seules les lignes modifiées sont écrites)
+- Recrée l'index de recherche du backend (colonne tsvector + GIN sur PostgreSQL, FTS5 + triggers sur SQLite)
+- À lancer après un import massif qui contourne les signaux (bulk_create, SQL brut)
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from utils.search import SEARCH_FIELDS, install_index, refresh_documents
+
+
+class Command(BaseCommand):
+    help = "Recalcule les documents de recherche et recrée l'index plein texte."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', help='app_label.Model (répétable), tous par défaut')
+
+    def handle(self, *args, **options):
+        labels = options['model'] or list(SEARCH_FIELDS)
+        unknown = set(labels) - set(SEARCH_FIELDS)
+        if unknown:
+            raise CommandError(f"Modèle non indexé : {', '.join(sorted(unknown))}")
+
+        for label in labels:
+            model = apps.get_model(label)
+            install_index(connection, model._meta.db_table)
+            changed = refresh_documents(model._base_manager.all())
+            self.stdout.write(self.style.SUCCESS(f"✔ {label} : {changed} document(s) mis à jour."))
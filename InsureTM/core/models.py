@@ -1,3 +1,90 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 
-# Create your models here.
+
+class ProofBlob(models.Model):
+    """
+    A content-addressed proof file (see utils.storage) and the number of
+    records (TestCase / Anomalie FileFields) pointing at it.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} réf.)"
+
+
+class DataVersion(models.Model):
+    """
+    Generation counter of a data scope ('anomalies', 'campaigns', 'campaign:<id>'),
+    bumped by utils.invalidation after each commit that changes it.  Report
+    fingerprints (core.reports) are built from these counters.
+    """
+    scope = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
+class ReportStorage(FileSystemStorage):
+    # Outside MEDIA_ROOT: /media/ is public, reports go through an authorised download endpoint.
+    # REPORTS_ROOT is read on each access, not frozen when the model is defined.
+    @property
+    def base_location(self):
+        return settings.REPORTS_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def get_report_storage():
+    return ReportStorage()
+
+
+class ReportJob(models.Model):
+    """Génération d'un rapport en arrière-plan ; l'artefact est réutilisé tant que l'empreinte est inchangée."""
+    KIND_CHOICES = [
+        ('anomalies_pdf', "Rapport d'anomalies (PDF)"),
+        ('closure_pdf', 'Fiche de clôture de campagne (PDF)'),
+    ]
+    STATUS_CHOICES = [
+        ('QUEUED', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échec'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    # Hash of kind + params: every generation of the same report, whatever the data version
+    cache_key = models.CharField(max_length=64, db_index=True)
+    # Hash of cache_key + data versions: identical fingerprint, identical report
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    artifact = models.FileField(upload_to='reports/%Y/%m/', storage=get_report_storage, blank=True, null=True)
+    filename = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)  # downloads served from the stored artifact
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Rapport {self.id} - {self.kind} ({self.status})"
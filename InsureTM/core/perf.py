@@ -0,0 +1,207 @@
+"""
+Endpoint performance harness: synthetic dataset, per-endpoint measurement and budgets.
+
+Used by `manage.py benchmark_endpoints` (full run, latency + EXPLAIN) and by
+core/tests.py (query-count regression guard).  Works on SQLite and PostgreSQL.
+"""
+import io
+import json
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'perf_budgets.json')
+
+# (name, url, role of the calling user).  Only read endpoints that never call an LLM.
+ENDPOINTS = [
+    ('business-projects', '/api/business-projects/', 'ADMIN'),
+    ('projects', '/api/projects/', 'ADMIN'),
+    ('campaigns', '/api/campaigns/', 'ADMIN'),
+    ('testcases', '/api/testcases/?ordering=id', 'ADMIN'),
+    ('testcases-tester', '/api/testcases/?ordering=id', 'TESTER'),
+    ('anomalies', '/api/anomalies/', 'ADMIN'),
+    ('comments', '/api/comments/', 'ADMIN'),
+    ('chat-conversations', '/api/chat/conversations/', 'ADMIN'),
+    ('chat-messages', '/api/chat/messages/', 'ADMIN'),
+    ('notifications', '/api/notifications/', 'ADMIN'),
+    ('emails', '/api/emails/', 'ADMIN'),
+    ('users', '/api/users/', 'ADMIN'),
+    ('analytics-releases', '/api/analytics/releases/', 'ADMIN'),
+    ('analytics-testers', '/api/analytics/testers/', 'ADMIN'),
+    ('analytics-modules', '/api/analytics/modules/', 'ADMIN'),
+]
+
+
+def seed(scale=1, seed_value=42):
+    """
+    Build the benchmark dataset: the demo fixture from `seed_demo`, then `scale`
+    multiples of synthetic test cases, anomalies, comments, chat and notifications.
+
+    Returns {role: user} for the users the endpoints are called with.
+    """
+    from django.contrib.auth import get_user_model
+    from anomalies.models import Anomalie
+    from campaigns.models import Campaign, TaskAssignment
+    from chat.models import Conversation, Message
+    from comments.models import Comment
+    from emails.models import Email
+    from notifications.models import Notification
+    from testCases.models import TestCase, extract_module
+    from analytics.rollups import rebuild_all
+    from notifications.badges import recompute as recompute_badges
+    from utils.search import refresh_documents
+
+    User = get_user_model()
+    rng = random.Random(seed_value)
+    random.seed(seed_value)  # seed_demo draws from the global generator
+
+    def make_user(username, role, **extra):
+        return User.objects.create_user(
+            username=username, email=f'{username}@perf.invalid', password='x', role=role, **extra
+        )
+
+    admin = make_user('perf_admin', 'ADMIN', is_superuser=True)
+    make_user('perf_manager', 'MANAGER')
+    testers = [make_user(f'perf_tester_{i}', 'TESTER') for i in range(5 * scale)]
+    call_command('seed_demo', stdout=io.StringIO())
+
+    campaigns = list(Campaign.objects.all())
+    modules = ['Souscription', 'Sinistres', 'Facturation', 'Authentification', '']
+    now = timezone.now()
+
+    cases = []
+    for campaign in campaigns:
+        for i in range(20 * scale):
+            data = {'Module': modules[i % len(modules)], 'Etape': f'Étape {i}', 'Attendu': 'OK'}
+            cases.append(TestCase(
+                campaign=campaign,
+                test_case_ref=f'PERF-{campaign.id}-{i}',
+                data_json=data,
+                module=extract_module(data),
+                status=('PENDING', 'PASSED', 'FAILED')[i % 3],
+                tester=testers[i % len(testers)],
+                execution_date=now - timedelta(days=rng.randint(0, 30)),
+            ))
+    cases = TestCase.objects.bulk_create(cases, batch_size=500)
+
+    TaskAssignment.objects.bulk_create([
+        TaskAssignment(campaign=tc.campaign, tester=tc.tester, test_case_ref=tc.test_case_ref)
+        for tc in cases[::4]
+    ], batch_size=500)
+
+    Anomalie.objects.bulk_create([
+        Anomalie(
+            test_case=tc,
+            titre=f'Anomalie {tc.test_case_ref}',
+            description='Écart constaté pendant la recette.',
+            cree_par=tc.tester,
+        )
+        for tc in cases[::3]
+    ], batch_size=500)
+
+    Comment.objects.bulk_create([
+        Comment(author=tc.tester, recipient=admin, test_case=tc, message='Merci de vérifier.')
+        for tc in cases[::5]
+    ], batch_size=500)
+    # bulk_create skips the search signals
+    for model in (TestCase, Anomalie, Comment):
+        refresh_documents(model.objects.all())
+    # ... and the dashboard rollups
+    rebuild_all()
+
+    Notification.objects.bulk_create([
+        Notification(recipient=admin, title='Test exécuté', message=tc.test_case_ref, related_campaign=tc.campaign)
+        for tc in cases[:100 * scale]
+    ], batch_size=500)
+
+    Email.objects.bulk_create([
+        Email(sender=tester, recipient=admin, subject='Rapport', body='Voir pièce jointe.')
+        for tester in testers for _ in range(4)
+    ], batch_size=500)
+
+    for tester in testers:
+        conversation = Conversation.objects.create(type='DIRECT')
+        conversation.participants.add(admin, tester)
+        Message.objects.bulk_create([
+            Message(conversation=conversation, author=(admin, tester)[i % 2], text=f'Message {i}')
+            for i in range(10 * scale)
+        ])
+    # bulk_create skips the badge counters too
+    recompute_badges()
+
+    return {'ADMIN': admin, 'TESTER': testers[0]}
+
+
+def measure(client, url, iterations=5):
+    """
+    Call `url` `iterations` times on a cold cache.
+
+    Query count and DB time come from the first call; latency percentiles from all calls.
+    """
+    latencies = []
+    captured = None
+    status_code = None
+    size = 0
+    for i in range(iterations):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if i == 0:
+            captured = list(ctx.captured_queries)
+            status_code = response.status_code
+            size = len(response.content)
+
+    latencies.sort()
+    return {
+        'status': status_code,
+        'queries': len(captured),
+        'bytes': size,
+        'db_ms': round(sum(float(q['time']) for q in captured) * 1000, 2),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'captured': captured,
+    }
+
+
+def explain(sql):
+    """EXPLAIN a captured SELECT on the current backend."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    prefix = {
+        'postgresql': 'EXPLAIN (ANALYZE, BUFFERS) ',
+        'sqlite': 'EXPLAIN QUERY PLAN ',
+    }.get(connection.vendor, 'EXPLAIN ')
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        rows = cursor.fetchall()
+    return '\n'.join(' '.join(str(col) for col in row) for row in rows)
+
+
+def load_budgets(path=BUDGETS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_budget(name, result, budgets, check_latency=True):
+    """Return the list of budget violations for one endpoint result."""
+    budget = budgets.get(name)
+    if not budget:
+        return []
+    violations = []
+    if result['status'] >= 400:
+        violations.append(f"{name}: statut HTTP {result['status']}")
+    if result['queries'] > budget['max_queries']:
+        violations.append(f"{name}: {result['queries']} requêtes > budget {budget['max_queries']}")
+    if check_latency and 'p95_ms' in budget and result['p95_ms'] > budget['p95_ms']:
+        violations.append(f"{name}: p95 {result['p95_ms']} ms > budget {budget['p95_ms']} ms")
+    return violations
@@ -0,0 +1,221 @@
+"""
+Background report generation with stored, fingerprinted artifacts.
+
+A report (anomaly list PDF, campaign closure PDF) is requested, not built, by the
+request: `request_report` returns a ReportJob and the PDF is built in a thread.
+
+- every kind declares the data scopes it reads; their DataVersion counters (bumped
+  by utils.invalidation on commit) plus the kind and its params make the fingerprint;
+- a DONE job with the same fingerprint is served from storage (`hits` counted), a
+  queued / running one is shared, otherwise a new job is started after commit;
+- builds go through one semaphore of settings.REPORT_CONCURRENCY slots per process;
+- artifacts live in settings.REPORTS_ROOT (not under the public /media/) and older
+  generations of the same report are deleted once a new one is stored;
+- settings.REPORT_CACHE_TTL bounds the reuse of an artifact, for the data the
+  counters do not follow (user and project names, daily ML insights).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Bump when a builder's layout changes: stored artifacts are then regenerated
+REPORT_FORMAT_VERSION = 1
+WAIT_POLL_SECONDS = 0.25
+
+# builder(params) -> (filename, content_type, bytes); params(user, data) -> params stored on the job
+# (raises a DRF error when the user may not request it); scopes(params) -> DataVersion scopes read
+ReportKind = namedtuple('ReportKind', 'builder params scopes daily')
+
+REPORT_KINDS = {
+    'anomalies_pdf': ReportKind(
+        'anomalies.reports.build_anomalies_pdf', 'anomalies.reports.anomaly_report_params',
+        lambda params: ['anomalies', 'campaigns'], daily=False,
+    ),
+    # The closure sheet includes the day's ML projection: one generation per day at most
+    'closure_pdf': ReportKind(
+        'analytics.reports.build_closure_pdf', 'analytics.reports.closure_report_params',
+        lambda params: [f"campaign:{params['campaign_id']}"], daily=True,
+    ),
+}
+
+_build_slots = None
+_build_slots_lock = threading.Lock()
+
+
+def _slots():
+    global _build_slots
+    with _build_slots_lock:
+        if _build_slots is None:
+            _build_slots = threading.BoundedSemaphore(max(1, settings.REPORT_CONCURRENCY))
+        return _build_slots
+
+
+def _digest(payload):
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def current_versions(scopes):
+    """{scope: version} for `scopes`; a scope never bumped is at 0."""
+    from .models import DataVersion
+
+    versions = dict.fromkeys(scopes, 0)
+    versions.update(DataVersion.objects.filter(scope__in=scopes).values_list('scope', 'version'))
+    return versions
+
+
+def report_cache_key(kind, params):
+    return _digest({'kind': kind, 'params': params, 'format': REPORT_FORMAT_VERSION})
+
+
+def report_fingerprint(kind, params):
+    spec = REPORT_KINDS[kind]
+    payload = {'key': report_cache_key(kind, params), 'versions': current_versions(spec.scopes(params))}
+    if spec.daily:
+        payload['day'] = timezone.localdate().isoformat()
+    return _digest(payload)
+
+
+def report_params(kind, user, data):
+    """Validated, user-scoped params of a `kind` report built from request data."""
+    return import_string(REPORT_KINDS[kind].params)(user, data)
+
+
+def can_access(job, user):
+    """Managers and admins see every report; testers only the ones built for them."""
+    if user.role in ('ADMIN', 'MANAGER'):
+        return True
+    return job.params.get('tester_id') == user.id
+
+
+def _is_stored(job):
+    return bool(job.artifact) and job.artifact.storage.exists(job.artifact.name)
+
+
+def request_report(kind, params, user=None):
+    """(job, cached): the stored report for the current data, the one being built, or a new job."""
+    from .models import ReportJob
+
+    if kind not in REPORT_KINDS:
+        raise ValueError(f"Type de rapport inconnu : {kind}")
+    fingerprint = report_fingerprint(kind, params)
+    now = timezone.now()
+    jobs = ReportJob.objects.filter(fingerprint=fingerprint)
+
+    done = jobs.filter(
+        status='DONE', finished_at__gte=now - timedelta(seconds=settings.REPORT_CACHE_TTL),
+    ).order_by('-finished_at').first()
+    if done is not None and _is_stored(done):
+        ReportJob.objects.filter(pk=done.pk).update(hits=F('hits') + 1)
+        done.hits += 1
+        return done, True
+
+    # A job older than REPORT_JOB_TIMEOUT is considered lost (process restarted) and not shared
+    in_progress = jobs.filter(
+        status__in=('QUEUED', 'RUNNING'), created_at__gte=now - timedelta(seconds=settings.REPORT_JOB_TIMEOUT),
+    ).first()
+    if in_progress is not None:
+        return in_progress, False
+
+    job = ReportJob.objects.create(
+        kind=kind, params=params, cache_key=report_cache_key(kind, params),
+        fingerprint=fingerprint, requested_by=user,
+    )
+    transaction.on_commit(lambda: start(job.id))
+    return job, False
+
+
+def start(job_id):
+    threading.Thread(target=_run_in_thread, args=(job_id,), name=f'report-{job_id}', daemon=True).start()
+
+
+def _run_in_thread(job_id):
+    from .models import ReportJob
+
+    try:
+        close_old_connections()
+        run_report(ReportJob.objects.get(pk=job_id))
+    except Exception as exc:
+        logger.exception("Report job %s crashed", job_id)
+        ReportJob.objects.filter(pk=job_id).update(status='FAILED', error=str(exc), finished_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+def run_report(job):
+    """Build the artifact of `job`, store it, and drop the older generations of the same report."""
+    from .models import ReportJob
+
+    ReportJob.objects.filter(pk=job.pk).update(status='RUNNING', started_at=timezone.now())
+    builder = import_string(REPORT_KINDS[job.kind].builder)
+    with _slots():
+        started = time.monotonic()
+        filename, content_type, content = builder(job.params)
+
+    extension = filename.rsplit('.', 1)[-1] if '.' in filename else 'bin'
+    # Fingerprint as file name: not guessable, and unique per data version
+    job.artifact.save(f'{job.fingerprint}.{extension}', ContentFile(content), save=False)
+    job.filename = filename
+    job.content_type = content_type
+    job.size = len(content)
+    job.status = 'DONE'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['artifact', 'filename', 'content_type', 'size', 'status', 'finished_at'])
+    logger.info("Report %s (%s) built in %.1fs, %d bytes", job.id, job.kind, time.monotonic() - started, job.size)
+
+    superseded = (
+        ReportJob.objects.filter(cache_key=job.cache_key, status='DONE')
+        .exclude(pk=job.pk).exclude(artifact__isnull=True).exclude(artifact='')
+    )
+    for old in superseded:
+        old.artifact.delete(save=False)
+        ReportJob.objects.filter(pk=old.pk).update(artifact=None)
+    return job
+
+
+def wait_for(job, seconds):
+    """Poll `job` until it is DONE / FAILED or `seconds` have passed; returns the refreshed job."""
+    deadline = time.monotonic() + seconds
+    while job.status not in ('DONE', 'FAILED') and time.monotonic() < deadline:
+        time.sleep(WAIT_POLL_SECONDS)
+        job.refresh_from_db()
+    return job
+
+
+def serve_report(request, job):
+    from utils.media import serve_file
+
+    response = serve_file(request, job.artifact.path, content_type=job.content_type or None, as_attachment=True)
+    if response.status_code != 304:
+        response['Content-Disposition'] = f'attachment; filename="{job.filename}"'
+    return response
+
+
+def report_response(request, kind, data):
+    """
+    Legacy synchronous exports: the stored file when it is up to date, else wait up to
+    settings.REPORT_INLINE_WAIT_SECONDS for the worker, else 202 with the job to poll.
+    """
+    from rest_framework.response import Response
+    from .serializers import ReportJobSerializer
+
+    job, _ = request_report(kind, report_params(kind, request.user, data), request.user)
+    job = wait_for(job, settings.REPORT_INLINE_WAIT_SECONDS)
+    if job.status == 'DONE':
+        return serve_report(request, job)
+    if job.status == 'FAILED':
+        return Response({'error': "La génération du rapport a échoué.", 'detail': job.error}, status=500)
+    return Response(ReportJobSerializer(job).data, status=202)
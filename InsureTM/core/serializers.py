@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+from .models import ReportJob
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'kind', 'params', 'status', 'filename', 'size', 'hits', 'error',
+            'download_url', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'DONE':
+            return None
+        return f'/api/reports/{obj.id}/download/'
@@ -1,3 +1,536 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from core import perf
+
+
+class EndpointQueryBudgetTest(TestCase):
+    """Fails when a list / analytics endpoint issues more SQL queries than core/perf_budgets.json allows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = perf.seed(scale=1)
+
+    def test_endpoints_within_query_budget(self):
+        budgets = perf.load_budgets()
+        for name, url, role in perf.ENDPOINTS:
+            with self.subTest(endpoint=name):
+                client = APIClient()
+                client.force_authenticate(self.users[role])
+                result = perf.measure(client, url, iterations=1)
+                self.assertEqual(result['status'], 200)
+                self.assertIn(name, budgets)
+                self.assertEqual(perf.check_budget(name, result, budgets, check_latency=False), [])
+
+    def test_explain_runs_on_current_backend(self):
+        client = APIClient()
+        client.force_authenticate(self.users['ADMIN'])
+        result = perf.measure(client, '/api/analytics/modules/', iterations=1)
+        plans = [perf.explain(q['sql']) for q in result['captured']]
+        self.assertTrue(any(plans))
+
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, override_settings
+
+from core.models import ProofBlob
+from utils.storage import blob_digest, get_proof_storage
+
+
+class ContentAddressedProofStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        from django.contrib.auth import get_user_model
+        from campaigns.models import Campaign
+        from Project.models import Project
+        from testCases.models import TestCase as TestCaseModel
+        self.user = get_user_model().objects.create_user(username='blob_user', email='blob@lloyd.com', password='x')
+        campaign = Campaign.objects.create(title='Blobs', project=Project.objects.create(name='Blobs'))
+        self.tc = TestCaseModel.objects.create(campaign=campaign, test_case_ref='TC_BLOB')
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_shared_screenshot_is_stored_once_and_refcounted(self):
+        from anomalies.models import Anomalie
+        content = b'identical playwright screenshot'
+        digest = hashlib.sha256(content).hexdigest()
+
+        self.tc.proof_file.save('screenshot.png', ContentFile(content), save=False)
+        self.tc.save()
+        anomaly = Anomalie.objects.create(
+            test_case=self.tc, titre='Bug', description='x', cree_par=self.user,
+            preuve_image=self.tc.proof_file.name,
+        )
+
+        self.assertEqual(self.tc.proof_hash, digest)
+        self.assertEqual(anomaly.preuve_hash, digest)
+        self.assertEqual(blob_digest(anomaly.preuve_image.name), digest)
+        self.assertEqual(ProofBlob.objects.get(digest=digest).refcount, 2)
+        stored = [f for _, _, files in os.walk(self.media_root) for f in files]
+        self.assertEqual(stored, [f'{digest}.png'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            anomaly.delete()
+        self.assertEqual(ProofBlob.objects.get(digest=digest).refcount, 1)
+        self.assertTrue(get_proof_storage().exists(self.tc.proof_file.name))
+
+        name = self.tc.proof_file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tc.delete()
+        self.assertFalse(ProofBlob.objects.filter(digest=digest).exists())
+        self.assertFalse(get_proof_storage().exists(name))
+
+    def test_upload_handler_hashes_while_receiving(self):
+        content = b'uploaded proof bytes'
+        request = RequestFactory().post('/', {'proof': SimpleUploadedFile('p.png', content, content_type='image/png')})
+        self.assertEqual(request.FILES['proof'].sha256, hashlib.sha256(content).hexdigest())
+
+
+from utils.media import parse_range, serve_file
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.content = bytes(range(256)) * 40
+        self.path = os.path.join(self.media_root, 'video.webm')
+        with open(self.path, 'wb') as f:
+            f.write(self.content)
+        self.factory = RequestFactory()
+
+    def _get(self, **headers):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            return serve_file(self.factory.get('/media/video.webm', **headers), self.path, content_type='video/webm')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=500-5000', 1000), (500, 999))
+        self.assertEqual(parse_range('bytes=1000-', 1000), 'unsatisfiable')
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range(None, 1000))
+
+    def test_range_request_returns_partial_content(self):
+        response = self._get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        full = self._get()
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        self.assertEqual(self._get(HTTP_RANGE='bytes=999999-').status_code, 416)
+
+    def test_conditional_requests(self):
+        etag = self._get()['ETag']
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Stale If-Range: whole file instead of a range of a changed representation
+        response = self._get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_blob_etag_is_content_digest(self):
+        digest = hashlib.sha256(self.content).hexdigest()
+        blob_path = os.path.join(self.media_root, 'blobs', digest[:2], f'{digest}.webm')
+        os.makedirs(os.path.dirname(blob_path))
+        shutil.copy(self.path, blob_path)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = serve_file(self.factory.get('/'), blob_path)
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_accel_redirect_offloads_body(self):
+        with override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = serve_file(self.factory.get('/', HTTP_RANGE='bytes=0-9'), self.path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/video.webm')
+        self.assertEqual(response.content, b'')
+
+
+from utils import search
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from campaigns.models import Campaign
+        from comments.models import Comment
+        from Project.models import Project
+        from testCases.models import TestCase as TestCaseModel
+
+        self.user = get_user_model().objects.create_user(
+            username='manager', email='manager@lloyd.com', password='x', role='MANAGER',
+        )
+        campaign = Campaign.objects.create(title='Recette Été', project=Project.objects.create(name='P'))
+        self.case = TestCaseModel.objects.create(campaign=campaign, test_case_ref='TC_LOGIN_01', data_json={'Module': 'Sinistres'})
+        self.numeric = TestCaseModel.objects.create(campaign=campaign, test_case_ref='4242')
+        self.comment = Comment.objects.create(author=self.user, test_case=self.case, message='Écran figé après validation')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _ids(self, url, term):
+        response = self.client.get(url, {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data.get('results', response.data)]
+
+    def test_parse_query(self):
+        self.assertEqual(search.parse_query(' #12 '), (12, []))
+        self.assertEqual(search.parse_query('12'), (12, []))
+        self.assertEqual(search.parse_query("Échec d'OTP_2"), (None, ['echec', 'd', 'otp', '2']))
+        self.assertEqual(search.normalize('  Grisé  ÉTÉ '), 'grise ete')
+
+    def test_test_cases_by_text_reference_and_exact_fields(self):
+        self.assertEqual(self._ids('/api/testcases/', 'login sinistres'), [self.case.id])
+        self.assertEqual(self._ids('/api/testcases/', 'ete'), [self.numeric.id, self.case.id])
+        self.assertEqual(self._ids('/api/testcases/', '4242'), [self.numeric.id])
+        self.assertEqual(self._ids('/api/testcases/', f'#{self.case.id}'), [self.case.id])
+
+    def test_comments_search_and_update(self):
+        self.assertEqual(self._ids('/api/comments/', 'fige'), [self.comment.id])
+        self.comment.message = 'Corrigé'
+        self.comment.save(update_fields=['message'])
+        self.assertEqual(self._ids('/api/comments/', 'fige'), [])
+        self.assertEqual(self._ids('/api/comments/', 'corrige manager'), [self.comment.id])
+
+    def test_fts_triggers_survive_table_rebuilds(self):
+        from django.db import connection
+        from testCases.models import TestCase as TestCaseModel
+
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 triggers are SQLite only')
+        table = TestCaseModel._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER "{table}_fts_au"')
+        search._ensure_after_migrate(sender=None, using='default')
+        self.case.test_case_ref = 'TC_PAIEMENT_02'
+        self.case.save()
+        self.assertEqual(self._ids('/api/testcases/', 'paiement'), [self.case.id])
+
+
+import io
+import zipfile
+
+from openpyxl import load_workbook
+
+from utils.xlsx_export import Column, column_letter, stream_xlsx
+
+
+class StreamingXlsxExportTest(TestCase):
+    columns = [Column('ID', 6, 10), Column('Titre', 10, 30), Column('Note', 8, 20)]
+
+    def _workbook(self, rows, **kwargs):
+        chunks = list(stream_xlsx(self.columns, rows, **kwargs))
+        data = b''.join(chunks)
+        self.assertIsNone(zipfile.ZipFile(io.BytesIO(data)).testzip())
+        return chunks, load_workbook(io.BytesIO(data))
+
+    def test_rows_styles_and_layout(self):
+        rows = ([i, f'Anomalie {i} « échec »', None if i % 2 else 1.5] for i in range(1, 1201))
+        chunks, wb = self._workbook(rows, sheet_title='Anomalies', chunk_rows=500)
+        ws = wb['Anomalies']
+        self.assertEqual([c.value for c in ws[1]], ['ID', 'Titre', 'Note'])
+        self.assertTrue(ws['A1'].font.b)
+        self.assertEqual(ws.max_row, 1201)
+        self.assertEqual(ws['A1200'].value, 1199)
+        self.assertEqual(ws['B2'].value, 'Anomalie 1 « échec »')
+        self.assertEqual(ws['C3'].value, 1.5)
+        self.assertTrue(ws['B2'].alignment.wrap_text)
+        self.assertEqual(ws.freeze_panes, 'A2')
+        self.assertEqual(ws.auto_filter.ref, 'A1:C1201')
+        # Rows are flushed as they are produced, not in one final block
+        self.assertGreater(len(chunks), 3)
+
+    def test_widths_come_from_a_bounded_sample(self):
+        rows = [[1, 'court', 'x']] * 3 + [[2, 'y' * 200, 'x']]
+        _, wb = self._workbook(rows, sample_size=3)
+        ws = wb.active
+        self.assertEqual(ws.column_dimensions['B'].width, 10)
+        _, wb = self._workbook(rows, sample_size=10)
+        self.assertEqual(wb.active.column_dimensions['B'].width, 30)
+
+    def test_illegal_characters_and_letters(self):
+        _, wb = self._workbook([[1, 'a\x00b\x1f<c>&', '']], sheet_title='Campagne: [v2]')
+        ws = wb.active
+        self.assertEqual(ws.title, 'Campagne v2')
+        self.assertEqual(ws['B2'].value, 'ab<c>&')
+        self.assertEqual([column_letter(i) for i in (0, 25, 26, 701, 702)], ['A', 'Z', 'AA', 'ZZ', 'AAA'])
+
+
+from unittest.mock import patch
+
+from core import reports
+from core.models import DataVersion, ReportJob
+from utils import invalidation
+
+
+class BackgroundReportTest(TestCase):
+    def setUp(self):
+        self.reports_root = tempfile.mkdtemp()
+        self.override = override_settings(REPORTS_ROOT=self.reports_root, REPORT_INLINE_WAIT_SECONDS=0)
+        self.override.enable()
+        patcher = patch('core.reports.start')  # jobs are run synchronously below
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from django.contrib.auth import get_user_model
+        from anomalies.models import Anomalie
+        from campaigns.models import Campaign
+        from Project.models import Project
+        from testCases.models import TestCase as TestCaseModel
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='rep_mgr', email='rep_mgr@lloyd.com', password='x', role='MANAGER')
+        self.tester = User.objects.create_user(username='rep_tester', email='rep_tester@lloyd.com', password='x', role='TESTER')
+        self.campaign = Campaign.objects.create(title='Recette rapports', project=Project.objects.create(name='Rapports'))
+        self.case = TestCaseModel.objects.create(campaign=self.campaign, test_case_ref='TC_REP_1')
+        self.anomaly = Anomalie.objects.create(
+            test_case=self.case, titre='Échec de connexion', description='x', cree_par=self.tester, impact='CRITIQUE',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.reports_root, ignore_errors=True)
+
+    def _request(self, kind='anomalies_pdf', params=None):
+        return self.client.post('/api/reports/', {'kind': kind, 'params': params or {}}, format='json')
+
+    def test_unchanged_report_is_served_from_storage(self):
+        response = self._request(params={'impact': 'CRITIQUE'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'QUEUED')
+        job = reports.run_report(ReportJob.objects.get(pk=response.data['id']))
+
+        self.assertTrue(job.artifact.path.startswith(os.path.realpath(self.reports_root)))
+        self.assertNotIn(job.fingerprint[:8], job.filename)
+        response = self._request(params={'impact': 'CRITIQUE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['id'], response.data['hits']), (job.id, 1))
+
+        download = self.client.get(response.data['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download['Content-Type'], 'application/pdf')
+        self.assertIn('rapport_anomalies.pdf', download['Content-Disposition'])
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+    def test_anomaly_change_bumps_version_and_replaces_artifact(self):
+        first = reports.run_report(ReportJob.objects.get(pk=self._request().data['id']))
+        old_path = first.artifact.path
+
+        with self.captureOnCommitCallbacks(execute=True), invalidation.batch():
+            self.anomaly.statut = 'RESOLUE'
+            self.anomaly.save()
+        self.assertEqual(DataVersion.objects.get(scope='anomalies').version, 1)
+        self.assertEqual(DataVersion.objects.get(scope=f'campaign:{self.campaign.id}').version, 1)
+
+        response = self._request()
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['id'], first.id)
+        self.assertEqual(self._request().data['id'], response.data['id'])  # in progress: shared
+        reports.run_report(ReportJob.objects.get(pk=response.data['id']))
+        self.assertFalse(os.path.exists(old_path))
+        first.refresh_from_db()
+        self.assertFalse(first.artifact)
+
+    def test_testers_get_their_own_reports_only(self):
+        manager_job = reports.run_report(ReportJob.objects.get(pk=self._request().data['id']))
+        self.client.force_authenticate(self.tester)
+
+        self.assertEqual(self.client.get(f'/api/reports/{manager_job.id}/download/').status_code, 404)
+        response = self._request()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['params'], {'tester_id': self.tester.id})
+        self.assertEqual(self._request('closure_pdf', {'campaign_id': self.campaign.id}).status_code, 403)
+
+    @patch('analytics.ml_service.MLTimelineGuard.get_campaign_status', return_value={'status': 'EN_AVANCE'})
+    @patch('analytics.ml_service.MLTimelineGuard.__init__', return_value=None)
+    @patch('analytics.readiness_service.ReleaseReadinessManager.calculate_readiness_score',
+           return_value={'score': 85, 'reasons': ['Couverture complète']})
+    def test_legacy_closure_endpoint_queues_then_serves(self, readiness, *_):
+        url = f'/api/analytics/closure-report/{self.campaign.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        readiness.assert_not_called()  # scoring happens in the worker, not in the request
+
+        reports.run_report(ReportJob.objects.get(pk=response.data['id']))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'fiche_cloture_{self.campaign.id}.pdf', response['Content-Disposition'])
+        self.assertEqual(readiness.call_count, 1)
+
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from anomalies.serializers import AnomalieSerializer
+
+
+class SparseFieldsetsTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from anomalies.models import Anomalie
+        from campaigns.models import Campaign, CampaignAssignment
+        from Project.models import Project
+        from testCases.models import ExecutionLog, TestCase as TestCaseModel
+
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='sparse_mgr', email='sparse_mgr@lloyd.com', password='x', role='MANAGER')
+        self.tester = User.objects.create_user(username='sparse_tst', email='sparse_tst@lloyd.com', password='x', role='TESTER')
+        self.campaign = Campaign.objects.create(title='Sparse', project=Project.objects.create(name='Sparse'))
+        CampaignAssignment.objects.create(campaign=self.campaign, tester=self.tester, test_quota=4)
+        self.test_case = TestCaseModel.objects.create(
+            campaign=self.campaign, test_case_ref='TC_SPARSE', tester=self.tester,
+            data_json={'Etape': 'x' * 2000}, automation_code='test("long", async () => {});' * 100,
+        )
+        ExecutionLog.build(self.test_case, 'Error: Timeout 30000ms exceeded', status='FAILED').save()
+        self.anomaly = Anomalie.objects.create(
+            test_case=self.test_case, titre='Paiement bloqué', description='trace ' * 500, cree_par=self.manager,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_list_rows_are_compact_and_detail_is_full(self):
+        with patch.object(AnomalieSerializer, 'get_playwright_script') as script, \
+                patch.object(AnomalieSerializer, 'get_execution_logs') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            row = self.client.get('/api/anomalies/').data['results'][0]
+        script.assert_not_called()
+        logs.assert_not_called()
+        self.assertEqual(row['titre'], 'Paiement bloqué')
+        self.assertFalse({'description', 'execution_logs', 'playwright_script', 'preuve_hash'} & row.keys())
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('"automation_code"', sql)
+        self.assertNotIn('"data_json"', sql)
+        self.assertNotIn('"testCases_executionlog"', sql)
+
+        detail = self.client.get(f'/api/anomalies/{self.anomaly.id}/').data
+        self.assertEqual(detail['description'], self.anomaly.description)
+        self.assertIn('Timeout 30000ms', detail['execution_logs'])
+        self.assertEqual(detail['playwright_script'], self.test_case.automation_code)
+
+    def test_fields_and_omit(self):
+        row = self.client.get('/api/anomalies/?fields=titre,execution_logs,inconnu').data['results'][0]
+        self.assertEqual(set(row), {'id', 'titre', 'execution_logs'})
+        self.assertIn('Timeout 30000ms', row['execution_logs'])
+
+        detail = self.client.get(f'/api/anomalies/{self.anomaly.id}/?omit=description,playwright_script').data
+        self.assertNotIn('description', detail)
+        self.assertIn('execution_logs', detail)
+
+        case = self.client.get('/api/testcases/?fields=test_case_ref,data_json').data['results'][0]
+        self.assertEqual(case, {'id': self.test_case.id, 'test_case_ref': 'TC_SPARSE', 'data_json': self.test_case.data_json})
+        case = self.client.get('/api/testcases/').data['results'][0]
+        self.assertFalse({'data_json', 'automation_code', 'execution_log_excerpt', 'assigned_tester_name'} & case.keys())
+        self.assertEqual(case['campaign_title'], 'Sparse')
+
+    def test_campaign_rows_skip_nested_and_unrequested_counters(self):
+        row = self.client.get('/api/campaigns/').data['results'][0]
+        self.assertFalse({'tasks', 'current_quotas', 'tester_progress'} & row.keys())
+        self.assertEqual(row['nb_test_cases'], 1)
+        self.assertEqual(self.client.get(f'/api/campaigns/{self.campaign.id}/').data['current_quotas'], {str(self.tester.id): 4})
+
+        self.client.force_authenticate(self.tester)
+        with CaptureQueriesContext(connection) as queries:
+            row = self.client.get('/api/campaigns/?fields=title').data['results'][0]
+        self.assertEqual(row, {'id': self.campaign.id, 'title': 'Sparse'})
+        self.assertFalse(any('testCases_testcase' in q['sql'] for q in queries.captured_queries))
+        row = self.client.get('/api/campaigns/?fields=nb_test_cases,progress_percentage').data['results'][0]
+        self.assertEqual((row['nb_test_cases'], row['progress_percentage']), (4, 0))
+
+    def test_writes_answer_with_the_full_representation(self):
+        response = self.client.patch(
+            f'/api/anomalies/{self.anomaly.id}/?fields=titre', {'statut': 'EN_INVESTIGATION'}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('description', response.data)
+
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from config.pagination import APPROX_COUNT_CAP, estimate_count
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from anomalies.models import Anomalie
+
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='cursor_mgr', email='cursor_mgr@lloyd.com', password='x', role='MANAGER')
+        Anomalie.objects.bulk_create([Anomalie(titre=f'Anomalie {i}', cree_par=self.manager) for i in range(25)])
+        # Several rows share a timestamp: the id breaks the tie
+        base = timezone.now()
+        for index, pk in enumerate(Anomalie.objects.order_by('id').values_list('id', flat=True)):
+            Anomalie.objects.filter(pk=pk).update(cree_le=base + timedelta(minutes=index // 3))
+        self.expected = list(Anomalie.objects.order_by('-cree_le', '-id').values_list('id', flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _walk(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).data
+            self.assertNotIn('count', data)
+            pages.append(data)
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return ids, pages
+
+    def test_cursor_walks_every_row_once_forward_and_back(self):
+        ids, pages = self._walk('/api/anomalies/?cursor=')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.client.get(pages[2]['previous']).data
+        self.assertEqual([row['id'] for row in back['results']], self.expected[10:20])
+        back = self.client.get(back['previous']).data
+        self.assertEqual([row['id'] for row in back['results']], self.expected[:10])
+        self.assertIsNone(back['previous'])
+
+        ascending, _ = self._walk('/api/anomalies/?cursor=&ordering=cree_le')
+        self.assertEqual(ascending, self.expected[::-1])
+
+    def test_page_numbers_still_work(self):
+        data = self.client.get('/api/anomalies/', {'page': 2, 'page_size': 10}).data
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(len(data['results']), 10)
+
+    def test_counts_on_request_and_invalid_cursor(self):
+        data = self.client.get('/api/anomalies/', {'cursor': '', 'count': 'exact'}).data
+        self.assertEqual((data['count'], data['count_estimated']), (25, False))
+        data = self.client.get('/api/anomalies/', {'cursor': '', 'count': 'approx'}).data
+        self.assertEqual((data['count'], data['count_estimated']), (25, False))
+        from anomalies.models import Anomalie
+        with patch('config.pagination.APPROX_COUNT_CAP', 20):
+            self.assertEqual(estimate_count(Anomalie.objects.all()), (20, True))
+        self.assertGreater(APPROX_COUNT_CAP, 25)
+
+        self.assertEqual(self.client.get('/api/anomalies/', {'cursor': 'pas-un-curseur'}).status_code, 404)
+
+    def test_chat_history_is_newest_first_by_default(self):
+        from chat.models import Conversation, Message
+
+        conversation = Conversation.objects.create(type='GROUP', name='Cursor')
+        conversation.participants.add(self.manager)
+        Message.objects.bulk_create([Message(conversation=conversation, author=self.manager, text=f'm{i}') for i in range(15)])
+        data = self.client.get('/api/chat/messages/', {'conversation': conversation.id}).data
+        self.assertEqual([row['text'] for row in data['results']], [f'm{i}' for i in range(14, 4, -1)])
+        older = self.client.get(data['next']).data
+        self.assertEqual([row['text'] for row in older['results']], [f'm{i}' for i in range(4, -1, -1)])
+        self.assertIsNone(older['next'])
+
+        self.assertEqual(self.client.get('/api/chat/messages/', {'conversation': conversation.id, 'page': 1}).data['count'], 15)
@@ -1,3 +1,40 @@
-from django.shortcuts import render
+from django.http import Http404
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-# Create your views here.
+from .models import ReportJob
+from .reports import REPORT_KINDS, can_access, report_params, request_report, serve_report
+from .serializers import ReportJobSerializer
+
+
+class ReportJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    POST /api/reports/ {kind, params}: 200 with the stored report when the data is unchanged,
+    202 with the job to poll otherwise.  GET <id>/ is the status, GET <id>/download/ the file.
+    """
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+    queryset = ReportJob.objects.all()
+
+    def get_object(self):
+        job = super().get_object()
+        if not can_access(job, self.request.user):
+            raise Http404
+        return job
+
+    def create(self, request):
+        kind = request.data.get('kind')
+        if kind not in REPORT_KINDS:
+            return Response({'error': "Type de rapport inconnu."}, status=400)
+        params = report_params(kind, request.user, request.data.get('params') or {})
+        job, _ = request_report(kind, params, request.user)
+        return Response(ReportJobSerializer(job).data, status=200 if job.status == 'DONE' else 202)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'DONE' or not job.artifact:
+            return Response({'error': "Rapport pas encore disponible.", 'status': job.status}, status=409)
+        return serve_report(request, job)
@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import Email
+from .models import Email, OutboxMessage
 
 @admin.register(Email)
 class EmailAdmin(admin.ModelAdmin):
     list_display = ('sender', 'recipient', 'subject', 'created_at', 'is_read')
     list_filter = ('is_read', 'created_at')
     search_fields = ('subject', 'body', 'sender__username', 'recipient__username')
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to', 'subject', 'last_error')
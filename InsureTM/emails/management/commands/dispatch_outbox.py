@@ -0,0 +1,39 @@
+"""
+python manage.py dispatch_outbox [--once]
+- Envoie les e-mails en attente de l'outbox (emails.outbox) sur une connexion SMTP réutilisée
+- Sans --once : tourne en continu (processus dédié, avec EMAIL_OUTBOX_WORKERS=0 sur les serveurs web)
+- --once : vide l'outbox puis s'arrête (cron), code de sortie 1 si des messages restent en échec
+"""
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from emails.outbox import IDLE_POLL_SECONDS, Dispatcher, stats
+
+
+class Command(BaseCommand):
+    help = "Envoie les e-mails de l'outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vide l'outbox puis s'arrête")
+
+    def handle(self, *args, **options):
+        dispatcher = Dispatcher(f'{socket.gethostname()}:{os.getpid()}:cli')
+        try:
+            if options['once']:
+                sent = dispatcher.drain()
+                current = stats(window_hours=1)
+                self.stdout.write(self.style.SUCCESS(
+                    f"✔ {sent} e-mail(s) envoyé(s), {current['pending']} en attente, retard {current['lag_seconds']}s."
+                ))
+                if current['failed']:
+                    raise CommandError(f"{current['failed']} e-mail(s) en échec sur la dernière heure.")
+                return
+            while True:
+                dispatcher.drain()
+                time.sleep(IDLE_POLL_SECONDS)
+                dispatcher.close_if_idle()
+        finally:
+            dispatcher.close()
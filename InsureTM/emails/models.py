@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Email(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_emails')
@@ -12,6 +13,44 @@ class Email(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the list (config.pagination)
+            models.Index(fields=['created_at', 'id'], name='email_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"From {self.sender} to {self.recipient}: {self.subject}"
+
+
+class OutboxMessage(models.Model):
+    """E-mail sortant, écrit dans la transaction de la requête et envoyé par emails.outbox."""
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('SENDING', 'En cours d\'envoi'),
+        ('SENT', 'Envoyé'),
+        ('FAILED', 'Échec'),
+    ]
+
+    to = models.CharField(max_length=254)
+    subject = models.CharField(max_length=998)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+    # Nom du fichier joint dans le stockage par défaut (pièce jointe d'un Email)
+    attachment = models.CharField(max_length=255, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Lot d'un dispatcher : un message SENDING dont le bail a expiré est remis en attente
+    claimed_by = models.CharField(max_length=100, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to}: {self.subject} ({self.status})"
@@ -0,0 +1,284 @@
+"""
+Transactional e-mail outbox.
+
+Notifications used to open an SMTP/TLS connection per message, synchronously in the
+request, once per recipient.  utils.email_service (and the internal messages) now
+call `enqueue`, and dispatcher threads send the messages:
+
+- enqueue() writes an OutboxMessage in the caller's transaction: a rolled back
+  request sends nothing, a committed one cannot lose its e-mails;
+- after commit, settings.EMAIL_OUTBOX_WORKERS threads per process claim batches of
+  due messages with a conditional UPDATE (PENDING -> SENDING under a lease): a
+  message is never sent twice, and one left SENDING by a dead process is retried;
+- each thread keeps its SMTP connection open across batches and sends them with
+  `send_messages` on it (one message per call, so a refused recipient only fails
+  its own row); the connection is closed after EMAIL_OUTBOX_IDLE_SECONDS without
+  mail and reopened when the server drops it;
+- failures are retried with exponential backoff (EMAIL_OUTBOX_RETRY_SECONDS,
+  doubled per attempt, at most MAX_BACKOFF_SECONDS) up to EMAIL_OUTBOX_MAX_ATTEMPTS;
+  refused recipients and other 5xx answers fail at once;
+- stats() reports queue depth, lag and delivery times (/api/emails/outbox_stats/);
+- `python manage.py dispatch_outbox` drains the outbox from a dedicated process.
+
+emails.smtp_stub.LocalSMTPServer stands in for the SMTP server in tests.
+"""
+import logging
+import mimetypes
+import os
+import smtplib
+import socket
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Idle dispatchers re-check the table this often (retries coming due, other processes)
+IDLE_POLL_SECONDS = 10
+# A claimed batch not finished within this delay is handed to another dispatcher
+LEASE_SECONDS = 300
+MAX_BACKOFF_SECONDS = 3600
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_workers = []
+
+
+def enqueue(subject, to, body, html_body='', attachment=''):
+    """Queue one e-mail in the current transaction; dispatchers are woken once it commits."""
+    from .models import OutboxMessage
+
+    message = OutboxMessage.objects.create(
+        to=to, subject=subject[:998], body=body, html_body=html_body, attachment=attachment or '',
+    )
+    transaction.on_commit(wake)
+    return message
+
+
+def claim(worker_name, limit):
+    """Move up to `limit` due messages to SENDING for `worker_name`; returns them, oldest first."""
+    from .models import OutboxMessage
+
+    now = timezone.now()
+    OutboxMessage.objects.filter(status='SENDING', locked_until__lt=now).update(status='PENDING', claimed_by='')
+    due = list(
+        OutboxMessage.objects.filter(status='PENDING', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    token = f'{worker_name}:{uuid.uuid4().hex[:12]}'
+    OutboxMessage.objects.filter(pk__in=due, status='PENDING').update(
+        status='SENDING', claimed_by=token, locked_until=now + timedelta(seconds=LEASE_SECONDS),
+    )
+    return list(OutboxMessage.objects.filter(claimed_by=token, status='SENDING').order_by('next_attempt_at', 'id'))
+
+
+def build_message(row, connection=None):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[row.to],
+        connection=connection,
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    if row.attachment:
+        with default_storage.open(row.attachment, 'rb') as f:
+            content_type, _ = mimetypes.guess_type(row.attachment)
+            message.attach(os.path.basename(row.attachment), f.read(), content_type or 'application/octet-stream')
+    return message
+
+
+def is_permanent(exc):
+    """Refused recipients and 5xx answers will not succeed later (authentication errors may)."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    return (
+        isinstance(exc, smtplib.SMTPResponseException)
+        and not isinstance(exc, smtplib.SMTPAuthenticationError)
+        and exc.smtp_code >= 500
+    )
+
+
+def backoff_seconds(attempts):
+    return min(settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** max(0, attempts - 1), MAX_BACKOFF_SECONDS)
+
+
+def _record_failure(row, exc):
+    from .models import OutboxMessage
+
+    attempts = row.attempts + 1
+    final = is_permanent(exc) or attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    OutboxMessage.objects.filter(pk=row.pk).update(
+        status='FAILED' if final else 'PENDING',
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=backoff_seconds(attempts)),
+        claimed_by='',
+        locked_until=None,
+        last_error=f'{type(exc).__name__}: {exc}'[:2000],
+    )
+    log = logger.error if final else logger.warning
+    log("Outbox message %s to %s failed (attempt %d%s): %s", row.pk, row.to, attempts, ', abandoned' if final else '', exc)
+
+
+class Dispatcher:
+    """Sends claimed batches over one SMTP connection, kept open between batches."""
+
+    def __init__(self, name):
+        self.name = name
+        self.connection = None
+        self.last_used = 0.0
+
+    def _open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        self.last_used = time.monotonic()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close_if_idle(self):
+        if self.connection is not None and time.monotonic() - self.last_used > settings.EMAIL_OUTBOX_IDLE_SECONDS:
+            self.close()
+
+    def send_batch(self, limit=None):
+        """Claim and send one batch; returns the number of messages sent."""
+        from .models import OutboxMessage
+
+        rows = claim(self.name, limit or settings.EMAIL_OUTBOX_BATCH_SIZE)
+        if not rows:
+            self.close_if_idle()
+            return 0
+
+        sent = []
+        for index, row in enumerate(rows):
+            try:
+                connection = self._open()
+                if not connection.send_messages([build_message(row, connection)]):
+                    raise smtplib.SMTPException("Message non envoyé.")
+            except Exception as exc:
+                _record_failure(row, exc)
+                if is_permanent(exc):
+                    continue
+                # Server unreachable or session dropped: hand the rest of the batch back untouched
+                self.close()
+                OutboxMessage.objects.filter(pk__in=[r.pk for r in rows[index + 1:]], status='SENDING').update(
+                    status='PENDING', claimed_by='', locked_until=None,
+                )
+                break
+            sent.append(row.pk)
+
+        if sent:
+            OutboxMessage.objects.filter(pk__in=sent).update(
+                status='SENT', sent_at=timezone.now(), attempts=F('attempts') + 1,
+                claimed_by='', locked_until=None, last_error='',
+            )
+        return len(sent)
+
+    def drain(self):
+        """Send batches until nothing is due; returns the number of messages sent."""
+        total = 0
+        while True:
+            sent = self.send_batch()
+            total += sent
+            if not sent:
+                return total
+
+
+def _worker_loop(name):
+    dispatcher = Dispatcher(name)
+    while True:
+        try:
+            close_old_connections()
+            dispatcher.drain()
+        except Exception:
+            logger.exception("Outbox dispatcher %s error", name)
+            dispatcher.close()
+        finally:
+            close_old_connections()
+        _wakeup.wait(IDLE_POLL_SECONDS)
+        _wakeup.clear()
+        dispatcher.close_if_idle()
+
+
+def ensure_started():
+    """Start this process's dispatcher threads (idempotent)."""
+    count = settings.EMAIL_OUTBOX_WORKERS
+    if count <= 0:
+        return
+    with _lock:
+        _workers[:] = [t for t in _workers if t.is_alive()]
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        for i in range(len(_workers), count):
+            thread = threading.Thread(
+                target=_worker_loop, args=(f'{prefix}:{i}',), name=f'outbox-dispatcher-{i}', daemon=True,
+            )
+            thread.start()
+            _workers.append(thread)
+
+
+def wake():
+    ensure_started()
+    _wakeup.set()
+
+
+def _summary(values):
+    if not values:
+        return {'avg': None, 'p50': None, 'p95': None, 'max': None}
+    values = sorted(values)
+    return {
+        'avg': round(statistics.mean(values), 2),
+        'p50': round(statistics.median(values), 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+        'max': round(values[-1], 2),
+    }
+
+
+def stats(window_hours=24):
+    """Outbox depth, lag of the oldest due message and delivery times over the last `window_hours`."""
+    from .models import OutboxMessage
+
+    now = timezone.now()
+    counts = dict(
+        OutboxMessage.objects.filter(status__in=('PENDING', 'SENDING'))
+        .values_list('status').annotate(n=Count('id')).values_list('status', 'n')
+    )
+    oldest_due = (
+        OutboxMessage.objects.filter(status__in=('PENDING', 'SENDING'), next_attempt_at__lte=now)
+        .order_by('created_at').values_list('created_at', flat=True).first()
+    )
+    since = now - timedelta(hours=window_hours)
+    delivered = list(
+        OutboxMessage.objects.filter(status='SENT', sent_at__gte=since)
+        .order_by('-sent_at').values_list('created_at', 'sent_at', 'attempts')[:1000]
+    )
+    return {
+        'workers': settings.EMAIL_OUTBOX_WORKERS,
+        'pending': counts.get('PENDING', 0),
+        'sending': counts.get('SENDING', 0),
+        'retrying': OutboxMessage.objects.filter(status='PENDING', attempts__gt=0).count(),
+        'lag_seconds': round((now - oldest_due).total_seconds(), 2) if oldest_due else 0,
+        'window_hours': window_hours,
+        'sent': OutboxMessage.objects.filter(status='SENT', sent_at__gte=since).count(),
+        'failed': OutboxMessage.objects.filter(status='FAILED', created_at__gte=since).count(),
+        'delivery_seconds': _summary([(sent - created).total_seconds() for created, sent, _ in delivered]),
+        'retried_deliveries': sum(1 for _, _, attempts in delivered if attempts > 1),
+    }
@@ -0,0 +1,111 @@
+"""
+Local SMTP server standing in for smtp.gmail.com in tests (no TLS, no authentication).
+
+    with LocalSMTPServer(reject={'refuse@lloyd.com'}) as server, server.settings():
+        ...  # Django's SMTP backend now talks to the stub
+    server.messages     # [(mail_from, [recipients], raw message bytes)]
+    server.connections  # SMTP sessions opened so far
+
+Recipients in `reject` are answered with 550; `drop_after` closes a session after
+that many accepted messages, like a server dropping an idle connection.
+"""
+import re
+import socketserver
+import threading
+
+from django.test.utils import override_settings
+
+_ADDRESS_RE = re.compile(r'<([^>]*)>')
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def handle(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.connections += 1
+        accepted = 0
+        mail_from, recipients = None, []
+        self.reply('220 localhost ESMTP stub')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+            command = command.upper()
+            address = _ADDRESS_RE.search(argument)
+            address = address.group(1) if address else ''
+            if command in ('EHLO', 'HELO'):
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == 'MAIL':
+                mail_from, recipients = address, []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                if address in stub.reject:
+                    self.reply('550 Mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for raw in iter(self.rfile.readline, b''):
+                    if raw in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(raw[1:] if raw.startswith(b'..') else raw)
+                with stub.lock:
+                    stub.messages.append((mail_from, recipients, b''.join(data)))
+                accepted += 1
+                self.reply('250 OK')
+                if stub.drop_after and accepted >= stub.drop_after:
+                    return
+            elif command == 'RSET':
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalSMTPServer:
+    def __init__(self, reject=(), drop_after=0):
+        self.reject = set(reject)
+        self.drop_after = drop_after
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def settings(self):
+        """override_settings pointing Django's SMTP backend at this server."""
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+
+    def __enter__(self):
+        self._server = _Server(('127.0.0.1', 0), _Session)
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, name='smtp-stub', daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
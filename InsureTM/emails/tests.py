@@ -0,0 +1,110 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from emails import outbox
+from emails.models import OutboxMessage
+from emails.smtp_stub import LocalSMTPServer
+from utils.email_service import send_otp_email
+
+
+@override_settings(DEFAULT_FROM_EMAIL='insuretm@lloyd.com')
+class OutboxTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='outbox_admin', email='outbox_admin@lloyd.com', password='x', role='ADMIN')
+
+    def _queue(self, count, to='dest{}@lloyd.com'):
+        return [outbox.enqueue(f'Sujet {i}', to.format(i), 'Texte', html_body=f'<p>{i}</p>') for i in range(count)]
+
+    @patch('emails.outbox.wake')
+    def test_messages_are_written_with_the_transaction(self, wake):
+        try:
+            with transaction.atomic():
+                send_otp_email(self.admin, '123456')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxMessage.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            send_otp_email(self.admin, '123456')
+            wake.assert_not_called()
+        wake.assert_called_once()
+        self.assertEqual(OutboxMessage.objects.get().to, 'outbox_admin@lloyd.com')
+        self.assertEqual(mail.outbox, [])
+
+    @patch('emails.outbox.wake')
+    def test_batch_is_sent_over_one_reused_connection(self, _wake):
+        self._queue(5)
+        with LocalSMTPServer() as server, server.settings():
+            dispatcher = outbox.Dispatcher('test')
+            self.assertEqual(dispatcher.send_batch(limit=3), 3)
+            self.assertEqual(dispatcher.drain(), 2)
+            dispatcher.close()
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 5)
+        self.assertEqual(server.messages[0][1], ['dest0@lloyd.com'])
+        self.assertIn(b'Sujet 0', server.messages[0][2])
+        self.assertEqual(OutboxMessage.objects.filter(status='SENT', attempts=1).count(), 5)
+
+    @patch('emails.outbox.wake')
+    def test_refused_recipient_fails_alone_and_dropped_session_is_resumed(self, _wake):
+        self._queue(4)
+        outbox.enqueue('Refusé', 'refuse@lloyd.com', 'Texte')
+        with LocalSMTPServer(reject={'refuse@lloyd.com'}, drop_after=2) as server, server.settings():
+            dispatcher = outbox.Dispatcher('test')
+            dispatcher.drain()
+            dispatcher.close()
+            # The session dropped after two messages: the third failed, the rest of the batch went back
+            retried = OutboxMessage.objects.get(status='PENDING', attempts=1)
+            OutboxMessage.objects.filter(pk=retried.pk).update(next_attempt_at=timezone.now())
+            dispatcher.drain()
+            dispatcher.close()
+
+        refused = OutboxMessage.objects.get(to='refuse@lloyd.com')
+        self.assertEqual((refused.status, refused.attempts), ('FAILED', 1))
+        self.assertIn('SMTPRecipientsRefused', refused.last_error)
+        self.assertEqual(OutboxMessage.objects.filter(status='SENT').count(), 4)
+        self.assertGreaterEqual(server.connections, 2)
+
+    @patch('emails.outbox.wake')
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_SECONDS=30)
+    def test_unreachable_server_is_retried_with_backoff(self, _wake):
+        message, = self._queue(1)
+        with LocalSMTPServer() as server, server.settings():
+            pass  # closed: connections are refused
+        with server.settings():
+            outbox.Dispatcher('test').send_batch()
+            message.refresh_from_db()
+            self.assertEqual((message.status, message.attempts), ('PENDING', 1))
+            self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=25))
+            self.assertEqual(outbox.Dispatcher('test').send_batch(), 0)  # not due yet
+
+            OutboxMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+            outbox.Dispatcher('test').send_batch()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('FAILED', 2))
+        self.assertEqual(outbox.backoff_seconds(3), 120)
+
+    @patch('emails.outbox.ensure_started')
+    @patch('emails.outbox.wake')
+    def test_stats_report_queue_lag(self, _wake, _ensure_started):
+        self._queue(2)
+        OutboxMessage.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        data = client.get('/api/emails/outbox_stats/').data
+        self.assertEqual(data['pending'], 2)
+        self.assertGreaterEqual(data['lag_seconds'], 299)
+
+        outbox.Dispatcher('test').drain()  # locmem backend in tests
+        self.assertEqual(len(mail.outbox), 2)
+        data = client.get('/api/emails/outbox_stats/').data
+        self.assertEqual((data['pending'], data['lag_seconds'], data['sent']), (0, 0, 2))
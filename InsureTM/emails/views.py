@@ -1,15 +1,13 @@
 import logging
-import mimetypes
 
-from django.conf import settings
-from django.core.mail import EmailMessage
 from django.db.models import Q
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 
-from notifications.models import Notification
+from notifications.badges import adjust
+from notifications.service import notify
 from .models import Email
 from .serializers import EmailSerializer
 
@@ -20,6 +18,7 @@ class EmailViewSet(viewsets.ModelViewSet):
     serializer_class = EmailSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    cursor_ordering = '-created_at'  # ?cursor= (config.pagination)
 
     def get_queryset(self):
         user = self.request.user
@@ -54,15 +53,17 @@ class EmailViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         recipient = serializer.validated_data.get('recipient')
         instance = serializer.save(sender=self.request.user)
+        adjust('emails_unread', {recipient.id: 1})
 
         self._send_smtp_email(instance, recipient)
 
-        Notification.objects.create(
-            recipient=recipient,
+        notify(
+            [recipient],
             title="Nouveau Message",
             message=f"Vous avez reçu un message de {self.request.user.username} : {instance.subject}",
             type='email_received',
             related_object_id=instance.id,
+            digest_key=f'email_received:{self.request.user.id}',
         )
 
     def destroy(self, request, *args, **kwargs):
@@ -73,13 +74,15 @@ class EmailViewSet(viewsets.ModelViewSet):
                 {"detail": "Vous n'avez pas la permission de supprimer ce message."},
                 status=status.HTTP_403_FORBIDDEN
             )
+        # The unread badge is lowered by the post_delete handler (notifications.signals)
         email.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def _send_smtp_email(self, instance, recipient):
-        """Send the email via SMTP with HTML formatting."""
+        """Queue the HTML email in the outbox (emails.outbox); it is sent over SMTP after commit."""
         try:
-            from utils.email_service import _base_html, _info_row
+            from utils.email_service import _base_html
+            from .outbox import enqueue
             content = f"""
             <p style="margin:0 0 20px 0;font-size:15px;line-height:1.6;color:#475569;">
                 Bonjour <strong>{recipient.first_name or recipient.username}</strong>,<br><br>
@@ -94,30 +97,32 @@ class EmailViewSet(viewsets.ModelViewSet):
                 badge_color="#6366f1",
                 content_html=content
             )
-            from django.core.mail import EmailMultiAlternatives
-            msg = EmailMultiAlternatives(
-                subject=instance.subject,
-                body=instance.body,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[recipient.email],
+            enqueue(
+                instance.subject, recipient.email, instance.body, html_body=html_body,
+                attachment=instance.attachment.name if instance.attachment else '',
             )
-            msg.attach_alternative(html_body, "text/html")
-            if instance.attachment:
-                import mimetypes
-                instance.attachment.open('rb')
-                content_type, _ = mimetypes.guess_type(instance.attachment.name)
-                msg.attach(instance.attachment.name, instance.attachment.read(), content_type or 'application/octet-stream')
-                instance.attachment.close()
-            msg.send(fail_silently=False)
         except Exception:
-            logger.exception("Failed to send email via SMTP for instance %s", instance.id)
+            logger.exception("Failed to queue email for instance %s", instance.id)
+
+    @action(detail=False, methods=['get'])
+    def outbox_stats(self, request):
+        """Outbox depth, lag and delivery times (emails.outbox), for administrators."""
+        from . import outbox
+        if request.user.role != 'ADMIN':
+            return Response({"detail": "Réservé aux administrateurs."}, status=status.HTTP_403_FORBIDDEN)
+        outbox.ensure_started()
+        try:
+            window_hours = max(1, min(int(request.query_params.get('hours', 24)), 24 * 30))
+        except ValueError:
+            window_hours = 24
+        return Response(outbox.stats(window_hours))
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         email = self.get_object()
         if request.user != email.recipient:
             return Response({'status': 'unauthorized'}, status=status.HTTP_403_FORBIDDEN)
-        email.is_read = True
-        email.save()
+        if Email.objects.filter(pk=email.pk, is_read=False).update(is_read=True):
+            adjust('emails_unread', {request.user.id: -1})
         return Response({'status': 'email marked as read'})
 
@@ -0,0 +1,232 @@
+"""
+Unread badge counters.
+
+The bell, the chat list and the inbox used to count unread rows on every load
+(one COUNT per conversation for the chat).  The counts are now stored and
+maintained where they change:
+
+- BadgeCounter (one row per user): unread notifications and unread e-mails;
+- ConversationReadCursor.unread_count: unread messages of a conversation;
+- writes (new notification / e-mail / message, read, deletion) adjust them with
+  F() expressions in the same transaction, never below zero; unread notifications and
+  e-mails deleted in any way, cascades included, are counted off on post_delete;
+- `snapshot` reads every badge of many users in two queries: it backs
+  /api/notifications/badges/ and the `badges` event pushed on ws/notifications/
+  after commit (utils.invalidation.mark_badges);
+- `python manage.py rebuild_badges [--check]` recomputes them from the tables.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+COUNTER_FIELDS = ('notifications_unread', 'emails_unread')
+
+
+def _update_counters(field, ids_by_delta):
+    from .models import BadgeCounter
+
+    now = timezone.now()
+    return sum(
+        BadgeCounter.objects.filter(user_id__in=ids).update(**{field: Greatest(F(field) + delta, 0)}, updated_at=now)
+        for delta, ids in ids_by_delta.items()
+    )
+
+
+def adjust(field, deltas):
+    """Add `deltas` ({user id: +/-n}) to one counter of each user: one UPDATE per distinct delta."""
+    from utils.invalidation import mark_badges
+    from .models import BadgeCounter
+
+    deltas = {user_id: delta for user_id, delta in deltas.items() if user_id and delta}
+    if not deltas:
+        return
+    ids_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        ids_by_delta[delta].append(user_id)
+
+    if _update_counters(field, ids_by_delta) < len(deltas):
+        # First badge of some of these users: create their row, then apply their delta
+        existing = set(BadgeCounter.objects.filter(user_id__in=deltas).values_list('user_id', flat=True))
+        missing = [user_id for user_id in deltas if user_id not in existing]
+        BadgeCounter.objects.bulk_create([BadgeCounter(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+        missing_by_delta = defaultdict(list)
+        for user_id in missing:
+            missing_by_delta[deltas[user_id]].append(user_id)
+        _update_counters(field, missing_by_delta)
+    mark_badges(deltas)
+
+
+def unread_deleted(field, user_ids):
+    """
+    Unread rows of these recipients were deleted, one by one or by a cascade (post_delete,
+    notifications.signals): lower their counters.  No row is created, since the
+    recipient may be the user being deleted.
+    """
+    from utils.invalidation import mark_badges
+
+    ids_by_delta = defaultdict(list)
+    for user_id, count in Counter(user_id for user_id in user_ids if user_id).items():
+        ids_by_delta[-count].append(user_id)
+    if ids_by_delta and _update_counters(field, ids_by_delta):
+        mark_badges([user_id for ids in ids_by_delta.values() for user_id in ids])
+
+
+def message_posted(message):
+    """A chat message adds one unread message for every other participant of its conversation."""
+    from utils.invalidation import mark_badges
+    from chat.models import Conversation, ConversationReadCursor
+
+    readers = list(
+        Conversation.participants.through.objects.filter(conversation_id=message.conversation_id)
+        .exclude(user_id=message.author_id).values_list('user_id', flat=True)
+    )
+    if not readers:
+        return
+    cursors = ConversationReadCursor.objects.filter(conversation_id=message.conversation_id, user_id__in=readers)
+    if cursors.update(unread_count=F('unread_count') + 1) < len(readers):
+        # Participants who never opened the conversation get a cursor with this first message unread
+        existing = set(cursors.values_list('user_id', flat=True))
+        ConversationReadCursor.objects.bulk_create([
+            ConversationReadCursor(conversation_id=message.conversation_id, user_id=user_id, unread_count=1)
+            for user_id in readers if user_id not in existing
+        ], ignore_conflicts=True)
+    mark_badges(readers)
+
+
+def message_deleted(message):
+    """Call before deleting a chat message: it no longer counts for those who had not read it."""
+    from utils.invalidation import mark_badges
+    from chat.models import ConversationReadCursor
+
+    cursors = (
+        ConversationReadCursor.objects.filter(conversation_id=message.conversation_id, unread_count__gt=0)
+        .exclude(user_id=message.author_id)
+        .filter(Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=message.id))
+    )
+    readers = list(cursors.values_list('user_id', flat=True))
+    if readers:
+        cursors.update(unread_count=Greatest(F('unread_count') - 1, 0))
+        mark_badges(readers)
+
+
+def conversation_read(conversation, user, last_message):
+    """Move the read cursor of `user` to `last_message`; the messages after it stay unread."""
+    from utils.invalidation import mark_badges
+    from chat.models import ConversationReadCursor
+
+    remaining = conversation.messages.filter(id__gt=last_message.id).exclude(author=user).count()
+    ConversationReadCursor.objects.update_or_create(
+        conversation=conversation,
+        user=user,
+        defaults={'last_read_message': last_message, 'unread_count': remaining},
+    )
+    mark_badges([user.id])
+
+
+def snapshot(user_ids):
+    """{user id: {'notifications', 'emails', 'chat', 'conversations': {conversation id: n}}}"""
+    from chat.models import ConversationReadCursor
+    from .models import BadgeCounter
+
+    badges = {
+        user_id: {'notifications': 0, 'emails': 0, 'chat': 0, 'conversations': {}}
+        for user_id in user_ids
+    }
+    for user_id, notifications, emails in BadgeCounter.objects.filter(user_id__in=badges).values_list(
+        'user_id', *COUNTER_FIELDS
+    ):
+        badges[user_id].update(notifications=notifications, emails=emails)
+    for user_id, conversation_id, unread in ConversationReadCursor.objects.filter(
+        user_id__in=badges, unread_count__gt=0
+    ).values_list('user_id', 'conversation_id', 'unread_count'):
+        badges[user_id]['conversations'][conversation_id] = unread
+        badges[user_id]['chat'] += unread
+    return badges
+
+
+def _models():
+    from chat.models import Conversation, ConversationReadCursor, Message
+    from emails.models import Email
+    from .models import BadgeCounter, Notification
+
+    return BadgeCounter, Notification, Email, Conversation, ConversationReadCursor, Message
+
+
+def recompute(check=False):
+    """
+    Recompute every badge from the source tables; returns the number of wrong
+    (or missing) user counters and conversation cursors.  With `check`, nothing is written.
+    """
+    from utils.invalidation import mark_badges
+
+    wrong, changed_users = _recompute(_models(), check=check)
+    mark_badges(changed_users)
+    return wrong
+
+
+def _recompute(models, check=False):
+    BadgeCounter, Notification, Email, Conversation, ConversationReadCursor, Message = models
+    changed_users = set()
+
+    expected = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for field, rows in (
+        ('notifications_unread', Notification.objects.filter(is_read=False).values('recipient_id')),
+        ('emails_unread', Email.objects.filter(is_read=False).values('recipient_id')),
+    ):
+        for user_id, count in rows.annotate(n=Count('id')).values_list('recipient_id', 'n'):
+            expected[user_id][field] = count
+    current = {row['user_id']: row for row in BadgeCounter.objects.values('user_id', *COUNTER_FIELDS)}
+    wrong_counters = [
+        user_id for user_id in set(expected) | set(current)
+        if any(expected[user_id][f] != current.get(user_id, {}).get(f, 0) for f in COUNTER_FIELDS)
+    ]
+    if not check:
+        BadgeCounter.objects.bulk_create(
+            [BadgeCounter(user_id=user_id) for user_id in wrong_counters if user_id not in current],
+            ignore_conflicts=True,
+        )
+        for user_id in wrong_counters:
+            BadgeCounter.objects.filter(user_id=user_id).update(**expected[user_id], updated_at=timezone.now())
+        changed_users.update(wrong_counters)
+
+    # Participants without a cursor have never read anything: every message of the others is unread
+    participants = set(Conversation.participants.through.objects.values_list('conversation_id', 'user_id'))
+    missing = participants - set(ConversationReadCursor.objects.values_list('conversation_id', 'user_id'))
+    per_author = defaultdict(int)
+    per_conversation = defaultdict(int)
+    for conversation_id, author_id, count in (
+        Message.objects.values('conversation_id', 'author_id').annotate(n=Count('id'))
+        .values_list('conversation_id', 'author_id', 'n')
+    ):
+        per_author[conversation_id, author_id] = count
+        per_conversation[conversation_id] += count
+    missing = {
+        (conversation_id, user_id): per_conversation[conversation_id] - per_author[conversation_id, user_id]
+        for conversation_id, user_id in missing
+    }
+    missing = {key: unread for key, unread in missing.items() if unread}
+    if not check and missing:
+        ConversationReadCursor.objects.bulk_create([
+            ConversationReadCursor(conversation_id=conversation_id, user_id=user_id, unread_count=unread)
+            for (conversation_id, user_id), unread in missing.items()
+        ], ignore_conflicts=True)
+        changed_users.update(user_id for _, user_id in missing)
+
+    unread = (
+        Message.objects.filter(conversation=OuterRef('conversation'))
+        .exclude(author=OuterRef('user'))
+        .filter(id__gt=Coalesce(OuterRef('last_read_message_id'), 0))
+        .order_by().values('conversation').annotate(n=Count('id')).values('n')
+    )
+    wrong_cursors = list(
+        ConversationReadCursor.objects.annotate(expected=Coalesce(Subquery(unread), 0))
+        .exclude(unread_count=F('expected')).values_list('id', 'user_id', 'expected')
+    )
+    if not check:
+        for pk, user_id, count in wrong_cursors:
+            ConversationReadCursor.objects.filter(pk=pk).update(unread_count=count)
+        changed_users.update(user_id for _, user_id, _ in wrong_cursors)
+
+    return len(wrong_counters) + len(missing) + len(wrong_cursors), changed_users
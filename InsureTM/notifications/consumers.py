@@ -0,0 +1,32 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .service import user_group
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """Pushes the connected user's notifications (notifications.service.notify)."""
+
+    async def connect(self):
+        self.user = self.scope['user']
+        self.group_name = None
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = user_group(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def live_event(self, event):
+        await self.send(text_data=json.dumps(event['payload']))
+
+    # Several notifications for this user coalesced by the invalidation bus in one flush
+    async def live_event_batch(self, event):
+        for payload in event['payloads']:
+            await self.send(text_data=json.dumps(payload))
@@ -0,0 +1,34 @@
+"""
+python manage.py rebuild_badges [--check]
+- Recalcule les compteurs de badges (notifications.badges) : notifications et e-mails non lus, messages non lus par conversation
+- --check : compare les compteurs aux tables sans rien écrire, code de sortie 1 en cas d'écart
+- À lancer après un import massif qui contourne les vues (bulk_create, SQL brut)
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.badges import recompute
+
+
+class Command(BaseCommand):
+    help = "Recalcule (ou vérifie avec --check) les compteurs de badges non lus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Vérifie les compteurs sans les modifier")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['check']:
+            wrong = recompute(check=True)
+            if wrong:
+                raise CommandError(f"{wrong} compteur(s) de badges désynchronisé(s).")
+            self.stdout.write(self.style.SUCCESS(
+                f"✔ Compteurs de badges conformes aux données ({time.perf_counter() - started:.1f}s)."
+            ))
+            return
+
+        wrong = recompute()
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {wrong} compteur(s) de badges corrigé(s) en {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Frozen copy of the notifications.badges recompute as of this migration
+def backfill(apps, schema_editor):
+    BadgeCounter = apps.get_model('notifications', 'BadgeCounter')
+    Notification = apps.get_model('notifications', 'Notification')
+    Email = apps.get_model('emails', 'Email')
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationReadCursor = apps.get_model('chat', 'ConversationReadCursor')
+    Message = apps.get_model('chat', 'Message')
+
+    counters = {}
+    for field, model in (('notifications_unread', Notification), ('emails_unread', Email)):
+        for user_id, count in (
+            model.objects.filter(is_read=False).values('recipient_id').annotate(n=Count('id'))
+            .values_list('recipient_id', 'n')
+        ):
+            counters.setdefault(user_id, {})[field] = count
+    BadgeCounter.objects.bulk_create(
+        [BadgeCounter(user_id=user_id, **counts) for user_id, counts in counters.items() if user_id],
+        batch_size=1000,
+    )
+
+    # Participants without a cursor have never read anything: every message of the others is unread
+    per_author, per_conversation = {}, {}
+    for conversation_id, author_id, count in (
+        Message.objects.values('conversation_id', 'author_id').annotate(n=Count('id'))
+        .values_list('conversation_id', 'author_id', 'n')
+    ):
+        per_author[conversation_id, author_id] = count
+        per_conversation[conversation_id] = per_conversation.get(conversation_id, 0) + count
+    participants = set(Conversation.participants.through.objects.values_list('conversation_id', 'user_id'))
+    existing = set(ConversationReadCursor.objects.values_list('conversation_id', 'user_id'))
+    missing = {
+        (conversation_id, user_id): per_conversation.get(conversation_id, 0) - per_author.get((conversation_id, user_id), 0)
+        for conversation_id, user_id in participants - existing
+    }
+    ConversationReadCursor.objects.bulk_create([
+        ConversationReadCursor(conversation_id=conversation_id, user_id=user_id, unread_count=unread)
+        for (conversation_id, user_id), unread in missing.items() if unread
+    ], batch_size=1000)
+
+    unread = (
+        Message.objects.filter(conversation=OuterRef('conversation'))
+        .exclude(author=OuterRef('user'))
+        .filter(id__gt=Coalesce(OuterRef('last_read_message_id'), 0))
+        .order_by().values('conversation').annotate(n=Count('id')).values('n')
+    )
+    for pk, count in (
+        ConversationReadCursor.objects.annotate(expected=Coalesce(Subquery(unread), 0))
+        .exclude(expected=0).values_list('pk', 'expected')
+    ):
+        ConversationReadCursor.objects.filter(pk=pk).update(unread_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_digest'),
+        ('users', '0004_user_avatar_user_phone_number'),
+        ('chat', '0006_read_cursor_unread_count'),
+        ('emails', '0003_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='badge_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('notifications_unread', models.PositiveIntegerField(default=0)),
+                ('emails_unread', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
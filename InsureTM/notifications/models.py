@@ -11,9 +11,26 @@ class Notification(models.Model):
     type = models.CharField(max_length=50, default='info') # e.g., 'campaign_assignment', 'execution_update'
     related_campaign = models.ForeignKey(Campaign, on_delete=models.SET_NULL, null=True, blank=True)
     related_object_id = models.IntegerField(null=True, blank=True) # ID of the related object (Execution, Anomaly, etc.)
+    # Bursts of the same notification are coalesced into one unread digest (notifications.service)
+    digest_key = models.CharField(max_length=150, blank=True, default='')
+    count = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'digest_key', 'is_read'], name='notif_digest_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.recipient.username}"
+
+
+class BadgeCounter(models.Model):
+    """Unread counts shown in the header and sidebar, kept up to date by notifications.badges."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='badge_counter')
+    notifications_unread = models.PositiveIntegerField(default=0)
+    emails_unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Badges user={self.user_id}"
@@ -0,0 +1,117 @@
+"""
+Notification fan-out.
+
+Views used to loop over their recipients with one `Notification.objects.create`
+each, and clients polled /api/notifications/ to see them.  `notify` replaces
+those loops:
+
+- recipients (a queryset, users or ids) are resolved in at most one query;
+- a recipient who still has an unread notification with the same digest key
+  from the last DIGEST_WINDOW_SECONDS gets it updated (count + 1, latest
+  message, moved to the top) instead of a new row: bursts become one digest;
+- the other rows are written with one `bulk_create`, the digests with one UPDATE;
+- every new or updated notification is pushed to the recipient's channel group
+  (`user_group`, ws/notifications/) after commit, through the invalidation bus;
+- the unread badge (notifications.badges) of each recipient of a new row goes up by one.
+
+`bulk_notify` writes and pushes notifications already aggregated per recipient
+(a different text for each one, e.g. the summary of a bulk result update).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models import F, QuerySet
+from django.utils import timezone
+
+# Unread notifications with the same digest key newer than this are coalesced
+DIGEST_WINDOW_SECONDS = 600
+
+
+def user_group(user_id):
+    return f'notifications_{user_id}'
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+def resolve_recipients(recipients, exclude=None):
+    """Distinct recipient ids, in order; a queryset is read with one query."""
+    excluded = _pk(exclude)
+    if isinstance(recipients, QuerySet):
+        if excluded is not None:
+            recipients = recipients.exclude(pk=excluded)
+        ids = recipients.values_list('pk', flat=True)
+    else:
+        ids = (_pk(r) for r in recipients if r is not None)
+    return [pk for pk in dict.fromkeys(ids) if pk is not None and pk != excluded]
+
+
+def notify(recipients, title, message, type='info', related_campaign=None, related_object_id=None,
+           digest_key=None, exclude=None):
+    """Notify every recipient (except `exclude`); returns the new or updated notifications."""
+    from .models import Notification
+
+    ids = resolve_recipients(recipients, exclude=exclude)
+    if not ids:
+        return []
+
+    campaign_id = _pk(related_campaign)
+    if digest_key is None:
+        digest_key = f'{type}:{campaign_id or ""}:{title}'
+    digest_key = digest_key[:150]
+    now = timezone.now()
+
+    open_digests = {}  # recipient id -> (notification id, count); the latest one wins
+    for pk, recipient_id, count in (
+        Notification.objects.filter(
+            recipient_id__in=ids, digest_key=digest_key, is_read=False,
+            created_at__gte=now - timedelta(seconds=DIGEST_WINDOW_SECONDS),
+        ).order_by('created_at').values_list('id', 'recipient_id', 'count')
+    ):
+        open_digests[recipient_id] = (pk, count)
+
+    fields = dict(
+        title=title, message=message, type=type,
+        related_campaign_id=campaign_id, related_object_id=related_object_id, digest_key=digest_key,
+    )
+    digests = []
+    if open_digests:
+        Notification.objects.filter(pk__in=[pk for pk, _ in open_digests.values()]).update(
+            title=title, message=message, related_object_id=related_object_id,
+            count=F('count') + 1, created_at=now,
+        )
+        digests = [
+            Notification(pk=pk, recipient_id=recipient_id, count=count + 1, created_at=now, **fields)
+            for recipient_id, (pk, count) in open_digests.items()
+        ]
+    created = Notification.objects.bulk_create([
+        Notification(recipient_id=recipient_id, **fields) for recipient_id in ids if recipient_id not in open_digests
+    ])
+    _push(created + digests, created)
+    return created + digests
+
+
+def bulk_notify(notifications):
+    """Write unsaved Notification instances with one bulk_create and push them; returns them."""
+    from .models import Notification
+
+    created = Notification.objects.bulk_create(notifications)
+    _push(created, created)
+    return created
+
+
+def _push(notifications, created):
+    """Queue each notification for its recipient's socket (sent once the transaction commits) and count the new ones."""
+    from utils.invalidation import emit
+    from .badges import adjust
+    from .serializers import NotificationSerializer
+
+    adjust('notifications_unread', Counter(n.recipient_id for n in created))
+
+    for notification in notifications:
+        emit(user_group(notification.recipient_id), {
+            'type': 'notification',
+            'digest': notification.count > 1,
+            'notification': NotificationSerializer(notification).data,
+        })
@@ -1,7 +1,10 @@
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete
 from django.dispatch import receiver
 from campaigns.models import Campaign
+from emails.models import Email
+from .badges import unread_deleted
 from .models import Notification
+from .service import notify
 from utils.email_service import send_campaign_assignment_email
 
 @receiver(m2m_changed, sender=Campaign.assigned_testers.through)
@@ -9,15 +12,28 @@ def notify_tester_assignment(sender, instance, action, reverse, model, pk_set, *
     if action == "post_add":
         from django.contrib.auth import get_user_model
         User = get_user_model()
-        testers = User.objects.filter(pk__in=pk_set)
+        testers = list(User.objects.filter(pk__in=pk_set))
+        notify(
+            testers,
+            title="Nouvelle Campagne Assignée",
+            message=f"Vous avez été assigné(e) à la campagne : {instance.title}",
+            type='campaign_assignment',
+            related_campaign=instance,
+        )
         for tester in testers:
-            Notification.objects.create(
-                recipient=tester,
-                title="Nouvelle Campagne Assignée",
-                message=f"Vous avez été assigné(e) à la campagne : {instance.title}",
-                type='campaign_assignment',
-                related_campaign=instance
-            )
             # Send SMTP email
             if tester.email:
                 send_campaign_assignment_email(tester, instance)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        unread_deleted('notifications_unread', [instance.recipient_id])
+
+
+@receiver(post_delete, sender=Email)
+def email_deleted(sender, instance, **kwargs):
+    # Also reached when deleting a user cascades to the e-mails they sent
+    if not instance.is_read:
+        unread_deleted('emails_unread', [instance.recipient_id])
@@ -1,8 +1,20 @@
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.test import TestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 
-from .models import Notification
+from chat.models import Conversation, ConversationReadCursor
+from emails.models import Email
+from utils.invalidation import batch as invalidation_batch
+from notifications.consumers import NotificationConsumer
+from notifications.badges import adjust, recompute, snapshot
+from notifications.models import BadgeCounter, Notification
+from notifications.service import bulk_notify, notify, user_group
 
 User = get_user_model()
 
@@ -46,3 +58,206 @@ class NotificationAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         notif.refresh_from_db()
         self.assertTrue(notif.is_read)
+
+
+class NotificationServiceTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='svc_manager', email='svc_manager@test.com', password='x', role='MANAGER')
+        self.testers = [
+            User.objects.create_user(username=f'svc_tester{i}', email=f'svc_tester{i}@test.com', password='x', role='TESTER')
+            for i in range(3)
+        ]
+
+    def test_fan_out_resolves_recipients_once_and_bulk_creates(self):
+        recipients = User.objects.filter(role__in=['TESTER', 'MANAGER'])
+        notify(recipients, 'Bienvenue', 'Bonjour', exclude=self.manager)  # creates the badge counter rows
+        # recipient ids, open digests, one INSERT, one badge counter UPDATE
+        with self.assertNumQueries(4):
+            created = notify(recipients, 'Annonce', 'Bonjour', exclude=self.manager)
+        self.assertEqual(len(created), 3)
+        self.assertEqual(
+            set(Notification.objects.values_list('recipient_id', flat=True)),
+            {t.id for t in self.testers},
+        )
+
+    def test_burst_is_coalesced_into_one_digest(self):
+        tester = self.testers[0]
+        for i in range(3):
+            notify([tester], 'Nouveau Commentaire', f'Commentaire {i}', type='comment_posted')
+        notify([tester], 'Nouvelle Anomalie', 'Anomalie', type='anomaly_reported')
+
+        digest = Notification.objects.get(recipient=tester, type='comment_posted')
+        self.assertEqual((digest.count, digest.message), (3, 'Commentaire 2'))
+        self.assertEqual(Notification.objects.filter(recipient=tester).count(), 2)
+
+        # Once read, the next one starts a new notification
+        Notification.objects.filter(pk=digest.pk).update(is_read=True)
+        notify([tester], 'Nouveau Commentaire', 'Commentaire 3', type='comment_posted')
+        self.assertEqual(Notification.objects.filter(recipient=tester, type='comment_posted').count(), 2)
+
+    def test_notifications_are_pushed_to_the_user_group_after_commit(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(user_group(self.manager.id), channel)
+
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            notify([self.manager], 'Nouveau Projet', 'Projet A')
+            notify([self.manager], 'Nouveau Projet', 'Projet B')
+            bulk_notify([Notification(recipient=self.manager, title='3 résultats de test', message='...')])
+
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(event['type'], 'live_event_batch')
+        first, digest, summary, badges = event['payloads']
+        self.assertEqual((first['digest'], first['notification']['message']), (False, 'Projet A'))
+        self.assertEqual((digest['digest'], digest['notification']['count']), (True, 2))
+        self.assertEqual(digest['notification']['id'], first['notification']['id'])
+        self.assertEqual(summary['notification']['title'], '3 résultats de test')
+        self.assertEqual((badges['type'], badges['notifications']), ('badges', 2))
+
+    def test_consumer_forwards_user_notifications(self):
+        async def run_test():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = self.manager
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await get_channel_layer().group_send(user_group(self.manager.id), {
+                'type': 'live_event', 'payload': {'type': 'notification', 'notification': {'id': 1}},
+            })
+            response = await communicator.receive_json_from()
+            self.assertEqual(response['notification'], {'id': 1})
+            await communicator.disconnect()
+
+        async_to_sync(run_test)()
+
+
+class BadgeCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='badge_alice', email='badge_alice@test.com', password='x', role='MANAGER')
+        self.bob = User.objects.create_user(username='badge_bob', email='badge_bob@test.com', password='x', role='TESTER')
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def _badges(self):
+        return self.client.get('/api/notifications/badges/').data
+
+    def test_notification_counter_follows_creation_and_reads(self):
+        notify([self.bob], 'Annonce', 'A', type='info')
+        notify([self.bob], 'Annonce', 'B', type='info')  # digest: still one unread
+        notify([self.bob], 'Nouvelle Anomalie', 'C', type='anomaly_reported')
+        self.assertEqual(self._badges()['notifications'], 2)
+
+        notification = Notification.objects.filter(recipient=self.bob).first()
+        self.client.post(f'/api/notifications/{notification.id}/mark_read/')
+        self.client.post(f'/api/notifications/{notification.id}/mark_read/')  # already read: no change
+        self.assertEqual(self._badges()['notifications'], 1)
+
+        self.client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self._badges()['notifications'], 0)
+
+    def test_mark_all_read_keeps_notifications_created_meanwhile(self):
+        notify([self.bob], 'Annonce', 'A', type='info')
+        real_adjust = adjust
+
+        def notified_meanwhile(field, deltas):
+            # A notification committed between the UPDATE and the counter write
+            notify([self.bob], 'Nouvelle Anomalie', 'B', type='anomaly_reported')
+            real_adjust(field, deltas)
+
+        with patch('notifications.views.adjust', side_effect=notified_meanwhile):
+            self.client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self._badges()['notifications'], 1)
+        self.assertEqual(recompute(check=True), 0)
+
+    def test_email_counter_follows_inbox(self):
+        sender = APIClient()
+        sender.force_authenticate(self.alice)
+        for i in range(2):
+            response = sender.post('/api/emails/', {'recipient': self.bob.id, 'subject': f'Objet {i}', 'body': 'Texte'})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._badges()['emails'], 2)
+
+        first, second = Email.objects.filter(recipient=self.bob).order_by('id')
+        self.client.post(f'/api/emails/{first.id}/mark_read/')
+        self.assertEqual(self._badges()['emails'], 1)
+        self.client.delete(f'/api/emails/{second.id}/')
+        self.assertEqual(self._badges()['emails'], 0)
+
+    def test_counters_follow_deletions_and_cascades(self):
+        sender = APIClient()
+        sender.force_authenticate(self.alice)
+        for i in range(2):
+            sender.post('/api/emails/', {'recipient': self.bob.id, 'subject': f'Objet {i}', 'body': 'Texte'})
+        notify([self.bob], 'Annonce', 'A', type='info')
+        notify([self.bob], 'Nouvelle Anomalie', 'B', type='anomaly_reported')
+        # The two e-mails share one digest notification
+        self.assertEqual((self._badges()['emails'], self._badges()['notifications']), (2, 3))
+
+        Notification.objects.filter(recipient=self.bob, type='anomaly_reported').delete()
+        self.assertEqual(self._badges()['notifications'], 2)
+
+        # Deleting the sender cascades to the e-mails bob has not read
+        self.alice.delete()
+        self.assertEqual(self._badges()['emails'], 0)
+        self.assertEqual(recompute(check=True), 0)
+
+        # The recipient's own counter goes with them, without being recreated
+        self.bob.delete()
+        self.assertFalse(BadgeCounter.objects.exists())
+
+    def test_chat_counter_per_conversation(self):
+        conversation = Conversation.objects.create(type='DIRECT')
+        conversation.participants.add(self.alice, self.bob)
+        author = APIClient()
+        author.force_authenticate(self.alice)
+        ids = [
+            author.post('/api/chat/messages/', {'conversation': conversation.id, 'text': f'Message {i}'}).data['id']
+            for i in range(3)
+        ]
+
+        listed = self.client.get('/api/chat/conversations/').data
+        listed = listed['results'] if isinstance(listed, dict) else listed
+        self.assertEqual(listed[0]['unread_count'], 3)
+        self.assertEqual(self._badges()['conversations'], {conversation.id: 3})
+
+        self.client.post(f'/api/chat/conversations/{conversation.id}/mark_read/', {'last_message_id': ids[0]})
+        self.assertEqual(self._badges()['chat'], 2)
+        author.delete(f'/api/chat/messages/{ids[2]}/')
+        self.assertEqual(self._badges()['chat'], 1)
+        self.client.post(f'/api/chat/conversations/{conversation.id}/mark_read/')
+        self.assertEqual(self._badges()['chat'], 0)
+
+    def test_badges_are_pushed_once_per_flush(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(user_group(self.bob.id), channel)
+
+        with self.captureOnCommitCallbacks(execute=True), invalidation_batch():
+            notify([self.bob], 'Annonce', 'A')
+            notify([self.bob], 'Nouvelle Anomalie', 'B', type='anomaly_reported')
+
+        payloads = async_to_sync(channel_layer.receive)(channel)['payloads']
+        self.assertEqual([p['type'] for p in payloads], ['notification', 'notification', 'badges'])
+        self.assertEqual(payloads[-1]['notifications'], 2)
+
+    def test_recompute_repairs_drifted_counters(self):
+        Notification.objects.create(recipient=self.bob, title='Import', message='SQL brut')
+        Email.objects.create(sender=self.alice, recipient=self.bob, subject='Import', body='...')
+        conversation = Conversation.objects.create(type='DIRECT')
+        conversation.participants.add(self.alice, self.bob)
+        conversation.messages.create(author=self.alice, text='Bonjour')
+        BadgeCounter.objects.create(user=self.alice, notifications_unread=4)
+
+        # bob's counter (missing), alice's counter (drifted) and bob's cursor (missing); alice has nothing unread
+        self.assertEqual(recompute(check=True), 3)
+        self.assertFalse(BadgeCounter.objects.filter(user=self.bob).exists())
+        recompute()
+        self.assertEqual(recompute(check=True), 0)
+        self.assertEqual(
+            snapshot([self.bob.id, self.alice.id]),
+            {
+                self.bob.id: {'notifications': 1, 'emails': 1, 'chat': 1, 'conversations': {conversation.id: 1}},
+                self.alice.id: {'notifications': 0, 'emails': 0, 'chat': 0, 'conversations': {}},
+            },
+        )
+        self.assertFalse(ConversationReadCursor.objects.filter(user=self.alice).exists())
@@ -1,6 +1,8 @@
+from django.db import transaction
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from .badges import adjust, snapshot
 from .models import Notification
 from .serializers import NotificationSerializer
 
@@ -16,7 +18,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         return (Notification.objects
                 .filter(recipient=self.request.user)
                 .only('id', 'title', 'message', 'is_read', 'created_at', 'type',
-                      'related_campaign_id', 'related_object_id')
+                      'related_campaign_id', 'related_object_id', 'count')
                 .order_by('-created_at'))
 
     def get_queryset(self):
@@ -27,14 +29,22 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         notification = self._base_queryset().filter(pk=pk).first()
         if not notification:
             return Response({'detail': 'Not found.'}, status=404)
-        notification.is_read = True
-        notification.save(update_fields=['is_read'])
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            adjust('notifications_unread', {request.user.id: -1})
         return Response({'status': 'notification marked as read'})
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
-        updated = Notification.objects.filter(
-            recipient=request.user,
-            is_read=False,
-        ).update(is_read=True)
+        # The counter goes down by the rows marked here: a notification created meanwhile stays counted
+        with transaction.atomic():
+            updated = Notification.objects.filter(
+                recipient=request.user,
+                is_read=False,
+            ).update(is_read=True)
+            adjust('notifications_unread', {request.user.id: -updated})
         return Response({'status': 'all notifications marked as read', 'updated': updated})
+
+    @action(detail=False, methods=['get'])
+    def badges(self, request):
+        """Unread notifications, e-mails and chat messages (per conversation), from the counters."""
+        return Response(snapshot([request.user.id])[request.user.id])
@@ -0,0 +1,277 @@
+"""
+Remote Playwright runner agent.
+
+    python -m testCases.agent --server https://api.insuretb.tech --token <jeton> \
+        --project /opt/insuretm/project --capacity 2
+
+Runs on any machine with Node, the Playwright project (project/, with node_modules and
+browsers) and a copy of this package; it needs neither Django nor the backend settings
+(standard library only, helpers in testCases.playwright_io) and talks to the backend
+only over HTTP (testCases.agent_api), so throughput grows by starting more agents.
+Each of the `capacity` slots:
+
+1. claims a queued run (POST agent/claim/), writes the spec under the local project;
+2. runs `npx playwright test` with the runner's process handling (timeout, process group);
+3. heartbeats every `heartbeat_seconds` with the new output, which renews the lease and
+   reports cancellation — a lost lease stops the run and drops its result;
+4. uploads the final logs and screenshot/video/trace (POST agent/jobs/<id>/complete/).
+
+If the agent dies, its leases expire and the backend queues the runs again.
+Register an agent with `python manage.py register_runner_agent <nom>`.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from urllib import error as urlerror
+from urllib import request as urlrequest
+
+from .playwright_io import load_json_report, parse_json_report, read_log_delta, run_process
+
+logger = logging.getLogger(__name__)
+
+IDLE_POLL_SECONDS = 5
+HTTP_TIMEOUT_SECONDS = 60
+ARTIFACT_CONTENT_TYPES = {'screenshot': 'image/png', 'video': 'video/webm', 'trace': 'application/zip'}
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class AgentClient:
+    """Minimal JSON/multipart client for the agent API (standard library only)."""
+
+    def __init__(self, server, token):
+        self.base_url = server.rstrip('/') + '/api/testcases/agent/'
+        self.token = token
+        self.hostname = socket.gethostname()
+
+    def _send(self, path, body, content_type):
+        req = urlrequest.Request(self.base_url + path, data=body, method='POST', headers={
+            'Authorization': f'Agent {self.token}',
+            'Content-Type': content_type,
+            'X-Agent-Host': self.hostname,
+        })
+        try:
+            with urlrequest.urlopen(req, timeout=HTTP_TIMEOUT_SECONDS) as response:
+                raw = response.read()
+                return response.status, json.loads(raw) if raw else None
+        except urlerror.HTTPError as e:
+            raw = e.read()
+            try:
+                return e.code, json.loads(raw) if raw else None
+            except ValueError:
+                return e.code, None
+
+    def post(self, path, data=None):
+        return self._send(path, json.dumps(data or {}).encode('utf-8'), 'application/json')
+
+    def post_files(self, path, fields, files):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields.items():
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8')
+                + str(value).encode('utf-8') + b'\r\n'
+            )
+        for name, path_on_disk in files.items():
+            with open(path_on_disk, 'rb') as f:
+                content = f.read()
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                f'filename="{os.path.basename(path_on_disk)}"\r\n'
+                f'Content-Type: {ARTIFACT_CONTENT_TYPES.get(name, "application/octet-stream")}\r\n\r\n'.encode('utf-8')
+                + content + b'\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+        return self._send(path, b''.join(parts), f'multipart/form-data; boundary={boundary}')
+
+    def claim(self, slot):
+        status, data = self.post('claim/', {'slot': slot})
+        return data if status == 200 else None
+
+    def heartbeat(self, job_id, logs=''):
+        status, data = self.post(f'jobs/{job_id}/heartbeat/', {'logs': logs})
+        if status == 409:
+            raise LeaseLost(job_id)
+        return data or {}
+
+    def complete(self, job_id, outcome, logs, artifacts):
+        files = {key: path for key, path in artifacts.items() if path and os.path.exists(path)}
+        status, data = self.post_files(f'jobs/{job_id}/complete/', {'outcome': outcome, 'logs': logs}, files)
+        if status == 409:
+            raise LeaseLost(job_id)
+        return data
+
+
+class Heartbeat(threading.Thread):
+    """Renews the lease of a running job and streams its new output; flags cancel / lease loss."""
+
+    def __init__(self, client, job, log_path):
+        super().__init__(daemon=True)
+        self.client = client
+        self.job_id = job['job_id']
+        self.interval = job['heartbeat_seconds']
+        self.log_path = log_path
+        self.offset = 0
+        self.cancelled = threading.Event()
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def beat(self):
+        text, self.offset, _ = read_log_delta(self.log_path, self.offset)
+        try:
+            if self.client.heartbeat(self.job_id, text).get('cancel_requested'):
+                self.cancelled.set()
+        except LeaseLost:
+            self.lost = True
+            self.cancelled.set()
+        except OSError as e:
+            # Backend unreachable: keep running, the next beat may still be inside the lease
+            logger.warning("Heartbeat for job %s failed: %s", self.job_id, e)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.beat()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class Agent:
+    def __init__(self, client, project, capacity=1, poll_seconds=IDLE_POLL_SECONDS):
+        self.client = client
+        self.project = os.path.abspath(project)
+        self.capacity = capacity
+        self.poll_seconds = poll_seconds
+
+    def _env(self, job, output_dir, report_path):
+        env = os.environ.copy()
+        env.update({
+            'SKIP_WEBSERVER': 'true',
+            'PYTHONUNBUFFERED': '1',
+            'FORCE_COLOR': '0',
+            'CI': 'true',
+            'DEBUG': 'pw:api',
+            'PW_VIDEO': 'on',
+            'PLAYWRIGHT_OUTPUT_DIR': output_dir,
+            'PLAYWRIGHT_JSON_OUTPUT_NAME': report_path,
+        })
+        if job['execution_mode'] in ('headed', 'ui'):
+            env.setdefault('DISPLAY', ':99')
+            env['PW_HEADED'] = 'true'
+            if job['execution_mode'] == 'ui':
+                env['PLAYWRIGHT_SLOWMO'] = '800'
+        return env
+
+    def execute(self, job):
+        """Run one claimed job and report it.  Returns the outcome sent, or None when the lease was lost."""
+        job_id = job['job_id']
+        tests_dir = os.path.join(self.project, 'tests')
+        spec_path = os.path.normpath(os.path.join(self.project, job['script_path']))
+        if os.path.commonpath([tests_dir, spec_path]) != tests_dir:
+            self.client.complete(job_id, 'ERROR', f"Chemin de script refusé : {job['script_path']}", {})
+            return 'ERROR'
+        os.makedirs(os.path.dirname(spec_path), exist_ok=True)
+        with open(spec_path, 'w') as f:
+            f.write(job['script'])
+
+        results_dir = os.path.join(self.project, 'test-results')
+        output_dir = os.path.join(results_dir, f'agent_{job_id}')
+        log_path = os.path.join(results_dir, f'agent_{job_id}.log')
+        report_path = os.path.join(results_dir, f'agent_{job_id}.json')
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.makedirs(results_dir, exist_ok=True)
+
+        cmd = ['npx', 'playwright', 'test', spec_path, f'--output={output_dir}', '--reporter=list,json']
+        if job['execution_mode'] in ('headed', 'ui'):
+            cmd.append('--headed')
+
+        heartbeat = Heartbeat(self.client, job, log_path)
+        try:
+            with open(log_path, 'w') as log_file:
+                log_file.write(f'▶ Agent {self.client.hostname} : {job["test_case_ref"]}\n')
+                log_file.flush()
+                heartbeat.start()
+                returncode, timeout_or_cancel = run_process(
+                    cmd, self.project, self._env(job, output_dir, report_path), log_file,
+                    job['timeout_seconds'], heartbeat.cancelled.is_set,
+                )
+                if timeout_or_cancel == 'TIMEOUT':
+                    log_file.write(f'\n⏱ Exécution interrompue : délai de {job["timeout_seconds"]}s dépassé.\n')
+                elif timeout_or_cancel == 'CANCELLED':
+                    log_file.write('\n⛔ Exécution annulée.\n')
+            heartbeat.stop()
+            if heartbeat.lost:
+                logger.warning("Lease of job %s lost, result dropped", job_id)
+                return None
+
+            with open(log_path, 'r', errors='replace') as f:
+                logs = f.read()
+            if timeout_or_cancel:
+                outcome = timeout_or_cancel
+            else:
+                outcome = 'PASSED' if returncode == 0 else 'FAILED'
+            spec_outcomes = parse_json_report(load_json_report(report_path, remove=True), tests_dir)
+            spec = spec_outcomes.get(spec_path) or next(iter(spec_outcomes.values()), {})
+            artifacts = {key: spec.get(key) for key in ARTIFACT_CONTENT_TYPES}
+            try:
+                self.client.complete(job_id, outcome, logs, artifacts)
+            except LeaseLost:
+                logger.warning("Lease of job %s lost before its result was uploaded", job_id)
+                return None
+            return outcome
+        finally:
+            heartbeat.stop()
+            shutil.rmtree(output_dir, ignore_errors=True)
+            for path in (log_path, report_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _slot_loop(self, slot):
+        while True:
+            job = None
+            try:
+                job = self.client.claim(slot)
+                if job:
+                    logger.info("Slot %s runs job %s (%s)", slot, job['job_id'], job['test_case_ref'])
+                    self.execute(job)
+            except Exception:
+                logger.exception("Agent slot %s error", slot)
+            if not job:
+                time.sleep(self.poll_seconds)
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._slot_loop, args=(slot,), name=f'agent-slot-{slot}', daemon=True)
+            for slot in range(self.capacity)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agent d'exécution Playwright distant.")
+    parser.add_argument('--server', default=os.environ.get('RUNNER_AGENT_SERVER'))
+    parser.add_argument('--token', default=os.environ.get('RUNNER_AGENT_TOKEN'))
+    parser.add_argument('--project', default=os.environ.get('RUNNER_AGENT_PROJECT', '../project'))
+    parser.add_argument('--capacity', type=int, default=int(os.environ.get('RUNNER_AGENT_CAPACITY', 1)))
+    parser.add_argument('--poll', type=float, default=IDLE_POLL_SECONDS)
+    args = parser.parse_args(argv)
+    if not args.server or not args.token:
+        parser.error('--server et --token sont requis (ou RUNNER_AGENT_SERVER / RUNNER_AGENT_TOKEN).')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+    Agent(AgentClient(args.server, args.token), args.project, max(1, args.capacity), args.poll).run()
+
+
+if __name__ == '__main__':
+    main()
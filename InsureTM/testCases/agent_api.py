@@ -0,0 +1,165 @@
+"""
+HTTP API used by remote runner agents (testCases/agent.py).
+
+Agents authenticate with `Authorization: Agent <token>` (RunnerAgent.register /
+`python manage.py register_runner_agent`), never with a user JWT:
+
+- POST agent/claim/                     next single-run job + its spec, 204 when none;
+- POST agent/jobs/<id>/heartbeat/       renew the lease, append new output; tells the
+                                        agent when the run was cancelled or lost;
+- POST agent/jobs/<id>/complete/        final logs + screenshot/video/trace (multipart).
+
+Every call refreshes RunnerAgent.last_heartbeat, and a claim first re-queues the
+jobs of agents whose lease expired.
+"""
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils import timezone
+from rest_framework import exceptions, permissions, viewsets
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.response import Response
+
+from . import execution_queue, runner
+from .models import ExecutionJob, RunnerAgent
+
+logger = logging.getLogger(__name__)
+
+AGENT_OUTCOMES = ('PASSED', 'FAILED', 'TIMEOUT', 'CANCELLED', 'ERROR')
+ARTIFACT_UPLOADS = {'screenshot': 'screenshot.png', 'video': 'video.webm', 'trace': 'trace.zip'}
+
+
+class RunnerAgentAuthentication(BaseAuthentication):
+    keyword = 'Agent'
+
+    def authenticate(self, request):
+        header = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(header) != 2 or header[0] != self.keyword:
+            return None
+        agent = RunnerAgent.objects.filter(token_hash=RunnerAgent.hash_token(header[1]), is_active=True).first()
+        if agent is None:
+            raise exceptions.AuthenticationFailed('Jeton d\'agent invalide.')
+        now = timezone.now()
+        hostname = request.META.get('HTTP_X_AGENT_HOST', '')[:255]
+        RunnerAgent.objects.filter(pk=agent.pk).update(last_heartbeat=now, hostname=hostname or agent.hostname)
+        agent.last_heartbeat = now
+        # No user behind an agent: request.user stays anonymous, request.auth is the agent
+        return AnonymousUser(), agent
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class IsRunnerAgent(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return isinstance(request.auth, RunnerAgent)
+
+
+class RunnerAgentViewSet(viewsets.ViewSet):
+    authentication_classes = [RunnerAgentAuthentication]
+    permission_classes = [IsRunnerAgent]
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def _held_job(self, request, job_id):
+        """The job if this agent still holds it, else None (lease expired, re-queued or cancelled)."""
+        return ExecutionJob.objects.select_related('test_case', 'requested_by').filter(
+            pk=job_id, agent=request.auth, status='RUNNING',
+        ).first()
+
+    @action(detail=False, methods=['post'])
+    def claim(self, request):
+        agent = request.auth
+        execution_queue.requeue_expired()
+        worker = f"{agent.name}:{request.data.get('slot', 0)}"
+        while True:
+            job = execution_queue.claim_next(worker, agent=agent)
+            if job is None:
+                return Response(status=204)
+            path = job.test_case.automation_script_path
+            if path and os.path.exists(path):
+                break
+            ExecutionJob.objects.filter(pk=job.pk).update(
+                status='DONE', result='ERROR', error='Script introuvable.', finished_at=timezone.now(),
+            )
+            runner.write_result(job.test_case_id, {'status': 'FAILED', 'logs': 'Script introuvable.', 'anomaly_id': None})
+
+        with open(path, 'r') as f:
+            script = f.read()
+        _, live_log_path, _ = runner.execution_paths(job.test_case_id)
+        with open(live_log_path, 'a') as f:
+            f.write(f'▶ Exécution confiée à l\'agent {agent.name}\n')
+        lease = settings.RUNNER_AGENT_LEASE_SECONDS
+        return Response({
+            'job_id': job.id,
+            'test_case_id': job.test_case_id,
+            'test_case_ref': job.test_case.test_case_ref,
+            'execution_mode': job.execution_mode,
+            'timeout_seconds': job.timeout_seconds,
+            'lease_seconds': lease,
+            'heartbeat_seconds': max(1, lease // 3),
+            # Relative to the Playwright project, so the agent's playwright.config picks the same project
+            'script_path': os.path.relpath(path, runner.project_dir()),
+            'script': script,
+        })
+
+    @action(detail=False, methods=['post'], url_path=r'jobs/(?P<job_id>\d+)/heartbeat')
+    def heartbeat(self, request, job_id=None):
+        job = execution_queue.renew_lease(job_id, request.auth)
+        if job is None:
+            return Response({'error': 'Bail perdu : exécution reprise ou terminée.', 'lost': True}, status=409)
+
+        logs = request.data.get('logs') or ''
+        if logs:
+            _, live_log_path, _ = runner.execution_paths(job.test_case_id)
+            offset = os.path.getsize(live_log_path) if os.path.exists(live_log_path) else 0
+            with open(live_log_path, 'a') as f:
+                f.write(logs)
+            publisher = runner.LogPublisher(job.test_case_id, live_log_path)
+            publisher.offset = offset
+            publisher()
+        return Response({'cancel_requested': job.cancel_requested, 'lease_expires_at': job.lease_expires_at})
+
+    @action(detail=False, methods=['post'], url_path=r'jobs/(?P<job_id>\d+)/complete')
+    def complete(self, request, job_id=None):
+        job = self._held_job(request, job_id)
+        if job is None:
+            return Response({'error': 'Bail perdu : résultat ignoré.', 'lost': True}, status=409)
+        outcome = request.data.get('outcome')
+        if outcome not in AGENT_OUTCOMES:
+            return Response({'error': f"'outcome' doit valoir {', '.join(AGENT_OUTCOMES)}."}, status=400)
+        logs = request.data.get('logs') or ''
+
+        if outcome == 'CANCELLED':
+            ExecutionJob.objects.filter(pk=job.pk).update(
+                status='CANCELLED', result='', finished_at=timezone.now(), lease_expires_at=None,
+            )
+            runner.write_result(job.test_case_id, {'status': 'CANCELLED', 'logs': logs, 'anomaly_id': None})
+            return Response({'status': 'CANCELLED'})
+
+        output_dir, _, _ = runner.execution_paths(job.test_case_id)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
+        artifacts = {}
+        for key, filename in ARTIFACT_UPLOADS.items():
+            upload = request.FILES.get(key)
+            if upload is None:
+                artifacts[key] = None
+                continue
+            target = os.path.join(output_dir, filename)
+            with open(target, 'wb') as f:
+                for chunk in upload.chunks():
+                    f.write(chunk)
+            artifacts[key] = target
+
+        status = 'PASSED' if outcome == 'PASSED' else 'FAILED'
+        anomaly_id = runner.record_outcome(job, status, logs, artifacts)
+        ExecutionJob.objects.filter(pk=job.pk).update(
+            status='DONE', result=outcome, finished_at=timezone.now(), lease_expires_at=None,
+        )
+        return Response({'status': status, 'anomaly_id': anomaly_id})
@@ -0,0 +1,213 @@
+"""
+Warm browser pool for headless Playwright runs.
+
+Each pooled server is a long-lived Chromium started with `launchServer` on
+localhost (project/scripts/browser-server.cjs).  A run leases one server and
+passes its ws endpoint to the spec through PW_WS_ENDPOINT, so the test connects
+to an already running browser (new context per test) instead of launching one.
+
+- servers are health-checked (process alive, port accepting) on every lease,
+  and an unhealthy one is stopped outside the pool lock;
+- a server's output after its ws endpoint is drained and discarded;
+- a server is recycled after settings.PLAYWRIGHT_BROWSER_MAX_RUNS runs;
+- at most settings.PLAYWRIGHT_BROWSER_POOL_SIZE servers per process;
+- when no server can be started the run falls back to a cold browser launch.
+"""
+import atexit
+import logging
+import os
+import select
+import signal
+import socket
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STARTUP_TIMEOUT_SECONDS = 30
+HEALTH_TIMEOUT_SECONDS = 1
+
+
+class BrowserServer:
+    def __init__(self, process, ws_endpoint):
+        self.process = process
+        self.ws_endpoint = ws_endpoint
+        self.runs = 0
+        self.busy = False
+        self.started_at = time.monotonic()
+
+    @classmethod
+    def start(cls, cwd):
+        script = os.path.join(cwd, 'scripts', 'browser-server.cjs')
+        process = subprocess.Popen(
+            ['node', script], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            start_new_session=True, text=True,
+        )
+        ready, _, _ = select.select([process.stdout], [], [], STARTUP_TIMEOUT_SECONDS)
+        ws_endpoint = process.stdout.readline().strip() if ready else ''
+        server = cls(process, ws_endpoint)
+        if not ws_endpoint.startswith('ws://') or not server.healthy():
+            server.stop()
+            raise RuntimeError(f'Serveur navigateur indisponible ({ws_endpoint or "pas de réponse"})')
+        # Later output is discarded: a full pipe would block the browser server
+        threading.Thread(target=_drain, args=(process.stdout,), daemon=True).start()
+        return server
+
+    def healthy(self):
+        if self.process.poll() is not None:
+            return False
+        url = urlparse(self.ws_endpoint)
+        try:
+            with socket.create_connection((url.hostname, url.port), timeout=HEALTH_TIMEOUT_SECONDS):
+                return True
+        except OSError:
+            return False
+
+    def stop(self):
+        if self.process.poll() is not None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.wait(timeout=5)
+        except (ProcessLookupError, PermissionError):
+            pass
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+
+
+class BrowserPool:
+    def __init__(self, cwd, size, max_runs):
+        self.cwd = cwd
+        self.size = size
+        self.max_runs = max_runs
+        self.servers = []
+        self._cond = threading.Condition()
+
+    def _acquire(self):
+        leased, dead = None, []
+        with self._cond:
+            while leased is None:
+                for server in list(self.servers):
+                    if server.busy:
+                        continue
+                    if not server.healthy():
+                        logger.warning("Browser server %s unhealthy, replacing it", server.ws_endpoint)
+                        self.servers.remove(server)
+                        dead.append(server)
+                        continue
+                    server.busy = True
+                    leased = server
+                    break
+                if leased is None and len(self.servers) < self.size:
+                    # Reserve the slot, start outside the lock
+                    placeholder = BrowserServer(process=_Placeholder(), ws_endpoint='')
+                    placeholder.busy = True
+                    self.servers.append(placeholder)
+                    break
+                if leased is None:
+                    self._cond.wait()
+        # Dead servers are stopped outside the lock: other leases do not wait for them
+        for server in dead:
+            server.stop()
+        if leased is not None:
+            return leased
+
+        try:
+            server = BrowserServer.start(self.cwd)
+        except Exception as e:
+            logger.warning("Could not start browser server: %s", e)
+            server = None
+        with self._cond:
+            self.servers.remove(placeholder)
+            if server is not None:
+                server.busy = True
+                self.servers.append(server)
+            self._cond.notify()
+        return server
+
+    def _release(self, server):
+        with self._cond:
+            server.busy = False
+            server.runs += 1
+            if server.runs >= self.max_runs or not server.healthy():
+                self.servers.remove(server)
+                threading.Thread(target=server.stop, daemon=True).start()
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self):
+        """Yield the ws endpoint of a warm browser, or None (cold launch) when the pool cannot provide one."""
+        server = self._acquire()
+        try:
+            yield server.ws_endpoint if server else None
+        finally:
+            if server is not None:
+                self._release(server)
+
+    def shutdown(self):
+        with self._cond:
+            servers, self.servers = self.servers, []
+        for server in servers:
+            server.stop()
+
+    def status(self):
+        with self._cond:
+            return [
+                {'ws_endpoint': s.ws_endpoint, 'busy': s.busy, 'runs': s.runs,
+                 'uptime_seconds': round(time.monotonic() - s.started_at, 1)}
+                for s in self.servers if s.ws_endpoint
+            ]
+
+
+def _drain(stream):
+    try:
+        for _ in stream:
+            pass
+    except (OSError, ValueError):
+        pass
+
+
+class _Placeholder:
+    """Stands for a server being started, so concurrent leases respect the pool size."""
+    pid = None
+
+    def poll(self):
+        return None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide pool, or None when disabled (PLAYWRIGHT_BROWSER_POOL_SIZE=0)."""
+    global _pool
+    if settings.PLAYWRIGHT_BROWSER_POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            from .runner import project_dir
+            _pool = BrowserPool(
+                project_dir(), settings.PLAYWRIGHT_BROWSER_POOL_SIZE, settings.PLAYWRIGHT_BROWSER_MAX_RUNS,
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+@contextmanager
+def lease():
+    pool = get_pool()
+    if pool is None:
+        yield None
+        return
+    with pool.lease() as ws_endpoint:
+        yield ws_endpoint
@@ -1,4 +1,7 @@
 import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
 class TestCaseLogsConsumer(AsyncWebsocketConsumer):
@@ -13,6 +16,28 @@ class TestCaseLogsConsumer(AsyncWebsocketConsumer):
         )
         await self.accept()
 
+        # ?offset=<bytes already shown>: send what was written since, then only pushed deltas
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'offset' in query:
+            try:
+                offset = max(0, int(query['offset'][0]))
+            except ValueError:
+                offset = 0
+            await self.send_backlog(offset)
+
+    async def send_backlog(self, offset):
+        from .runner import execution_paths, read_log_delta
+
+        _, live_log_path, _ = execution_paths(self.test_case_id)
+        text, new_offset, reset = await sync_to_async(read_log_delta)(live_log_path, offset)
+        if text or reset:
+            await self.send(text_data=json.dumps({
+                "type": "log",
+                "message": text,
+                "offset": new_offset,
+                "reset": reset,
+            }))
+
     async def disconnect(self, close_code):
         # Leave group
         await self.channel_layer.group_discard(
@@ -22,8 +47,17 @@ class TestCaseLogsConsumer(AsyncWebsocketConsumer):
 
     # Receive message from group
     async def log_message(self, event):
-        # Send message to WebSocket
+        # Send only the new output; `offset` lets the client resume through live-logs/?offset=
         await self.send(text_data=json.dumps({
             "type": "log",
-            "message": event['message']
+            "message": event['message'],
+            "offset": event.get('offset'),
+            "reset": event.get('reset', False),
+        }))
+
+    async def log_end(self, event):
+        await self.send(text_data=json.dumps({
+            "type": "end",
+            "status": event.get('status'),
+            "anomaly_id": event.get('anomaly_id'),
         }))
@@ -0,0 +1,380 @@
+"""
+Bounded execution queue for Playwright runs.
+
+execute-script/ no longer starts a thread per request: it records an ExecutionJob
+(QUEUED) and returns.  A small pool of worker threads per process claims jobs from
+the database and runs them through testCases.runner:
+
+- at most settings.PLAYWRIGHT_WORKERS jobs are RUNNING at once: a claim counts them
+  and takes its job while holding a lock row (ExecutionClaimLock), so concurrent
+  claims from gunicorn/daphne processes are serialised and the bound holds in the DB;
+- fairness: the next job belongs to the requester with the fewest running jobs,
+  oldest first, so one tester launching a whole campaign cannot starve the others;
+- a job is claimed with a conditional UPDATE (status='QUEUED'), never twice;
+- each run has a timeout (settings.PLAYWRIGHT_JOB_TIMEOUT) and can be cancelled.
+
+A suite job (enqueue_suite) runs many test cases in one Playwright process with
+`--workers=N` and takes a single slot.
+
+Remote runner agents (testCases/agent.py) claim single-run jobs through the agent
+API instead: each holds at most `capacity` jobs (same lock, one row per agent) under
+a lease renewed by its heartbeats; a job whose lease expires (agent died) is queued
+again, up to settings.RUNNER_AGENT_MAX_ATTEMPTS times.
+
+Set PLAYWRIGHT_WORKERS=0 to disable the in-process pool (agents only).
+"""
+import logging
+import os
+import socket
+import statistics
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import runner
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('QUEUED', 'RUNNING')
+
+# Idle workers re-check the table this often (jobs queued by another process)
+IDLE_POLL_SECONDS = 5
+# RUNNING jobs older than their timeout plus this grace were left by a dead worker
+STALE_GRACE_SECONDS = 120
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_workers = []
+_reaped = False
+
+
+def enqueue(test_case, user, execution_mode='headless'):
+    """
+    Queue an execution of `test_case`.  Returns (job, created): a test case already
+    queued or running is not queued a second time.
+    """
+    from .models import ExecutionJob
+
+    active = ExecutionJob.objects.filter(test_case=test_case, status__in=ACTIVE_STATUSES).first()
+    if active:
+        return active, False
+
+    if execution_mode not in runner.MODE_LABELS:
+        execution_mode = 'headless'
+    job = ExecutionJob.objects.create(
+        test_case=test_case,
+        requested_by=user,
+        execution_mode=execution_mode,
+        timeout_seconds=settings.PLAYWRIGHT_JOB_TIMEOUT,
+    )
+    runner.start_live_log(test_case, execution_mode, position=queue_position(job))
+    transaction.on_commit(wake)
+    return job, True
+
+
+def enqueue_suite(test_cases, user, campaign=None, workers=None):
+    """Queue one suite job running every given test case in a single Playwright process."""
+    from .models import ExecutionJob
+
+    workers = max(1, min(workers or settings.PLAYWRIGHT_SUITE_WORKERS, settings.PLAYWRIGHT_SUITE_WORKERS))
+    job = ExecutionJob.objects.create(
+        campaign=campaign,
+        test_case_ids=sorted(tc.id for tc in test_cases),
+        requested_by=user,
+        workers=workers,
+        timeout_seconds=settings.PLAYWRIGHT_SUITE_TIMEOUT,
+    )
+    transaction.on_commit(wake)
+    return job
+
+
+def queue_position(job):
+    """1-based position among queued jobs, or None once the job has started."""
+    from .models import ExecutionJob
+
+    if job.status != 'QUEUED':
+        return None
+    return ExecutionJob.objects.filter(status='QUEUED', created_at__lte=job.created_at).count()
+
+
+def cancel(job):
+    """Cancel a queued job at once, or ask its worker to stop a running one."""
+    from .models import ExecutionJob
+
+    now = timezone.now()
+    if ExecutionJob.objects.filter(pk=job.pk, status='QUEUED').update(
+        status='CANCELLED', cancel_requested=True, finished_at=now,
+    ):
+        if job.is_suite:
+            return True
+        runner.write_result(job.test_case_id, {
+            'status': 'CANCELLED', 'logs': '⛔ Exécution annulée avant son démarrage.', 'anomaly_id': None,
+        })
+        return True
+    # The worker notices the flag within runner.POLL_SECONDS and stops the browser
+    return bool(ExecutionJob.objects.filter(pk=job.pk, status='RUNNING').update(cancel_requested=True))
+
+
+def _lock_pool(name):
+    """
+    Lock the claim row of a slot pool until the transaction ends: an UPDATE, so it is a
+    row lock on PostgreSQL and takes the write lock first on SQLite.  Concurrent claims
+    on the same pool wait here, then count the RUNNING jobs committed before them.
+    """
+    from .models import ExecutionClaimLock
+
+    now = timezone.now()
+    if not ExecutionClaimLock.objects.filter(name=name).update(claimed_at=now):
+        ExecutionClaimLock.objects.bulk_create([ExecutionClaimLock(name=name)], ignore_conflicts=True)
+        ExecutionClaimLock.objects.filter(name=name).update(claimed_at=now)
+
+
+def claim_next(worker_name, agent=None):
+    """
+    Atomically move the next fair QUEUED job to RUNNING; None when full or empty.
+
+    Local workers share the PLAYWRIGHT_WORKERS bound; an agent is bounded by its own
+    capacity, only takes single runs, and gets a lease it must renew.  The count and
+    the claim run under the pool's lock (_lock_pool), so the bound holds across processes.
+    """
+    from .models import ExecutionJob
+
+    with transaction.atomic():
+        running_jobs = ExecutionJob.objects.filter(status='RUNNING')
+        if agent is None:
+            _lock_pool('local')
+            if running_jobs.filter(agent__isnull=True).count() >= settings.PLAYWRIGHT_WORKERS:
+                return None
+        else:
+            _lock_pool(f'agent:{agent.pk}')
+            if running_jobs.filter(agent=agent).count() >= agent.capacity:
+                return None
+
+        running = dict(
+            running_jobs.values_list('requested_by')
+            .annotate(n=Count('id'))
+            .values_list('requested_by', 'n')
+        )
+        queued = ExecutionJob.objects.filter(status='QUEUED')
+        if agent is not None:
+            queued = queued.filter(test_case__isnull=False)
+        candidates = list(queued.order_by('created_at', 'id').values_list('id', 'requested_by')[:200])
+        # Stable sort: fewest running jobs per requester first, FIFO inside a requester
+        candidates.sort(key=lambda c: running.get(c[1], 0))
+
+        now = timezone.now()
+        claim = {'status': 'RUNNING', 'started_at': now, 'worker': worker_name, 'attempts': F('attempts') + 1}
+        if agent is not None:
+            claim.update(agent=agent, lease_expires_at=now + timedelta(seconds=settings.RUNNER_AGENT_LEASE_SECONDS))
+        # Another pool (the agents, the local workers) may take a candidate first: status='QUEUED' is re-checked
+        for job_id, _ in candidates:
+            if ExecutionJob.objects.filter(pk=job_id, status='QUEUED').update(**claim):
+                return ExecutionJob.objects.select_related('test_case', 'requested_by').get(pk=job_id)
+    return None
+
+
+def renew_lease(job_id, agent):
+    """Extend an agent's lease on a running job.  Returns the job, or None when the agent lost it."""
+    from .models import ExecutionJob
+
+    expires = timezone.now() + timedelta(seconds=settings.RUNNER_AGENT_LEASE_SECONDS)
+    if not ExecutionJob.objects.filter(pk=job_id, agent=agent, status='RUNNING').update(lease_expires_at=expires):
+        return None
+    return ExecutionJob.objects.get(pk=job_id)
+
+
+def requeue_expired():
+    """Queue again the jobs of agents that stopped heartbeating; give up after RUNNER_AGENT_MAX_ATTEMPTS."""
+    from .models import ExecutionJob
+
+    now = timezone.now()
+    expired = list(
+        ExecutionJob.objects.filter(status='RUNNING', agent__isnull=False, lease_expires_at__lt=now)
+        .values_list('id', 'test_case_id', 'attempts', 'agent__name')
+    )
+    requeued = 0
+    for job_id, test_case_id, attempts, agent_name in expired:
+        logger.warning("Lease of job %s expired on agent %s", job_id, agent_name)
+        lost = ExecutionJob.objects.filter(pk=job_id, status='RUNNING', lease_expires_at__lt=now)
+        if attempts >= settings.RUNNER_AGENT_MAX_ATTEMPTS:
+            if lost.update(status='DONE', result='ERROR', error=f'Agent {agent_name} perdu.', finished_at=now):
+                runner.write_result(test_case_id, {
+                    'status': 'FAILED', 'logs': f'Erreur interne : agent {agent_name} perdu.', 'anomaly_id': None,
+                })
+            continue
+        if lost.update(status='QUEUED', agent=None, worker='', started_at=None, lease_expires_at=None):
+            requeued += 1
+            _, live_log_path, _ = runner.execution_paths(test_case_id)
+            if os.path.exists(live_log_path):
+                with open(live_log_path, 'a') as f:
+                    f.write(f'\n⚠ Agent {agent_name} injoignable : exécution remise en file d\'attente.\n')
+    if requeued:
+        transaction.on_commit(wake)
+    return requeued
+
+
+def execute(job):
+    """Run a claimed job and record how it ended."""
+    from .models import ExecutionJob
+
+    def is_cancelled():
+        return ExecutionJob.objects.filter(pk=job.pk, cancel_requested=True).exists()
+
+    try:
+        run = runner.run_suite if job.is_suite else runner.run_job
+        outcome = run(job, is_cancelled)
+        error = ''
+    except Exception as exc:
+        logger.exception("Execution job %s crashed", job.pk)
+        outcome, error = 'ERROR', str(exc)
+
+    ExecutionJob.objects.filter(pk=job.pk).update(
+        status='CANCELLED' if outcome == 'CANCELLED' else 'DONE',
+        result='' if outcome == 'CANCELLED' else outcome,
+        error=error,
+        finished_at=timezone.now(),
+    )
+    return outcome
+
+
+def reap_stale():
+    """Close RUNNING jobs whose worker died (process restart) so they stop counting against the bound."""
+    from .models import ExecutionJob
+
+    now = timezone.now()
+    stale = [
+        job for job in ExecutionJob.objects.filter(status='RUNNING', started_at__isnull=False, agent__isnull=True)
+        if job.started_at + timedelta(seconds=job.timeout_seconds + STALE_GRACE_SECONDS) < now
+    ]
+    for job in stale:
+        ExecutionJob.objects.filter(pk=job.pk, status='RUNNING').update(
+            status='DONE', result='ERROR', error='Worker interrompu.', finished_at=now,
+        )
+        if job.is_suite:
+            continue
+        runner.write_result(job.test_case_id, {
+            'status': 'FAILED', 'logs': 'Erreur interne : exécution interrompue.', 'anomaly_id': None,
+        })
+    return len(stale)
+
+
+def _worker_loop(name):
+    while True:
+        job = None
+        try:
+            close_old_connections()
+            job = claim_next(name)
+            if job is not None:
+                execute(job)
+        except Exception:
+            logger.exception("Execution worker %s error", name)
+        finally:
+            close_old_connections()
+        if job is None:
+            _wakeup.wait(IDLE_POLL_SECONDS)
+            _wakeup.clear()
+
+
+def ensure_started():
+    """Start this process's worker threads (idempotent)."""
+    global _reaped
+    count = settings.PLAYWRIGHT_WORKERS
+    if count <= 0:
+        return
+    with _lock:
+        if not _reaped:
+            _reaped = True
+            try:
+                reap_stale()
+            except Exception:
+                logger.exception("Could not reap stale execution jobs")
+        _workers[:] = [t for t in _workers if t.is_alive()]
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        for i in range(len(_workers), count):
+            thread = threading.Thread(
+                target=_worker_loop, args=(f'{prefix}:{i}',), name=f'playwright-worker-{i}', daemon=True,
+            )
+            thread.start()
+            _workers.append(thread)
+
+
+def wake():
+    ensure_started()
+    _wakeup.set()
+
+
+def _summary(values):
+    if not values:
+        return {'avg': None, 'p50': None, 'p95': None, 'max': None}
+    values = sorted(values)
+    return {
+        'avg': round(statistics.mean(values), 2),
+        'p50': round(statistics.median(values), 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+        'max': round(values[-1], 2),
+    }
+
+
+def stats(window_hours=24):
+    """Queue depth, runner agents and wait/run time distribution over the last `window_hours`."""
+    from .models import ExecutionJob, RunnerAgent
+
+    now = timezone.now()
+    counts = dict(
+        ExecutionJob.objects.filter(status__in=ACTIVE_STATUSES)
+        .values_list('status')
+        .annotate(n=Count('id'))
+        .values_list('status', 'n')
+    )
+    oldest = (
+        ExecutionJob.objects.filter(status='QUEUED')
+        .order_by('created_at').values_list('created_at', flat=True).first()
+    )
+    recent = list(
+        ExecutionJob.objects.filter(created_at__gte=now - timedelta(hours=window_hours), started_at__isnull=False)
+        .order_by('-created_at')
+        .values_list('created_at', 'started_at', 'finished_at', 'result')[:1000]
+    )
+    results = {}
+    for _, _, finished, result in recent:
+        if finished and result:
+            results[result] = results.get(result, 0) + 1
+
+    # Failed single runs: log triage savings and failure-to-anomaly latency (runner.record_outcome)
+    triaged = [
+        summary for summary in ExecutionJob.objects.filter(
+            created_at__gte=now - timedelta(hours=window_hours), test_case__isnull=False, result='FAILED',
+        ).values_list('summary', flat=True)[:1000]
+        if isinstance(summary, dict) and 'triage' in summary
+    ]
+    tokens_in = sum(s['triage']['tokens_in'] for s in triaged)
+    tokens_sent = sum(s['triage']['tokens_sent'] for s in triaged)
+
+    agents = [
+        {'name': a.name, 'capacity': a.capacity, 'online': a.is_online, 'last_heartbeat': a.last_heartbeat}
+        for a in RunnerAgent.objects.filter(is_active=True)
+    ]
+    return {
+        'workers': settings.PLAYWRIGHT_WORKERS,
+        'agents': agents,
+        'queued': counts.get('QUEUED', 0),
+        'running': counts.get('RUNNING', 0),
+        'oldest_queued_seconds': round((now - oldest).total_seconds(), 2) if oldest else None,
+        'window_hours': window_hours,
+        'wait_seconds': _summary([(started - created).total_seconds() for created, started, _, _ in recent]),
+        'run_seconds': _summary([
+            (finished - started).total_seconds() for _, started, finished, _ in recent if finished
+        ]),
+        'results': results,
+        'anomaly_triage': {
+            'runs': len(triaged),
+            'tokens_in': tokens_in,
+            'tokens_sent': tokens_sent,
+            'reduction_pct': round(100 * (1 - tokens_sent / tokens_in), 1) if tokens_in else None,
+            'anomaly_latency_ms': _summary([s['anomaly_latency_ms'] for s in triaged]),
+        },
+    }
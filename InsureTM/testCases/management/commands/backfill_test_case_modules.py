@@ -0,0 +1,50 @@
+"""
+python manage.py backfill_test_case_modules [--batch-size 2000]
+- Recalcule TestCase.module depuis data_json pour les lignes existantes
+- Écrit uniquement les lignes dont le module a changé (bulk_update par lot)
+- Reporte les changements de module sur les agrégats des tableaux de bord (analytics.rollups)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from analytics.rollups import count_saved
+from testCases.models import TestCase, extract_module
+
+
+class Command(BaseCommand):
+    help = "Remplit le champ module des cas de test à partir de data_json."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        scanned = updated = 0
+        last_id = 0
+
+        while True:
+            # Keyset pagination: stable and cheap on large tables
+            batch = list(
+                TestCase.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'data_json', 'module', 'campaign', 'tester', 'status', 'execution_date')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            scanned += len(batch)
+
+            changed = []
+            for tc in batch:
+                module = extract_module(tc.data_json)
+                if module != tc.module:
+                    tc.module = module
+                    changed.append(tc)
+            if changed:
+                with transaction.atomic():
+                    TestCase.objects.bulk_update(changed, ['module'])
+                    count_saved(changed, fields=['module'])
+                updated += len(changed)
+            self.stdout.write(f"   {scanned} analysés, {updated} mis à jour")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Backfill terminé : {updated}/{scanned} cas de test mis à jour."))
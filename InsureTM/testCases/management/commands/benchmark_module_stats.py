@@ -0,0 +1,103 @@
+"""
+python manage.py benchmark_module_stats [--rows 1000000]
+- Insère N cas de test synthétiques dans une transaction annulée à la fin
+- Compare l'ancien parcours Python de data_json au GROUP BY sur la colonne module
+- Affiche le plan d'exécution de la requête agrégée
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from campaigns.models import Campaign
+from Project.models import Project
+from testCases.models import TestCase, extract_module
+
+MODULES = ['Souscription', 'Sinistres', 'Facturation', 'Authentification', 'Reporting', 'Contrats', 'Portail', '']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mesure l'agrégat taux d'échec par module sur un volume synthétique (rollback final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--campaigns', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write(self.style.SUCCESS("↩ Données synthétiques annulées."))
+
+    def _run(self, options):
+        rows, batch_size = options['rows'], options['batch_size']
+        rng = random.Random(42)
+        project = Project.objects.create(name='benchmark_module_stats')
+        campaigns = Campaign.objects.bulk_create(
+            [Campaign(project=project, title=f'bench-{i}') for i in range(options['campaigns'])]
+        )
+
+        self.stdout.write(f"⏳ Insertion de {rows} cas de test ({connection.vendor})…")
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            objs = []
+            for i in range(offset, min(offset + batch_size, rows)):
+                module = rng.choice(MODULES)
+                # Mix of both shapes found in imported Excel files
+                if i % 2:
+                    data = {'Module': module, 'Etape': 'Ouvrir la page'}
+                else:
+                    data = [{'Etape': 'Ouvrir la page'}, {'Domaine': module}]
+                objs.append(TestCase(
+                    campaign=rng.choice(campaigns),
+                    test_case_ref=f'BENCH-{i}',
+                    data_json=data,
+                    module=extract_module(data),
+                    status=rng.choice(['PENDING', 'PASSED', 'FAILED']),
+                ))
+            TestCase.objects.bulk_create(objs, batch_size=batch_size)
+        self.stdout.write(f"   insertion : {time.perf_counter() - started:.1f}s")
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE "testCases_testcase"')
+
+        qs = TestCase.objects.filter(campaign__project=project)
+
+        started = time.perf_counter()
+        legacy = {}
+        for tc in qs.only('id', 'status', 'campaign_id', 'data_json').iterator(chunk_size=500):
+            name = extract_module(tc.data_json) or 'Core'
+            stats = legacy.setdefault(name, [0, 0])
+            stats[0] += 1
+            stats[1] += tc.status == 'FAILED'
+        legacy_time = time.perf_counter() - started
+
+        aggregate = (
+            qs.annotate(module_name=Coalesce(NullIf('module', Value('')), Value('Core')))
+            .values('module_name')
+            .annotate(
+                total=Count('id'),
+                fails=Count('id', filter=Q(status='FAILED')),
+                releases=Count('campaign_id', distinct=True),
+            )
+        )
+        started = time.perf_counter()
+        grouped = {row['module_name']: [row['total'], row['fails']] for row in aggregate}
+        group_time = time.perf_counter() - started
+
+        if grouped != legacy:
+            self.stdout.write(self.style.ERROR("❌ Les deux méthodes divergent !"))
+        self.stdout.write(f"   parcours Python data_json : {legacy_time * 1000:.0f} ms")
+        self.stdout.write(f"   GROUP BY module           : {group_time * 1000:.0f} ms")
+        self.stdout.write("\n📋 Plan d'exécution :")
+        self.stdout.write(aggregate.explain())
@@ -0,0 +1,31 @@
+"""
+python manage.py prune_test_results [--days 14] [--dry-run]
+- Supprime les sorties Playwright (project/test-results) plus anciennes que N jours
+- Conserve celles des exécutions en file d'attente ou en cours
+- Vide les chemins d'artefacts enregistrés pour les exécutions supprimées
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from testCases.runner import prune_test_results
+
+
+class Command(BaseCommand):
+    help = "Supprime les anciens résultats d'exécution Playwright."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PLAYWRIGHT_RESULTS_RETENTION_DAYS)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options['days'])
+        removed, freed = prune_test_results(older_than, dry_run=options['dry_run'])
+        for name in removed:
+            self.stdout.write(f"   {name}")
+        verb = "seraient supprimées" if options['dry_run'] else "supprimées"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(removed)} sorties {verb} ({freed / (1024 * 1024):.1f} Mo)."
+        ))
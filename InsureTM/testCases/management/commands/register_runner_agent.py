@@ -0,0 +1,32 @@
+"""
+python manage.py register_runner_agent <nom> [--capacity 2] [--disable]
+- Crée (ou régénère le jeton d'un) agent d'exécution Playwright distant
+- Affiche le jeton une seule fois : seul son empreinte SHA-256 est stockée
+- --disable : désactive l'agent (ses requêtes sont refusées)
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from testCases.models import RunnerAgent
+
+
+class Command(BaseCommand):
+    help = "Enregistre un agent d'exécution Playwright et affiche son jeton."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name')
+        parser.add_argument('--capacity', type=int, default=1)
+        parser.add_argument('--disable', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['disable']:
+            if not RunnerAgent.objects.filter(name=options['name']).update(is_active=False):
+                raise CommandError(f"Agent inconnu : {options['name']}")
+            self.stdout.write(self.style.SUCCESS(f"✅ Agent {options['name']} désactivé."))
+            return
+
+        agent, token = RunnerAgent.register(options['name'], capacity=max(1, options['capacity']))
+        self.stdout.write(self.style.SUCCESS(f"✅ Agent {agent.name} enregistré (capacité {agent.capacity})."))
+        self.stdout.write(f"   Jeton (à conserver, il ne sera plus affiché) : {token}")
+        self.stdout.write(
+            f"   python -m testCases.agent --server <url API> --token {token} --project <dossier project/>"
+        )
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of testCases.models.extract_module as of this migration
+MODULE_KEYS = ('Module', 'Domaine')
+BATCH_SIZE = 2000
+
+
+def extract_module(data_json):
+    rows = data_json if isinstance(data_json, list) else [data_json]
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        for key in MODULE_KEYS:
+            value = row.get(key)
+            if value:
+                return str(value).strip()[:255]
+    return ''
+
+
+def fill_modules(apps, schema_editor):
+    TestCase = apps.get_model('testCases', 'TestCase')
+    last_id = 0
+    while True:
+        batch = list(TestCase.objects.filter(id__gt=last_id).order_by('id').only('id', 'data_json')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        changed = []
+        for tc in batch:
+            tc.module = extract_module(tc.data_json)
+            if tc.module:
+                changed.append(tc)
+        TestCase.objects.bulk_update(changed, ['module'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0010_campaign_assigned_testers'),
+        ('testCases', '0009_testcase_proof_video'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testcase',
+            name='module',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='testcase',
+            index=models.Index(fields=['module', 'status'], name='testcase_module_status_idx'),
+        ),
+        migrations.RunPython(fill_modules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:37
+
+import utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testCases', '0010_testcase_module'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testcase',
+            name='proof_file',
+            field=models.FileField(blank=True, null=True, storage=utils.storage.get_proof_storage, upload_to='executions/proofs/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='testcase',
+            name='proof_video',
+            field=models.FileField(blank=True, null=True, storage=utils.storage.get_proof_storage, upload_to='executions/videos/%Y/%m/%d/'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testCases', '0011_alter_testcase_proof_file_alter_testcase_proof_video'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('execution_mode', models.CharField(default='headless', max_length=10)),
+                ('status', models.CharField(choices=[('QUEUED', 'En attente'), ('RUNNING', 'En cours'), ('DONE', 'Terminé'), ('CANCELLED', 'Annulé')], default='QUEUED', max_length=10)),
+                ('result', models.CharField(blank=True, choices=[('PASSED', 'Succès'), ('FAILED', 'Échec'), ('TIMEOUT', 'Délai dépassé'), ('ERROR', 'Erreur interne')], default='', max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+                ('timeout_seconds', models.PositiveIntegerField(default=600)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='execution_jobs', to=settings.AUTH_USER_MODEL)),
+                ('test_case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='execution_jobs', to='testCases.testcase')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='execjob_status_created_idx')],
+            },
+        ),
+    ]
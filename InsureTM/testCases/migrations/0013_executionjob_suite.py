@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0010_campaign_assigned_testers'),
+        ('testCases', '0012_executionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionjob',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='execution_jobs', to='campaigns.campaign'),
+        ),
+        migrations.AddField(
+            model_name='executionjob',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='executionjob',
+            name='test_case_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='executionjob',
+            name='workers',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='executionjob',
+            name='test_case',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='execution_jobs', to='testCases.testcase'),
+        ),
+    ]
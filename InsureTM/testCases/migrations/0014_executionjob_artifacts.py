@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testCases', '0013_executionjob_suite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='executionjob',
+            name='artifacts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
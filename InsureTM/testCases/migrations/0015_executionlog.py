@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-19 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anomalies', '0011_alter_anomalie_preuve_image_and_more'),
+        ('testCases', '0014_executionjob_artifacts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(blank=True, default='', max_length=20)),
+                ('content', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('excerpt', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('anomaly', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='execution_logs', to='anomalies.anomalie')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='testCases.executionjob')),
+                ('test_case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='execution_logs', to='testCases.testcase')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['test_case', '-created_at'], name='execlog_tc_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+import gzip
+import re
+
+from django.db import migrations
+
+MOVED_KEYS = ('execution_logs', 'anomaly_id')
+
+# Frozen copy of testCases.models.extract_log_excerpt as of this migration
+LOG_EXCERPT_CHARS = 2000
+_LOG_ERROR_RE = re.compile(r'error|✘|failed|timeout|expected|received|échec', re.IGNORECASE)
+
+
+def extract_log_excerpt(text, limit=LOG_EXCERPT_CHARS):
+    lines = [line for line in (text or '').splitlines() if not line.lstrip().startswith('pw:api')]
+    picked = set()
+    for i, line in enumerate(lines):
+        if _LOG_ERROR_RE.search(line):
+            picked.update((i, i + 1))
+    selected = [lines[i] for i in sorted(picked) if i < len(lines)]
+    excerpt = '\n'.join(selected or lines[-30:]).strip()
+    return excerpt[-limit:]
+
+
+def move_logs_out_of_data_json(apps, schema_editor):
+    TestCase = apps.get_model('testCases', 'TestCase')
+    ExecutionLog = apps.get_model('testCases', 'ExecutionLog')
+    Anomalie = apps.get_model('anomalies', 'Anomalie')
+
+    last_id = 0
+    while True:
+        batch = list(
+            TestCase.objects.filter(id__gt=last_id).order_by('id').only('id', 'data_json', 'status')[:500]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        changed, logs = [], []
+        for tc in batch:
+            data = tc.data_json
+            if not isinstance(data, dict) or not any(key in data for key in MOVED_KEYS):
+                continue
+            text = data.pop('execution_logs', None)
+            anomaly_id = data.pop('anomaly_id', None)
+            anomaly_id = int(anomaly_id) if str(anomaly_id).isdigit() else None
+            changed.append(tc)
+            if text:
+                raw = str(text).replace('\x00', '').encode('utf-8')
+                logs.append((anomaly_id, ExecutionLog(
+                    test_case_id=tc.id,
+                    status=tc.status,
+                    content=gzip.compress(raw, compresslevel=6),
+                    size=len(raw),
+                    excerpt=extract_log_excerpt(str(text)),
+                )))
+
+        # Anomalies deleted since the run are dropped: one query per batch
+        wanted = {anomaly_id for anomaly_id, _ in logs if anomaly_id}
+        existing = set(Anomalie.objects.filter(pk__in=wanted).values_list('pk', flat=True)) if wanted else set()
+        for anomaly_id, log in logs:
+            log.anomaly_id = anomaly_id if anomaly_id in existing else None
+        ExecutionLog.objects.bulk_create([log for _, log in logs])
+        TestCase.objects.bulk_update(changed, ['data_json'])
+
+
+def restore_logs_into_data_json(apps, schema_editor):
+    TestCase = apps.get_model('testCases', 'TestCase')
+    ExecutionLog = apps.get_model('testCases', 'ExecutionLog')
+
+    seen = set()
+    for log in ExecutionLog.objects.order_by('-created_at', '-id').iterator():
+        if log.test_case_id in seen:
+            continue
+        seen.add(log.test_case_id)
+        tc = TestCase.objects.get(pk=log.test_case_id)
+        data = tc.data_json if isinstance(tc.data_json, dict) else {}
+        data['execution_logs'] = gzip.decompress(bytes(log.content)).decode('utf-8', errors='replace')
+        if log.anomaly_id:
+            data['anomaly_id'] = log.anomaly_id
+        tc.data_json = data
+        tc.save(update_fields=['data_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testCases', '0015_executionlog'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_logs_out_of_data_json, restore_logs_into_data_json),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testCases', '0016_move_execution_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RunnerAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('capacity', models.PositiveSmallIntegerField(default=1)),
+                ('is_active', models.BooleanField(default=True)),
+                ('hostname', models.CharField(blank=True, default='', max_length=255)),
+                ('last_heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='executionjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='executionjob',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='executionjob',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='testCases.runneragent'),
+        ),
+    ]
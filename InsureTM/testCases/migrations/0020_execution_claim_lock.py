@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-19 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testCases', '0019_testcase_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionClaimLock',
+            fields=[
+                ('name', models.CharField(max_length=120, primary_key=True, serialize=False)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -1,10 +1,36 @@
+import gzip
+import hashlib
+import re
+import secrets
+
 from django.db import models
 from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.utils import timezone
+from analytics.rollups import track_rollups
+from utils.search import register_search
+from utils.storage import blob_digest, file_sha256, get_proof_storage, storing_blobs, track_blob_fields
+
+MODULE_KEYS = ('Module', 'Domaine')
+
+
+def extract_module(data_json):
+    """Return the functional module of a test case from its imported Excel row ('' when absent).
+
+    data_json is either a dict (one row) or a list of dicts (one per step); the first
+    'Module' / 'Domaine' value found wins.
+    """
+    rows = data_json if isinstance(data_json, list) else [data_json]
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        for key in MODULE_KEYS:
+            value = row.get(key)
+            if value:
+                return str(value).strip()[:255]
+    return ''
+
 
 class TestCase(models.Model):
     # Relation : Une campagne a plusieurs Test Cases
@@ -15,7 +41,7 @@ class TestCase(models.Model):
     )
     
     # Référence stable (ex: ID, Numéro de ligne) pour l'assignation
-    test_case_ref = models.CharField(max_length=100)
+    test_case_ref = models.CharField(max_length=100, db_index=True)
     
     # Contenu variable de l'Excel (Etape, Résultat, etc.)
     data_json = models.JSONField(default=dict)
@@ -41,45 +67,274 @@ class TestCase(models.Model):
     execution_date = models.DateTimeField(auto_now_add=True, null=True)
     
     # Preuve d'exécution (Capture écran ou fichier)
-    proof_file = models.FileField(upload_to='executions/proofs/%Y/%m/%d/', blank=True, null=True)
+    proof_file = models.FileField(upload_to='executions/proofs/%Y/%m/%d/', storage=get_proof_storage, blank=True, null=True)
     proof_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
     # Enregistrement vidéo Playwright
-    proof_video = models.FileField(upload_to='executions/videos/%Y/%m/%d/', blank=True, null=True)
+    proof_video = models.FileField(upload_to='executions/videos/%Y/%m/%d/', storage=get_proof_storage, blank=True, null=True)
+
+    # Module fonctionnel extrait de data_json ('Module' / 'Domaine'), dénormalisé pour les agrégats
+    module = models.CharField(max_length=255, blank=True, default='')
+
+    # Texte normalisé indexé pour la recherche (utils.search), maintenu à l'enregistrement
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['module', 'status'], name='testcase_module_status_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if self.proof_file:
-            import hashlib
-            hasher = hashlib.sha256()
-            try:
-                opened_here = False
-                if self.proof_file.closed:
-                    self.proof_file.open('rb')
-                    opened_here = True
-                else:
-                    self.proof_file.seek(0)
-                
-                for chunk in self.proof_file.chunks():
-                    hasher.update(chunk)
-                
-                self.proof_hash = hasher.hexdigest()
-                
-                if opened_here:
-                    self.proof_file.close()
-            except Exception:
-                pass
-        else:
-            self.proof_hash = None
-        super().save(*args, **kwargs)
+        self.module = extract_module(self.data_json)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'data_json' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'module'}
+        # Content-addressed storage: the hash is the blob name, no second read of the file.
+        # A failed save discards the blob it stored.
+        with storing_blobs(self.proof_file):
+            if self.proof_file:
+                self.proof_hash = blob_digest(self.proof_file.name) or self.proof_hash or file_sha256(self.proof_file)
+            else:
+                self.proof_hash = None
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.test_case_ref} - {self.campaign.title}"
 
 
+class RunnerAgent(models.Model):
+    """Processus distant qui exécute des ExecutionJob (testCases/agent.py) ; authentifié par jeton."""
+    name = models.CharField(max_length=100, unique=True)
+    token_hash = models.CharField(max_length=64, unique=True)  # SHA-256 of the token, never the token itself
+    capacity = models.PositiveSmallIntegerField(default=1)      # jobs run at once
+    is_active = models.BooleanField(default=True)
+    hostname = models.CharField(max_length=255, blank=True, default='')
+    last_heartbeat = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def register(cls, name, capacity=1):
+        """Create (or re-key) an agent.  Returns (agent, token); the token is shown only once."""
+        token = secrets.token_urlsafe(32)
+        agent, _ = cls.objects.update_or_create(
+            name=name, defaults={'token_hash': cls.hash_token(token), 'capacity': capacity, 'is_active': True},
+        )
+        return agent, token
+
+    @property
+    def is_online(self):
+        if not self.last_heartbeat:
+            return False
+        lease = settings.RUNNER_AGENT_LEASE_SECONDS
+        return (timezone.now() - self.last_heartbeat).total_seconds() < lease
+
+    def __str__(self):
+        return self.name
+
+
+class ExecutionJob(models.Model):
+    """Une exécution Playwright demandée : file d'attente persistante traitée par testCases.execution_queue."""
+    STATUS_CHOICES = [
+        ('QUEUED', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('CANCELLED', 'Annulé'),
+    ]
+    RESULT_CHOICES = [
+        ('PASSED', 'Succès'),
+        ('FAILED', 'Échec'),
+        ('TIMEOUT', 'Délai dépassé'),
+        ('ERROR', 'Erreur interne'),
+    ]
+
+    # Single run: test_case.  Suite run (one Playwright process): test_case_ids, optionally campaign.
+    test_case = models.ForeignKey(
+        TestCase, on_delete=models.CASCADE, null=True, blank=True, related_name='execution_jobs'
+    )
+    campaign = models.ForeignKey(
+        'campaigns.Campaign', on_delete=models.CASCADE, null=True, blank=True, related_name='execution_jobs'
+    )
+    test_case_ids = models.JSONField(default=list, blank=True)
+    workers = models.PositiveSmallIntegerField(default=1)
+    summary = models.JSONField(default=dict, blank=True)
+    # Artifact paths from the run's manifest (suite: keyed by test case id)
+    artifacts = models.JSONField(default=dict, blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='execution_jobs'
+    )
+    execution_mode = models.CharField(max_length=10, default='headless')  # 'headless' | 'headed' | 'ui'
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    result = models.CharField(max_length=10, choices=RESULT_CHOICES, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    timeout_seconds = models.PositiveIntegerField(default=600)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    # Remote runs: the agent holding the job and until when, renewed by its heartbeats
+    agent = models.ForeignKey(RunnerAgent, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='execjob_status_created_idx'),
+        ]
+
+    @property
+    def is_suite(self):
+        return bool(self.test_case_ids)
+
+    @property
+    def wait_seconds(self):
+        end = self.started_at or self.finished_at or timezone.now()
+        return (end - self.created_at).total_seconds()
+
+    @property
+    def run_seconds(self):
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+    def __str__(self):
+        if self.is_suite:
+            return f"Job {self.id} - suite de {len(self.test_case_ids)} tests ({self.status})"
+        return f"Job {self.id} - {self.test_case_id} ({self.status})"
+
+
+class ExecutionClaimLock(models.Model):
+    """Une ligne par pool de slots (workers locaux, chaque agent) : claim_next la verrouille pour compter puis réserver."""
+    name = models.CharField(max_length=120, primary_key=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class GeneratedScript(models.Model):
+    """Cache des scripts Playwright générés, indexé par empreinte (version du prompt, titre, data_json)."""
+    key = models.CharField(max_length=64, unique=True)
+    prompt_version = models.PositiveSmallIntegerField()
+    code = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Script {self.key[:12]} (v{self.prompt_version})"
+
+
+class ScriptGenerationJob(models.Model):
+    """Génération de scripts pour une campagne ou une liste de cas (testCases.script_generation)."""
+    STATUS_CHOICES = [
+        ('QUEUED', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échec'),
+    ]
+
+    campaign = models.ForeignKey(
+        'campaigns.Campaign', on_delete=models.CASCADE, null=True, blank=True, related_name='script_generation_jobs'
+    )
+    test_case_ids = models.JSONField(default=list, blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='script_generation_jobs'
+    )
+    force = models.BooleanField(default=False)  # ignore the cache and call the model again
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    total = models.PositiveIntegerField(default=0)
+    generated = models.PositiveIntegerField(default=0)
+    cached = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=dict, blank=True)  # test case id -> message
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Génération {self.id} - {len(self.test_case_ids)} cas ({self.status})"
+
+
+LOG_EXCERPT_CHARS = 2000
+_LOG_ERROR_RE = re.compile(r'error|✘|failed|timeout|expected|received|échec', re.IGNORECASE)
+
+
+def extract_log_excerpt(text, limit=LOG_EXCERPT_CHARS):
+    """Error lines of a Playwright output (its tail when there are none), at most `limit` characters."""
+    lines = [line for line in (text or '').splitlines() if not line.lstrip().startswith('pw:api')]
+    picked = set()
+    for i, line in enumerate(lines):
+        if _LOG_ERROR_RE.search(line):
+            # Keep the line that follows too: usually the locator / expected value
+            picked.update((i, i + 1))
+    selected = [lines[i] for i in sorted(picked) if i < len(lines)]
+    excerpt = '\n'.join(selected or lines[-30:]).strip()
+    return excerpt[-limit:]
+
+
+class ExecutionLog(models.Model):
+    """Sortie complète d'une exécution Playwright, compressée (gzip) : un enregistrement par exécution."""
+    test_case = models.ForeignKey(TestCase, on_delete=models.CASCADE, related_name='execution_logs')
+    job = models.ForeignKey(ExecutionJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='logs')
+    anomaly = models.ForeignKey(
+        'anomalies.Anomalie', on_delete=models.SET_NULL, null=True, blank=True, related_name='execution_logs'
+    )
+    status = models.CharField(max_length=20, blank=True, default='')
+    content = models.BinaryField()
+    size = models.PositiveIntegerField(default=0)  # bytes before compression
+    excerpt = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['test_case', '-created_at'], name='execlog_tc_created_idx'),
+        ]
+
+    @classmethod
+    def build(cls, test_case, text, **kwargs):
+        """Unsaved log for `text` (usable with bulk_create)."""
+        raw = (text or '').replace('\x00', '').encode('utf-8')
+        return cls(
+            test_case=test_case,
+            content=gzip.compress(raw, compresslevel=6),
+            size=len(raw),
+            excerpt=extract_log_excerpt(text),
+            **kwargs
+        )
+
+    @property
+    def text(self):
+        return gzip.decompress(bytes(self.content)).decode('utf-8', errors='replace')
+
+    def head(self, lines=200):
+        return '\n'.join(self.text.splitlines()[:lines])
+
+    def tail(self, lines=200):
+        return '\n'.join(self.text.splitlines()[-lines:])
+
+    def __str__(self):
+        return f"Log {self.id} - {self.test_case_id} ({self.status})"
+
+
 @receiver(post_save, sender=TestCase)
 @receiver(post_delete, sender=TestCase)
 def invalidate_bp_health_on_test_case_change(sender, instance, **kwargs):
-    from business_projects.health_cache import invalidate_bp_health_for_campaign
-    invalidate_bp_health_for_campaign(instance.campaign_id)
+    from utils.invalidation import mark_campaign
+    mark_campaign(instance.campaign_id)
 
 
 @receiver(post_save, sender=TestCase)
@@ -87,28 +342,16 @@ def broadcast_test_case_event(sender, instance, created, **kwargs):
     if instance.status == 'PENDING':
         return
 
-    try:
-        from analytics.ml_service import invalidate_campaign_timeline_cache
-        invalidate_campaign_timeline_cache(instance.campaign_id)
-
-        channel_layer = get_channel_layer()
-        group_name = f'campaign_{instance.campaign.id}'
-        
-        payload = {
-            "type": "tester_activity",
-            "tester_id": instance.tester.id if instance.tester else 0,
-            "action": "completed" if instance.status == 'PASSED' else "failed",
-            "tc_id": instance.test_case_ref,
-            "timestamp": instance.execution_date.isoformat() if instance.execution_date else timezone.now().isoformat()
-        }
-        
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": "live_event",
-                "payload": payload
-            }
-        )
-    except Exception as e:
-        # Standard logging could be added here
-        pass
\ No newline at end of file
+    from utils.invalidation import emit
+    emit(f'campaign_{instance.campaign_id}', {
+        "type": "tester_activity",
+        "tester_id": instance.tester_id or 0,
+        "action": "completed" if instance.status == 'PASSED' else "failed",
+        "tc_id": instance.test_case_ref,
+        "timestamp": instance.execution_date.isoformat() if instance.execution_date else timezone.now().isoformat()
+    })
+
+
+track_blob_fields(TestCase, 'proof_file', 'proof_video')
+register_search(TestCase)
+track_rollups(TestCase)
@@ -0,0 +1,168 @@
+"""
+Playwright process and report helpers shared by the runner and the remote agent.
+
+testCases.agent runs on machines without the backend settings or database, so
+everything it needs from the runner lives here, on the standard library only:
+
+- run_process: one `npx playwright test` in its own session, with a timeout and a
+  cancel check, killed as a process group;
+- read_log_delta: the text appended to a live log since a byte offset;
+- load_json_report / parse_json_report: the Playwright JSON reporter output,
+  flattened per spec file.
+
+testCases.runner re-exports them for the rest of the backend.
+"""
+import json
+import logging
+import os
+import signal
+import subprocess
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often a running job checks its deadline and the cancel flag
+POLL_SECONDS = 2
+# How often new subprocess output is pushed to testcase_logs_<id>
+LOG_PUSH_SECONDS = 0.5
+
+
+def read_log_delta(path, offset=0):
+    """
+    Text appended to `path` after byte `offset`: (text, new_offset, reset).
+
+    An incomplete trailing UTF-8 sequence is left for the next read; `reset` is True
+    when the file is shorter than `offset` (a new run started) and it was re-read from 0.
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            reset = offset > size
+            if reset:
+                offset = 0
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return '', offset, False
+
+    # Do not split a multi-byte character: back off to the last complete one
+    cut = len(data)
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            break
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if back < needed:
+                cut = len(data) - back
+            break
+    return data[:cut].decode('utf-8', errors='replace'), offset + cut, reset
+
+
+def run_process(cmd, cwd, env, log_file, timeout_seconds, is_cancelled, on_output=None):
+    """
+    Run `cmd` with stdout/stderr going to `log_file`.
+
+    Returns (returncode, outcome) where outcome is None, 'TIMEOUT' or 'CANCELLED'.
+    The process gets its own session so npx and every browser it spawned are killed together.
+    `on_output` is called every LOG_PUSH_SECONDS while the process runs, and once at the end.
+    """
+    process = subprocess.Popen(
+        cmd, cwd=cwd, stdout=log_file, stderr=log_file, env=env, start_new_session=True,
+    )
+    started = time.monotonic()
+    deadline = started + timeout_seconds
+    next_check = started + POLL_SECONDS
+    outcome = None
+    while True:
+        try:
+            returncode = process.wait(timeout=LOG_PUSH_SECONDS if on_output else POLL_SECONDS)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        if on_output:
+            on_output()
+        now = time.monotonic()
+        if now >= deadline:
+            outcome = 'TIMEOUT'
+        elif now >= next_check:
+            next_check = now + POLL_SECONDS
+            if is_cancelled():
+                outcome = 'CANCELLED'
+        if outcome:
+            _terminate(process)
+            returncode = process.returncode
+            break
+    if on_output:
+        on_output()
+    return returncode, outcome
+
+
+def _terminate(process, grace_seconds=5):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace_seconds)
+    except (ProcessLookupError, PermissionError):
+        pass
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+def parse_json_report(report, default_root):
+    """
+    Flatten a Playwright JSON report into {absolute spec file: outcome}.
+
+    outcome = {'ok': bool, 'errors': [str], 'screenshot', 'video', 'trace': path|None, 'duration_ms': int}.
+    A file is ok only if every test it contains ended as expected (or was skipped).
+    """
+    root = (report.get('config') or {}).get('rootDir') or default_root
+    outcomes = {}
+
+    def walk(suite):
+        for spec in suite.get('specs', []):
+            path = os.path.normpath(os.path.join(root, spec.get('file') or suite.get('file') or ''))
+            outcome = outcomes.setdefault(path, {
+                'ok': True, 'errors': [], 'screenshot': None, 'video': None, 'trace': None, 'duration_ms': 0,
+            })
+            outcome['ok'] = outcome['ok'] and bool(spec.get('ok'))
+            for test in spec.get('tests', []):
+                for result in test.get('results', []):
+                    outcome['duration_ms'] += result.get('duration') or 0
+                    for error in result.get('errors') or ([result['error']] if result.get('error') else []):
+                        message = error.get('message') or error.get('value') or ''
+                        if message:
+                            outcome['errors'].append(f"{spec.get('title', '')} : {message}")
+                    for attachment in result.get('attachments', []):
+                        content_type, attachment_path = attachment.get('contentType', ''), attachment.get('path')
+                        if not attachment_path:
+                            continue
+                        if content_type == 'image/png' and (not outcome['screenshot'] or not spec.get('ok')):
+                            outcome['screenshot'] = attachment_path
+                        elif content_type.startswith('video/') and not outcome['video']:
+                            outcome['video'] = attachment_path
+                        elif attachment.get('name') == 'trace' and not outcome['trace']:
+                            outcome['trace'] = attachment_path
+        for child in suite.get('suites', []):
+            walk(child)
+
+    for suite in report.get('suites', []):
+        walk(suite)
+    return outcomes
+
+
+def load_json_report(report_path, remove=False):
+    report = {}
+    if os.path.exists(report_path):
+        try:
+            with open(report_path, 'r', errors='replace') as f:
+                report = json.load(f)
+        except ValueError as e:
+            logger.error("Unreadable Playwright JSON report %s: %s", report_path, e)
+        if remove:
+            os.remove(report_path)
+    return report
@@ -0,0 +1,657 @@
+"""
+Playwright runner: executes one ExecutionJob in a subprocess and persists its outcome.
+
+Called by the worker pool in testCases.execution_queue.  Progress is exchanged with
+the frontend through two files under project/test-results/ (polled by live-logs/):
+`live_<id>.log` while the job is queued or running, `result_<id>.json` once it is over.
+New output is also pushed, as deltas, to the `testcase_logs_<id>` channel group
+(TestCaseLogsConsumer), followed by a `log_end` event.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+from .playwright_io import (  # noqa: F401 (re-exported for views, consumers and tests)
+    LOG_PUSH_SECONDS, POLL_SECONDS, load_json_report, parse_json_report, read_log_delta, run_process,
+)
+
+logger = logging.getLogger(__name__)
+
+MODE_LABELS = {'headless': 'Headless ⚡', 'headed': 'Headed 👁️', 'ui': 'UI 🎮'}
+
+
+def project_dir():
+    return os.path.abspath(os.path.join(settings.BASE_DIR, '..', 'project'))
+
+
+def execution_paths(test_case_id):
+    """(output_dir, live_log_path, result_path) for a test case."""
+    results_dir = os.path.join(project_dir(), 'test-results')
+    return (
+        os.path.join(results_dir, f'test_{test_case_id}'),
+        os.path.join(results_dir, f'live_{test_case_id}.log'),
+        os.path.join(results_dir, f'result_{test_case_id}.json'),
+    )
+
+
+MANIFEST_NAME = 'manifest.json'
+ARTIFACT_KEYS = ('screenshot', 'video', 'trace')
+
+
+def write_manifest(output_dir, artifacts):
+    """Record where a run's artifacts are, so later lookups never walk test-results/."""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(artifacts, f)
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def find_playwright_artifacts(project_root: str, test_case_id: int) -> tuple[str | None, str | None]:
+    """Screenshot (.png) and video (.webm) of the last run of a test case, from its manifest."""
+    output_dir = os.path.join(project_root, 'test-results', f'test_{test_case_id}')
+    manifest = read_manifest(output_dir)
+    if manifest:
+        return manifest.get('screenshot'), manifest.get('video')
+    return _scan_output_dir(output_dir)
+
+
+def _scan_output_dir(output_dir):
+    """Fallback when no JSON report was produced: look inside this run's own output dir only."""
+    screenshot_path = None
+    video_path = None
+    if not os.path.isdir(output_dir):
+        return None, None
+    for root, _, files in os.walk(output_dir):
+        for file in files:
+            full = os.path.join(root, file)
+            if file.endswith('.png') and (not screenshot_path or 'test-failed' in file):
+                # Prefer failure screenshots when multiple exist
+                screenshot_path = full
+            if file.endswith('.webm') and not video_path:
+                video_path = full
+    return screenshot_path, video_path
+
+
+def start_live_log(test_case, execution_mode, position=None):
+    """Reset the live log / result files so the first poll is never empty."""
+    _, live_log_path, result_path = execution_paths(test_case.id)
+    os.makedirs(os.path.dirname(live_log_path), exist_ok=True)
+
+    # Remove stale result file from a previous run
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    with open(live_log_path, 'w') as f:
+        f.write(f'▶ Démarrage du runner Playwright pour : {test_case.test_case_ref}\n')
+        f.write(f'▶ Mode d\'exécution : {MODE_LABELS.get(execution_mode, MODE_LABELS["headless"])}\n')
+        if position:
+            f.write(f'⏳ En file d\'attente (position {position})…\n')
+        f.write('\n')
+
+
+def write_result(test_case_id, result):
+    """Publish the final result for live-logs/ and drop the live log."""
+    _, live_log_path, result_path = execution_paths(test_case_id)
+    os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+    _group_send(log_group(test_case_id), {
+        'type': 'log_end', 'status': result.get('status'), 'anomaly_id': result.get('anomaly_id'),
+    })
+    if os.path.exists(live_log_path):
+        try:
+            os.remove(live_log_path)
+        except OSError:
+            pass
+
+
+_RESULT_ENTRY_RE = re.compile(
+    r'^(?:(?P<kind>test|suite)_(?P<id>\d+)'
+    r'|(?:live|result|report)_(?P<tc_id>\d+)\.(?:log|json)'
+    r'|suite_(?P<suite_json_id>\d+)\.json'
+    r'|live_suite_(?P<suite_log_id>\d+)\.log)$'
+)
+
+
+def prune_test_results(older_than, dry_run=False):
+    """
+    Delete run outputs under test-results/ last modified before `older_than` (a datetime),
+    except those of queued or running jobs.  Returns (removed names, freed bytes).
+    """
+    from .models import ExecutionJob
+
+    results_dir = os.path.join(project_dir(), 'test-results')
+    if not os.path.isdir(results_dir):
+        return [], 0
+
+    active_cases, active_suites = set(), set()
+    for job_id, test_case_id in ExecutionJob.objects.filter(
+        status__in=('QUEUED', 'RUNNING')
+    ).values_list('id', 'test_case_id'):
+        if test_case_id:
+            active_cases.add(test_case_id)
+        else:
+            active_suites.add(job_id)
+
+    cutoff = older_than.timestamp()
+    removed, freed = [], 0
+    with os.scandir(results_dir) as entries:
+        for entry in entries:
+            match = _RESULT_ENTRY_RE.match(entry.name)
+            if not match:
+                continue
+            suite_id = match.group('suite_json_id') or match.group('suite_log_id') or (
+                match.group('id') if match.group('kind') == 'suite' else None
+            )
+            tc_id = match.group('tc_id') or (match.group('id') if match.group('kind') == 'test' else None)
+            if (suite_id and int(suite_id) in active_suites) or (tc_id and int(tc_id) in active_cases):
+                continue
+            if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                continue
+            size = _disk_usage(entry)
+            if not dry_run:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+            removed.append(entry.name)
+            freed += size
+
+    if not dry_run:
+        # Recorded artifact paths of those runs no longer exist
+        ExecutionJob.objects.filter(finished_at__lt=older_than).exclude(artifacts={}).update(artifacts={})
+    return removed, freed
+
+
+def _disk_usage(entry):
+    if not entry.is_dir(follow_symlinks=False):
+        return entry.stat(follow_symlinks=False).st_size
+    total = 0
+    for root, _, files in os.walk(entry.path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def log_group(test_case_id):
+    return f'testcase_logs_{test_case_id}'
+
+
+def _group_send(group, message):
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group, message)
+    except Exception as e:
+        logger.warning("Live log push to %s failed: %s", group, e)
+
+
+class LogPublisher:
+    """Tails a live log and pushes only the new bytes to the test case's channel group."""
+
+    def __init__(self, test_case_id, path):
+        self.group = log_group(test_case_id)
+        self.path = path
+        self.offset = 0
+
+    def __call__(self):
+        text, new_offset, reset = read_log_delta(self.path, self.offset)
+        if not text and not reset:
+            return
+        message = {'type': 'log_message', 'message': text, 'offset': new_offset}
+        if reset:
+            message['reset'] = True
+        self.offset = new_offset
+        _group_send(self.group, message)
+
+
+def strip_missing_storage_state(path):
+    """Remove a storageState pointing at a missing file, which would crash Playwright with ENOENT."""
+    try:
+        with open(path, 'r') as f:
+            content = f.read()
+        storage_match = re.search(r'storageState:\s*(["\'])(.*?)\1', content)
+        if storage_match:
+            storage_abs_path = os.path.abspath(os.path.join(project_dir(), storage_match.group(2)))
+            if not os.path.exists(storage_abs_path):
+                new_content = re.sub(r',\s*storageState:\s*(["\'])(.*?)\1', '', content)
+                new_content = re.sub(r'storageState:\s*(["\'])(.*?)\1\s*,?', '', new_content)
+                if new_content != content:
+                    with open(path, 'w') as f:
+                        f.write(new_content)
+    except Exception as e:
+        logger.error(f"Failed to check/remove missing storageState: {e}")
+
+
+def playwright_command(spec_paths, output_dir, execution_mode='headless', reporter='list', extra_args=()):
+    """(env, cmd) for `npx playwright test` on the given spec files."""
+    env = os.environ.copy()
+    env['SKIP_WEBSERVER'] = 'true'
+    env['FRONTEND_URL'] = settings.FRONTEND_URL
+    env['PYTHONUNBUFFERED'] = '1'
+    env['FORCE_COLOR'] = '0'
+    env['CI'] = 'true'
+    # DEBUG=pw:api streams each Playwright action to stdout as it executes
+    env['DEBUG'] = 'pw:api'
+
+    # Activate video recording via env var (playwright.config.ts reads PW_VIDEO)
+    env['PW_VIDEO'] = 'on'
+    env['PLAYWRIGHT_OUTPUT_DIR'] = output_dir
+
+    # Build Playwright command based on execution_mode
+    cmd = ['npx', 'playwright', 'test', *spec_paths, f'--output={output_dir}', f'--reporter={reporter}', *extra_args]
+
+    if execution_mode in ('headed', 'ui'):
+        # Use the existing Xvfb on :99 (started at container boot, watched by x11vnc + noVNC)
+        # Do NOT use xvfb-run — it creates a new display invisible to x11vnc
+        env['DISPLAY'] = ':99'
+        env['PW_HEADED'] = 'true'
+        cmd.append('--headed')
+        if execution_mode == 'ui':
+            env['PLAYWRIGHT_SLOWMO'] = '800'
+    return env, cmd
+
+
+@contextmanager
+def _browser(execution_mode, env, log_file):
+    """Point a headless run at a warm pooled browser (PW_WS_ENDPOINT); headed runs launch their own."""
+    if execution_mode != 'headless':
+        yield
+        return
+    from . import browser_pool
+    with browser_pool.lease() as ws_endpoint:
+        if ws_endpoint:
+            env['PW_WS_ENDPOINT'] = ws_endpoint
+            log_file.write('▶ Navigateur : instance préchauffée\n')
+            log_file.flush()
+        yield
+
+
+def describe_failure(ref, logs):
+    """
+    Anomaly (title, description, triage) of a failed run.  Only the locally triaged excerpt
+    goes to the model, not the whole pw:api trace; the description keeps that excerpt.
+    """
+    from analytics.groq_service import GroqService
+    from analytics.log_triage import triage_logs
+    from .script_generation import model_slots
+
+    triage = triage_logs(logs)
+    try:
+        with model_slots():
+            anomaly_title, anomaly_desc = GroqService().generate_anomaly_from_logs(
+                ref, logs, excerpt=triage['excerpt'],
+            )
+    except Exception as exc:
+        logger.error(f"Groq error: {exc}")
+        anomaly_title = f"Échec du test automatique : {ref}"
+        anomaly_desc = "Le test a échoué. Diagnostic IA indisponible."
+
+    safe_title = str(anomaly_title).replace('\x00', '')[:250]
+    safe_desc = str(anomaly_desc).replace('\x00', '').strip()
+    if triage['excerpt']:
+        # Full output lives in ExecutionLog; the description keeps the triaged excerpt only
+        safe_desc += f"\n\n--- EXTRAIT DES LOGS ---\n{triage['excerpt']}"
+    return safe_title, safe_desc, triage
+
+
+def record_outcome(job, status, logs, artifacts):
+    """
+    Persist a finished single run (local worker or runner agent): test case status and proofs,
+    anomaly on failure, ExecutionLog, manifest and the result file read by live-logs/.
+    Returns the anomaly id or None.
+    """
+    from django.core.files import File
+    from django.db import transaction
+    from anomalies.models import Anomalie
+    from utils import invalidation
+    from .models import ExecutionJob, ExecutionLog, TestCase
+
+    output_dir, _, _ = execution_paths(job.test_case_id)
+    write_manifest(output_dir, artifacts)
+    screenshot_path, video_path = artifacts.get('screenshot'), artifacts.get('video')
+    if not screenshot_path or not video_path:
+        logger.warning(
+            "Playwright artifacts missing for test %s (png=%s, webm=%s, output_dir=%s)",
+            job.test_case_id, screenshot_path, video_path, output_dir,
+        )
+
+    # The model is asked before the transaction opens: no lock held during the call
+    failure = None
+    if status == 'FAILED':
+        failed_at = time.monotonic()
+        ref = TestCase.objects.values_list('test_case_ref', flat=True).get(pk=job.test_case_id)
+        failure = (*describe_failure(ref, logs), failed_at)
+
+    # Runs in worker threads, outside any request: batch() so caches, report versions and
+    # dashboard rollups are refreshed once the writes commit
+    with invalidation.batch(), transaction.atomic():
+        tc = TestCase.objects.get(pk=job.test_case_id)
+        tc.status = status
+        tc.execution_date = timezone.now()
+        tc.tester = job.requested_by
+        ExecutionJob.objects.filter(pk=job.pk).update(artifacts=artifacts)
+
+        if screenshot_path and os.path.exists(screenshot_path):
+            with open(screenshot_path, 'rb') as f:
+                tc.proof_file.save(f'screenshot_tc_{tc.id}.png', File(f), save=False)
+
+        if video_path and os.path.exists(video_path):
+            with open(video_path, 'rb') as f:
+                tc.proof_video.save(f'video_tc_{tc.id}.webm', File(f), save=False)
+
+        anomaly = None
+        if failure:
+            safe_title, safe_desc, triage, failed_at = failure
+            anomaly = Anomalie(
+                test_case=tc,
+                titre=safe_title,
+                description=safe_desc,
+                impact='A_DEFINIR',
+                priorite='A_DEFINIR',
+                visibilite='PUBLIQUE',
+                statut='OUVERTE',
+                cree_par=job.requested_by,
+            )
+            # Same content-addressed blobs as the test case: no second read or write
+            if tc.proof_file:
+                anomaly.preuve_image = tc.proof_file.name
+            if tc.proof_video:
+                anomaly.preuve_video = tc.proof_video.name
+            anomaly.save()
+            ExecutionJob.objects.filter(pk=job.pk).update(summary={
+                'triage': {
+                    'tokens_in': triage['tokens_in'],
+                    'tokens_sent': triage['tokens_out'],
+                    'structured': triage['structured'],
+                },
+                'anomaly_latency_ms': round((time.monotonic() - failed_at) * 1000),
+            })
+
+        tc.save()
+        ExecutionLog.build(tc, logs, job=job, status=status, anomaly=anomaly).save()
+    anomaly_id = anomaly.id if anomaly else None
+
+    # Write result file so live-logs/ knows execution is done
+    write_result(tc.id, {
+        'status': status,
+        'logs': logs,
+        'anomaly_id': anomaly_id,
+        'video_path': video_path,
+    })
+    return anomaly_id
+
+
+def run_job(job, is_cancelled):
+    """
+    Execute a claimed ExecutionJob.  Returns the job result:
+    'PASSED', 'FAILED', 'TIMEOUT', 'CANCELLED' or 'ERROR'.
+    """
+    test_case = job.test_case
+    root = project_dir()
+    output_dir, live_log_path, _ = execution_paths(test_case.id)
+    path = test_case.automation_script_path
+
+    try:
+        if not path or not os.path.exists(path):
+            write_result(test_case.id, {'status': 'FAILED', 'logs': 'Script introuvable.', 'anomaly_id': None})
+            return 'ERROR'
+        strip_missing_storage_state(path)
+
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+
+        report_path = os.path.join(os.path.dirname(output_dir), f'report_{test_case.id}.json')
+        if os.path.exists(report_path):
+            os.remove(report_path)
+        env, cmd = playwright_command([path], output_dir, job.execution_mode, reporter='list,json')
+        env['PLAYWRIGHT_JSON_OUTPUT_NAME'] = report_path
+
+        # Write stdout/stderr directly to file — bypasses Node.js pipe buffering
+        publisher = LogPublisher(test_case.id, live_log_path)
+        with open(live_log_path, 'a') as live_log_file, _browser(job.execution_mode, env, live_log_file):
+            returncode, outcome = run_process(
+                cmd, root, env, live_log_file, job.timeout_seconds, is_cancelled, on_output=publisher,
+            )
+            if outcome == 'TIMEOUT':
+                live_log_file.write(f'\n⏱ Exécution interrompue : délai de {job.timeout_seconds}s dépassé.\n')
+            elif outcome == 'CANCELLED':
+                live_log_file.write('\n⛔ Exécution annulée.\n')
+        publisher()
+
+        with open(live_log_path, 'r', errors='replace') as f:
+            logs = f.read()
+
+        if outcome == 'CANCELLED':
+            write_result(test_case.id, {'status': 'CANCELLED', 'logs': logs, 'anomaly_id': None})
+            return 'CANCELLED'
+
+        status = 'PASSED' if returncode == 0 and not outcome else 'FAILED'
+
+        # Screenshot + Video, from the JSON reporter attachments
+        spec_outcomes = parse_json_report(load_json_report(report_path, remove=True), os.path.join(root, 'tests'))
+        spec = spec_outcomes.get(os.path.normpath(path)) or next(iter(spec_outcomes.values()), None)
+        if spec:
+            artifacts = {key: spec[key] for key in ARTIFACT_KEYS}
+        else:
+            screenshot, video = _scan_output_dir(output_dir)
+            artifacts = {'screenshot': screenshot, 'video': video, 'trace': None}
+        record_outcome(job, status, logs, artifacts)
+        return outcome or status
+
+    except Exception as exc:
+        import traceback as _tb
+        logger.error(f"Playwright runner error: {_tb.format_exc()}")
+        write_result(test_case.id, {'status': 'FAILED', 'logs': f'Erreur interne : {exc}', 'anomaly_id': None})
+        return 'ERROR'
+
+
+# ---------------------------------------------------------------------------
+# Suite runs: many test cases in one Playwright process (JSON reporter)
+# ---------------------------------------------------------------------------
+def suite_paths(job_id):
+    """(output_dir, live_log_path, report_path) for a suite job."""
+    results_dir = os.path.join(project_dir(), 'test-results')
+    return (
+        os.path.join(results_dir, f'suite_{job_id}'),
+        os.path.join(results_dir, f'live_suite_{job_id}.log'),
+        os.path.join(results_dir, f'suite_{job_id}.json'),
+    )
+
+
+def run_suite(job, is_cancelled):
+    """
+    Execute a suite ExecutionJob: one `npx playwright test` over every script, `--workers=N`,
+    then map each spec file back to its TestCase and write all results in bulk.
+    Returns 'PASSED', 'FAILED', 'TIMEOUT', 'CANCELLED' or 'ERROR'.
+    """
+    from .models import ExecutionJob, TestCase
+
+    root = project_dir()
+    output_dir, live_log_path, report_path = suite_paths(job.id)
+    os.makedirs(os.path.dirname(live_log_path), exist_ok=True)
+
+    cases = list(
+        TestCase.objects.select_related('campaign').filter(pk__in=job.test_case_ids)
+        .exclude(automation_script_path__isnull=True).exclude(automation_script_path='')
+    )
+    by_path = {}
+    for tc in cases:
+        path = os.path.normpath(tc.automation_script_path)
+        if os.path.exists(path):
+            by_path.setdefault(path, []).append(tc)
+    if not by_path:
+        ExecutionJob.objects.filter(pk=job.pk).update(summary={'total': 0, 'error': 'Aucun script trouvé.'})
+        return 'ERROR'
+
+    for path in by_path:
+        strip_missing_storage_state(path)
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    if os.path.exists(report_path):
+        os.remove(report_path)
+
+    env, cmd = playwright_command(
+        sorted(by_path), output_dir, 'headless', reporter='list,json', extra_args=[f'--workers={job.workers}'],
+    )
+    env['PLAYWRIGHT_JSON_OUTPUT_NAME'] = report_path
+
+    with open(live_log_path, 'a') as live_log_file, _browser('headless', env, live_log_file):
+        live_log_file.write(f'▶ Suite de {len(cases)} tests, {job.workers} workers\n\n')
+        live_log_file.flush()
+        _, outcome = run_process(cmd, root, env, live_log_file, job.timeout_seconds, is_cancelled)
+        if outcome == 'TIMEOUT':
+            live_log_file.write(f'\n⏱ Suite interrompue : délai de {job.timeout_seconds}s dépassé.\n')
+        elif outcome == 'CANCELLED':
+            live_log_file.write('\n⛔ Suite annulée.\n')
+    if outcome == 'CANCELLED':
+        return 'CANCELLED'
+
+    report = load_json_report(report_path)
+    spec_outcomes = parse_json_report(report, os.path.join(root, 'tests'))
+    artifacts = {
+        str(tc.id): {key: spec_outcomes[path][key] for key in ARTIFACT_KEYS}
+        for path, path_cases in by_path.items() if path in spec_outcomes
+        for tc in path_cases
+    }
+    write_manifest(output_dir, artifacts)
+    ExecutionJob.objects.filter(pk=job.pk).update(artifacts=artifacts)
+    global_errors = [e.get('message', '') for e in report.get('errors', []) if isinstance(e, dict)]
+    if outcome == 'TIMEOUT':
+        global_errors.append(f'Délai de {job.timeout_seconds}s dépassé.')
+
+    summary = apply_suite_results(job, by_path, spec_outcomes, global_errors)
+    ExecutionJob.objects.filter(pk=job.pk).update(summary=summary)
+    if outcome:
+        return outcome
+    return 'PASSED' if summary['failed'] == 0 else 'FAILED'
+
+
+def apply_suite_results(job, by_path, spec_outcomes, global_errors=()):
+    """
+    Bulk-write statuses, proofs and anomalies for a finished suite.  Specs missing from the
+    report (crash, timeout) count as failed.  Returns the summary stored on the job.
+    """
+    from collections import defaultdict
+    from concurrent.futures import ThreadPoolExecutor
+    from django.core.files import File
+    from django.db import transaction
+    from analytics.rollups import count_saved
+    from anomalies.models import Anomalie
+    from anomalies.similarity import index_anomalies
+    from utils import invalidation
+    from utils.search import refresh_documents
+    from utils.storage import blob_digest, sync_blob_refs
+    from .models import ExecutionLog, TestCase
+
+    now = timezone.now()
+    fallback_error = '\n'.join(e for e in global_errors if e) or 'Aucun résultat Playwright pour ce script.'
+    updated, failed_cases, case_logs = [], [], {}
+
+    for path, cases in by_path.items():
+        outcome = spec_outcomes.get(path) or {'ok': False, 'errors': [fallback_error], 'screenshot': None, 'video': None}
+        status = 'PASSED' if outcome['ok'] else 'FAILED'
+        logs = '\n'.join(outcome['errors']) or ('✔ Tous les tests sont passés.' if outcome['ok'] else fallback_error)
+        for tc in cases:
+            case_logs[tc.id] = logs
+            tc.status = status
+            tc.execution_date = now
+            tc.tester = job.requested_by
+            for attr, source, name in (
+                ('proof_file', outcome['screenshot'], f'screenshot_tc_{tc.id}.png'),
+                ('proof_video', outcome['video'], f'video_tc_{tc.id}.webm'),
+            ):
+                if source and os.path.exists(source):
+                    with open(source, 'rb') as f:
+                        getattr(tc, attr).save(name, File(f), save=False)
+            tc.proof_hash = blob_digest(tc.proof_file.name) if tc.proof_file else tc.proof_hash
+            updated.append(tc)
+            if status == 'FAILED':
+                failed_cases.append((tc, logs))
+
+    # Failures are diagnosed like single runs, in parallel and before the transaction opens
+    described = []
+    if failed_cases:
+        with ThreadPoolExecutor(max_workers=min(len(failed_cases), max(1, settings.SCRIPT_GENERATION_CONCURRENCY))) as pool:
+            described = list(pool.map(lambda failed: describe_failure(failed[0].test_case_ref, failed[1]), failed_cases))
+
+    with invalidation.batch(), transaction.atomic():
+        anomalies = Anomalie.objects.bulk_create([
+            Anomalie(
+                test_case=tc,
+                titre=title,
+                description=description,
+                impact='A_DEFINIR',
+                priorite='A_DEFINIR',
+                visibilite='PUBLIQUE',
+                statut='OUVERTE',
+                cree_par=job.requested_by,
+                preuve_image=tc.proof_file.name or None,
+                preuve_hash=blob_digest(tc.proof_file.name),
+                preuve_video=tc.proof_video.name or None,
+            )
+            for (tc, _), (title, description, _) in zip(failed_cases, described)
+        ])
+        # bulk_create skips pre_save: index the new anomalies in one pass
+        refresh_documents(Anomalie.objects.filter(pk__in=[anomaly.pk for anomaly in anomalies]))
+        if anomalies:
+            # bulk_create skips post_save: sign them for duplicate detection, and bump their data version
+            index_anomalies(Anomalie.objects.filter(pk__in=[anomaly.pk for anomaly in anomalies]))
+            invalidation.mark_anomalies()
+        anomaly_by_case = {tc.id: anomaly for anomaly, (tc, _) in zip(anomalies, failed_cases)}
+        ExecutionLog.objects.bulk_create([
+            ExecutionLog.build(tc, case_logs[tc.id], job=job, status=tc.status, anomaly=anomaly_by_case.get(tc.id))
+            for tc in updated
+        ], batch_size=500)
+
+        fields = ['status', 'execution_date', 'tester', 'proof_file', 'proof_hash', 'proof_video']
+        TestCase.objects.bulk_update(updated, fields, batch_size=500)
+        # bulk writes skip post_save: keep blob reference counts, rollups, caches and live views in sync
+        count_saved(updated, fields=fields)
+        count_saved(anomalies, created=True)
+        for tc in updated:
+            sync_blob_refs(tc, ['proof_file', 'proof_video'])
+        for anomaly in anomalies:
+            sync_blob_refs(anomaly, ['preuve_image', 'preuve_video'], created=True)
+
+        by_campaign = defaultdict(list)
+        for tc in updated:
+            by_campaign[tc.campaign_id].append(tc)
+        for campaign_id, cases in by_campaign.items():
+            invalidation.mark_campaign(campaign_id)
+            invalidation.emit(f"campaign_{campaign_id}", {
+                "type": "tester_activity_batch",
+                "tester_id": job.requested_by_id or 0,
+                "tc_ids": [tc.id for tc in cases],
+                "passed": sum(1 for tc in cases if tc.status == 'PASSED'),
+                "failed": sum(1 for tc in cases if tc.status == 'FAILED'),
+                "timestamp": now.isoformat(),
+            })
+
+    return {
+        'total': len(updated),
+        'passed': sum(1 for tc in updated if tc.status == 'PASSED'),
+        'failed': len(failed_cases),
+        'anomalies': [a.id for a in anomalies],
+    }
@@ -0,0 +1,226 @@
+"""
+Batch Playwright script generation with a content-addressed cache.
+
+A generated script only depends on the prompt (GroqService.PLAYWRIGHT_PROMPT_VERSION),
+the test title and its data_json, so it is cached under the SHA-256 of the three
+(GeneratedScript).  Regenerating an unchanged test case is a lookup, not a completion.
+
+A ScriptGenerationJob (campaign or id list) runs in a background thread:
+
+- cached scripts are resolved with one query, only misses reach the model;
+- misses are generated by a thread pool, and every model call in the process goes
+  through one semaphore of settings.SCRIPT_GENERATION_CONCURRENCY slots;
+- the first quota / rate-limit error opens the circuit: remaining misses are not sent;
+- progress is pushed to the campaign channel (`script_generation` events), and the
+  scripts are written with one bulk_update at the end.
+"""
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_model_slots = None
+_model_slots_lock = threading.Lock()
+
+
+def model_slots():
+    """Semaphore every model call of the process goes through (SCRIPT_GENERATION_CONCURRENCY slots)."""
+    global _model_slots
+    with _model_slots_lock:
+        if _model_slots is None:
+            _model_slots = threading.BoundedSemaphore(max(1, settings.SCRIPT_GENERATION_CONCURRENCY))
+        return _model_slots
+
+
+def is_quota_error(exc):
+    message = str(exc).lower()
+    return '429' in message or 'quota' in message or 'rate' in message
+
+
+def script_cache_key(title, data_json):
+    from analytics.groq_service import GroqService
+
+    if isinstance(data_json, str):
+        payload = data_json
+    else:
+        payload = json.dumps(data_json, sort_keys=True, ensure_ascii=False, default=str)
+    raw = f'{GroqService.PLAYWRIGHT_PROMPT_VERSION}\x00{title}\x00{payload}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _complete(service, title, data_json):
+    with model_slots():
+        return service.generate_playwright_test(title, data_json)
+
+
+def _remember(key, code):
+    from analytics.groq_service import GroqService
+    from .models import GeneratedScript
+
+    GeneratedScript.objects.update_or_create(
+        key=key, defaults={'code': code, 'prompt_version': GroqService.PLAYWRIGHT_PROMPT_VERSION},
+    )
+
+
+def generate_cached(title, data_json, force=False, service=None):
+    """Script for one test case: (code, from_cache).  `force` always calls the model."""
+    from analytics.groq_service import GroqService
+    from .models import GeneratedScript
+
+    key = script_cache_key(title, data_json)
+    if not force:
+        hit = GeneratedScript.objects.filter(key=key).values_list('code', flat=True).first()
+        if hit is not None:
+            GeneratedScript.objects.filter(key=key).update(hits=F('hits') + 1)
+            return hit, True
+    code = _complete(service or GroqService(), title, data_json)
+    if code:
+        _remember(key, code)
+    return code, False
+
+
+def enqueue_generation(test_cases, user, campaign=None, force=False):
+    from .models import ScriptGenerationJob
+
+    job = ScriptGenerationJob.objects.create(
+        campaign=campaign,
+        test_case_ids=sorted(tc.id for tc in test_cases),
+        requested_by=user,
+        force=force,
+        total=len(test_cases),
+    )
+    transaction.on_commit(lambda: start(job.id))
+    return job
+
+
+def start(job_id):
+    threading.Thread(target=_run_in_thread, args=(job_id,), name=f'script-generation-{job_id}', daemon=True).start()
+
+
+def _run_in_thread(job_id):
+    from .models import ScriptGenerationJob
+
+    try:
+        close_old_connections()
+        run_generation(ScriptGenerationJob.objects.get(pk=job_id))
+    except Exception as exc:
+        logger.exception("Script generation job %s crashed", job_id)
+        ScriptGenerationJob.objects.filter(pk=job_id).update(
+            status='FAILED', errors={'job': str(exc)}, finished_at=timezone.now(),
+        )
+    finally:
+        close_old_connections()
+
+
+def _progress(job, campaign_ids, event):
+    from utils.invalidation import batch, emit
+
+    payload = {
+        'type': 'script_generation',
+        'job_id': job.id,
+        'total': job.total,
+        'generated': job.generated,
+        'cached': job.cached,
+        'failed': job.failed,
+        **event,
+    }
+    # Outside a request: batch() flushes the events right away (autocommit)
+    with batch():
+        for campaign_id in campaign_ids:
+            emit(f'campaign_{campaign_id}', payload)
+
+
+def run_generation(job):
+    """Generate (or fetch from cache) the script of every test case of `job`, then store them in bulk."""
+    from analytics.groq_service import GroqService
+    from .models import GeneratedScript, ScriptGenerationJob, TestCase
+
+    ScriptGenerationJob.objects.filter(pk=job.pk).update(status='RUNNING')
+    cases = list(TestCase.objects.filter(pk__in=job.test_case_ids).only('id', 'test_case_ref', 'campaign_id', 'data_json'))
+    campaign_ids = sorted({tc.campaign_id for tc in cases if tc.campaign_id})
+    keys = {tc.id: script_cache_key(tc.test_case_ref, tc.data_json) for tc in cases}
+    job.total = len(cases)
+
+    codes, errors = {}, {}
+    if not job.force:
+        cached = dict(GeneratedScript.objects.filter(key__in=set(keys.values())).values_list('key', 'code'))
+        for tc in cases:
+            if keys[tc.id] in cached:
+                codes[tc.id] = cached[keys[tc.id]]
+        job.cached = len(codes)
+        if codes:
+            GeneratedScript.objects.filter(key__in={keys[i] for i in codes}).update(hits=F('hits') + 1)
+            _progress(job, campaign_ids, {'status': 'cached', 'tc_ids': sorted(codes)})
+
+    misses = [tc for tc in cases if tc.id not in codes]
+    # Identical (title, data_json) pairs are generated once
+    by_key = {}
+    for tc in misses:
+        by_key.setdefault(keys[tc.id], []).append(tc)
+
+    circuit_open = threading.Event()
+    service = GroqService()
+
+    def generate(tc):
+        if circuit_open.is_set():
+            raise RuntimeError('Quota du modèle atteint : génération interrompue.')
+        try:
+            return _complete(service, tc.test_case_ref, tc.data_json)
+        except Exception as exc:
+            if is_quota_error(exc):
+                circuit_open.set()
+            raise
+
+    new_scripts = {}
+    with ThreadPoolExecutor(max_workers=max(1, settings.SCRIPT_GENERATION_CONCURRENCY)) as pool:
+        futures = {pool.submit(generate, group[0]): key for key, group in by_key.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            group = by_key[key]
+            try:
+                code = future.result()
+            except Exception as exc:
+                code = None
+                message = str(exc)[:500]
+            else:
+                message = '' if code else 'Script vide retourné par le modèle.'
+            for tc in group:
+                if code:
+                    codes[tc.id] = code
+                else:
+                    errors[str(tc.id)] = message
+            if code:
+                new_scripts[key] = code
+                job.generated += len(group)
+            else:
+                job.failed += len(group)
+            _progress(job, campaign_ids, {
+                'status': 'generated' if code else 'failed',
+                'tc_ids': [tc.id for tc in group],
+                'tc_refs': [tc.test_case_ref for tc in group],
+            })
+
+    for key, code in new_scripts.items():
+        _remember(key, code)
+    for tc in cases:
+        if tc.id in codes:
+            tc.automation_code = codes[tc.id]
+    TestCase.objects.bulk_update([tc for tc in cases if tc.id in codes], ['automation_code'], batch_size=500)
+
+    job.status = 'FAILED' if cases and not codes else 'DONE'
+    job.errors = errors
+    job.finished_at = timezone.now()
+    ScriptGenerationJob.objects.filter(pk=job.pk).update(
+        status=job.status, total=job.total, generated=job.generated, cached=job.cached,
+        failed=job.failed, errors=errors, finished_at=job.finished_at,
+    )
+    _progress(job, campaign_ids, {'status': 'done', 'job_status': job.status})
+    return job
@@ -1,10 +1,14 @@
 import json
 import logging
+import os
 from datetime import datetime, date
 
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import TestCase
+from utils.fieldsets import SparseFieldsMixin
+from utils.storage import file_sha256
+from .models import ExecutionJob, ExecutionLog, ScriptGenerationJob, TestCase
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +25,18 @@ def sanitize_for_json(obj):
 
 
 
-class TestCaseSerializer(serializers.ModelSerializer):
+class TestCaseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tester_name = serializers.SerializerMethodField()
     campaign_title = serializers.SerializerMethodField()
     project_name = serializers.SerializerMethodField()
     business_project_name = serializers.SerializerMethodField()
     release_type = serializers.SerializerMethodField()
     assigned_tester_name = serializers.SerializerMethodField()
+    execution_log_excerpt = serializers.SerializerMethodField()
+
+    def get_execution_log_excerpt(self, obj):
+        # Annotated by TestCaseViewSet.get_queryset (latest ExecutionLog.excerpt)
+        return getattr(obj, 'execution_log_excerpt', None)
 
     def get_tester_name(self, obj):
         if obj.tester:
@@ -93,13 +102,23 @@ class TestCaseSerializer(serializers.ModelSerializer):
 
         return validated_data
 
+    def validate_bulk_proof(self, value):
+        """Proof of a bulk result (bulk-results endpoint): format and size are checked too."""
+        extension = os.path.splitext(value.name or '')[1].lower()
+        if extension not in settings.PROOF_FILE_EXTENSIONS:
+            raise serializers.ValidationError(
+                f"Format de preuve non pris en charge ({', '.join(settings.PROOF_FILE_EXTENSIONS)})."
+            )
+        if value.size > settings.PROOF_FILE_MAX_MB * 1024 * 1024:
+            raise serializers.ValidationError(
+                f"Le fichier de preuve dépasse {settings.PROOF_FILE_MAX_MB} Mo."
+            )
+        return self.validate_proof_file(value)
+
     def validate_proof_file(self, value):
         if value:
-            import hashlib
-            hasher = hashlib.sha256()
-            for chunk in value.chunks():
-                hasher.update(chunk)
-            file_hash = hasher.hexdigest()
+            # Computed by the hashing upload handler while the request was read
+            file_hash = file_sha256(value)
             
             # Rejet des doublons physiques de preuve
             queryset = TestCase.objects.filter(proof_hash=file_hash)
@@ -120,4 +139,65 @@ class TestCaseSerializer(serializers.ModelSerializer):
             'tester', 'tester_name', 'assigned_tester_name',
             'execution_date', 'proof_file', 'proof_hash', 'proof_video',
             'is_automated', 'automation_code', 'automation_script_path',
-        ]
\ No newline at end of file
+            'execution_log_excerpt',
+        ]
+
+
+class TestCaseListSerializer(TestCaseSerializer):
+    """List row: no Excel data, script or log excerpt (detail or ?fields=)."""
+    assigned_tester_name = None  # one TaskAssignment query per row
+    execution_log_excerpt = None
+
+    class Meta(TestCaseSerializer.Meta):
+        fields = [
+            'id', 'campaign', 'campaign_title', 'project_name',
+            'business_project_name', 'release_type',
+            'test_case_ref', 'status',
+            'tester', 'tester_name',
+            'execution_date', 'proof_file', 'proof_video',
+            'is_automated',
+        ]
+
+class ExecutionJobSerializer(serializers.ModelSerializer):
+    test_case_ref = serializers.CharField(source='test_case.test_case_ref', read_only=True)
+    requested_by_name = serializers.SerializerMethodField()
+    wait_seconds = serializers.FloatField(read_only=True)
+    run_seconds = serializers.FloatField(read_only=True)
+    position = serializers.SerializerMethodField()
+
+    def get_requested_by_name(self, obj):
+        if obj.requested_by:
+            return f"{obj.requested_by.first_name} {obj.requested_by.last_name}".strip() or obj.requested_by.username
+        return None
+
+    def get_position(self, obj):
+        from .execution_queue import queue_position
+        return queue_position(obj)
+
+    class Meta:
+        model = ExecutionJob
+        fields = [
+            'id', 'test_case', 'test_case_ref', 'campaign', 'test_case_ids', 'workers', 'summary', 'artifacts',
+            'requested_by', 'requested_by_name',
+            'execution_mode', 'status', 'result', 'error', 'timeout_seconds', 'cancel_requested',
+            'agent', 'attempts', 'lease_expires_at',
+            'created_at', 'started_at', 'finished_at', 'wait_seconds', 'run_seconds', 'position',
+        ]
+        read_only_fields = fields
+
+
+class ExecutionLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExecutionLog
+        fields = ['id', 'test_case', 'job', 'anomaly', 'status', 'size', 'excerpt', 'created_at']
+        read_only_fields = fields
+
+
+class ScriptGenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScriptGenerationJob
+        fields = [
+            'id', 'campaign', 'test_case_ids', 'requested_by', 'force', 'status',
+            'total', 'generated', 'cached', 'failed', 'errors', 'created_at', 'finished_at',
+        ]
+        read_only_fields = fields
@@ -1,12 +1,44 @@
-from django.test import TestCase
-from config.asgi import application
-from testCases.models import TestCase as TestCaseModel
-from campaigns.models import Campaign
-from Project.models import Project
-from django.contrib.auth import get_user_model
-from channels.layers import get_channel_layer
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
 from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from analytics import rollups
+from analytics.log_triage import triage_logs
+from anomalies.models import Anomalie
+from campaigns.models import Campaign
+from config.asgi import application
+from notifications.models import Notification
+from Project.models import Project
+from testCases import browser_pool, execution_queue, runner, script_generation
+from testCases.agent import Agent
+from testCases.models import (
+    ExecutionJob, ExecutionLog, GeneratedScript, RunnerAgent, ScriptGenerationJob, TestCase as TestCaseModel,
+    extract_log_excerpt, extract_module,
+)
+from testCases.serializers import TestCaseSerializer
+from utils import invalidation
+from utils.testing import TemporaryMediaMixin
 
 User = get_user_model()
 
@@ -47,11 +79,7 @@ class TestCaseLogsConsumerTest(TestCase):
         async_to_sync(run_test)()
 
 
-from django.core.files.uploadedfile import SimpleUploadedFile
-from testCases.serializers import TestCaseSerializer
-from rest_framework.exceptions import ValidationError
-
-class TestCaseSHAProofTestCase(TestCase):
+class TestCaseSHAProofTestCase(TemporaryMediaMixin, TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='tester2', email='tester2@lloyd.com', password='password')
         self.project = Project.objects.create(name='Project 2')
@@ -101,3 +129,1147 @@ class TestCaseSHAProofTestCase(TestCase):
             
         self.assertIn("Ce fichier de preuve existe déjà dans la base de données (doublon détecté via SHA-256).", str(context.exception))
 
+    def test_single_update_accepts_any_proof_format(self):
+        # Format and size limits only apply to bulk results
+        tc = TestCaseModel.objects.create(test_case_ref='TC_05', campaign=self.campaign, tester=self.user)
+        proof = SimpleUploadedFile("trace.zip", b"zipped trace", content_type="application/zip")
+        serializer = TestCaseSerializer(instance=tc, data={'proof_file': proof}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(ValidationError):
+            TestCaseSerializer(instance=tc).validate_bulk_proof(proof)
+
+    def test_failed_save_discards_its_blob(self):
+        from django.db import DatabaseError, models
+        from core.models import ProofBlob
+        from utils.storage import blob_name, get_proof_storage
+
+        content = b"proof of a failed save"
+        tc = TestCaseModel(test_case_ref='TC_05', campaign=self.campaign, tester=self.user)
+        tc.proof_file = SimpleUploadedFile("proof.png", content, content_type="image/png")
+        with patch.object(models.Model, 'save', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            tc.save()
+        self.assertFalse(ProofBlob.objects.exists())
+        self.assertFalse(get_proof_storage().exists(blob_name(hashlib.sha256(content).hexdigest(), 'proof.png')))
+
+    def test_purged_blob_is_written_again_when_reused(self):
+        from core.models import ProofBlob
+        from utils.storage import get_proof_storage
+
+        content = b"proof deleted then uploaded again"
+        tc = TestCaseModel.objects.create(
+            test_case_ref='TC_06', campaign=self.campaign,
+            proof_file=SimpleUploadedFile("proof.png", content, content_type="image/png"),
+        )
+        name = tc.proof_file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            tc.delete()
+        self.assertFalse(get_proof_storage().exists(name))
+        self.assertFalse(ProofBlob.objects.exists())
+
+        again = TestCaseModel.objects.create(
+            test_case_ref='TC_07', campaign=self.campaign,
+            proof_file=SimpleUploadedFile("again.png", content, content_type="image/png"),
+        )
+        self.assertEqual(again.proof_file.name, name)
+        self.assertTrue(get_proof_storage().exists(name))
+        self.assertEqual(ProofBlob.objects.get().refcount, 1)
+
+
+class BulkResultsTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', email='manager@lloyd.com', password='password', role='MANAGER')
+        self.tester = User.objects.create_user(username='tester3', email='tester3@lloyd.com', password='password', role='TESTER')
+        self.project = Project.objects.create(name='Project 3')
+        self.campaign = Campaign.objects.create(title='Campaign 3', project=self.project, imported_by=self.manager)
+        self.cases = [
+            TestCaseModel.objects.create(test_case_ref=f'TC_B{i}', campaign=self.campaign, tester=self.tester)
+            for i in range(20)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.tester)
+
+    @patch('testCases.views.send_execution_digest_email')
+    def test_bulk_results_single_digest_per_manager(self, mock_email):
+        results = [
+            {"test_case_id": tc.id, "status": 'PASSED' if i % 2 else 'FAILED'}
+            for i, tc in enumerate(self.cases)
+        ]
+        response = self.client.post('/api/testcases/bulk-results/', {"results": results}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 20)
+
+        self.assertEqual(TestCaseModel.objects.filter(campaign=self.campaign, status='PASSED').count(), 10)
+        self.assertEqual(Notification.objects.filter(recipient=self.manager).count(), 1)
+        mock_email.assert_called_once()
+        self.assertEqual(len(mock_email.call_args[0][2]), 20)
+
+    def test_bulk_results_rejects_invalid_status(self):
+        response = self.client.post(
+            '/api/testcases/bulk-results/',
+            {"results": [{"test_case_id": self.cases[0].id, "status": 'DONE'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.cases[0].refresh_from_db()
+        self.assertEqual(self.cases[0].status, 'PENDING')
+
+    def test_bulk_results_rejects_unsupported_proof(self):
+        proof = SimpleUploadedFile('proof.exe', b'MZ binary', content_type='application/octet-stream')
+        response = self.client.post('/api/testcases/bulk-results/', {
+            'results': json.dumps([{"test_case_id": self.cases[0].id, "status": 'PASSED'}]),
+            f'proof_{self.cases[0].id}': proof,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['test_case_id'], self.cases[0].id)
+        self.cases[0].refresh_from_db()
+        self.assertEqual(self.cases[0].status, 'PENDING')
+        self.assertFalse(self.cases[0].proof_file)
+
+    def test_bulk_results_rollback_leaves_no_blob_or_email(self):
+        from core.models import ProofBlob
+        from emails.models import OutboxMessage
+        from utils.storage import blob_name, get_proof_storage
+
+        content = b'\x89PNG rolled back proof'
+        proof = SimpleUploadedFile('proof.png', content, content_type='image/png')
+        with patch('utils.invalidation.mark_campaign', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.client.post('/api/testcases/bulk-results/', {
+                'results': json.dumps([{"test_case_id": self.cases[0].id, "status": 'PASSED'}]),
+                f'proof_{self.cases[0].id}': proof,
+            }, format='multipart')
+
+        self.cases[0].refresh_from_db()
+        self.assertEqual(self.cases[0].status, 'PENDING')
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertFalse(ProofBlob.objects.exists())
+        name = blob_name(hashlib.sha256(content).hexdigest(), 'proof.png')
+        self.assertFalse(get_proof_storage().exists(name))
+
+    def test_bulk_results_hides_other_testers_cases(self):
+        other = User.objects.create_user(username='tester4', email='tester4@lloyd.com', password='password', role='TESTER')
+        foreign = TestCaseModel.objects.create(test_case_ref='TC_X', campaign=self.campaign, tester=other)
+        response = self.client.post(
+            '/api/testcases/bulk-results/',
+            {"results": [{"test_case_id": foreign.id, "status": 'PASSED'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class XlsxExportTestCase(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='xlsx_mgr', email='xlsx_mgr@lloyd.com', password='password', role='MANAGER')
+        self.tester = User.objects.create_user(
+            username='xlsx_tester', email='xlsx_tester@lloyd.com', password='password', role='TESTER', first_name='Léa',
+        )
+        self.campaign = Campaign.objects.create(title='Recette Été', project=Project.objects.create(name='P'), imported_by=self.manager)
+        self.failed = TestCaseModel.objects.create(
+            test_case_ref='TC_X1', campaign=self.campaign, tester=self.tester, status='FAILED',
+            data_json={'Module': 'Sinistres', 'Etape': 'Déclarer'},
+        )
+        TestCaseModel.objects.create(test_case_ref='TC_X2', campaign=self.campaign)
+        Anomalie.objects.create(test_case=self.failed, titre='Bug', description='', cree_par=self.manager)
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _sheet(self, response):
+        import io
+        from openpyxl import load_workbook
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+
+    def test_campaign_results_export(self):
+        ws = self._sheet(self.client.get(f'/api/campaigns/{self.campaign.id}/results-xlsx/'))
+        self.assertEqual(ws.title, 'Recette Été')
+        self.assertEqual(ws.max_row, 3)
+        row = [cell.value for cell in ws[2]]
+        self.assertEqual(row[:5], ['TC_X1', 'Recette Été', 'Sinistres', 'Échec', 'Léa'])
+        self.assertEqual(row[6], 1)
+        self.assertEqual(row[7], 'Module : Sinistres ; Etape : Déclarer')
+        self.assertIsNone(ws['F3'].value)
+
+    def test_test_case_export_uses_list_filters(self):
+        ws = self._sheet(self.client.get('/api/testcases/export-xlsx/', {'status': 'FAILED', 'campaign_id': self.campaign.id}))
+        self.assertEqual(ws.max_row, 2)
+        self.assertEqual(ws['A2'].value, 'TC_X1')
+
+
+class InvalidationBusTestCase(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name='Project 4')
+        self.campaign = Campaign.objects.create(title='Campaign 4', project=self.project)
+
+    @patch('utils.invalidation._send_events')
+    @patch('utils.invalidation._invalidate_caches')
+    def test_batch_flushes_once_on_commit(self, mock_invalidate, mock_send):
+        with self.captureOnCommitCallbacks(execute=True), invalidation.batch():
+            for i in range(5):
+                TestCaseModel.objects.create(test_case_ref=f'TC_I{i}', campaign=self.campaign, status='PASSED')
+            # Nothing is flushed before the transaction commits
+            mock_invalidate.assert_not_called()
+
+        mock_invalidate.assert_called_once()
+        self.assertEqual(mock_invalidate.call_args[0][0].campaigns, {self.campaign.id})
+        mock_send.assert_called_once()
+        events = mock_send.call_args[0][0]
+        self.assertEqual(len(events[f'campaign_{self.campaign.id}']), 5)
+
+    @patch('utils.invalidation._send_events')
+    @patch('utils.invalidation._invalidate_caches')
+    def test_rolled_back_changes_are_not_flushed(self, mock_invalidate, mock_send):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic(), invalidation.batch():
+                    TestCaseModel.objects.create(test_case_ref='TC_R', campaign=self.campaign, status='FAILED')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        mock_invalidate.assert_not_called()
+        mock_send.assert_not_called()
+
+
+class InvalidationOutsideTransactionTestCase(TransactionTestCase):
+    """Worker threads and management commands write in autocommit, outside any batch()."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bus_worker', email='bus_worker@lloyd.com', password='password')
+        self.campaign = Campaign.objects.create(title='Campaign 6', project=Project.objects.create(name='Project 6'))
+        self.test_case = TestCaseModel.objects.create(test_case_ref='TC_W', campaign=self.campaign)
+
+    def test_marks_outside_batch_are_flushed_at_once(self):
+        from core.models import DataVersion
+
+        campaign_version = DataVersion.objects.get(scope=f'campaign:{self.campaign.id}').version
+        Anomalie.objects.create(test_case=self.test_case, titre='Bug', description='', cree_par=self.user)
+        self.assertEqual(DataVersion.objects.get(scope='anomalies').version, 1)
+        self.assertEqual(DataVersion.objects.get(scope=f'campaign:{self.campaign.id}').version, campaign_version + 1)
+
+        Anomalie.objects.create(test_case=self.test_case, titre='Bug 2', description='', cree_par=self.user)
+        self.assertEqual(DataVersion.objects.get(scope='anomalies').version, 2)
+
+    def test_emit_outside_batch_is_sent(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('bus_outside', channel)
+
+        invalidation.emit('bus_outside', {'type': 'ping'})
+        self.assertEqual(async_to_sync(channel_layer.receive)(channel), {'type': 'live_event', 'payload': {'type': 'ping'}})
+
+
+class ModuleExtractionTestCase(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name='Project 5')
+        self.campaign = Campaign.objects.create(title='Campaign 5', project=self.project)
+
+    def test_extract_module_handles_dict_and_list_rows(self):
+        self.assertEqual(extract_module({'Module': 'Sinistres'}), 'Sinistres')
+        self.assertEqual(extract_module({'Domaine': ' Contrats '}), 'Contrats')
+        self.assertEqual(extract_module([{'Etape': 'a'}, {'Domaine': 'Facturation'}]), 'Facturation')
+        self.assertEqual(extract_module({'Etape': 'a'}), '')
+        self.assertEqual(extract_module(None), '')
+
+    def test_module_kept_in_sync_on_save(self):
+        tc = TestCaseModel.objects.create(test_case_ref='TC_M', campaign=self.campaign, data_json={'Module': 'Portail'})
+        self.assertEqual(TestCaseModel.objects.get(pk=tc.pk).module, 'Portail')
+        tc.data_json = {'Module': 'Reporting'}
+        tc.save(update_fields=['data_json'])
+        self.assertEqual(TestCaseModel.objects.get(pk=tc.pk).module, 'Reporting')
+
+    def test_backfill_command(self):
+        tc = TestCaseModel.objects.create(test_case_ref='TC_BF', campaign=self.campaign, data_json={'Module': 'Portail'})
+        TestCaseModel.objects.filter(pk=tc.pk).update(module='')
+        from django.core.management import call_command
+        from io import StringIO
+        call_command('backfill_test_case_modules', stdout=StringIO())
+        self.assertEqual(TestCaseModel.objects.get(pk=tc.pk).module, 'Portail')
+
+
+@override_settings(PLAYWRIGHT_WORKERS=2, PLAYWRIGHT_JOB_TIMEOUT=600)
+class ExecutionQueueTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+        patcher = patch('testCases.runner.project_dir', return_value=self.results_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # No worker threads in tests: jobs are claimed explicitly
+        for target in ('testCases.execution_queue.wake', 'testCases.execution_queue.ensure_started'):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.alice = User.objects.create_user(username='alice', email='alice@lloyd.com', password='password', role='TESTER')
+        self.bob = User.objects.create_user(username='bob', email='bob@lloyd.com', password='password', role='TESTER')
+        self.project = Project.objects.create(name='Project 6')
+        self.campaign = Campaign.objects.create(title='Campaign 6', project=self.project)
+        script = os.path.join(self.results_dir, 'spec.ts')
+        with open(script, 'w') as f:
+            f.write("test('ok', async () => {});")
+        self.cases = [
+            TestCaseModel.objects.create(
+                test_case_ref=f'TC_Q{i}', campaign=self.campaign, tester=self.alice,
+                automation_script_path=script,
+            )
+            for i in range(5)
+        ]
+
+    def test_execute_script_queues_once(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = f'/api/testcases/{self.cases[0].id}/execute-script/'
+        first = client.post(url, {'execution_mode': 'headless'}, format='json')
+        again = client.post(url, {'execution_mode': 'headless'}, format='json')
+        self.assertEqual(first.data['status'], 'QUEUED')
+        self.assertEqual(first.data['position'], 1)
+        self.assertEqual(again.data['job_id'], first.data['job_id'])
+        self.assertEqual(ExecutionJob.objects.count(), 1)
+
+        logs = client.get(f'/api/testcases/{self.cases[0].id}/live-logs/')
+        self.assertTrue(logs.data['running'])
+        self.assertTrue(logs.data['queued'])
+        self.assertIn('TC_Q0', logs.data['logs'])
+
+    def test_claim_is_bounded_and_fair(self):
+        # Alice queues three runs before Bob queues one
+        for tc in self.cases[:3]:
+            execution_queue.enqueue(tc, self.alice)
+        bob_job, _ = execution_queue.enqueue(self.cases[3], self.bob)
+
+        first = execution_queue.claim_next('w0')
+        second = execution_queue.claim_next('w1')
+        self.assertEqual(first.requested_by, self.alice)
+        self.assertEqual(second.pk, bob_job.pk)
+        # Both slots are busy
+        self.assertIsNone(execution_queue.claim_next('w2'))
+        self.assertEqual(ExecutionJob.objects.filter(status='RUNNING').count(), 2)
+
+    def test_cancel_queued_job(self):
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.post(f'/api/testcases/jobs/{job.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'CANCELLED')
+        self.assertIsNone(execution_queue.claim_next('w0'))
+
+        logs = client.get(f'/api/testcases/{self.cases[0].id}/live-logs/')
+        self.assertFalse(logs.data['running'])
+        self.assertEqual(logs.data['status'], 'CANCELLED')
+
+    def test_jobs_are_scoped_to_tester(self):
+        execution_queue.enqueue(self.cases[0], self.alice)
+        execution_queue.enqueue(self.cases[1], self.bob)
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        response = client.get('/api/testcases/jobs/')
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['test_case_ref'] for row in rows], ['TC_Q1'])
+
+    @patch('testCases.runner.run_job', return_value='PASSED')
+    def test_stats_reports_wait_and_run_times(self, mock_run):
+        execution_queue.enqueue(self.cases[0], self.alice)
+        execution_queue.execute(execution_queue.claim_next('w0'))
+        execution_queue.enqueue(self.cases[1], self.bob)
+
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.get('/api/testcases/jobs/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['queued'], 1)
+        self.assertEqual(response.data['running'], 0)
+        self.assertEqual(response.data['results'], {'PASSED': 1})
+        self.assertIsNotNone(response.data['wait_seconds']['p95'])
+
+    def test_run_process_enforces_timeout(self):
+        with tempfile.TemporaryFile('w+') as log_file:
+            returncode, outcome = runner.run_process(
+                [sys.executable, '-c', 'import time; time.sleep(30)'],
+                self.results_dir, None, log_file, timeout_seconds=0, is_cancelled=lambda: False,
+            )
+        self.assertEqual(outcome, 'TIMEOUT')
+        self.assertNotEqual(returncode, 0)
+
+
+@override_settings(PLAYWRIGHT_WORKERS=2, PLAYWRIGHT_JOB_TIMEOUT=600)
+class ConcurrentClaimTestCase(TemporaryMediaMixin, TransactionTestCase):
+    """Workers of several processes claim at the same time: the bound must hold in the database."""
+
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+        for target, kwargs in (
+            ('testCases.runner.project_dir', {'return_value': self.results_dir}),
+            ('testCases.execution_queue.wake', {}),
+            ('testCases.execution_queue.ensure_started', {}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        alice = User.objects.create_user(username='claim_alice', email='claim_alice@lloyd.com', password='pw', role='TESTER')
+        campaign = Campaign.objects.create(title='Campaign 7', project=Project.objects.create(name='Project 7'))
+        for i in range(6):
+            execution_queue.enqueue(TestCaseModel.objects.create(test_case_ref=f'TC_C{i}', campaign=campaign), alice)
+
+    def test_concurrent_claims_respect_the_bound(self):
+        real_now = timezone.now
+
+        def slow_now():
+            # Widen the window between counting the running jobs and claiming one
+            time.sleep(0.05)
+            return real_now()
+
+        start = threading.Barrier(6)
+        claimed, errors = [], []
+
+        def worker(name):
+            start.wait()
+            try:
+                while True:
+                    try:
+                        claimed.append(execution_queue.claim_next(name))
+                        return
+                    except OperationalError as exc:
+                        # The in-memory test database does not wait for locks like a file database
+                        if 'locked' not in str(exc):
+                            raise
+                        time.sleep(0.01)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        with patch('testCases.execution_queue.timezone.now', side_effect=slow_now):
+            threads = [threading.Thread(target=worker, args=(f'w{i}',)) for i in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len([job for job in claimed if job]), 2)
+        self.assertEqual(ExecutionJob.objects.filter(status='RUNNING').count(), 2)
+
+
+@override_settings(PLAYWRIGHT_BROWSER_POOL_SIZE=0)
+class SuiteExecutionTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+        patcher = patch('testCases.runner.project_dir', return_value=self.results_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for target in ('testCases.execution_queue.wake', 'testCases.execution_queue.ensure_started'):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.manager = User.objects.create_user(username='suite_mgr', email='suite_mgr@lloyd.com', password='password', role='MANAGER')
+        self.project = Project.objects.create(name='Project 7')
+        self.campaign = Campaign.objects.create(title='Campaign 7', project=self.project)
+        self.tests_dir = os.path.join(self.results_dir, 'tests', 'generated')
+        os.makedirs(self.tests_dir)
+        self.cases = []
+        for i in range(3):
+            script = os.path.join(self.tests_dir, f'test_{i}.spec.ts')
+            with open(script, 'w') as f:
+                f.write(f"test('cas {i}', async () => {{}});")
+            self.cases.append(TestCaseModel.objects.create(
+                test_case_ref=f'TC_S{i}', campaign=self.campaign, automation_script_path=script,
+            ))
+        # Not automated: skipped by the suite
+        TestCaseModel.objects.create(test_case_ref='TC_MANUAL', campaign=self.campaign)
+
+    def _report(self):
+        def spec(i, ok):
+            result = {'status': 'passed' if ok else 'failed', 'duration': 1200, 'attachments': []}
+            if not ok:
+                result['errors'] = [{'message': 'Timeout 30000ms exceeded'}]
+            return {'title': f'cas {i}', 'ok': ok, 'file': f'generated/test_{i}.spec.ts',
+                    'tests': [{'results': [result]}]}
+        return {
+            'config': {'rootDir': os.path.join(self.results_dir, 'tests')},
+            'suites': [{'title': 'generated', 'suites': [
+                {'file': f'generated/test_{i}.spec.ts', 'specs': [spec(i, i != 1)]} for i in range(3)
+            ]}],
+            'errors': [],
+        }
+
+    def test_run_suite_endpoint_queues_single_job(self):
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        response = client.post('/api/testcases/run-suite/', {'campaign_id': self.campaign.id, 'workers': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['skipped']), 1)
+        job = ExecutionJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.test_case_ids, sorted(tc.id for tc in self.cases))
+        self.assertEqual(job.workers, 2)
+
+    def test_suite_maps_report_back_to_test_cases(self):
+        report = self._report()
+
+        def fake_run(cmd, cwd, env, log_file, timeout_seconds, is_cancelled):
+            self.assertIn('--workers=4', cmd)
+            self.assertEqual(sum(1 for arg in cmd if arg.endswith('.spec.ts')), 3)
+            with open(env['PLAYWRIGHT_JSON_OUTPUT_NAME'], 'w') as f:
+                json.dump(report, f)
+            return 1, None
+
+        job = execution_queue.enqueue_suite(self.cases, self.manager, campaign=self.campaign, workers=4)
+        claimed = execution_queue.claim_next('w0')
+        rollups.rebuild_all()  # setUp writes never committed
+        with patch('testCases.runner.run_process', side_effect=fake_run), \
+                patch('analytics.groq_service.GroqService.generate_anomaly_from_logs',
+                      return_value=('Timeout de chargement applicatif', 'Le bouton reste absent.')) as groq, \
+                self.assertNoLogs('analytics.rollups', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            outcome = execution_queue.execute(claimed)
+
+        self.assertEqual(outcome, 'FAILED')
+        statuses = dict(TestCaseModel.objects.filter(campaign=self.campaign).values_list('test_case_ref', 'status'))
+        self.assertEqual(statuses, {'TC_S0': 'PASSED', 'TC_S1': 'FAILED', 'TC_S2': 'PASSED', 'TC_MANUAL': 'PENDING'})
+        failed = TestCaseModel.objects.get(test_case_ref='TC_S1')
+        log = failed.execution_logs.get()
+        self.assertIn('Timeout 30000ms exceeded', log.text)
+        self.assertEqual(failed.anomalies.count(), 1)
+        self.assertEqual(log.anomaly_id, failed.anomalies.get().id)
+        # Suite failures go through the same triage and model diagnosis as single runs
+        anomaly = failed.anomalies.get()
+        self.assertEqual(anomaly.titre, 'Timeout de chargement applicatif')
+        self.assertIn('--- EXTRAIT DES LOGS ---', anomaly.description)
+        self.assertIn('Timeout 30000ms exceeded', anomaly.description)
+        self.assertEqual(groq.call_args.kwargs['excerpt'], triage_logs(log.text)['excerpt'])
+        self.assertEqual(log.job_id, job.id)
+        self.assertNotIn('execution_logs', failed.data_json)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('DONE', 'FAILED'))
+        self.assertEqual(job.summary['passed'], 2)
+        self.assertEqual(job.summary['failed'], 1)
+        # Bulk writes report their bucket changes to the dashboard rollups
+        self.assertEqual(rollups.reconcile(), [])
+
+    def test_missing_spec_in_report_counts_as_failed(self):
+        report = self._report()
+        report['suites'][0]['suites'].pop()  # test_2 crashed before reporting
+        outcomes = runner.parse_json_report(report, '')
+        by_path = {os.path.normpath(tc.automation_script_path): [tc] for tc in self.cases}
+        self.assertNotIn(os.path.normpath(self.cases[2].automation_script_path), outcomes)
+        job = execution_queue.enqueue_suite(self.cases, self.manager)
+        summary = runner.apply_suite_results(job, by_path, outcomes, ['Worker crashed'])
+        self.assertEqual(summary['failed'], 2)
+        self.assertEqual(TestCaseModel.objects.get(pk=self.cases[2].pk).execution_logs.get().text, 'Worker crashed')
+
+
+class IncrementalLogTestCase(TestCase):
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+        patcher = patch('testCases.runner.project_dir', return_value=self.results_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='log_admin', email='log_admin@lloyd.com', password='password', role='ADMIN')
+        self.project = Project.objects.create(name='Project 8')
+        self.campaign = Campaign.objects.create(title='Campaign 8', project=self.project)
+        self.test_case = TestCaseModel.objects.create(test_case_ref='TC_L', campaign=self.campaign)
+        _, self.live_log_path, _ = runner.execution_paths(self.test_case.id)
+        os.makedirs(os.path.dirname(self.live_log_path), exist_ok=True)
+
+    def _append(self, data):
+        with open(self.live_log_path, 'ab') as f:
+            f.write(data)
+
+    def test_read_log_delta_keeps_multibyte_characters_whole(self):
+        self._append('▶ début\n'.encode() + 'é'.encode()[:1])
+        text, offset, reset = runner.read_log_delta(self.live_log_path, 0)
+        self.assertEqual(text, '▶ début\n')
+        self._append('é'.encode()[1:] + b't\n')
+        text, offset, _ = runner.read_log_delta(self.live_log_path, offset)
+        self.assertEqual(text, 'ét\n')
+        self.assertEqual(offset, os.path.getsize(self.live_log_path))
+        # Shorter file: a new run started
+        self.assertTrue(runner.read_log_delta(self.live_log_path, offset + 100)[2])
+
+    def test_live_logs_offset_returns_only_new_output(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/testcases/{self.test_case.id}/live-logs/'
+        self._append(b'ligne 1\n')
+        first = client.get(url)
+        self.assertEqual(first.data['logs'], 'ligne 1\n')
+        self._append(b'ligne 2\n')
+        second = client.get(url, {'offset': first.data['offset']})
+        self.assertEqual(second.data['logs'], 'ligne 2\n')
+        self.assertTrue(second.data['running'])
+
+        runner.write_result(self.test_case.id, {'status': 'PASSED', 'logs': 'ligne 1\nligne 2\nfin\n', 'anomaly_id': None})
+        final = client.get(url, {'offset': second.data['offset']})
+        self.assertFalse(final.data['running'])
+        self.assertEqual(final.data['logs'], 'fin\n')
+
+    def test_publisher_pushes_deltas_to_group(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'testcase_logs_{self.test_case.id}', channel)
+        publisher = runner.LogPublisher(self.test_case.id, self.live_log_path)
+
+        self._append(b'a\n')
+        publisher()
+        publisher()  # nothing new: no message
+        self._append(b'b\n')
+        publisher()
+
+        first = async_to_sync(channel_layer.receive)(channel)
+        second = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual((first['message'], first['offset']), ('a\n', 2))
+        self.assertEqual((second['message'], second['offset']), ('b\n', 4))
+
+
+class FakeServer:
+    def __init__(self, n):
+        self.ws_endpoint = f'ws://127.0.0.1:{9000 + n}/'
+        self.runs = 0
+        self.busy = False
+        self.started_at = 0
+        self.alive = True
+        self.stopped = False
+
+    def healthy(self):
+        return self.alive
+
+    def stop(self):
+        self.stopped = True
+
+
+class BrowserPoolTestCase(TestCase):
+    def setUp(self):
+        self.started = []
+
+        def start(cwd):
+            server = FakeServer(len(self.started))
+            self.started.append(server)
+            return server
+
+        patcher = patch.object(browser_pool.BrowserServer, 'start', side_effect=start)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = browser_pool.BrowserPool('/tmp', size=2, max_runs=3)
+
+    def test_servers_are_reused_then_recycled(self):
+        endpoints = []
+        for _ in range(4):
+            with self.pool.lease() as ws:
+                endpoints.append(ws)
+        # One warm server for three runs, then a fresh one
+        self.assertEqual(endpoints[:3], [self.started[0].ws_endpoint] * 3)
+        self.assertEqual(endpoints[3], self.started[1].ws_endpoint)
+        self.assertTrue(self.started[0].stopped)
+
+    def test_concurrent_leases_use_distinct_servers(self):
+        with self.pool.lease() as first, self.pool.lease() as second:
+            self.assertNotEqual(first, second)
+        self.assertEqual(len(self.started), 2)
+
+    def test_unhealthy_server_is_replaced(self):
+        with self.pool.lease():
+            pass
+        self.started[0].alive = False
+        with self.pool.lease() as ws:
+            self.assertEqual(ws, self.started[1].ws_endpoint)
+        self.assertTrue(self.started[0].stopped)
+
+    def test_unhealthy_server_is_stopped_outside_the_lock(self):
+        with self.pool.lease():
+            pass
+        server = self.started[0]
+        server.alive = False
+        lock_free = []
+
+        def stop():
+            # Probe from another thread: the condition's lock is reentrant
+            def probe():
+                acquired = self.pool._cond.acquire(blocking=False)
+                if acquired:
+                    self.pool._cond.release()
+                lock_free.append(acquired)
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+
+        server.stop = stop
+        with self.pool.lease():
+            pass
+        self.assertEqual(lock_free, [True])
+
+    def test_start_failure_falls_back_to_cold_launch(self):
+        with patch.object(browser_pool.BrowserServer, 'start', side_effect=RuntimeError('node absent')):
+            with self.pool.lease() as ws:
+                self.assertIsNone(ws)
+        self.assertEqual(self.pool.servers, [])
+
+
+BROWSER_SERVER_STUB = """
+import socket, sys, time
+server = socket.socket()
+server.bind(('127.0.0.1', 0))
+server.listen()
+print(f'ws://127.0.0.1:{server.getsockname()[1]}/', flush=True)
+sys.stdout.write('x' * 200000 + '\\n')
+sys.stdout.flush()
+open(sys.argv[1], 'w').close()
+time.sleep(30)
+"""
+
+
+class BrowserServerOutputTestCase(TestCase):
+    def test_output_after_endpoint_does_not_block_the_server(self):
+        marker = os.path.join(tempfile.mkdtemp(), 'flushed')
+        self.addCleanup(shutil.rmtree, os.path.dirname(marker))
+        popen = subprocess.Popen
+
+        def stub(args, **kwargs):
+            return popen([sys.executable, '-c', BROWSER_SERVER_STUB, marker], **kwargs)
+
+        with patch('testCases.browser_pool.subprocess.Popen', side_effect=stub):
+            server = browser_pool.BrowserServer.start('/tmp')
+        self.addCleanup(server.stop)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(marker) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # Past the pipe buffer: only a drained stdout lets the write complete
+        self.assertTrue(os.path.exists(marker))
+
+
+class ArtifactManifestTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+        patcher = patch('testCases.runner.project_dir', return_value=self.results_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='art_admin', email='art_admin@lloyd.com', password='password', role='ADMIN')
+        self.project = Project.objects.create(name='Project 9')
+        self.campaign = Campaign.objects.create(title='Campaign 9', project=self.project)
+        self.test_case = TestCaseModel.objects.create(test_case_ref='TC_A', campaign=self.campaign)
+        self.output_dir = runner.execution_paths(self.test_case.id)[0]
+
+    def test_lookup_reads_manifest_not_other_runs(self):
+        # Another test's output must never be picked up
+        other = os.path.join(self.results_dir, 'test-results', 'test_999')
+        os.makedirs(other)
+        open(os.path.join(other, 'video.webm'), 'wb').close()
+        self.assertEqual(runner.find_playwright_artifacts(self.results_dir, self.test_case.id), (None, None))
+
+        runner.write_manifest(self.output_dir, {'screenshot': '/x/shot.png', 'video': '/x/run.webm', 'trace': None})
+        self.assertEqual(
+            runner.find_playwright_artifacts(self.results_dir, self.test_case.id), ('/x/shot.png', '/x/run.webm')
+        )
+
+    def test_serve_video_uses_recorded_artifacts(self):
+        video = os.path.join(self.results_dir, 'run.webm')
+        with open(video, 'wb') as f:
+            f.write(b'webm')
+        ExecutionJob.objects.create(
+            test_case=self.test_case, requested_by=self.user, status='DONE', artifacts={'video': video},
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with patch('testCases.views.find_playwright_artifacts') as scan:
+            response = client.get(f'/api/testcases/{self.test_case.id}/serve-video/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'webm')
+        scan.assert_not_called()
+
+    def test_prune_keeps_recent_and_active_outputs(self):
+        results = os.path.join(self.results_dir, 'test-results')
+        old_time = (timezone.now() - timedelta(days=30)).timestamp()
+        active = TestCaseModel.objects.create(test_case_ref='TC_ACTIVE', campaign=self.campaign)
+        ExecutionJob.objects.create(test_case=active, requested_by=self.user, status='RUNNING')
+        done = ExecutionJob.objects.create(
+            test_case=self.test_case, requested_by=self.user, status='DONE',
+            finished_at=timezone.now() - timedelta(days=30), artifacts={'video': '/old.webm'},
+        )
+        for name in (f'test_{self.test_case.id}', f'test_{active.id}', 'test_12345'):
+            os.makedirs(os.path.join(results, name))
+            with open(os.path.join(results, name, 'video.webm'), 'wb') as f:
+                f.write(b'x' * 10)
+        for name in (f'test_{self.test_case.id}', f'test_{active.id}'):
+            os.utime(os.path.join(results, name), (old_time, old_time))
+        open(os.path.join(results, '.last-run.json'), 'w').close()
+        os.utime(os.path.join(results, '.last-run.json'), (old_time, old_time))
+
+        call_command('prune_test_results', '--days', '14', stdout=StringIO())
+
+        self.assertEqual(sorted(os.listdir(results)), sorted(['.last-run.json', f'test_{active.id}', 'test_12345']))
+        done.refresh_from_db()
+        self.assertEqual(done.artifacts, {})
+
+
+class ExecutionLogStoreTestCase(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.manager = User.objects.create_user(username='log_mgr', email='log_mgr@x.com', password='pw', role='MANAGER')
+        self.project = Project.objects.create(name='Log Project')
+        self.campaign = Campaign.objects.create(title='Log Campaign', project=self.project, imported_by=self.manager)
+        self.test_case = TestCaseModel.objects.create(
+            campaign=self.campaign, test_case_ref='TC_LOG', data_json={'Etape': 'Ouvrir la page'}, status='FAILED',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+        noise = '\n'.join(f'pw:api navigating to page {i}' for i in range(5000))
+        self.output = f'Running 1 test\n{noise}\nError: locator.click: Timeout 30000ms exceeded\n  at spec.ts:12\nfin'
+
+    def test_log_is_compressed_with_error_excerpt(self):
+        log = ExecutionLog.build(self.test_case, self.output, status='FAILED')
+        log.save()
+        log = ExecutionLog.objects.get(pk=log.pk)
+        self.assertEqual(log.text, self.output)
+        self.assertEqual(log.size, len(self.output.encode('utf-8')))
+        self.assertLess(len(bytes(log.content)), log.size // 10)
+        self.assertIn('Timeout 30000ms exceeded', log.excerpt)
+        self.assertIn('at spec.ts:12', log.excerpt)
+        self.assertNotIn('pw:api', log.excerpt)
+        self.assertEqual(log.tail(1), 'fin')
+        self.assertEqual(log.head(1), 'Running 1 test')
+
+    def test_excerpt_falls_back_to_last_lines(self):
+        self.assertEqual(extract_log_excerpt('a\nb\nc'), 'a\nb\nc')
+        self.assertEqual(extract_log_excerpt(''), '')
+
+    def test_migration_moves_legacy_logs(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module('testCases.migrations.0016_move_execution_logs')
+        anomaly = Anomalie.objects.create(test_case=self.test_case, titre='Bug', description='', cree_par=self.manager)
+        other = TestCaseModel.objects.create(campaign=self.campaign, test_case_ref='TC_LOG2', status='FAILED')
+        TestCaseModel.objects.filter(pk=self.test_case.pk).update(
+            data_json={'Etape': 'Ouvrir la page', 'execution_logs': self.output, 'anomaly_id': anomaly.id},
+        )
+        TestCaseModel.objects.filter(pk=other.pk).update(data_json={'execution_logs': 'Error: x', 'anomaly_id': 999999})
+
+        migration.move_logs_out_of_data_json(apps, None)
+
+        log = ExecutionLog.objects.get(test_case=self.test_case)
+        self.assertEqual((log.text, log.anomaly_id), (self.output, anomaly.id))
+        # The frozen excerpt logic still matches the model's
+        self.assertEqual(log.excerpt, extract_log_excerpt(self.output))
+        self.assertIsNone(ExecutionLog.objects.get(test_case=other).anomaly_id)
+        self.assertEqual(TestCaseModel.objects.get(pk=self.test_case.pk).data_json, {'Etape': 'Ouvrir la page'})
+
+    def test_list_carries_excerpt_and_endpoints_serve_parts(self):
+        ExecutionLog.build(self.test_case, 'premier run ok', status='PASSED').save()
+        latest = ExecutionLog.build(self.test_case, self.output, status='FAILED')
+        latest.save()
+
+        # List rows are compact (utils.fieldsets): the excerpt and Excel data are asked for
+        listed = self.client.get('/api/testcases/?fields=execution_log_excerpt,data_json')
+        row = next(r for r in listed.data['results'] if r['id'] == self.test_case.id)
+        self.assertIn('Timeout 30000ms exceeded', row['execution_log_excerpt'])
+        self.assertEqual(row['data_json'], {'Etape': 'Ouvrir la page'})
+
+        history = self.client.get(f'/api/testcases/{self.test_case.id}/execution-logs/')
+        self.assertEqual([h['id'] for h in history.data], [latest.id, latest.id - 1])
+        self.assertNotIn('content', history.data[0])
+
+        tail = self.client.get(f'/api/testcases/{self.test_case.id}/execution-logs/{latest.id}/?part=tail&lines=2')
+        self.assertEqual(tail.data['content'], '  at spec.ts:12\nfin')
+        errors = self.client.get(f'/api/testcases/{self.test_case.id}/execution-logs/{latest.id}/?part=errors')
+        self.assertEqual(errors.data['content'], latest.excerpt)
+        self.assertEqual(
+            self.client.get(f'/api/testcases/{self.test_case.id}/execution-logs/{latest.id}/?part=bogus').status_code, 400,
+        )
+        self.assertEqual(self.client.get(f'/api/testcases/{self.test_case.id}/execution-logs/999999/').status_code, 404)
+
+    @patch('testCases.execution_queue.ensure_started')
+    def test_live_logs_fallback_reads_latest_log(self, _ensure_started):
+        ExecutionLog.build(self.test_case, self.output, status='FAILED').save()
+        with tempfile.TemporaryDirectory() as tmp, patch('testCases.runner.project_dir', return_value=tmp):
+            response = self.client.get(f'/api/testcases/{self.test_case.id}/live-logs/')
+        self.assertEqual(response.data['logs'], self.output)
+        self.assertEqual(response.data['status'], 'FAILED')
+
+
+@override_settings(PLAYWRIGHT_WORKERS=1, RUNNER_AGENT_LEASE_SECONDS=30, RUNNER_AGENT_MAX_ATTEMPTS=3)
+class RunnerAgentTestCase(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir, ignore_errors=True)
+        for target, kwargs in (
+            ('testCases.runner.project_dir', {'return_value': self.results_dir}),
+            ('testCases.execution_queue.wake', {}),
+            ('testCases.execution_queue.ensure_started', {}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.alice = User.objects.create_user(username='agent_alice', email='agent_alice@lloyd.com', password='pw', role='TESTER')
+        self.campaign = Campaign.objects.create(title='Agent Campaign', project=Project.objects.create(name='Agent Project'))
+        script = os.path.join(self.results_dir, 'tests', 'tester', 'spec_agent.spec.ts')
+        os.makedirs(os.path.dirname(script))
+        with open(script, 'w') as f:
+            f.write("test('ok', async () => {});")
+        self.cases = [
+            TestCaseModel.objects.create(
+                test_case_ref=f'TC_A{i}', campaign=self.campaign, tester=self.alice, automation_script_path=script,
+            )
+            for i in range(4)
+        ]
+        self.agent_a, token_a = RunnerAgent.register('agent-a', capacity=1)
+        self.agent_b, token_b = RunnerAgent.register('agent-b', capacity=2)
+        self.client_a, self.client_b = APIClient(), APIClient()
+        self.client_a.credentials(HTTP_AUTHORIZATION=f'Agent {token_a}')
+        self.client_b.credentials(HTTP_AUTHORIZATION=f'Agent {token_b}')
+
+    def test_agents_claim_within_their_capacity(self):
+        for tc in self.cases:
+            execution_queue.enqueue(tc, self.alice)
+
+        claimed = self.client_a.post('/api/testcases/agent/claim/')
+        self.assertEqual(claimed.status_code, 200)
+        self.assertEqual(claimed.data['script_path'], os.path.join('tests', 'tester', 'spec_agent.spec.ts'))
+        self.assertIn("test('ok'", claimed.data['script'])
+        self.assertEqual(self.client_a.post('/api/testcases/agent/claim/').status_code, 204)
+
+        self.assertEqual(self.client_b.post('/api/testcases/agent/claim/').status_code, 200)
+        self.assertEqual(self.client_b.post('/api/testcases/agent/claim/').status_code, 200)
+        self.assertEqual(self.client_b.post('/api/testcases/agent/claim/').status_code, 204)
+        # Agents do not use the local PLAYWRIGHT_WORKERS slot
+        self.assertIsNotNone(execution_queue.claim_next('local-0'))
+
+        self.assertEqual(ExecutionJob.objects.filter(agent=self.agent_b, status='RUNNING').count(), 2)
+        self.agent_a.refresh_from_db()
+        self.assertTrue(self.agent_a.is_online)
+
+    def test_expired_lease_is_requeued_to_another_agent(self):
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        self.assertEqual(self.client_a.post('/api/testcases/agent/claim/').data['job_id'], job.id)
+
+        # agent-a stops heartbeating
+        ExecutionJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        taken_over = self.client_b.post('/api/testcases/agent/claim/')
+        self.assertEqual(taken_over.data['job_id'], job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.agent_id, job.attempts), (self.agent_b.id, 2))
+
+        self.assertEqual(self.client_a.post(f'/api/testcases/agent/jobs/{job.id}/heartbeat/', {}, format='json').status_code, 409)
+        late = self.client_a.post(f'/api/testcases/agent/jobs/{job.id}/complete/', {'outcome': 'PASSED', 'logs': 'ok'})
+        self.assertEqual(late.status_code, 409)
+
+    def test_lease_gives_up_after_max_attempts(self):
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        self.client_a.post('/api/testcases/agent/claim/')
+        ExecutionJob.objects.filter(pk=job.pk).update(attempts=3, lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(execution_queue.requeue_expired(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('DONE', 'ERROR'))
+
+    def test_heartbeat_streams_output_and_reports_cancel(self):
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        self.client_a.post('/api/testcases/agent/claim/')
+        beat = self.client_a.post(f'/api/testcases/agent/jobs/{job.id}/heartbeat/', {'logs': 'pw:api click\n'}, format='json')
+        self.assertFalse(beat.data['cancel_requested'])
+        _, live_log_path, _ = runner.execution_paths(self.cases[0].id)
+        with open(live_log_path) as f:
+            self.assertIn('pw:api click', f.read())
+
+        execution_queue.cancel(job)
+        beat = self.client_a.post(f'/api/testcases/agent/jobs/{job.id}/heartbeat/', {}, format='json')
+        self.assertTrue(beat.data['cancel_requested'])
+
+    @patch('analytics.groq_service.GroqService.generate_anomaly_from_logs', return_value=('Échec', 'Bouton absent'))
+    def test_complete_records_result_and_artifacts(self, _groq):
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        self.client_a.post('/api/testcases/agent/claim/')
+        screenshot = SimpleUploadedFile('shot.png', b'\x89PNG agent', content_type='image/png')
+        response = self.client_a.post(f'/api/testcases/agent/jobs/{job.id}/complete/', {
+            'outcome': 'FAILED', 'logs': 'Error: locator not found', 'screenshot': screenshot,
+        })
+        self.assertEqual(response.status_code, 200)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('DONE', 'FAILED'))
+        tc = TestCaseModel.objects.get(pk=self.cases[0].pk)
+        self.assertEqual(tc.status, 'FAILED')
+        self.assertTrue(tc.proof_file)
+        self.assertEqual(response.data['anomaly_id'], tc.anomalies.get().id)
+        self.assertEqual(tc.execution_logs.get().job_id, job.id)
+        self.assertTrue(os.path.exists(job.artifacts['screenshot']))
+
+    @patch('analytics.groq_service.GroqService.generate_anomaly_from_logs', return_value=('Échec', 'Bouton absent'))
+    def test_worker_outcome_bumps_report_versions(self, _groq):
+        from core.models import DataVersion
+
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        self.client_a.post('/api/testcases/agent/claim/')
+        job.refresh_from_db()
+        campaign_scope = f'campaign:{self.campaign.id}'
+        before = dict(DataVersion.objects.values_list('scope', 'version'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            anomaly_id = runner.record_outcome(job, 'FAILED', 'Error: locator not found', {})
+
+        self.assertIsNotNone(anomaly_id)
+        after = dict(DataVersion.objects.values_list('scope', 'version'))
+        self.assertGreater(after['anomalies'], before.get('anomalies', 0))
+        self.assertGreater(after[campaign_scope], before.get(campaign_scope, 0))
+
+    @patch('analytics.groq_service.GroqService.generate_anomaly_from_logs', return_value=('Échec', 'Bouton absent'))
+    def test_worker_outcome_refreshes_rollups(self, _groq):
+        from analytics.models import AnomalyRollup, TestCaseRollup
+        from analytics.rollups import rebuild_all
+
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        self.client_a.post('/api/testcases/agent/claim/')
+        job.refresh_from_db()
+        rebuild_all()  # setUp writes never committed
+
+        # The outcome moves the test case between buckets: no campaign recompute
+        with self.assertNoLogs('analytics.rollups', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            runner.record_outcome(job, 'FAILED', 'Error: locator not found', {})
+
+        failed = TestCaseRollup.objects.get(campaign=self.campaign, status='FAILED')
+        self.assertEqual((failed.count, failed.tester_id), (1, self.alice.id))
+        self.assertEqual(failed.day, timezone.localdate())
+        anomalies = AnomalyRollup.objects.get(campaign=self.campaign)
+        self.assertEqual((anomalies.count, anomalies.statut), (1, 'OUVERTE'))
+
+    def test_rejects_unknown_token_and_user_jwt(self):
+        stranger = APIClient()
+        stranger.credentials(HTTP_AUTHORIZATION='Agent nope')
+        self.assertEqual(stranger.post('/api/testcases/agent/claim/').status_code, 401)
+        user = APIClient()
+        user.force_authenticate(self.alice)
+        self.assertIn(user.post('/api/testcases/agent/claim/').status_code, (401, 403))
+
+    def test_agent_does_not_import_django(self):
+        import subprocess
+        from django.conf import settings
+
+        probe = "import sys, testCases.agent; print(sorted({m.split('.')[0] for m in sys.modules} & {'django', 'rest_framework'}))"
+        out = subprocess.run([sys.executable, '-c', probe], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), '[]')
+
+    def test_agent_process_runs_claimed_job(self):
+        job, _ = execution_queue.enqueue(self.cases[0], self.alice)
+        payload = self.client_a.post('/api/testcases/agent/claim/').data
+        payload['heartbeat_seconds'] = 60
+        project = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project, ignore_errors=True)
+
+        class FakeClient:
+            hostname = 'test-host'
+            completed = None
+
+            def heartbeat(self, job_id, logs=''):
+                return {}
+
+            def complete(self, job_id, outcome, logs, artifacts):
+                FakeClient.completed = (job_id, outcome, logs)
+
+        def fake_run(cmd, cwd, env, log_file, timeout_seconds, is_cancelled):
+            self.assertEqual(cwd, project)
+            self.assertTrue(os.path.exists(cmd[3]))
+            log_file.write('1 passed\n')
+            return 0, None
+
+        with patch('testCases.agent.run_process', side_effect=fake_run):
+            outcome = Agent(FakeClient(), project).execute(payload)
+        self.assertEqual(outcome, 'PASSED')
+        self.assertEqual(FakeClient.completed[:2], (job.id, 'PASSED'))
+        self.assertIn('1 passed', FakeClient.completed[2])
+
+
+@override_settings(SCRIPT_GENERATION_CONCURRENCY=2)
+class ScriptGenerationTestCase(TestCase):
+    def setUp(self):
+        for target, kwargs in (
+            ('analytics.groq_service.GroqService.__init__', {'return_value': None}),
+            ('testCases.script_generation.start', {}),
+        ):
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.manager = User.objects.create_user(username='gen_mgr', email='gen_mgr@lloyd.com', password='pw', role='MANAGER')
+        self.campaign = Campaign.objects.create(title='Gen Campaign', project=Project.objects.create(name='Gen Project'))
+        self.cases = [
+            TestCaseModel.objects.create(
+                test_case_ref=f'TC_G{i}', campaign=self.campaign, data_json={'Etape': f'Ouvrir la page {i}'},
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def _run(self, force=False):
+        job = script_generation.enqueue_generation(self.cases, self.manager, campaign=self.campaign, force=force)
+        return script_generation.run_generation(job)
+
+    @patch('analytics.groq_service.GroqService.generate_playwright_test', side_effect=lambda title, data: f'// {title}')
+    def test_unchanged_cases_are_served_from_cache(self, generate):
+        job = self._run()
+        self.assertEqual((job.status, job.generated, job.cached), ('DONE', 3, 0))
+        self.assertEqual(generate.call_count, 3)
+        self.assertEqual(TestCaseModel.objects.get(pk=self.cases[1].pk).automation_code, '// TC_G1')
+
+        job = self._run()
+        self.assertEqual((job.generated, job.cached), (0, 3))
+        self.assertEqual(generate.call_count, 3)
+
+        TestCaseModel.objects.filter(pk=self.cases[0].pk).update(data_json={'Etape': 'Autre page'})
+        self.cases[0].refresh_from_db()
+        job = self._run()
+        self.assertEqual((job.generated, job.cached), (1, 2))
+        self.assertEqual(generate.call_count, 4)
+
+        self._run(force=True)
+        self.assertEqual(generate.call_count, 7)
+        self.assertEqual(GeneratedScript.objects.count(), 4)
+
+    @override_settings(SCRIPT_GENERATION_CONCURRENCY=1)
+    @patch('analytics.groq_service.GroqService.generate_playwright_test', side_effect=Exception('Error code: 429 rate limit'))
+    def test_quota_error_opens_the_circuit(self, generate):
+        job = self._run()
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual((job.status, job.failed), ('FAILED', 3))
+        self.assertEqual(len(job.errors), 3)
+
+    @patch('utils.invalidation._send_events')
+    @patch('analytics.groq_service.GroqService.generate_playwright_test', return_value='// code')
+    def test_endpoint_queues_job_and_streams_progress(self, _generate, send_events):
+        response = self.client.post('/api/testcases/generate-scripts/', {'campaign_id': self.campaign.id}, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = ScriptGenerationJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.test_case_ids, sorted(tc.id for tc in self.cases))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            script_generation.run_generation(job)
+        payloads = [
+            payload
+            for call in send_events.call_args_list
+            for payload in call.args[0].get(f'campaign_{self.campaign.id}', [])
+        ]
+        self.assertEqual([p['status'] for p in payloads][-1], 'done')
+        self.assertEqual(sum(len(p['tc_ids']) for p in payloads if p['status'] == 'generated'), 3)
+
+        status = self.client.get(f'/api/testcases/generate-scripts/{job.id}/')
+        self.assertEqual((status.data['status'], status.data['generated']), ('DONE', 3))
+
+    def test_status_is_scoped_to_visible_jobs(self):
+        job = script_generation.enqueue_generation(self.cases, self.manager, campaign=self.campaign)
+        outsider = User.objects.create_user(username='gen_outsider', email='gen_out@lloyd.com', password='pw', role='TESTER')
+        client = APIClient()
+        client.force_authenticate(outsider)
+        self.assertEqual(client.get(f'/api/testcases/generate-scripts/{job.id}/').status_code, 404)
+
+        # A tester who sees the campaign's test cases can follow its generation
+        TestCaseModel.objects.filter(pk=self.cases[0].pk).update(tester=outsider)
+        self.assertEqual(client.get(f'/api/testcases/generate-scripts/{job.id}/').status_code, 200)
+
+    @patch('analytics.groq_service.GroqService.generate_playwright_test', return_value='// code')
+    def test_generate_script_action_reuses_cache(self, generate):
+        url = f'/api/testcases/{self.cases[0].id}/generate-script/'
+        self.assertFalse(self.client.post(url, {}, format='json').data['cached'])
+        self.assertTrue(self.client.post(url, {}, format='json').data['cached'])
+        self.assertEqual(generate.call_count, 1)
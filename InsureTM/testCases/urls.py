@@ -1,8 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TestCaseViewSet
+from .agent_api import RunnerAgentViewSet
+from .views import ExecutionJobViewSet, TestCaseViewSet
 
 router = DefaultRouter()
+# Registered before the catch-all prefix so 'jobs/' and 'agent/' are not read as a test case id
+router.register(r'jobs', ExecutionJobViewSet, basename='execution-job')
+router.register(r'agent', RunnerAgentViewSet, basename='runner-agent')
 router.register(r'', TestCaseViewSet, basename='testcase')
 
 urlpatterns = [
@@ -1,49 +1,92 @@
+import json
 import logging
 import os
-import subprocess
+from collections import defaultdict
 from django.utils import timezone
 
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.conf import settings
 from analytics.groq_service import GroqService
+from analytics.rollups import count_saved
 from anomalies.models import Anomalie
 
 from notifications.models import Notification
-from utils.email_service import send_execution_validated_email
-from .models import TestCase
-from .serializers import TestCaseSerializer
+from notifications.service import bulk_notify, notify
+from utils.email_service import send_execution_validated_email, send_execution_digest_email
+from utils.fieldsets import SPARSE_ACTIONS, SparseFieldsViewMixin
+from utils.search import search as search_queryset
+from utils.xlsx_export import Column, xlsx_response
+from utils.storage import discard_blobs, file_sha256, sync_blob_refs
+from . import execution_queue
+from .models import ExecutionJob, ExecutionLog, ScriptGenerationJob, TestCase
+from .runner import (
+    execution_paths, find_playwright_artifacts, project_dir as playwright_project_dir, read_log_delta, suite_paths,
+)
+from .script_generation import enqueue_generation, generate_cached
+from .serializers import (
+    ExecutionJobSerializer, ExecutionLogSerializer, ScriptGenerationJobSerializer, TestCaseListSerializer,
+    TestCaseSerializer,
+)
 
 logger = logging.getLogger(__name__)
 
-
-def _find_playwright_artifacts(project_dir: str, test_case_id: int) -> tuple[str | None, str | None]:
-    """Locate Playwright screenshot (.png) and video (.webm) under test output dirs."""
-    screenshot_path = None
-    video_path = None
-    search_roots = [
-        os.path.join(project_dir, 'test-results', f'test_{test_case_id}'),
-        os.path.join(project_dir, 'test-results'),
-    ]
-    for root_dir in search_roots:
-        if not os.path.isdir(root_dir):
-            continue
-        for root, _, files in os.walk(root_dir):
-            for file in files:
-                full = os.path.join(root, file)
-                if file.endswith('.png') and not screenshot_path:
-                    # Prefer failure screenshots when multiple exist
-                    if 'test-failed' in file or not screenshot_path:
-                        screenshot_path = full
-                if file.endswith('.webm') and not video_path:
-                    video_path = full
-            if screenshot_path and video_path:
-                break
-    return screenshot_path, video_path
+TEST_CASE_XLSX_COLUMNS = [
+    Column('Réf', 12, 30), Column('Campagne', 20, 40), Column('Module', 14, 30), Column('Statut', 10, 14),
+    Column('Testeur', 14, 30), Column("Date d'exécution", 18, 18), Column('Anomalies', 11, 11),
+    Column('Données', 30, 80),
+]
+TEST_CASE_EXPORT_FIELDS = (
+    'id', 'test_case_ref', 'module', 'status', 'execution_date', 'data_json',
+    'campaign__title', 'tester__username', 'tester__first_name', 'tester__last_name',
+)
+MAX_EXPORT_DATA_CHARS = 1000
+
+
+def _export_data_text(data):
+    """'Clé : valeur' pairs of an Excel row stored in data_json (dict or list of dicts)."""
+    items = []
+    for part in (data if isinstance(data, list) else [data]):
+        if isinstance(part, dict):
+            items += [f'{key} : {value}' for key, value in part.items() if value not in (None, '')]
+        elif part not in (None, ''):
+            items.append(str(part))
+    return ' ; '.join(items)[:MAX_EXPORT_DATA_CHARS]
+
+
+def test_case_export_rows(queryset):
+    """Rows of TEST_CASE_XLSX_COLUMNS, read from `queryset` with an iterator (test case list or campaign results)."""
+    status_labels = dict(TestCase._meta.get_field('status').choices)
+    anomaly_count = (
+        Anomalie.objects.filter(test_case=OuterRef('pk')).order_by()
+        .values('test_case').annotate(total=Count('id')).values('total')
+    )
+    queryset = (
+        queryset.select_related('campaign', 'tester').only(*TEST_CASE_EXPORT_FIELDS)
+        .annotate(anomaly_count=Coalesce(Subquery(anomaly_count), 0))
+    )
+    for tc in queryset.iterator(chunk_size=2000):
+        tester = ''
+        if tc.tester:
+            tester = f'{tc.tester.first_name} {tc.tester.last_name}'.strip() or tc.tester.username
+        executed = tc.status != 'PENDING' and tc.execution_date
+        yield [
+            tc.test_case_ref,
+            tc.campaign.title if tc.campaign else '',
+            tc.module or '',
+            status_labels.get(tc.status, tc.status),
+            tester,
+            timezone.localtime(tc.execution_date).strftime('%d/%m/%Y %H:%M') if executed else '',
+            tc.anomaly_count,
+            _export_data_text(tc.data_json),
+        ]
 
 
 class IsTesterOrAdmin(permissions.BasePermission):
@@ -55,9 +98,15 @@ class IsTesterOrAdmin(permissions.BasePermission):
         return request.user.is_authenticated and request.user.role in ['TESTER', 'ADMIN', 'MANAGER']
 
 
-class TestCaseViewSet(viewsets.ModelViewSet):
+class TestCaseViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = TestCase.objects.all()
     serializer_class = TestCaseSerializer
+    list_serializer_class = TestCaseListSerializer
+    cursor_ordering = '-id'  # ?cursor= (config.pagination); execution_date is nullable
+    deferred_columns = {
+        'data_json': ['data_json'],
+        'automation_code': ['automation_code'],
+    }
     permission_classes = [permissions.IsAuthenticated, IsTesterOrAdmin]
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
@@ -68,7 +117,18 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
     def get_queryset(self):
-        queryset = TestCase.objects.all()
+        # Full logs live in ExecutionLog; lists only carry the excerpt of the latest run
+        queryset = TestCase.objects.defer('search_document')
+        if self.action in SPARSE_ACTIONS:
+            queryset = self.defer_unreturned(
+                queryset.select_related('campaign__project__business_project', 'tester')
+            )
+        if self.action != 'export_xlsx' and self.returns_field('execution_log_excerpt'):
+            queryset = queryset.annotate(
+                execution_log_excerpt=Subquery(
+                    ExecutionLog.objects.filter(test_case=OuterRef('pk')).order_by('-created_at', '-id').values('excerpt')[:1]
+                ),
+            )
         
         if self.request.user.role == 'TESTER':
             from campaigns.models import TaskAssignment
@@ -83,10 +143,7 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         ordering = self.request.query_params.get('ordering')
 
         if search:
-            queryset = queryset.filter(
-                Q(test_case_ref__icontains=search) |
-                Q(campaign__title__icontains=search)
-            )
+            queryset = search_queryset(queryset, search)
 
         if status and status != 'ALL':
             queryset = queryset.filter(status=status)
@@ -106,20 +163,23 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         old_status = instance.status
         old_tester = instance.tester
 
+        # Stamp the execution date in the same write as the status change
+        extra = {}
+        new_status = serializer.validated_data.get('status', old_status)
+        if new_status in ['PASSED', 'FAILED'] and old_status != new_status:
+            extra['execution_date'] = timezone.now()
+
         # If Admin or Manager is editing, keep original tester unless deliberately changed?
         if user.role in ['ADMIN', 'MANAGER'] and instance.tester:
-            serializer.save()
+            serializer.save(**extra)
         else:
-            serializer.save(tester=user)
+            serializer.save(tester=user, **extra)
 
         updated = serializer.instance
         campaign = updated.campaign
 
         # 1. Notify Manager of Execution Results (PASSED/FAILED)
         if updated.status in ['PASSED', 'FAILED'] and old_status != updated.status:
-            updated.execution_date = timezone.now()
-            updated.save()
-            
             recipients = set()
             if campaign and campaign.imported_by:
                 recipients.add(campaign.imported_by)
@@ -128,28 +188,28 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                 recipients.update(get_user_model().objects.filter(role='ADMIN'))
             
             recipients.discard(user)
+            notify(
+                recipients,
+                title=f"Test {updated.status}",
+                message=f"{user.username} a exécuté le test {updated.test_case_ref} : {updated.status}",
+                type='execution_validated',
+                related_campaign=campaign,
+                related_object_id=updated.id,
+            )
             for r in recipients:
-                Notification.objects.create(
-                    recipient=r,
-                    title=f"Test {updated.status}",
-                    message=f"{user.username} a exécuté le test {updated.test_case_ref} : {updated.status}",
-                    type='execution_validated',
-                    related_campaign=campaign,
-                    related_object_id=updated.id,
-                )
                 if r.email:
                     send_execution_validated_email(r, user, updated)
 
         # 2. Notify Tester if Admin/Manager changed status or re-assigned
         if user.role in ['ADMIN', 'MANAGER'] and updated.tester and user != updated.tester:
             if old_status != updated.status or old_tester != updated.tester:
-                Notification.objects.create(
-                    recipient=updated.tester,
+                notify(
+                    [updated.tester],
                     title="Mise à jour de Test",
                     message=f"L'encadrement a mis à jour votre test {updated.test_case_ref} : {updated.status}",
                     type='info',
                     related_campaign=campaign,
-                    related_object_id=updated.id
+                    related_object_id=updated.id,
                 )
 
     def perform_destroy(self, instance):
@@ -162,15 +222,197 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         if manager: recipients.add(manager)
         recipients.discard(self.request.user)
         
-        for r in recipients:
-            Notification.objects.create(
-                recipient=r,
-                title="Cas de test Supprimé",
-                message=f"Le cas de test {instance.test_case_ref} a été supprimé.",
-                type='info'
-            )
+        notify(
+            recipients,
+            title="Cas de test Supprimé",
+            message=f"Le cas de test {instance.test_case_ref} a été supprimé.",
+            type='info',
+        )
         instance.delete()
 
+    BULK_RESULTS_MAX = 500
+
+    @action(detail=False, methods=['post'], url_path='bulk-results')
+    def bulk_results(self, request):
+        """
+        Record many execution results in one request.
+
+        Body: {"results": [{"test_case_id": 1, "status": "PASSED"}, ...]}
+        In multipart mode `results` is a JSON string and proofs are sent as `proof_<test_case_id>`.
+        """
+        user = request.user
+        results = request.data.get('results')
+        if isinstance(results, str):
+            try:
+                results = json.loads(results)
+            except ValueError:
+                return Response({"error": "results doit être une liste JSON valide."}, status=400)
+        if not isinstance(results, list) or not results:
+            return Response({"error": "results est requis."}, status=400)
+        if len(results) > self.BULK_RESULTS_MAX:
+            return Response({"error": f"Maximum {self.BULK_RESULTS_MAX} résultats par lot."}, status=400)
+
+        wanted = {}
+        errors = []
+        for item in results:
+            tc_id = item.get('test_case_id') if isinstance(item, dict) else None
+            new_status = item.get('status') if isinstance(item, dict) else None
+            if not tc_id or new_status not in ('PENDING', 'PASSED', 'FAILED'):
+                errors.append({"item": item, "error": "test_case_id ou status invalide."})
+                continue
+            try:
+                wanted[int(tc_id)] = new_status
+            except (TypeError, ValueError):
+                errors.append({"item": item, "error": "test_case_id invalide."})
+        if errors:
+            return Response({"errors": errors}, status=400)
+
+        # Only test cases visible to the caller can be updated
+        cases = {
+            tc.id: tc for tc in self.get_queryset().select_related('campaign', 'campaign__imported_by', 'tester')
+            .filter(id__in=wanted.keys())
+        }
+        missing = sorted(set(wanted) - set(cases))
+        if missing:
+            return Response({"error": "Cas de test introuvables.", "missing": missing}, status=404)
+
+        # Proofs are validated (format, size, duplicates) before anything is written
+        proofs = {}
+        for tc_id in wanted:
+            upload = request.FILES.get(f'proof_{tc_id}')
+            if not upload:
+                continue
+            try:
+                TestCaseSerializer(instance=cases[tc_id]).validate_bulk_proof(upload)
+            except ValidationError as exc:
+                errors.append({"test_case_id": tc_id, "error": exc.detail[0]})
+                continue
+            proofs[tc_id] = (upload, file_sha256(upload))
+        if errors:
+            return Response({"errors": errors}, status=400)
+        hashes = [h for _, h in proofs.values()]
+        if len(hashes) != len(set(hashes)):
+            return Response(
+                {"error": "Ce fichier de preuve existe déjà dans la base de données (doublon détecté via SHA-256)."},
+                status=400,
+            )
+
+        now = timezone.now()
+        keep_tester = user.role in ['ADMIN', 'MANAGER']
+        changed = []
+        for tc_id, new_status in wanted.items():
+            tc = cases[tc_id]
+            old_status, old_tester = tc.status, tc.tester
+            tc.status = new_status
+            if not (keep_tester and tc.tester):
+                tc.tester = user
+            if new_status in ['PASSED', 'FAILED'] and old_status != new_status:
+                tc.execution_date = now
+            if old_status != new_status or old_tester != tc.tester or tc_id in proofs:
+                changed.append((tc, old_status, old_tester))
+
+        if changed:
+            stored = []
+            try:
+                # Notifications and digest e-mails (outbox rows) are written in the same transaction
+                with transaction.atomic():
+                    for tc_id, (upload, digest) in proofs.items():
+                        cases[tc_id].proof_file.save(upload.name, upload, save=False)
+                        cases[tc_id].proof_hash = digest
+                        stored.append(cases[tc_id].proof_file.name)
+                    fields = ['status', 'tester', 'execution_date', 'proof_file', 'proof_hash']
+                    TestCase.objects.bulk_update([tc for tc, _, _ in changed], fields)
+                    # bulk_update skips post_save: keep proof blob reference counts and dashboard rollups in sync
+                    for tc, _, _ in changed:
+                        sync_blob_refs(tc, ['proof_file'])
+                    count_saved([tc for tc, _, _ in changed], fields=fields)
+                    self._after_bulk_results(user, changed)
+            except Exception:
+                discard_blobs(stored)
+                raise
+
+        return Response({"updated": len(changed), "unchanged": len(wanted) - len(changed)})
+
+    def _after_bulk_results(self, user, changed):
+        """bulk_update skips signals: notify, invalidate caches and broadcast once per batch."""
+        from utils.invalidation import mark_campaign, emit
+
+        User = get_user_model()
+        admins = None
+        executed_by_manager = defaultdict(list)
+        updated_by_tester = defaultdict(list)
+        by_campaign = defaultdict(list)
+
+        for tc, old_status, old_tester in changed:
+            campaign = tc.campaign
+            if campaign:
+                by_campaign[campaign.id].append(tc)
+            if tc.status in ['PASSED', 'FAILED'] and old_status != tc.status:
+                if campaign and campaign.imported_by:
+                    recipients = {campaign.imported_by}
+                else:
+                    if admins is None:
+                        admins = list(User.objects.filter(role='ADMIN'))
+                    recipients = set(admins)
+                recipients.discard(user)
+                for r in recipients:
+                    executed_by_manager[r].append(tc)
+            if user.role in ['ADMIN', 'MANAGER'] and tc.tester and user != tc.tester:
+                if old_status != tc.status or old_tester != tc.tester:
+                    updated_by_tester[tc.tester].append(tc)
+
+        notifications = []
+        for r, cases in executed_by_manager.items():
+            passed = sum(1 for tc in cases if tc.status == 'PASSED')
+            notifications.append(Notification(
+                recipient=r,
+                title=f"{len(cases)} résultats de test",
+                message=f"{user.username} a exécuté {len(cases)} tests : {passed} succès, {len(cases) - passed} échecs",
+                type='execution_validated',
+                related_campaign=cases[0].campaign,
+                related_object_id=cases[0].id if len(cases) == 1 else None,
+            ))
+        for tester, cases in updated_by_tester.items():
+            notifications.append(Notification(
+                recipient=tester,
+                title="Mise à jour de Tests",
+                message=f"L'encadrement a mis à jour {len(cases)} de vos tests",
+                type='info',
+                related_campaign=cases[0].campaign,
+                related_object_id=cases[0].id if len(cases) == 1 else None,
+            ))
+        bulk_notify(notifications)
+
+        for r, cases in executed_by_manager.items():
+            if r.email:
+                send_execution_digest_email(r, user, cases)
+
+        for campaign_id, cases in by_campaign.items():
+            mark_campaign(campaign_id)
+            executed = [tc.id for tc in cases if tc.status != 'PENDING']
+            if executed:
+                emit(f"campaign_{campaign_id}", {
+                    "type": "tester_activity_batch",
+                    "tester_id": user.id,
+                    "tc_ids": executed,
+                    "passed": sum(1 for tc in cases if tc.status == 'PASSED'),
+                    "failed": sum(1 for tc in cases if tc.status == 'FAILED'),
+                    "timestamp": timezone.now().isoformat(),
+                })
+
+    @action(detail=False, methods=['get'], url_path='export-xlsx')
+    def export_xlsx(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        campaign_id = request.query_params.get('campaign_id')
+        if campaign_id:
+            queryset = queryset.filter(campaign_id=campaign_id)
+        return xlsx_response(
+            f'cas_de_test_{timezone.now().strftime("%Y-%m-%d")}.xlsx',
+            TEST_CASE_XLSX_COLUMNS,
+            test_case_export_rows(queryset),
+            sheet_title='Cas de test',
+        )
+
     @action(detail=True, methods=['post'], url_path='generate-script')
     def generate_script(self, request, pk=None):
         test_case = self.get_object()
@@ -180,10 +422,48 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         manual_data = request.data.get('manual_data')
         data = manual_data if manual_data else test_case.data_json
         
-        generated_code = groq_service.generate_playwright_test(title, data)
+        # Unchanged (title, data) is served from the script cache without a model call
+        generated_code, cached = generate_cached(title, data, force=bool(request.data.get('force')), service=groq_service)
         test_case.automation_code = generated_code
         test_case.save()
-        return Response({"code": generated_code})
+        return Response({"code": generated_code, "cached": cached})
+
+    @action(detail=False, methods=['post'], url_path='generate-scripts')
+    def generate_scripts(self, request):
+        """
+        Batch generation for a campaign (campaign_id) or an id list (ids), in the background.
+        Cached scripts are reused unless force=true; progress is pushed on ws/campaign/<id>/.
+        """
+        campaign_id = request.data.get('campaign_id')
+        ids = request.data.get('ids') or []
+        if not campaign_id and not ids:
+            return Response({"error": "campaign_id ou ids est requis."}, status=400)
+
+        queryset = self.get_queryset()
+        campaign = None
+        if campaign_id:
+            from campaigns.models import Campaign
+            campaign = Campaign.objects.filter(pk=campaign_id).first()
+            if campaign is None:
+                return Response({"error": "Campagne introuvable."}, status=404)
+            queryset = queryset.filter(campaign=campaign)
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+        cases = list(queryset.only('id'))
+        if not cases:
+            return Response({"error": "Aucun cas de test à générer."}, status=400)
+
+        job = enqueue_generation(cases, request.user, campaign=campaign, force=bool(request.data.get('force')))
+        return Response(ScriptGenerationJobSerializer(job).data, status=202)
+
+    @action(detail=False, methods=['get'], url_path=r'generate-scripts/(?P<job_id>\d+)')
+    def generate_scripts_status(self, request, job_id=None):
+        # Own jobs, or jobs of a campaign whose test cases the caller can see
+        visible = Q(requested_by=request.user) | Q(campaign__in=self.get_queryset().values('campaign'))
+        job = ScriptGenerationJob.objects.filter(visible, pk=job_id).first()
+        if job is None:
+            return Response({"error": "Génération introuvable."}, status=404)
+        return Response(ScriptGenerationJobSerializer(job).data)
 
     @action(detail=False, methods=['post'], url_path='generate-script-standalone')
     def generate_script_standalone(self, request):
@@ -230,9 +510,11 @@ class TestCaseViewSet(viewsets.ModelViewSet):
             
         storage_state_path = f"tests/{role}/.auth/{role}.json"
 
+        # connectOptions: headless runs reuse a warm browser from testCases/browser_pool.py
         config_injection = (
             f"test.use({{ screenshot: 'on', video: 'on', baseURL: '{frontend_url}', "
-            f"storageState: '{storage_state_path}' }});\n"
+            f"storageState: '{storage_state_path}', "
+            f"connectOptions: process.env.PW_WS_ENDPOINT ? {{ wsEndpoint: process.env.PW_WS_ENDPOINT }} : undefined }});\n"
         )
 
         code = code.replace('http://localhost', frontend_url).replace('https://localhost', frontend_url)
@@ -253,227 +535,107 @@ class TestCaseViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], url_path='execute-script')
     def execute_script(self, request, pk=None):
         """
-        Starts Playwright execution in a background thread and returns IMMEDIATELY.
-        The frontend polls live-logs/ to get progress and the final result.
-        This prevents JWT expiry / thread pool starvation on long-running tests.
+        Queues a Playwright execution and returns IMMEDIATELY.
+        Runs are processed by the bounded worker pool (testCases/execution_queue.py);
+        the frontend polls live-logs/ to get queue position, progress and the final result.
         """
-        import threading, re, shutil
         test_case = self.get_object()
         path = test_case.automation_script_path
         if not path or not os.path.exists(path):
             return Response({"error": "Script not found"}, status=404)
 
-        project_dir = os.path.abspath(os.path.join(settings.BASE_DIR, '..', 'project'))
-
-        # Remove missing storageState to prevent ENOENT crash
-        try:
-            with open(path, 'r') as f:
-                content = f.read()
-            storage_match = re.search(r'storageState:\s*(["\'])(.*?)\1', content)
-            if storage_match:
-                storage_rel_path = storage_match.group(2)
-                storage_abs_path = os.path.abspath(os.path.join(project_dir, storage_rel_path))
-                if not os.path.exists(storage_abs_path):
-                    new_content = re.sub(r',\s*storageState:\s*(["\'])(.*?)\1', '', content)
-                    new_content = re.sub(r'storageState:\s*(["\'])(.*?)\1\s*,?', '', new_content)
-                    if new_content != content:
-                        with open(path, 'w') as f:
-                            f.write(new_content)
-        except Exception as e:
-            logger.error(f"Failed to check/remove missing storageState: {e}")
-
-        output_dir = os.path.join(project_dir, 'test-results', f'test_{test_case.id}')
-        live_log_path = os.path.join(project_dir, 'test-results', f'live_{test_case.id}.log')
-        result_path = os.path.join(project_dir, 'test-results', f'result_{test_case.id}.json')
-
-        os.makedirs(os.path.dirname(live_log_path), exist_ok=True)
-
-        # Remove stale result file from a previous run
-        if os.path.exists(result_path):
-            os.remove(result_path)
-
-        # Write startup message so first poll is never empty
-        with open(live_log_path, 'w') as f:
-            f.write(f'▶ Démarrage du runner Playwright pour : {test_case.test_case_ref}\n')
-
         execution_mode = request.data.get('execution_mode', 'headless')  # 'headless' | 'headed' | 'ui'
-        tester_id = request.user.id
-
-        mode_label = {'headless': 'Headless ⚡', 'headed': 'Headed 👁️', 'ui': 'UI 🎮'}.get(execution_mode, 'Headless ⚡')
-
-        # Overwrite startup message with mode info
-        with open(live_log_path, 'w') as f:
-            f.write(f'▶ Démarrage du runner Playwright pour : {test_case.test_case_ref}\n')
-            f.write(f'▶ Mode d\'exécution : {mode_label}\n\n')
+        job, _ = execution_queue.enqueue(test_case, request.user, execution_mode)
 
-        def run_playwright():
-            import json as _json
-            from django.db import connection as _db_connection
-            from django.core.files import File
+        return Response({
+            "status": job.status,
+            "id": test_case.id,
+            "job_id": job.id,
+            "position": execution_queue.queue_position(job),
+        })
 
-            try:
-                if os.path.exists(output_dir):
-                    shutil.rmtree(output_dir)
-
-                env = os.environ.copy()
-                env['SKIP_WEBSERVER'] = 'true'
-                env['FRONTEND_URL'] = settings.FRONTEND_URL
-                env['PYTHONUNBUFFERED'] = '1'
-                env['FORCE_COLOR'] = '0'
-                env['CI'] = 'true'
-                # DEBUG=pw:api streams each Playwright action to stdout as it executes
-                env['DEBUG'] = 'pw:api'
-
-                # Activate video recording via env var (playwright.config.ts reads PW_VIDEO)
-                env['PW_VIDEO'] = 'on'
-                env['PLAYWRIGHT_OUTPUT_DIR'] = output_dir
-
-                # Build Playwright command based on execution_mode
-                cmd = ['npx', 'playwright', 'test', path, f'--output={output_dir}', '--reporter=list']
-
-                if execution_mode in ('headed', 'ui'):
-                    # Use the existing Xvfb on :99 (started at container boot, watched by x11vnc + noVNC)
-                    # Do NOT use xvfb-run — it creates a new display invisible to x11vnc
-                    env['DISPLAY'] = ':99'
-                    env['PW_HEADED'] = 'true'
-                    cmd.append('--headed')
-                    if execution_mode == 'ui':
-                        env['PLAYWRIGHT_SLOWMO'] = '800'
-
-                # Write stdout/stderr directly to file — bypasses Node.js pipe buffering
-                with open(live_log_path, 'a') as live_log_file:
-                    process = subprocess.Popen(
-                        cmd,
-                        cwd=project_dir,
-                        stdout=live_log_file,
-                        stderr=live_log_file,
-                        env=env
-                    )
-                    returncode = process.wait()
-
-                with open(live_log_path, 'r', errors='replace') as f:
-                    logs = f.read()
-                status = 'PASSED' if returncode == 0 else 'FAILED'
-
-                # Persist to DB
-                tc = TestCase.objects.get(pk=test_case.id)
-                tc_data = tc.data_json or {}
-                if not isinstance(tc_data, dict):
-                    tc_data = {}
-                tc_data['execution_logs'] = logs
-                tc.data_json = tc_data
-                tc.status = status
-                tc.execution_date = timezone.now()
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                tc.tester = User.objects.get(pk=tester_id)
-
-                # Screenshot + Video
-                screenshot_path, video_path = _find_playwright_artifacts(project_dir, test_case.id)
-                if not screenshot_path or not video_path:
-                    logger.warning(
-                        "Playwright artifacts missing for test %s (png=%s, webm=%s, output_dir=%s)",
-                        test_case.id, screenshot_path, video_path, output_dir,
-                    )
-
-                if screenshot_path and os.path.exists(screenshot_path):
-                    with open(screenshot_path, 'rb') as f:
-                        tc.proof_file.save(f'screenshot_tc_{tc.id}.png', File(f), save=False)
-
-                if video_path and os.path.exists(video_path):
-                    with open(video_path, 'rb') as f:
-                        tc.proof_video.save(f'video_tc_{tc.id}.webm', File(f), save=False)
-
-                anomaly_id = None
-                if status == 'FAILED':
-                    from anomalies.models import Anomalie
-                    groq_service = GroqService()
-                    try:
-                        anomaly_title, anomaly_desc = groq_service.generate_anomaly_from_logs(tc.test_case_ref, logs)
-                    except Exception as exc:
-                        logger.error(f"Groq error: {exc}")
-                        anomaly_title = f"Échec du test automatique : {tc.test_case_ref}"
-                        anomaly_desc = "Le test a échoué. Diagnostic IA indisponible."
-
-                    safe_title = str(anomaly_title).replace('\x00', '')[:250]
-                    brief_desc = str(anomaly_desc).replace('\x00', '').strip()
-                    safe_desc = brief_desc
-                    if logs:
-                        safe_desc += f"\n\n--- LOGS ---\n{logs.replace(chr(0), '')}"
-
-                    anomaly = Anomalie(
-                        test_case=tc,
-                        titre=safe_title,
-                        description=safe_desc,
-                        impact='A_DEFINIR',
-                        priorite='A_DEFINIR',
-                        visibilite='PUBLIQUE',
-                        statut='OUVERTE',
-                        cree_par=User.objects.get(pk=tester_id)
-                    )
-                    if screenshot_path and os.path.exists(screenshot_path):
-                        with open(screenshot_path, 'rb') as f:
-                            anomaly.preuve_image.save(f'screenshot_tc_{tc.id}.png', File(f), save=False)
-                    if video_path and os.path.exists(video_path):
-                        with open(video_path, 'rb') as f:
-                            anomaly.preuve_video.save(f'video_tc_{tc.id}.webm', File(f), save=False)
-                    anomaly.save()
-                    anomaly_id = anomaly.id
-                    tc_data['anomaly_id'] = anomaly_id
-
-                tc.save()
-
-                # Write result file so live-logs/ knows execution is done
-                result = {
-                    'status': status,
-                    'logs': logs,
-                    'anomaly_id': anomaly_id,
-                    'video_path': video_path,
-                }
-                with open(result_path, 'w') as f:
-                    _json.dump(result, f)
-
-            except Exception as exc:
-                import traceback as _tb
-                logger.error(f"Playwright thread error: {_tb.format_exc()}")
-                result = {'status': 'FAILED', 'logs': f'Erreur interne : {exc}', 'anomaly_id': None}
-                with open(result_path, 'w') as f:
-                    import json as _json2
-                    _json2.dump(result, f)
-            finally:
-                # Remove live log file so live-logs/ endpoint knows execution ended
-                if os.path.exists(live_log_path):
-                    try:
-                        os.remove(live_log_path)
-                    except Exception:
-                        pass
-                _db_connection.close()
-
-        thread = threading.Thread(target=run_playwright, daemon=True)
-        thread.start()
-
-        # Return immediately — frontend will poll live-logs/ for the result
-        return Response({"status": "RUNNING", "id": test_case.id})
+    @action(detail=False, methods=['post'], url_path='run-suite')
+    def run_suite(self, request):
+        """
+        Queues one Playwright process for many automated test cases
+        (body: campaign_id and/or test_case_ids, optional workers).
+        Follow progress through /api/testcases/jobs/<job_id>/logs/.
+        """
+        campaign_id = request.data.get('campaign_id')
+        ids = request.data.get('test_case_ids') or []
+        if not campaign_id and not ids:
+            return Response({"error": "campaign_id ou test_case_ids requis."}, status=400)
+        try:
+            ids = [int(i) for i in ids]
+            workers = int(request.data['workers']) if request.data.get('workers') else None
+        except (TypeError, ValueError):
+            return Response({"error": "test_case_ids / workers invalides."}, status=400)
+
+        queryset = self.get_queryset()
+        campaign = None
+        if campaign_id:
+            from campaigns.models import Campaign
+            campaign = Campaign.objects.filter(pk=campaign_id).first()
+            if campaign is None:
+                return Response({"error": "Campagne introuvable."}, status=404)
+            queryset = queryset.filter(campaign=campaign)
+        if ids:
+            queryset = queryset.filter(id__in=ids)
+
+        runnable, skipped = [], []
+        for tc in queryset.only('id', 'automation_script_path'):
+            path = tc.automation_script_path
+            (runnable if path and os.path.exists(path) else skipped).append(tc)
+        if not runnable:
+            return Response({"error": "Aucun cas de test automatisé à exécuter.", "skipped": [tc.id for tc in skipped]}, status=400)
+
+        job = execution_queue.enqueue_suite(runnable, request.user, campaign=campaign, workers=workers)
+        return Response({
+            "status": job.status,
+            "job_id": job.id,
+            "count": len(runnable),
+            "workers": job.workers,
+            "skipped": [tc.id for tc in skipped],
+            "position": execution_queue.queue_position(job),
+        })
 
     @action(detail=True, methods=['get'], url_path='live-logs')
     def live_logs(self, request, pk=None):
-        """Polling endpoint: returns logs in progress, or final result when done."""
+        """
+        Polling endpoint: returns logs in progress, or final result when done.
+        With ?offset=<bytes already received> only the output written after it is returned;
+        every response carries the `offset` to send next time.
+        """
         import json as _json
         test_case = self.get_object()
-        project_dir = os.path.abspath(os.path.join(settings.BASE_DIR, '..', 'project'))
-        live_log_path = os.path.join(project_dir, 'test-results', f'live_{test_case.id}.log')
-        result_path = os.path.join(project_dir, 'test-results', f'result_{test_case.id}.json')
-
-        # Execution still running — return current log content
-        if os.path.exists(live_log_path):
-            with open(live_log_path, 'r', errors='replace') as f:
-                content = f.read()
-            return Response({'logs': content, 'running': True})
+        _, live_log_path, result_path = execution_paths(test_case.id)
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+        except ValueError:
+            offset = 0
+
+        # Execution queued or running — return the log written since `offset`
+        job = test_case.execution_jobs.filter(status__in=execution_queue.ACTIVE_STATUSES).first()
+        if job is not None or (os.path.exists(live_log_path) and not os.path.exists(result_path)):
+            content, new_offset, reset = read_log_delta(live_log_path, offset)
+            data = {'logs': content, 'running': True, 'offset': new_offset, 'reset': reset}
+            if job is not None:
+                execution_queue.ensure_started()
+                data.update({
+                    'queued': job.status == 'QUEUED',
+                    'position': execution_queue.queue_position(job),
+                    'job_id': job.id,
+                })
+            return Response(data)
 
         # Result file written by background thread — execution finished
         if os.path.exists(result_path):
             with open(result_path, 'r') as f:
                 result = _json.load(f)
+            logs = result.get('logs', '').encode('utf-8')
+            reset = offset > len(logs)
+            if reset:
+                offset = 0
             os.remove(result_path)
             test_case.refresh_from_db()
             proof_file_url = None
@@ -487,7 +649,9 @@ class TestCaseViewSet(viewsets.ModelViewSet):
                 if proof_video_url.startswith('http://'):
                     proof_video_url = 'https://' + proof_video_url[7:]
             return Response({
-                'logs': result.get('logs', ''),
+                'logs': logs[offset:].decode('utf-8', errors='replace'),
+                'offset': len(logs),
+                'reset': reset,
                 'running': False,
                 'status': result.get('status'),
                 'anomaly_id': result.get('anomaly_id'),
@@ -497,9 +661,9 @@ class TestCaseViewSet(viewsets.ModelViewSet):
             })
 
         # Fallback: execution finished but no result file (old run or error)
-        tc_data = test_case.data_json or {}
-        stored_logs = tc_data.get('execution_logs', '') if isinstance(tc_data, dict) else ''
-        anomaly_id = tc_data.get('anomaly_id') if isinstance(tc_data, dict) else None
+        last_log = test_case.execution_logs.first()
+        stored_logs = last_log.text if last_log else ''
+        anomaly_id = last_log.anomaly_id if last_log else None
         if anomaly_id is None and test_case.status == 'FAILED':
             latest = test_case.anomalies.order_by('-cree_le').values_list('id', flat=True).first()
             if latest:
@@ -511,6 +675,47 @@ class TestCaseViewSet(viewsets.ModelViewSet):
             'anomaly_id': anomaly_id,
         })
 
+    @action(detail=True, methods=['get'], url_path='execution-logs')
+    def execution_logs(self, request, pk=None):
+        """Execution history of this test case (one compressed log per run, content not loaded)."""
+        test_case = self.get_object()
+        logs = test_case.execution_logs.defer('content')[:50]
+        return Response(ExecutionLogSerializer(logs, many=True).data)
+
+    @action(detail=True, methods=['get'], url_path=r'execution-logs/(?P<log_id>\d+)')
+    def execution_log(self, request, pk=None, log_id=None):
+        """
+        One run's log: ?part=head|tail|errors|full (default tail), ?lines=N for head/tail.
+        `errors` is the excerpt stored at write time and does not decompress the log.
+        """
+        test_case = self.get_object()
+        part = request.query_params.get('part', 'tail')
+        if part not in ('head', 'tail', 'errors', 'full'):
+            return Response({"error": "Paramètre 'part' invalide (head, tail, errors ou full)."}, status=400)
+        try:
+            lines = max(1, min(int(request.query_params.get('lines', 200)), 5000))
+        except ValueError:
+            lines = 200
+
+        queryset = test_case.execution_logs.all()
+        if part == 'errors':
+            queryset = queryset.defer('content')
+        log = queryset.filter(pk=log_id).first()
+        if log is None:
+            return Response({"error": "Log introuvable."}, status=404)
+
+        data = ExecutionLogSerializer(log).data
+        if part == 'errors':
+            data['content'] = log.excerpt
+        elif part == 'head':
+            data['content'] = log.head(lines)
+        elif part == 'tail':
+            data['content'] = log.tail(lines)
+        else:
+            data['content'] = log.text
+        data['part'] = part
+        return Response(data)
+
     @action(detail=True, methods=['get'], url_path='serve-video')
     def serve_video(self, request, pk=None):
         """Serves the recorded Playwright video (.webm) for this test case.
@@ -518,7 +723,8 @@ class TestCaseViewSet(viewsets.ModelViewSet):
         <video src> cannot send Authorization headers, so we also accept
         ?token=<JWT> (same pattern as WebSocket auth).
         """
-        from django.http import FileResponse, Http404
+        from django.http import Http404
+        from utils.media import serve_file
         from rest_framework_simplejwt.tokens import AccessToken
         from django.contrib.auth import get_user_model
 
@@ -535,15 +741,74 @@ class TestCaseViewSet(viewsets.ModelViewSet):
 
         test_case = self.get_object()
 
+        # Authorised above; Range/304 handling and nginx offload are done by serve_file
         if test_case.proof_video:
-            return FileResponse(
-                test_case.proof_video.open('rb'),
-                content_type='video/webm',
-                as_attachment=False,
-            )
+            return serve_file(request, test_case.proof_video.path, content_type='video/webm')
 
-        project_dir = os.path.abspath(os.path.join(settings.BASE_DIR, '..', 'project'))
-        _, video_path = _find_playwright_artifacts(project_dir, test_case.id)
+        # Artifact paths recorded by the runner (manifest), no scan of test-results/
+        last_run = test_case.execution_jobs.exclude(artifacts={}).values_list('artifacts', flat=True).first()
+        video_path = (last_run or {}).get('video')
+        if not video_path:
+            _, video_path = find_playwright_artifacts(playwright_project_dir(), test_case.id)
         if not video_path or not os.path.exists(video_path):
             raise Http404("Vidéo non trouvée")
-        return FileResponse(open(video_path, 'rb'), content_type='video/webm', as_attachment=False)
\ No newline at end of file
+        return serve_file(request, video_path, content_type='video/webm')
+
+class ExecutionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Playwright execution queue: jobs, cancellation and wait/run statistics."""
+    serializer_class = ExecutionJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = ExecutionJob.objects.select_related('test_case', 'requested_by')
+        if self.request.user.role == 'TESTER':
+            queryset = queryset.filter(requested_by=self.request.user)
+
+        status = self.request.query_params.get('status')
+        if status and status != 'ALL':
+            queryset = queryset.filter(status=status)
+        test_case_id = self.request.query_params.get('test_case')
+        if test_case_id:
+            queryset = queryset.filter(test_case_id=test_case_id)
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        if not execution_queue.cancel(job):
+            return Response({"error": "Cette exécution est déjà terminée."}, status=400)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def logs(self, request, pk=None):
+        """Live output of a job (after ?offset= bytes) while it runs; summary once it is over."""
+        job = self.get_object()
+        if job.is_suite:
+            _, live_log_path, _ = suite_paths(job.id)
+        else:
+            _, live_log_path, _ = execution_paths(job.test_case_id)
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+        except ValueError:
+            offset = 0
+        content, new_offset, reset = read_log_delta(live_log_path, offset)
+        return Response({
+            'logs': content,
+            'offset': new_offset,
+            'reset': reset,
+            'running': job.status in execution_queue.ACTIVE_STATUSES,
+            'status': job.status,
+            'result': job.result,
+            'summary': job.summary,
+            'position': execution_queue.queue_position(job),
+        })
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        execution_queue.ensure_started()
+        try:
+            window_hours = max(1, min(int(request.query_params.get('hours', 24)), 24 * 30))
+        except ValueError:
+            window_hours = 24
+        return Response(execution_queue.stats(window_hours))
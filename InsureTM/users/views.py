@@ -4,7 +4,7 @@ from django.contrib.auth import get_user_model
 from django.db.models import Q
 
 from .serializers import UserSerializer, UserRegistrationSerializer, UserProfileUpdateSerializer
-from notifications.models import Notification
+from notifications.service import notify
 from utils.email_service import send_account_created_email, send_otp_email, send_password_reset_email
 from django.utils import timezone
 from datetime import timedelta
@@ -59,14 +59,13 @@ class UserViewSet(viewsets.ModelViewSet):
             send_account_created_email(user, raw_password)
             
         # Notify ADMINs
-        admins = User.objects.filter(role='ADMIN').exclude(id=user.id)
-        for admin in admins:
-            Notification.objects.create(
-                recipient=admin,
-                title="Nouveau Compte Utilisateur",
-                message=f"Le compte {user.username} ({user.role}) a été créé.",
-                type='info'
-            )
+        notify(
+            User.objects.filter(role='ADMIN'),
+            title="Nouveau Compte Utilisateur",
+            message=f"Le compte {user.username} ({user.role}) a été créé.",
+            type='info',
+            exclude=user,
+        )
 
 
 class LoginView(APIView):
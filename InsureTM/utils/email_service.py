@@ -1,7 +1,5 @@
 
 import logging
-from django.core.mail import EmailMultiAlternatives
-from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
@@ -58,7 +56,7 @@ def _info_row(label: str, value: str) -> str:
 
 
 def _send(subject: str, html_body: str, recipient_email: str):
-    """Low-level helper — sends HTML email, logs failures silently."""
+    """Low-level helper — queues an HTML email in the outbox (emails.outbox), sent after commit."""
     if not EMAILS_ENABLED:
         logger.info("[EMAILS BLOCKED] Attempted to send email to %s: %s", recipient_email, subject)
         return
@@ -66,17 +64,11 @@ def _send(subject: str, html_body: str, recipient_email: str):
         logger.warning("Attempted to send email but recipient_email is empty.")
         return
     try:
+        from emails.outbox import enqueue
         plain = "Veuillez consulter cet email dans un client supportant le HTML."
-        msg = EmailMultiAlternatives(
-            subject=subject,
-            body=plain,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[recipient_email],
-        )
-        msg.attach_alternative(html_body, "text/html")
-        msg.send(fail_silently=False)
+        enqueue(subject, recipient_email, plain, html_body=html_body)
     except Exception as e:
-        logger.error("Failed to send email to %s: %s", recipient_email, str(e))
+        logger.error("Failed to queue email to %s: %s", recipient_email, str(e))
 
 
 # ---------------------------------------------------------------------------
@@ -201,6 +193,46 @@ def send_execution_validated_email(recipient, tester, test_case):
     _send(subject, html, recipient.email)
 
 
+# ---------------------------------------------------------------------------
+# Execution Digest (bulk results)
+# ---------------------------------------------------------------------------
+def send_execution_digest_email(recipient, tester, test_cases):
+    """One summary email for a batch of executions instead of one per test case."""
+    passed = sum(1 for tc in test_cases if tc.status == 'PASSED')
+    failed = sum(1 for tc in test_cases if tc.status == 'FAILED')
+    subject = f"[InsureTM] {len(test_cases)} résultats de test ({passed} succès, {failed} échecs)"
+    name = recipient.first_name or recipient.username
+    campaigns = sorted({tc.campaign.title for tc in test_cases if tc.campaign})
+    rows = "".join(
+        _info_row(tc.test_case_ref, "SUCCÈS" if tc.status == 'PASSED' else "ÉCHEC")
+        for tc in test_cases[:50]
+    )
+    more = ""
+    if len(test_cases) > 50:
+        more = f"""<p style="margin:12px 0 0 0;font-size:13px;color:#64748b;">… et {len(test_cases) - 50} autres cas de test.</p>"""
+    content = f"""
+    <p style="margin:0 0 20px 0;font-size:15px;line-height:1.6;color:#475569;">
+        Bonjour <strong>{name}</strong>,<br><br>
+        <strong>{tester.get_full_name() or tester.username}</strong> vient d'enregistrer {len(test_cases)} résultats d'exécution.
+    </p>
+    <div style="background-color:#f8fafc;border:1px solid #e2e8f0;border-radius:8px;padding:20px;margin-bottom:24px;">
+        <table width="100%">
+            {_info_row('Campagne(s)', ', '.join(campaigns) or '—')}
+            {_info_row('Succès', str(passed))}
+            {_info_row('Échecs', str(failed))}
+        </table>
+    </div>
+    <div style="background-color:#ffffff;border:1px solid #e2e8f0;border-radius:8px;padding:20px;">
+        <table width="100%">
+            {rows}
+        </table>
+        {more}
+    </div>"""
+    badge_color = "#dc2626" if failed else "#16a34a"
+    html = _base_html("Résultats d'exécution", "Synthèse", badge_color, content)
+    _send(subject, html, recipient.email)
+
+
 # ---------------------------------------------------------------------------
 # Campaign Created
 # ---------------------------------------------------------------------------
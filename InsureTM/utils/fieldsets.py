@@ -0,0 +1,92 @@
+"""
+Sparse fieldsets and compact list rows for the REST API.
+
+List endpoints used to return the full detail representation on every row (logs,
+Playwright scripts, Excel rows, nested tasks).  Viewsets using SparseFieldsViewMixin
+with serializers using SparseFieldsMixin return only what the client reads:
+
+- the `list` action uses the viewset's `list_serializer_class` (compact rows), the
+  detail keeps the full serializer;
+- `?fields=titre,statut` returns exactly those fields, taken from the full serializer
+  (`id` is always kept); `?omit=description` drops fields from the default set;
+- dropped fields are removed from the serializer before representation, so their
+  SerializerMethodField methods (and the queries they run) are never called;
+- `deferred_columns` maps a field to the model columns (select_related paths
+  included) deferred when it is not returned; views skip their annotations the same
+  way with `returns_field()`.
+
+Only GET list / retrieve responses are trimmed: writes always answer with the full
+representation.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+ALWAYS_RETURNED = ('id',)
+SPARSE_ACTIONS = ('list', 'retrieve')
+
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Serializer mixin: keeps only the fields selected in the context by SparseFieldsViewMixin."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('sparse_fields')
+        omitted = self.context.get('omitted_fields') or set()
+        if selected is None and not omitted:
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if name in ALWAYS_RETURNED or ((selected is None or name in selected) and name not in omitted)
+        }
+
+
+class SparseFieldsViewMixin:
+    """ViewSet mixin: compact list serializer, `?fields=` / `?omit=`, deferred heavy columns."""
+
+    list_serializer_class = None
+    # serializer field -> model columns not loaded when the field is not returned
+    deferred_columns = {}
+
+    def sparse_params(self):
+        """(selected fields or None, omitted fields) of a GET list / retrieve; (None, empty) otherwise."""
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS or getattr(self, 'action', None) not in SPARSE_ACTIONS:
+            return None, set()
+        params = request.query_params
+        selected = parse_field_list(params[FIELDS_PARAM]) if FIELDS_PARAM in params else None
+        return selected, parse_field_list(params.get(OMIT_PARAM))
+
+    def get_serializer_class(self):
+        selected, _ = self.sparse_params()
+        if self.action == 'list' and self.list_serializer_class is not None and selected is None:
+            return self.list_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'], context['omitted_fields'] = self.sparse_params()
+        return context
+
+    def returned_fields(self):
+        """Names of the fields the response rows will contain."""
+        if getattr(self, '_returned_fields', None) is None:
+            self._returned_fields = set(self.get_serializer().fields)
+        return self._returned_fields
+
+    def returns_field(self, name):
+        return name in self.returned_fields()
+
+    def defer_unreturned(self, queryset):
+        if self.action not in SPARSE_ACTIONS:
+            return queryset
+        returned = self.returned_fields()
+        columns = [
+            column for field, columns in self.deferred_columns.items() if field not in returned
+            for column in columns
+        ]
+        return queryset.defer(*columns) if columns else queryset
@@ -0,0 +1,287 @@
+"""
+Deferred, coalesced invalidation bus.
+
+Model signals do not touch the cache or the channel layer directly: they mark
+campaigns / projects / business projects as dirty and queue live events here.
+Everything collected during a request (or a `batch()` block) is flushed once,
+after the surrounding transaction commits; a mark raised outside both a batch and
+a transaction (worker thread, management command) is flushed at once:
+
+- business project ids are resolved in a single query,
+- cache keys are removed with one `delete_many`,
+- data version counters (core.DataVersion, read by report fingerprints) are bumped
+  with one UPDATE,
+- the dashboard rollup deltas (analytics.rollups) are applied, one UPDATE per bucket,
+- the badge counters (notifications.badges) of the users whose counts changed are
+  read once and queued for their notification socket,
+- live events are grouped per channel group and sent in one `async_to_sync` call.
+"""
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class _Pending:
+    def __init__(self):
+        self.campaigns = set()
+        self.projects = set()
+        self.business_projects = set()
+        self.versions = set()  # DataVersion scopes to bump
+        self.anomaly_test_cases = set()  # resolved to 'campaign:<id>' scopes at flush
+        self._anomaly_campaigns = None
+        self.rollups = None  # analytics.rollups.Deltas
+        self.badge_users = set()  # users whose badge counters changed
+        self.events = {}  # group name -> [payload, ...]
+
+    def __bool__(self):
+        return bool(
+            self.campaigns or self.projects or self.business_projects
+            or self.versions or self.anomaly_test_cases or self.badge_users or self.events or self.rollups
+        )
+
+    def anomaly_campaigns(self):
+        """Campaigns of the test cases whose anomalies changed (one query, shared by the flush steps)."""
+        if self._anomaly_campaigns is None:
+            self._anomaly_campaigns = set()
+            if self.anomaly_test_cases:
+                from testCases.models import TestCase
+                self._anomaly_campaigns.update(
+                    TestCase.objects.filter(pk__in=self.anomaly_test_cases)
+                    .values_list('campaign_id', flat=True).distinct()
+                )
+                self._anomaly_campaigns.discard(None)
+        return self._anomaly_campaigns
+
+    def flush(self):
+        try:
+            _apply_rollups(self)
+        except Exception as e:
+            logger.error("Dashboard rollup update failed: %s", e)
+        try:
+            _invalidate_caches(self)
+        except Exception as e:
+            logger.error("Cache invalidation flush failed: %s", e)
+        try:
+            _bump_versions(self)
+        except Exception as e:
+            logger.error("Data version bump failed: %s", e)
+        try:
+            _queue_badges(self)
+        except Exception as e:
+            logger.warning("Badge push failed: %s", e)
+        try:
+            _send_events(self.events)
+        except Exception as e:
+            logger.warning("Live event flush failed: %s", e)
+
+
+def _schedule(pending):
+    """Flush `pending` once the current transaction commits (immediately in autocommit)."""
+    def hook():
+        if getattr(_local, 'pending', None) is pending and not getattr(_local, 'depth', 0):
+            _local.pending = None
+        pending.flush()
+
+    hook.pending = pending
+    transaction.on_commit(hook, robust=True)
+
+
+def _is_scheduled(pending):
+    """True while the on_commit hook of `pending` is still queued (not run, not rolled back)."""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return False
+    return any(getattr(entry[1], 'pending', None) is pending for entry in connection.run_on_commit)
+
+
+def _current():
+    """Pending set of the current batch() or transaction (deferred until commit)."""
+    pending = getattr(_local, 'pending', None)
+    if getattr(_local, 'depth', 0):
+        return pending
+    if pending is not None and _is_scheduled(pending):
+        return pending
+    pending = _Pending()
+    _local.pending = pending
+    _schedule(pending)
+    return pending
+
+
+@contextmanager
+def _collect():
+    """
+    Pending set to add a mark or event to.  Outside batch() and outside a transaction
+    (worker threads, management commands) nothing would commit later: it is flushed
+    as soon as the caller has added to it.
+    """
+    if getattr(_local, 'depth', 0) or transaction.get_connection().in_atomic_block:
+        yield _current()
+        return
+    pending = _Pending()
+    yield pending
+    pending.flush()
+
+
+@contextmanager
+def batch():
+    """Collect every invalidation raised inside the block and flush them once on commit."""
+    depth = getattr(_local, 'depth', 0)
+    if depth == 0:
+        outer = getattr(_local, 'pending', None)
+        _local.pending = _Pending()
+    _local.depth = depth + 1
+    try:
+        yield
+    finally:
+        _local.depth = depth
+        if depth == 0:
+            pending = _local.pending
+            _local.pending = outer
+            if pending:
+                _schedule(pending)
+
+
+def mark_campaign(campaign_id, project_id=None):
+    """Campaign data changed: drop its timeline cache and its business project health."""
+    if not campaign_id:
+        return
+    with _collect() as pending:
+        pending.campaigns.add(campaign_id)
+        pending.versions.update(('campaigns', f'campaign:{campaign_id}'))
+        if project_id:
+            pending.projects.add(project_id)
+
+
+def mark_anomalies(test_case_id=None):
+    """Anomalies changed: bump the global anomaly version and the one of the test case's campaign."""
+    with _collect() as pending:
+        pending.versions.add('anomalies')
+        if test_case_id:
+            pending.anomaly_test_cases.add(test_case_id)
+
+
+@contextmanager
+def rollup_deltas():
+    """Bucket deltas of the dashboard rollups, applied after commit (analytics.rollups.track_rollups)."""
+    with _collect() as pending:
+        if pending.rollups is None:
+            from analytics.rollups import Deltas
+            pending.rollups = Deltas()
+        yield pending.rollups
+
+
+def mark_business_project(business_project_id):
+    if business_project_id:
+        with _collect() as pending:
+            pending.business_projects.add(business_project_id)
+
+
+def mark_badges(user_ids):
+    """Badge counters of these users changed: push their new values once, after commit."""
+    user_ids = {pk for pk in user_ids if pk}
+    if user_ids:
+        with _collect() as pending:
+            pending.badge_users.update(user_ids)
+
+
+def emit(group, payload):
+    """Queue a `live_event` for a channel group; sent after commit with the rest of the batch."""
+    with _collect() as pending:
+        pending.events.setdefault(group, []).append(payload)
+
+
+def _invalidate_caches(pending):
+    from django.core.cache import cache
+    from business_projects.health_cache import bp_health_cache_key
+    from analytics.ml_service import campaign_timeline_cache_keys
+
+    bp_ids = set(pending.business_projects)
+    if pending.campaigns:
+        from campaigns.models import Campaign
+        bp_ids.update(
+            Campaign.objects.filter(pk__in=pending.campaigns)
+            .values_list('project__business_project_id', flat=True)
+        )
+    if pending.projects:
+        # Covers deleted campaigns, which can no longer be resolved above
+        from Project.models import Project
+        bp_ids.update(
+            Project.objects.filter(pk__in=pending.projects)
+            .values_list('business_project_id', flat=True)
+        )
+
+    keys = [bp_health_cache_key(bp_id) for bp_id in bp_ids if bp_id]
+    for campaign_id in pending.campaigns:
+        keys.extend(campaign_timeline_cache_keys(campaign_id))
+    if keys:
+        cache.delete_many(keys)
+
+
+def _apply_rollups(pending):
+    if pending.rollups:
+        pending.rollups.apply()
+
+
+def _bump_versions(pending):
+    scopes = set(pending.versions)
+    scopes.update(f'campaign:{campaign_id}' for campaign_id in pending.anomaly_campaigns())
+    if not scopes:
+        return
+    from django.db.models import F
+    from django.utils import timezone
+    from core.models import DataVersion
+
+    # Missing scopes start at 0 (concurrent creations are ignored), then every scope is bumped at once
+    DataVersion.objects.bulk_create([DataVersion(scope=scope) for scope in scopes], ignore_conflicts=True)
+    DataVersion.objects.filter(scope__in=scopes).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def _queue_badges(pending):
+    if not pending.badge_users:
+        return
+    from notifications.badges import snapshot
+    from notifications.service import user_group
+
+    for user_id, badges in snapshot(pending.badge_users).items():
+        pending.events.setdefault(user_group(user_id), []).append({'type': 'badges', **badges})
+
+
+def _send_events(events):
+    if not events:
+        return
+    from channels.layers import get_channel_layer
+    from asgiref.sync import async_to_sync
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    messages = []
+    for group, payloads in events.items():
+        if len(payloads) == 1:
+            messages.append((group, {"type": "live_event", "payload": payloads[0]}))
+        else:
+            messages.append((group, {"type": "live_event_batch", "payloads": payloads}))
+
+    async def send_all():
+        await asyncio.gather(*(channel_layer.group_send(group, message) for group, message in messages))
+
+    async_to_sync(send_all)()
+
+
+class InvalidationMiddleware:
+    """Wraps each request in `batch()` so signal-driven invalidations flush once per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batch():
+            return self.get_response(request)
@@ -0,0 +1,166 @@
+"""
+Media serving: byte ranges, conditional requests and nginx offload.
+
+`serve_file` is used once Django has authorised the request (serve-video/, /media/):
+
+- ETag / Last-Modified with 304 on If-None-Match / If-Modified-Since; content-addressed
+  blobs (utils.storage) use their SHA-256 as a strong ETag and are cached as immutable;
+- `Range: bytes=...` answered with 206 (If-Range honoured, 416 when unsatisfiable);
+- when settings.MEDIA_ACCEL_REDIRECT_PREFIX is set and the file lives under MEDIA_ROOT,
+  the body is left to nginx through X-Accel-Redirect (nginx then handles ranges itself),
+  so a video viewer no longer holds a Python worker.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from utils.storage import blob_digest
+
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag_for(path, stat):
+    digest = blob_digest(os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/'))
+    if digest:
+        return quote_etag(digest), True
+    return quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}'), False
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = [t.strip().removeprefix('W/') for t in header.split(',')]
+    return etag in tags
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to serve the whole file
+    (absent, malformed or multi-range header), or 'unsatisfiable'.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return 'unsatisfiable'
+    return start, end
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _accel_path(path):
+    prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+    if not prefix:
+        return None
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real = os.path.realpath(path)
+    if os.path.commonpath([media_root, real]) != media_root:
+        return None
+    return prefix.rstrip('/') + '/' + os.path.relpath(real, media_root).replace(os.sep, '/')
+
+
+def serve_file(request, path, content_type=None, as_attachment=False):
+    """Serve an already authorised file with Range, ETag/304 and optional X-Accel-Redirect."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("Fichier introuvable")
+    if not os.path.isfile(path):
+        raise Http404("Fichier introuvable")
+
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag, immutable = _etag_for(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        # Authorised content: browsers may cache it, shared caches may not
+        'Cache-Control': 'private, max-age=31536000, immutable' if immutable else 'private, max-age=0, must-revalidate',
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    accel = _accel_path(path)
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel
+        for key, value in headers.items():
+            response[key] = value
+        if as_attachment:
+            response['Content-Disposition'] = f'attachment; filename="{os.path.basename(path)}"'
+        return response
+
+    byte_range = None
+    if request.method == 'GET':
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if byte_range and if_range and if_range.strip() != etag:
+            if_range_date = parse_http_date_safe(if_range)
+            if if_range_date is None or int(stat.st_mtime) > if_range_date:
+                byte_range = None  # Representation changed: send it whole
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type, as_attachment=as_attachment)
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+def media_view(request, path):
+    """Replacement for django.views.static.serve on /media/ with the same (public) access."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Fichier introuvable")
+    return serve_file(request, full_path)
@@ -0,0 +1,360 @@
+"""
+Indexed full-text search for anomalies, test cases and comments.
+
+Each searchable model carries a `search_document` column: the normalised text (lower
+case, accents stripped) of its own fields and of the joined ones it is searched on
+(campaign title, test reference, author names), listed in SEARCH_FIELDS.  A search
+reads that single indexed column instead of `icontains` scans across joins:
+
+- PostgreSQL: a generated `search_vector` tsvector column (`insuretm_fr`, the French
+  configuration with unaccent) behind a GIN index; prefix tsquery, ranked by ts_rank;
+- SQLite (development): an external-content FTS5 table per model, kept in sync by
+  triggers and ranked by bm25; the triggers are re-created after `migrate` because
+  SQLite table rebuilds drop them;
+- any other backend: `search_document` containment, still a single column.
+
+`register_search(model)` keeps the document up to date on save; `connect_dependencies`
+(core.apps) refreshes the documents that embed a related row when that row changes
+(campaign renamed, user renamed, test case moved).  Bulk writes skip signals: call `refresh_documents`.
+
+`#123` or `123` is an exact primary key lookup (plus the model's exact fields, e.g. the
+test case reference), never a scan.
+"""
+import logging
+import re
+import unicodedata
+from collections import namedtuple
+
+from django.db import connections, transaction
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_init, post_migrate, post_save, pre_save
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = {
+    'anomalies.Anomalie': (
+        'titre', 'description', 'test_case__test_case_ref', 'test_case__campaign__title',
+        'cree_par__username', 'cree_par__first_name', 'cree_par__last_name',
+    ),
+    'testCases.TestCase': ('test_case_ref', 'module', 'campaign__title'),
+    'comments.Comment': ('message', 'author__username', 'author__first_name', 'author__last_name'),
+}
+# Exact-match fields tried on the numeric fast path, next to the primary key
+EXACT_FIELDS = {
+    'testCases.TestCase': ('test_case_ref',),
+}
+
+TS_CONFIG = 'insuretm_fr'
+MAX_FIELD_CHARS = 20000
+EXACT_RANK = 1e9
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_ID_RE = re.compile(r'#?\s*(\d+)')
+
+_registry = {}
+_fts_tables = {}
+
+ParsedQuery = namedtuple('ParsedQuery', 'pk tokens')
+
+
+def normalize(text):
+    """Lower case, accents stripped, whitespace collapsed."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def build_document(values):
+    return ' '.join(filter(None, (normalize(str(v)[:MAX_FIELD_CHARS]) for v in values if v is not None)))
+
+
+def parse_query(term):
+    """`#12` / `12` -> exact id; anything else -> normalised tokens (prefix matched)."""
+    term = (term or '').strip()
+    match = _ID_RE.fullmatch(term)
+    if match:
+        return ParsedQuery(int(match.group(1)), [])
+    return ParsedQuery(None, _TOKEN_RE.findall(normalize(term)))
+
+
+# --- documents -------------------------------------------------------------------
+
+def _resolve(instance, lookup):
+    """Follow `a__b__c` on an instance; None when a relation on the way is empty."""
+    value = instance
+    for part in lookup.split('__'):
+        value = getattr(value, part, None)
+        if value is None:
+            return None
+    return value
+
+
+def document_for(instance):
+    return build_document(_resolve(instance, lookup) for lookup in SEARCH_FIELDS[instance._meta.label])
+
+
+def refresh_documents(queryset, batch_size=2000):
+    """Recompute the documents of `queryset` with one joined query; writes only the rows that changed."""
+    model = queryset.model
+    lookups = SEARCH_FIELDS[model._meta.label]
+    changed, count = [], 0
+    rows = queryset.order_by().values_list('pk', 'search_document', *lookups)
+    for pk, current, *values in rows.iterator(chunk_size=batch_size):
+        document = build_document(values)
+        if document != current:
+            changed.append(model(pk=pk, search_document=document))
+        if len(changed) >= batch_size:
+            model._base_manager.bulk_update(changed, ['search_document'])
+            count += len(changed)
+            changed = []
+    if changed:
+        model._base_manager.bulk_update(changed, ['search_document'])
+        count += len(changed)
+    return count
+
+
+def _dependencies(model):
+    """(related model, lookup prefix, watched attnames) for every relation a document embeds."""
+    dependencies = {}
+    for lookup in SEARCH_FIELDS[model._meta.label]:
+        parts = lookup.split('__')
+        current = model
+        for depth in range(1, len(parts)):
+            current = current._meta.get_field(parts[depth - 1]).related_model
+            field = current._meta.get_field(parts[depth])
+            key = (current, '__'.join(parts[:depth]))
+            dependencies.setdefault(key, set()).add(field.attname)
+    return [(related, prefix, frozenset(attnames)) for (related, prefix), attnames in dependencies.items()]
+
+
+def register_search(model):
+    """Maintain `model.search_document` on save and when an embedded related row changes."""
+    label = model._meta.label
+    lookups = SEARCH_FIELDS[label]
+    local = {lookup for lookup in lookups if '__' not in lookup}
+    # Own columns the document depends on: local fields and the first hop of each relation
+    attnames = frozenset(model._meta.get_field(lookup.split('__')[0]).attname for lookup in lookups)
+    uid = f'search_{model._meta.label_lower}'
+
+    def remember(sender, instance, **kwargs):
+        instance._search_source = {a: instance.__dict__[a] for a in attnames if a in instance.__dict__}
+
+    def fill(sender, instance, raw=False, update_fields=None, **kwargs):
+        if raw or (update_fields is not None and not local & set(update_fields)):
+            return
+        previous = getattr(instance, '_search_source', None)
+        unchanged = (
+            not instance._state.adding and previous is not None and len(previous) == len(attnames)
+            and all(previous[a] == instance.__dict__.get(a) for a in attnames)
+        )
+        if not unchanged or not instance.__dict__.get('search_document'):
+            instance.search_document = document_for(instance)
+
+    def persist(sender, instance, raw=False, update_fields=None, **kwargs):
+        # save(update_fields=[...]) without search_document: write the recomputed document too
+        if not raw and update_fields is not None and 'search_document' not in update_fields and local & set(update_fields):
+            sender._base_manager.filter(pk=instance.pk).update(search_document=instance.search_document)
+        remember(sender, instance)
+
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    pre_save.connect(fill, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(persist, sender=model, weak=False, dispatch_uid=uid)
+
+    _registry[label] = model
+
+
+def connect_dependencies():
+    """Watch the related rows embedded in documents (called once the app registry is ready)."""
+    for model in _registry.values():
+        for related, prefix, watched in _dependencies(model):
+            _watch(related, watched, model, prefix)
+    post_migrate.connect(_ensure_after_migrate, weak=False, dispatch_uid='search_backend')
+
+
+def _watch(related, attnames, dependant, prefix):
+    uid = f'search_{dependant._meta.label_lower}_{prefix}'
+
+    def remember(sender, instance, **kwargs):
+        snapshots = instance.__dict__.setdefault('_search_snapshot', {})
+        snapshots[uid] = {a: instance.__dict__[a] for a in attnames if a in instance.__dict__}
+
+    def on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+        previous = instance.__dict__.get('_search_snapshot', {}).get(uid, {})
+        remember(sender, instance)
+        if created or raw or (update_fields is not None and not attnames & set(update_fields)):
+            return
+        # Deferred fields are unknown: compare only what was loaded
+        if any(previous.get(a, instance.__dict__.get(a)) != instance.__dict__.get(a) for a in attnames):
+            refresh_documents(dependant._base_manager.filter(**{prefix: instance.pk}))
+
+    post_init.connect(remember, sender=related, weak=False, dispatch_uid=uid)
+    post_save.connect(on_save, sender=related, weak=False, dispatch_uid=uid)
+
+
+# --- backends --------------------------------------------------------------------
+
+def _fts_table(table):
+    return f'{table}_fts'
+
+
+def _fts_available(model, connection):
+    key = (connection.alias, model._meta.db_table)
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [_fts_table(model._meta.db_table)],
+            )
+            _fts_tables[key] = cursor.fetchone() is not None
+    return _fts_tables[key]
+
+
+def _install_sqlite(connection, cursor, table):
+    fts, qn = _fts_table(table), connection.ops.quote_name
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts)} USING fts5("
+        f"search_document, content={qn(table)}, content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+                   [table, f'{fts}_%'])
+    if cursor.fetchone()[0] == 3:
+        return False
+    delete_old = f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, search_document) VALUES ('delete', old.id, old.search_document);"
+    insert_new = f"INSERT INTO {qn(fts)}(rowid, search_document) VALUES (new.id, new.search_document);"
+    for name, event, body in (
+        ('ai', 'AFTER INSERT', insert_new),
+        ('ad', 'AFTER DELETE', delete_old),
+        ('au', 'AFTER UPDATE OF search_document', delete_old + ' ' + insert_new),
+    ):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {qn(f'{fts}_{name}')}")
+        cursor.execute(f"CREATE TRIGGER {qn(f'{fts}_{name}')} {event} ON {qn(table)} BEGIN {body} END")
+    # Triggers were missing (first install or table rebuilt by a migration): resync the index
+    cursor.execute(f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')")
+    return True
+
+
+def _install_postgresql(connection, table):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_ts_config WHERE cfgname = %s", [TS_CONFIG])
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE TEXT SEARCH CONFIGURATION {TS_CONFIG} (COPY = french)")
+            try:
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+                    cursor.execute(
+                        f"ALTER TEXT SEARCH CONFIGURATION {TS_CONFIG} "
+                        "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem"
+                    )
+            except Exception as e:
+                # Documents are already unaccented in Python; unaccent only covers raw tsquery input
+                logger.warning("unaccent unavailable, %s uses the plain French dictionary: %s", TS_CONFIG, e)
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}'::regconfig, search_document)) STORED"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_search_gin')} ON {qn(table)} USING gin (search_vector)")
+
+
+def install_index(connection, table):
+    """Create the backend index of `table` (idempotent)."""
+    if connection.vendor == 'postgresql':
+        _install_postgresql(connection, table)
+    elif connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                _install_sqlite(connection, cursor, table)
+        except Exception as e:
+            logger.warning("FTS5 unavailable for %s, search falls back to containment: %s", table, e)
+    _fts_tables.clear()
+
+
+def drop_index(connection, table):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {qn(f'{table}_search_gin')}")
+            cursor.execute(f"ALTER TABLE {qn(table)} DROP COLUMN IF EXISTS search_vector")
+        elif connection.vendor == 'sqlite':
+            fts = _fts_table(table)
+            for name in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {qn(f'{fts}_{name}')}")
+            cursor.execute(f"DROP TABLE IF EXISTS {qn(fts)}")
+    _fts_tables.clear()
+
+
+def _ensure_after_migrate(sender, using='default', **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    tables = set(connection.introspection.table_names())
+    for model in _registry.values():
+        if model._meta.db_table in tables and _fts_table(model._meta.db_table) in tables:
+            install_index(connection, model._meta.db_table)
+
+
+# --- queries ---------------------------------------------------------------------
+
+def _text_match(queryset, tokens, rank):
+    """`queryset` filtered on `tokens` with the backend index, annotated with `search_rank` when `rank`."""
+    model = queryset.model
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        params = [TS_CONFIG, tsquery]
+        queryset = queryset.filter(
+            RawSQL(f"{table}.search_vector @@ to_tsquery(%s::regconfig, %s)", params, output_field=BooleanField())
+        )
+        if rank:
+            queryset = queryset.annotate(search_rank=RawSQL(
+                f"ts_rank({table}.search_vector, to_tsquery(%s::regconfig, %s))", params, output_field=FloatField(),
+            ))
+        return queryset
+    if connection.vendor == 'sqlite' and _fts_available(model, connection):
+        fts = qn(_fts_table(model._meta.db_table))
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        if not rank:
+            return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match]))
+        # bm25() is only available on the MATCH row itself: join the FTS table so it runs once per hit
+        return queryset.extra(
+            tables=[_fts_table(model._meta.db_table)],
+            where=[f"{fts}.rowid = {table}.{qn(model._meta.pk.column)}", f"{fts} MATCH %s"],
+            params=[match],
+            select={'search_rank': f"-bm25({fts})"},
+        )
+    for token in tokens:
+        queryset = queryset.filter(search_document__contains=token)
+    if rank:
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset
+
+
+def search(queryset, term, rank=True):
+    """
+    Filter `queryset` on the search `term`.
+
+    With `rank`, rows are annotated with `search_rank` and ordered by it (exact id
+    first); callers may still re-order afterwards.
+    """
+    model = queryset.model
+    parsed = parse_query(term)
+    if parsed.pk is not None:
+        condition = Q(pk=parsed.pk)
+        for field in EXACT_FIELDS.get(model._meta.label, ()):
+            condition |= Q(**{field: term.strip().lstrip('#').strip()})
+        queryset = queryset.filter(condition)
+        if rank:
+            queryset = queryset.annotate(
+                search_rank=Case(When(pk=parsed.pk, then=Value(EXACT_RANK)), default=Value(0.0), output_field=FloatField()),
+            ).order_by('-search_rank', '-pk')
+        return queryset
+    if not parsed.tokens:
+        return queryset.none()
+
+    queryset = _text_match(queryset, parsed.tokens, rank)
+    if rank:
+        queryset = queryset.order_by('-search_rank', '-pk')
+    return queryset
@@ -0,0 +1,305 @@
+"""
+Content-addressed storage for execution proofs (screenshots, videos).
+
+Blobs are stored once under `blobs/<2 hex>/<sha256><ext>`, whatever record or
+upload they come from.  The SHA-256 is computed while the bytes go to disk:
+
+- uploads: the hashing upload handlers below digest each chunk as Django
+  receives it and expose the result as `uploaded_file.sha256`;
+- other files (Playwright artifacts): the storage hashes while streaming to a
+  temporary file that is renamed into place.
+
+Identical content therefore costs one write, and the record's hash is read back
+from the blob name (`blob_digest`).  `core.ProofBlob` keeps a reference count
+per blob across every tracked FileField (see `track_blob_fields`); a blob is
+deleted when its last reference goes away.  Reusing and deleting a blob are
+serialised on that row (`lock_blob`), and a record save that fails discards the
+blobs it stored (`storing_blobs`).
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs/'
+_BLOB_RE = re.compile(r'^blobs/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.[A-Za-z0-9]+)?$')
+
+
+def blob_name(digest, original_name=''):
+    ext = os.path.splitext(original_name)[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,10}', ext):
+        ext = ''
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest}{ext}'
+
+
+def blob_digest(name):
+    """SHA-256 encoded in a blob name, or None for legacy (dated path) files."""
+    match = _BLOB_RE.match(name or '')
+    return match.group('digest') if match else None
+
+
+def file_sha256(content):
+    """Digest of a file-like object; free when a hashing upload handler already computed it."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+            content = File(content, name)
+
+        digest = getattr(content, 'sha256', None)
+        if digest:
+            final = blob_name(digest, name)
+            lock_blob(digest)
+            if self.exists(final):
+                return final
+            if hasattr(content, 'temporary_file_path'):
+                # Large upload already on disk: move it, no copy
+                full_path = self.path(final)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                file_move_safe(content.temporary_file_path(), full_path, allow_overwrite=True)
+                self._chmod(full_path)
+                return final
+
+        # Stream to a temp file (hashing on the way when the digest is unknown), then rename
+        directory = self.path(BLOB_PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if not digest:
+                        hasher.update(chunk)
+                    tmp.write(chunk)
+            digest = digest or hasher.hexdigest()
+            final = blob_name(digest, name)
+            lock_blob(digest)
+            full_path = self.path(final)
+            if os.path.exists(full_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                self._chmod(tmp_path)
+                # Same name means same bytes, so a concurrent writer is harmless
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        content.sha256 = digest
+        return final
+
+    def _chmod(self, path):
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+
+_proof_storage = None
+
+
+def get_proof_storage():
+    global _proof_storage
+    if _proof_storage is None:
+        _proof_storage = ContentAddressedStorage()
+    return _proof_storage
+
+
+# ---------------------------------------------------------------------------
+# Upload handlers: hash each chunk as it is received
+# ---------------------------------------------------------------------------
+class HashingMemoryFileUploadHandler(MemoryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        # Set before super(): it raises StopFutureHandlers when this handler takes the file
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.activated:
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+# ---------------------------------------------------------------------------
+# Reference counting
+# ---------------------------------------------------------------------------
+def lock_blob(digest):
+    """
+    Inside a transaction, lock the ProofBlob row of `digest` until it ends.  The storage
+    takes it before reusing or writing a blob and the purge while unlinking one, so a
+    blob is never reused as it is being deleted: the save waits, then finds it gone and
+    writes it again.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        return
+    from core.models import ProofBlob
+    list(ProofBlob.objects.select_for_update().filter(digest=digest).values_list('pk', flat=True))
+
+
+def commit_file(fieldfile):
+    """Store a pending upload now (instead of in Model.save) so its blob name is known; True if one was."""
+    if fieldfile and not fieldfile._committed:
+        fieldfile.save(fieldfile.name, fieldfile.file, save=False)
+        return True
+    return False
+
+
+@contextmanager
+def storing_blobs(*fieldfiles):
+    """
+    Model.save helper: store the pending uploads of `fieldfiles` and write the record
+    in one transaction; when it fails, the blobs stored for it are discarded.
+    """
+    stored = []
+    try:
+        with transaction.atomic():
+            for fieldfile in fieldfiles:
+                if commit_file(fieldfile):
+                    stored.append(fieldfile.name)
+            yield
+    except Exception:
+        discard_blobs(stored)
+        raise
+
+
+def retain_blob(name):
+    digest = blob_digest(name)
+    if not digest:
+        return
+    from core.models import ProofBlob
+    updated = ProofBlob.objects.filter(digest=digest).update(refcount=F('refcount') + 1)
+    if not updated:
+        storage = get_proof_storage()
+        size = storage.size(name) if storage.exists(name) else 0
+        blob, created = ProofBlob.objects.get_or_create(
+            digest=digest, defaults={'name': name, 'size': size, 'refcount': 1}
+        )
+        if not created:
+            ProofBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+
+
+def release_blob(name):
+    digest = blob_digest(name)
+    if not digest:
+        return
+    from core.models import ProofBlob
+    ProofBlob.objects.filter(digest=digest).update(refcount=F('refcount') - 1)
+
+    def purge():
+        with transaction.atomic():
+            # The row stays locked while the file goes (lock_blob): no upload reuses it meanwhile
+            blob = ProofBlob.objects.select_for_update().filter(digest=digest, refcount__lte=0).first()
+            if blob is None:
+                return
+            try:
+                get_proof_storage().delete(name)
+            except OSError as e:
+                logger.warning("Could not delete orphan blob %s: %s", name, e)
+            blob.delete()
+
+    transaction.on_commit(purge, robust=True)
+
+
+def discard_blobs(names):
+    """After a rollback: delete the blobs stored for it that no committed record references."""
+    from core.models import ProofBlob
+
+    digests = {blob_digest(name): name for name in names if blob_digest(name)}
+    referenced = set(ProofBlob.objects.filter(digest__in=digests).values_list('digest', flat=True))
+    for digest, name in digests.items():
+        if digest in referenced:
+            continue
+        try:
+            get_proof_storage().delete(name)
+        except OSError as e:
+            logger.warning("Could not delete orphan blob %s: %s", name, e)
+
+
+def sync_blob_refs(instance, field_names, created=False):
+    """Adjust reference counts after `instance` was written (also usable after bulk_update)."""
+    previous = {f: '' for f in field_names} if created else getattr(instance, '_blob_names', {})
+    current = dict(previous)
+    for field_name in field_names:
+        if field_name not in previous:
+            continue
+        new = getattr(instance, field_name).name or ''
+        old = previous[field_name]
+        if new != old:
+            retain_blob(new)
+            release_blob(old)
+        current[field_name] = new
+    instance._blob_names = current
+
+
+def track_blob_fields(model, *field_names):
+    """Keep core.ProofBlob reference counts in sync for the given FileFields of `model`."""
+    def remember(sender, instance, **kwargs):
+        # Deferred fields are left out: their previous value is unknown, so they are not synced
+        instance._blob_names = {
+            f: (getattr(instance, f).name or '') if instance.__dict__.get(f) else ''
+            for f in field_names
+            if f in instance.__dict__
+        }
+
+    def on_save(sender, instance, created=False, raw=False, **kwargs):
+        if not raw:
+            sync_blob_refs(instance, field_names, created=created)
+
+    def on_delete(sender, instance, **kwargs):
+        for field_name in field_names:
+            release_blob(getattr(instance, field_name).name or '')
+
+    uid = f'blob_refs_{model._meta.label_lower}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=uid)
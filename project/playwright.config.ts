@@ -21,6 +21,8 @@ export default defineConfig({
     trace: 'on-first-retry',
     video: process.env.PW_VIDEO === 'on' ? 'on' : 'off',
     viewport: { width: 1280, height: 720 },
+    // Set by the backend browser pool: connect to a warm Chromium instead of launching one
+    connectOptions: process.env.PW_WS_ENDPOINT ? { wsEndpoint: process.env.PW_WS_ENDPOINT } : undefined,
     launchOptions: {
       slowMo: 0,
     },
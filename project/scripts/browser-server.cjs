@@ -0,0 +1,20 @@
+// Long-lived Chromium server for the backend browser pool (InsureTM/testCases/browser_pool.py).
+// Prints its ws endpoint on the first stdout line; generated specs connect through
+// PW_WS_ENDPOINT (see the test.use() injected by save-script).
+const { chromium } = require('@playwright/test');
+
+(async () => {
+  const server = await chromium.launchServer({
+    host: '127.0.0.1',
+    port: Number(process.env.PW_SERVER_PORT) || 0,
+    headless: true,
+  });
+  process.stdout.write(server.wsEndpoint() + '\n');
+
+  const stop = () => server.close().finally(() => process.exit(0));
+  process.on('SIGTERM', stop);
+  process.on('SIGINT', stop);
+})().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -3,7 +3,8 @@ import { Bell, Menu, X, Sun, Moon, CheckCircle, AlertTriangle, MessageSquare, Ma
 import { Link, useNavigate } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 import { useTheme } from '../context/ThemeContext';
-import { notificationService, type Notification } from '../services/notificationService';
+import { BADGES_EVENT, notificationService, type Badges, type Notification, type NotificationPush } from '../services/notificationService';
+import { getWsBaseUrl } from '../utils/apiConfig';
 import { useAuth } from '../context/AuthContext';
 import { useSidebar } from '../context/SidebarContext';
 import * as Popover from '@radix-ui/react-popover';
@@ -40,17 +41,71 @@ const Header = () => {
       const raw = response.data as any;
       const data: Notification[] = Array.isArray(raw) ? raw : (raw?.results ?? []);
       setNotifications(data);
-      setUnreadCount(data.filter(n => !n.is_read).length);
     } catch (error) {
       console.error("Failed to fetch notifications", error);
     }
   };
 
+  const applyBadges = (badges: Badges) => {
+    setUnreadCount(badges.notifications);
+    window.dispatchEvent(new CustomEvent<Badges>(BADGES_EVENT, { detail: badges }));
+  };
+
+  const fetchBadges = async () => {
+    if (!user) return;
+    try {
+      const response = await notificationService.getBadges();
+      applyBadges(response.data);
+    } catch (error) {
+      console.error("Failed to fetch badges", error);
+    }
+  };
+
   useEffect(() => {
     fetchNotifications();
-    // Poll every 15 seconds to optimize performance
-    const interval = setInterval(fetchNotifications, 15000);
-    return () => clearInterval(interval);
+    fetchBadges();
+    const token = localStorage.getItem('access_token');
+    if (!user || !token) return;
+
+    // New notifications and badge counters are pushed on the user's socket; re-fetched only after a reconnect
+    let ws: WebSocket | null = null;
+    let retry: ReturnType<typeof setTimeout> | null = null;
+    let closed = false;
+    let reconnecting = false;
+
+    const connect = () => {
+      const wsBase = getWsBaseUrl().replace(/\/$/, '');
+      ws = new WebSocket(`${wsBase}/ws/notifications/?token=${token}`);
+      ws.onopen = () => {
+        if (!reconnecting) return;
+        fetchNotifications();
+        fetchBadges();
+      };
+      ws.onmessage = (e) => {
+        const data = JSON.parse(e.data) as NotificationPush;
+        if (data.type === 'badges') {
+          applyBadges(data);
+          return;
+        }
+        if (data.type !== 'notification') return;
+        // A digest replaces its earlier version and moves to the top
+        setNotifications(prev =>
+          [data.notification, ...prev.filter(n => n.id !== data.notification.id)].slice(0, 50)
+        );
+      };
+      ws.onclose = () => {
+        if (closed) return;
+        reconnecting = true;
+        retry = setTimeout(connect, 5000);
+      };
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      if (retry) clearTimeout(retry);
+      ws?.close();
+    };
   }, [user]);
 
   const resolveNotificationTarget = (notif: Notification) => {
@@ -189,6 +244,9 @@ const Header = () => {
                   <div>
                     <p className={`font-medium ${!notif.is_read ? 'text-blue-600 dark:text-blue-400' : 'text-slate-700 dark:text-slate-300'}`}>
                       {notif.title}
+                      {(notif.count ?? 1) > 1 && (
+                        <span className="ml-2 text-xs font-semibold text-slate-400">×{notif.count}</span>
+                      )}
                     </p>
                     <p className="text-slate-500 mt-1 line-clamp-2">{notif.message}</p>
                     <span className="text-xs text-slate-400 mt-2 block">
@@ -1,10 +1,11 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { Link, useLocation } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 import { useAuth } from '../context/AuthContext';
 import { useSidebar } from '../context/SidebarContext';
 import { useTheme } from '../context/ThemeContext';
 import { Menu } from 'lucide-react';
+import { BADGES_EVENT, type Badges } from '../services/notificationService';
 
 const Sidebar = () => {
   const { t } = useTranslation();
@@ -12,6 +13,20 @@ const Sidebar = () => {
   const { user } = useAuth();
   const { isOpen, toggle } = useSidebar();
   const { resolvedTheme } = useTheme();
+  const [badges, setBadges] = useState<Badges | null>(null);
+
+  // Counters fetched and pushed by the header (ws/notifications/)
+  useEffect(() => {
+    const onBadges = (e: Event) => setBadges((e as CustomEvent<Badges>).detail);
+    window.addEventListener(BADGES_EVENT, onBadges);
+    return () => window.removeEventListener(BADGES_EVENT, onBadges);
+  }, []);
+
+  const badgeFor = (href: string) => {
+    if (href === '/messages') return badges?.emails ?? 0;
+    if (href === '/chat') return badges?.chat ?? 0;
+    return 0;
+  };
 
   const isAdmin = user?.role === 'ADMIN' || user?.role === 'admin';
 
@@ -62,6 +77,7 @@ const Sidebar = () => {
         <div className="space-y-1 px-3">
           {filteredItems.map((item) => {
             const isActive = location.pathname === item.href;
+            const badge = badgeFor(item.href);
             return (
               <Link
                 key={item.name}
@@ -78,6 +94,11 @@ const Sidebar = () => {
                 <span className="truncate text-sm font-semibold tracking-tight">
                   {item.name}
                 </span>
+                {badge > 0 && (
+                  <span className="ml-auto min-w-[20px] h-5 px-1.5 rounded-full bg-blue-600 text-white text-[10px] font-bold flex items-center justify-center">
+                    {badge > 99 ? '99+' : badge}
+                  </span>
+                )}
               </Link>
             );
           })}
@@ -35,7 +35,7 @@ import {
 import { Link, useLocation, useNavigate } from 'react-router-dom';
 import { useTheme } from '../context/ThemeContext';
 import { useAuth } from '../context/AuthContext';
-import { anomalyService } from '../services/api';
+import { ANOMALY_ROW_FIELDS, anomalyService } from '../services/api';
 import { toast } from 'react-toastify';
 import { useSidebar } from '../context/SidebarContext';
 import { buildTableRowTdClass } from '../utils/tableRowStyles';
@@ -190,6 +190,7 @@ const Anomalies: React.FC = () => {
       setLoading(true);
       const response = await anomalyService.getAnomalies({
         page,
+        fields: ANOMALY_ROW_FIELDS,
         search: debouncedQuery || undefined,
         campaign_id: campaignIdFilter || undefined,
         impact: impactFilter !== 'Tout' ? impactFilter : undefined,
@@ -204,15 +205,7 @@ const Anomalies: React.FC = () => {
 
       const mappedAnomalies: Anomaly[] = data.map((a: any) => mapAnomalyFromApi(a));
       setData(mappedAnomalies);
-
-      if (location.state && (location.state as any).openAnomalyId) {
-          const targetId = (location.state as any).openAnomalyId.toString();
-          const toOpen = mappedAnomalies.find(an => an.id === targetId);
-          if (toOpen) {
-              setSelectedAnomaly(toOpen);
-              navigate(location.pathname, { replace: true, state: {} });
-          }
-      }
+      // location.state.openAnomalyId is opened with the full detail by the effect below
     } catch (error) {
       if (requestId !== searchRequestRef.current) return;
       console.error("Failed to fetch anomalies", error);
@@ -221,7 +214,7 @@ const Anomalies: React.FC = () => {
         setLoading(false);
       }
     }
-  }, [debouncedQuery, campaignIdFilter, impactFilter, sortOrder, location.state, location.pathname, navigate]);
+  }, [debouncedQuery, campaignIdFilter, impactFilter, sortOrder]);
 
   React.useEffect(() => {
     fetchAnomalies(1);
@@ -231,12 +224,7 @@ const Anomalies: React.FC = () => {
   React.useEffect(() => {
     if (!highlightId) return;
 
-    const openFromList = data.find((an) => an.id === highlightId);
-    if (openFromList) {
-      setSelectedAnomaly(openFromList);
-      return;
-    }
-
+    // List rows are compact: the modal needs the detail (script, logs)
     let cancelled = false;
     (async () => {
       try {
@@ -249,7 +237,7 @@ const Anomalies: React.FC = () => {
     })();
 
     return () => { cancelled = true; };
-  }, [highlightId, data]);
+  }, [highlightId]);
 
   React.useEffect(() => {
     const openId = (location.state as any)?.openAnomalyId;
@@ -278,6 +266,17 @@ const Anomalies: React.FC = () => {
     fetchAnomalies(page);
   };
 
+  // Logs and script are not part of the list rows: fetched for the clicked anomaly only
+  const openDetailModal = async (an: Anomaly, field: 'execution_logs' | 'playwright_script', title: string, empty: string) => {
+    try {
+      const res = await anomalyService.getAnomaly(an.id, { fields: field });
+      setLogModal({ title, content: res.data[field] || empty });
+    } catch (error) {
+      console.error(`Failed to load ${field}`, error);
+      toast.error("Impossible de charger le détail de l'anomalie.");
+    }
+  };
+
   const handleEditAnomaly = (an: any) => {
     setEditingAnomaly(an);
   };
@@ -766,7 +765,7 @@ const Anomalies: React.FC = () => {
                               <button
                                   onClick={(e) => {
                                       e.stopPropagation();
-                                      setLogModal({ title: `Logs d'exécution — ${an.title}`, content: an.execution_logs || "Aucun log d'exécution disponible." });
+                                      openDetailModal(an, 'execution_logs', `Logs d'exécution — ${an.title}`, "Aucun log d'exécution disponible.");
                                   }}
                                   className="px-3 py-1.5 bg-slate-100 dark:bg-white/5 text-slate-500 dark:text-slate-400 hover:text-blue-500 dark:hover:text-blue-400 hover:bg-blue-500/10 rounded-xl text-[10px] font-bold uppercase tracking-widest transition-all border border-slate-200 dark:border-white/10"
                               >
@@ -775,7 +774,7 @@ const Anomalies: React.FC = () => {
                               <button
                                   onClick={(e) => {
                                       e.stopPropagation();
-                                      setLogModal({ title: `Code Source — ${an.title}`, content: an.playwright_script || "Aucun code source disponible." });
+                                      openDetailModal(an, 'playwright_script', `Code Source — ${an.title}`, "Aucun code source disponible.");
                                   }}
                                   className="px-3 py-1.5 bg-slate-100 dark:bg-white/5 text-slate-500 dark:text-slate-400 hover:text-indigo-500 dark:hover:text-indigo-400 hover:bg-indigo-500/10 rounded-xl text-[10px] font-bold uppercase tracking-widest transition-all border border-slate-200 dark:border-white/10"
                               >
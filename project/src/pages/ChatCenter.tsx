@@ -34,6 +34,10 @@ interface Conversation {
     unreadCount: number;
 }
 
+// `cursor` query parameter of a paginated `next` / `previous` link
+const cursorOf = (link?: string | null): string | null =>
+    link ? new URL(link, window.location.origin).searchParams.get('cursor') : null;
+
 // ---------------------------------------------------------------------------
 // Main Component
 // ---------------------------------------------------------------------------
@@ -49,6 +53,9 @@ const ChatCenter = () => {
     const [conversations, setConversations] = useState<Conversation[]>([]);
     const [selectedConv, setSelectedConv] = useState<Conversation | null>(null);
     const [messages, setMessages] = useState<any[]>([]);
+    // Cursor of the next (older) page of the conversation history, null when fully loaded
+    const [olderCursor, setOlderCursor] = useState<string | null>(null);
+    const [loadingOlder, setLoadingOlder] = useState(false);
     const [loading, setLoading] = useState(true);
     const [chatMessage, setChatMessage] = useState('');
     const [searchQuery, setSearchQuery] = useState('');
@@ -98,6 +105,8 @@ const ChatCenter = () => {
     const selectedConvRef = useRef<Conversation | null>(null);
     const typingStopRef = useRef<ReturnType<typeof setTimeout> | null>(null);
     const typingHideRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+    // Scroll height before older messages were prepended, to keep the view in place
+    const prependScrollRef = useRef<number | null>(null);
 
     useEffect(() => {
         selectedConvRef.current = selectedConv;
@@ -328,8 +337,10 @@ const ChatCenter = () => {
 
         const fetchMessages = async () => {
             try {
+                // Newest page first (cursor pagination); displayed oldest to newest
                 const response = await chatService.getMessages({ conversation: selectedConv.id });
-                const msgs = response.data.results || response.data;
+                const msgs = [...(response.data.results || response.data)].reverse();
+                setOlderCursor(cursorOf(response.data.next));
                 setMessages(msgs);
                 if (msgs.length > 0) {
                     await markConversationAsRead(selectedConv.id, msgs[msgs.length - 1].id);
@@ -340,9 +351,33 @@ const ChatCenter = () => {
         };
 
         setTypingUser(null);
+        setOlderCursor(null);
         fetchMessages();
     }, [selectedConv?.id]);
 
+    const loadOlderMessages = async () => {
+        if (!selectedConv || !olderCursor || loadingOlder) return;
+        setLoadingOlder(true);
+        try {
+            const response = await chatService.getMessages({ conversation: selectedConv.id, cursor: olderCursor });
+            const older = [...(response.data.results || [])].reverse();
+            prependScrollRef.current = scrollRef.current?.scrollHeight ?? null;
+            setOlderCursor(cursorOf(response.data.next));
+            setMessages(prev => {
+                const known = new Set(prev.map(m => String(m.id)));
+                return [...older.filter((m: any) => !known.has(String(m.id))), ...prev];
+            });
+        } catch (err) {
+            console.error('Failed to fetch older messages', err);
+        } finally {
+            setLoadingOlder(false);
+        }
+    };
+
+    const handleMessagesScroll = (e: React.UIEvent<HTMLDivElement>) => {
+        if (e.currentTarget.scrollTop < 40) loadOlderMessages();
+    };
+
     // Fetch users for search
     useEffect(() => {
         if (showNewChatModal) {
@@ -352,9 +387,14 @@ const ChatCenter = () => {
         }
     }, [showNewChatModal]);
 
-    // Scroll to bottom
+    // Scroll to bottom (or stay in place when older messages were prepended)
     useEffect(() => {
         if (scrollRef.current) {
+            if (prependScrollRef.current !== null) {
+                scrollRef.current.scrollTop = scrollRef.current.scrollHeight - prependScrollRef.current;
+                prependScrollRef.current = null;
+                return;
+            }
             scrollRef.current.scrollTop = scrollRef.current.scrollHeight;
         }
     }, [messages]);
@@ -731,7 +771,10 @@ const ChatCenter = () => {
                                 </div>
                             </div>
 
-                            <div ref={scrollRef} className="flex-1 overflow-y-auto p-[16px] gap-[12px] flex flex-col custom-scrollbar-thin">
+                            <div ref={scrollRef} onScroll={handleMessagesScroll} className="flex-1 overflow-y-auto p-[16px] gap-[12px] flex flex-col custom-scrollbar-thin">
+                                {loadingOlder && (
+                                    <div className="flex justify-center text-[11px] text-slate-400">Chargement des messages précédents...</div>
+                                )}
                                 {groupMessagesByDate(messages).map((group, gIdx) => (
                                     <div key={gIdx} className="flex flex-col gap-[12px]">
                                         <div className="flex justify-center my-2">
@@ -47,6 +47,13 @@ import { useTheme } from '../context/ThemeContext';
 import { formatCadencePerDay } from '../utils/cadence';
 import { getWsBaseUrl } from '../utils/apiConfig';
 
+const CAMPAIGN_CARD_FIELDS = [
+    'id', 'title', 'description', 'created_at', 'nb_test_cases', 'excel_file',
+    'assigned_testers', 'assigned_testers_names', 'current_quotas', 'tester_progress',
+    'project', 'project_name', 'business_project_name', 'start_date', 'estimated_end_date', 'scheduled_at',
+    'passed_count', 'failed_count', 'executed_count', 'progress_percentage', 'anomalies_count',
+].join(',');
+
 interface TimelineGuardData {
     status: 'OPTIMAL' | 'WARNING' | 'CRITICAL' | 'INITIAL' | 'WAITING';
     velocity: number;
@@ -324,6 +331,8 @@ const DataDrivenManager = () => {
                 search: searchQuery,
                 tester: testerFilter,
                 ordering: sortOrder === 'newest' ? '-created_at' : 'created_at',
+                // Compact rows plus the per-tester quotas and progress shown on each card
+                fields: CAMPAIGN_CARD_FIELDS,
             };
             if (backBusinessProjectId) {
                 params.business_project = backBusinessProjectId;
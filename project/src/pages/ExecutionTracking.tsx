@@ -8,6 +8,7 @@ import ReviewPanel from '../components/ReviewPanel';
 import EditExecutionModal from '../components/EditExecutionModal';
 import { useNavigate, useLocation } from 'react-router-dom';
 import {
+    EXECUTION_ROW_FIELDS,
     executionService,
     projectService,
     campaignService,
@@ -213,6 +214,7 @@ const ExecutionTracking = () => {
             setLoading(true);
             const response = await executionService.getExecutions({
                 page,
+                fields: `${EXECUTION_ROW_FIELDS},execution_log_excerpt,automation_code`,
                 search: searchQuery,
                 ordering: sortOrder === 'newest' ? '-execution_date' : 'execution_date'
             });
@@ -240,7 +242,7 @@ const ExecutionTracking = () => {
                 release: t.project_name || 'Release A',
                 businessProject: t.business_project_name || 'Global',
                 releaseType: t.release_type,
-                execution_logs: t.data_json?.execution_logs,
+                execution_logs: t.execution_log_excerpt,
                 automation_code: t.automation_code
             };
         });
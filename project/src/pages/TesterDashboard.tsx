@@ -352,7 +352,7 @@ const TesterDashboard = () => {
             const avgCompletion = total > 0 ? Math.round((executed / total) * 100) : 0;
 
             try {
-                const anomaliesRes = await anomalyService.getAnomalies();
+                const anomaliesRes = await anomalyService.getAnomalies({ fields: 'statut' });
                 const anomData = anomaliesRes.data.results || anomaliesRes.data;
                 const openAnom = anomData.filter((a: any) => a.statut !== 'REALISE').length;
                 setStats(prev => ({ ...prev, totalTests: total, openAnomalies: openAnom, avgCompletion }));
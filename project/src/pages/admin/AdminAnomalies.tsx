@@ -3,7 +3,7 @@ import { useTranslation } from 'react-i18next';
 import PageLayout from '../../components/PageLayout';
 import AdminTable from '../../components/AdminTable';
 import EditAnomalyModal from '../../components/EditAnomalyModal';
-import { anomalyService } from '../../services/api';
+import { ANOMALY_ROW_FIELDS, anomalyService } from '../../services/api';
 import { toast } from 'react-toastify';
 import { AlertTriangle, Trash2, Pencil, Filter, ShieldAlert, AlertOctagon, AlertCircle, CheckCircle2, Search, Rocket, User, Calendar, ExternalLink, XCircle, Info, Layers, Eye } from 'lucide-react';
 import { Link, useLocation } from 'react-router-dom';
@@ -36,7 +36,7 @@ const AdminAnomalies = () => {
     const fetchAnomalies = async () => {
         try {
             setLoading(true);
-            const response = await anomalyService.getAnomalies();
+            const response = await anomalyService.getAnomalies({ fields: ANOMALY_ROW_FIELDS });
             const data = response.data.results || response.data;
             const sortedData = data.sort((a: any, b: any) =>
                 new Date(b.cree_le).getTime() - new Date(a.cree_le).getTime()
@@ -54,17 +54,31 @@ const AdminAnomalies = () => {
         fetchAnomalies();
     }, []);
 
+    const toDetail = (item: any) => ({
+        ...item,
+        title: item.titre,
+        severity: item.criticite === 'CRITIQUE' ? 'Critique' : item.criticite === 'MOYENNE' ? 'Moyenne' : 'Faible',
+        author_name: item.cree_par_nom,
+        created_at: item.cree_le,
+        campaign: item.campaign_title || 'N/A',
+        release: item.project_name || 'N/A',
+        relatedTest: item.test_case_ref
+    });
+
+    // List rows are compact: the row opens at once, the script and logs follow with the detail
+    const openDetails = (item: any) => {
+        setSelectedAnomaly(toDetail(item));
+        anomalyService.getAnomaly(item.id)
+            .then((res) => setSelectedAnomaly((current: any) => (current?.id === item.id ? toDetail(res.data) : current)))
+            .catch(() => {});
+    };
+
     useEffect(() => {
-        if (!highlightId || anomalies.length === 0) return;
-        const found = anomalies.find((a) => a.id.toString() === highlightId);
-        if (found) {
-            setSelectedAnomaly(found);
-            return;
-        }
+        if (!highlightId) return;
         anomalyService.getAnomaly(highlightId)
             .then((res) => setSelectedAnomaly(res.data))
             .catch(() => {});
-    }, [highlightId, anomalies]);
+    }, [highlightId]);
 
     useEffect(() => {
         setCurrentPage(1);
@@ -296,31 +310,13 @@ const AdminAnomalies = () => {
                         </div>
                     }
                     variant="transparent"
-                    onRowClick={(item) => setSelectedAnomaly({
-                        ...item,
-                        title: item.titre,
-                        severity: item.criticite === 'CRITIQUE' ? 'Critique' : item.criticite === 'MOYENNE' ? 'Moyenne' : 'Faible',
-                        author_name: item.cree_par_nom,
-                        created_at: item.cree_le,
-                        campaign: item.campaign_title || 'N/A',
-                        release: item.project_name || 'N/A',
-                        relatedTest: item.test_case_ref
-                    })}
+                    onRowClick={openDetails}
                     actions={(item) => (
                         <div className="flex items-center gap-4 pr-4">
                             <button
                                 onClick={(e) => {
                                     e.stopPropagation();
-                                    setSelectedAnomaly({
-                                        ...item,
-                                        title: item.titre,
-                                        severity: item.criticite === 'CRITIQUE' ? 'Critique' : item.criticite === 'MOYENNE' ? 'Moyenne' : 'Faible',
-                                        author_name: item.cree_par_nom,
-                                        created_at: item.cree_le,
-                                        campaign: item.campaign_title || 'N/A',
-                                        release: item.project_name || 'N/A',
-                                        relatedTest: item.test_case_ref
-                                    });
+                                    openDetails(item);
                                 }}
                                 className="text-slate-400 hover:text-blue-400 transition-all"
                                 title="Voir détails"
@@ -2,7 +2,7 @@ import React, { useEffect, useState, useMemo } from 'react';
 import { useTranslation } from 'react-i18next';
 import PageLayout from '../../components/PageLayout';
 import ExecutionTestList, { type TestItem } from '../../components/ExecutionTestList';
-import { executionService } from '../../services/api';
+import { EXECUTION_ROW_FIELDS, executionService } from '../../services/api';
 import { toast } from 'react-toastify';
 import EditExecutionModal from '../../components/EditExecutionModal';
 import { useLocation } from 'react-router-dom';
@@ -34,7 +34,8 @@ const AdminExecutions = () => {
     const fetchExecutions = async () => {
         try {
             setLoading(true);
-            const response = await executionService.getExecutions();
+            // assigned_tester_name is not part of the compact list rows
+            const response = await executionService.getExecutions({ fields: EXECUTION_ROW_FIELDS });
             const data = response.data.results || response.data;
             const mappedTests: TestItem[] = data.map((t_item: any, index: number) => ({
                 id: (t_item.id || index).toString(),
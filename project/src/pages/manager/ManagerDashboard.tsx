@@ -10,6 +10,7 @@ import {
     campaignService,
     anomalyService,
     aiService,
+    analyticsService,
     businessProjectService
 } from '../../services/api';
 import {
@@ -93,6 +94,8 @@ const ManagerDashboard = () => {
     const [isCatchupPlanOpen, setIsCatchupPlanOpen] = useState(false);
     const [catchupCampaignId, setCatchupCampaignId] = useState<number | null>(null);
     const [realtimeCampaignId, setRealtimeCampaignId] = useState<number | null>(null);
+    // Open anomalies per impact, from the server-side daily rollups (null until loaded)
+    const [openByImpact, setOpenByImpact] = useState<Record<string, number> | null>(null);
 
     const [rawData, setRawData] = useState<RawData & { businessProjects: any[] }>({
         projects: [],
@@ -110,7 +113,8 @@ const ManagerDashboard = () => {
             const [projectsRes, campaignsRes, anomaliesRes, businessProjectsRes] = await Promise.all([
                 projectService.getProjects({ page_size: 1000 }),
                 campaignService.getCampaigns({ page_size: 1000 } as any),
-                anomalyService.getAnomalies({ page_size: 1000 }),
+                // Only the columns the widgets aggregate
+                anomalyService.getAnomalies({ page_size: 1000, fields: 'cree_le,impact,statut,campaign_id' }),
                 businessProjectService.getBusinessProjects({ page_size: 1000 })
             ]);
 
@@ -178,6 +182,12 @@ const ManagerDashboard = () => {
     // Reset release filter when project changes
     useEffect(() => { setSelectedRelease('all'); }, [selectedProjectId]);
 
+    useEffect(() => {
+        analyticsService.getAnomalyDistribution(selectedProjectId)
+            .then(res => setOpenByImpact(res.data.open_by_impact))
+            .catch(() => setOpenByImpact(null));
+    }, [selectedProjectId]);
+
     // -------------------------------------------------------------------------
     // Derived / filtered data
     // -------------------------------------------------------------------------
@@ -247,11 +257,15 @@ const ManagerDashboard = () => {
         });
 
         // --- Anomaly distribution for pie chart (anomalies ouvertes uniquement) ---
+        // Every open anomaly is counted by the server rollups; the loaded rows are a fallback
+        const countImpacts = (impacts: (string | null)[]) => openByImpact
+            ? impacts.reduce((s: number, impact) => s + (impact ? openByImpact[impact] || 0 : 0), 0)
+            : openAnoms.filter((a: any) => impacts.includes(a.impact || null)).length;
         const distribution = [
-            { name: 'Critique / Bloquante', value: openAnoms.filter((a: any) => ['CRITIQUE', 'BLOQUANTES'].includes(a.impact)).length, color: '#f43f5e' },
-            { name: 'Majeure / Mineure', value: openAnoms.filter((a: any) => ['MAJEUR', 'MINEURS'].includes(a.impact)).length, color: '#f59e0b' },
-            { name: 'Autres (UX/Text)', value: openAnoms.filter((a: any) => ['COSMETIQUE', 'TEXTE', 'SIMPLE', 'FONCTIONNALITE'].includes(a.impact)).length, color: '#3b82f6' },
-            { name: 'À définir', value: openAnoms.filter((a: any) => !a.impact || a.impact === 'A_DEFINIR').length, color: '#64748b' },
+            { name: 'Critique / Bloquante', value: countImpacts(['CRITIQUE', 'BLOQUANTES']), color: '#f43f5e' },
+            { name: 'Majeure / Mineure', value: countImpacts(['MAJEUR', 'MINEURS']), color: '#f59e0b' },
+            { name: 'Autres (UX/Text)', value: countImpacts(['COSMETIQUE', 'TEXTE', 'SIMPLE', 'FONCTIONNALITE']), color: '#3b82f6' },
+            { name: 'À définir', value: countImpacts([null, 'A_DEFINIR']), color: '#64748b' },
         ].filter(d => d.value > 0);
 
         // --- Release grouping ---
@@ -298,7 +312,7 @@ const ManagerDashboard = () => {
             recentActivity,
             groupMode
         };
-    }, [rawData, selectedProjectId, groupMode]);
+    }, [rawData, selectedProjectId, groupMode, openByImpact]);
 
     // -------------------------------------------------------------------------
     // Tabs configuration
@@ -97,7 +97,9 @@ const TesterProfilePanel: React.FC<{ tester: Tester; onClose: () => void }> = ({
         const fetchStats = async () => {
             setLoading(true);
             try {
-                const res = await api.get('/testcases/', { params: { tester_id: tester.id, page_size: 1000 } });
+                const res = await api.get('/testcases/', {
+                    params: { tester_id: tester.id, page_size: 1000, fields: 'status,business_project_name,project_name,campaign_title' },
+                });
                 const cases = res.data?.results ?? res.data ?? [];
                 const passed = cases.filter((c: any) => c.status === 'PASSED').length;
                 const failed = cases.filter((c: any) => c.status === 'FAILED').length;
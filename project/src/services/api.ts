@@ -49,6 +49,25 @@ api.interceptors.response.use(
 const multipartHeaders = (data: unknown) =>
     data instanceof FormData ? { 'Content-Type': undefined } : undefined;
 
+// ---------------------------------------------------------------------------
+// Helper: background reports — request, poll until built, then download the blob.
+// An unchanged report is answered at once from the server's stored copy.
+// ---------------------------------------------------------------------------
+const REPORT_POLL_MS = 1500;
+const REPORT_MAX_WAIT_MS = 10 * 60 * 1000;
+
+const downloadReport = async (kind: string, params: Record<string, unknown> = {}) => {
+    let { data: job } = await api.post('/reports/', { kind, params });
+    const deadline = Date.now() + REPORT_MAX_WAIT_MS;
+    while (job.status !== 'DONE') {
+        if (job.status === 'FAILED') throw new Error(job.error || 'La génération du rapport a échoué.');
+        if (Date.now() > deadline) throw new Error('La génération du rapport prend trop de temps.');
+        await new Promise((resolve) => setTimeout(resolve, REPORT_POLL_MS));
+        ({ data: job } = await api.get(`/reports/${job.id}/`));
+    }
+    return api.get(`/reports/${job.id}/download/`, { responseType: 'blob' });
+};
+
 // ---------------------------------------------------------------------------
 // Services
 // ---------------------------------------------------------------------------
@@ -81,6 +100,9 @@ export const campaignService = {
     getCampaignDashboard: (id: string | number) => api.get(`/campaigns/${id}/dashboard/`),
 };
 
+// Compact test case rows plus the tester the case is assigned to (one lookup per row, hence opt-in)
+export const EXECUTION_ROW_FIELDS = 'id,campaign,campaign_title,project_name,business_project_name,release_type,test_case_ref,status,tester,tester_name,assigned_tester_name,execution_date,proof_file,proof_video,is_automated';
+
 export const executionService = {
     getExecutions: (params?: Record<string, unknown>) => api.get('/testcases/', { params }),
     getExecution: (id: string | number) => api.get(`/testcases/${id}/`),
@@ -101,17 +123,22 @@ export const executionService = {
     },
 };
 
+// List rows are compact (no description, logs or script): pages showing the description ask for it
+export const ANOMALY_ROW_FIELDS = 'id,titre,description,impact,priorite,visibilite,statut,preuve_image,preuve_video,cree_le,cree_par,cree_par_nom,test_case,test_case_ref,campaign_id,campaign_title,project_name';
+
 export const anomalyService = {
     getAnomalies: (params?: Record<string, unknown>) => api.get('/anomalies/', { params }),
-    getAnomaly: (id: string | number) => api.get(`/anomalies/${id}/`),
+    getAnomaly: (id: string | number, params?: { fields?: string; omit?: string }) =>
+        api.get(`/anomalies/${id}/`, { params }),
     createAnomaly: (data: FormData | Record<string, unknown>) =>
         api.post('/anomalies/', data, { headers: multipartHeaders(data) }),
     updateAnomaly: (id: string, data: FormData | Record<string, unknown>) =>
         api.patch(`/anomalies/${id}/`, data, { headers: multipartHeaders(data) }),
-    exportAnomaliesPdf: (params?: Record<string, unknown>) =>
-        api.get('/anomalies/export_pdf/', { params, responseType: 'blob' }),
+    exportAnomaliesPdf: (params?: Record<string, unknown>) => downloadReport('anomalies_pdf', params),
     exportAnomaliesXlsx: (params?: Record<string, unknown>) =>
         api.get('/anomalies/export_xlsx/', { params, responseType: 'blob' }),
+    getSimilarAnomalies: (id: string | number, limit = 5) =>
+        api.get(`/anomalies/${id}/similar/`, { params: { limit } }),
     diagnoseExternalLogs: (data: { logs: string; code?: string }) =>
         api.post('/anomalies/diagnose_external_logs/', data),
     deleteAnomaly: (id: string) => api.delete(`/anomalies/${id}/`),
@@ -178,7 +205,7 @@ export const aiService = {
     getReadinessScoreByProject: (projectId: string | number) =>
         api.get(`/analytics/readiness-score/project/${projectId}/`),
     exportClosureReport: (campaignId: string | number) =>
-        api.get(`/analytics/closure-report/${campaignId}/`, { responseType: 'blob' }),
+        downloadReport('closure_pdf', { campaign_id: campaignId }),
     getDashboardBrief: (stats: Record<string, unknown>) =>
         api.post('/analytics/dashboard-brief/', { stats }),
     getCatchupPlan: (campaignId: string | number) =>
@@ -212,6 +239,8 @@ export const analyticsService = {
     }),
     getHistoricalTesters: (projectId: string | number) => api.get('/analytics/testers/', { params: { project_id: projectId, period: '6_releases' } }),
     getHistoricalModules: (projectId: string | number) => api.get('/analytics/modules/', { params: { project_id: projectId } }),
+    getAnomalyDistribution: (projectId: string | number, params?: { days?: number; campaign_id?: number }) =>
+        api.get('/analytics/anomaly-distribution/', { params: { project_id: projectId, ...params } }),
     getQANews: () => api.get('/analytics/qa-news/'),
     deleteQANews: (id: string | number) => api.delete('/analytics/qa-news/', { params: { id } }),
     triggerQAScraping: () => api.post('/analytics/qa-news/'),
@@ -9,10 +9,28 @@ export interface Notification {
     type: string;
     related_campaign?: number;
     related_object_id?: number;
+    count?: number;
 }
 
+/** Unread counters (notifications.badges); conversation ids are keys */
+export interface Badges {
+    notifications: number;
+    emails: number;
+    chat: number;
+    conversations: Record<string, number>;
+}
+
+/** Messages pushed on ws/notifications/: a new or coalesced notification, or the new badge counters */
+export type NotificationPush =
+    | { type: 'notification'; digest: boolean; notification: Notification }
+    | ({ type: 'badges' } & Badges);
+
+/** Window event re-dispatched by the header so other components (sidebar) follow the badges */
+export const BADGES_EVENT = 'insuretm:badges';
+
 export const notificationService = {
     getNotifications: () => api.get<Notification[]>('/notifications/?page_size=50'),
     markAsRead: (id: number) => api.post(`/notifications/${id}/mark_read/`),
     markAllAsRead: () => api.post('/notifications/mark_all_read/'),
+    getBadges: () => api.get<Badges>('/notifications/badges/'),
 };